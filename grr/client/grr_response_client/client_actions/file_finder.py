@@ -25,16 +25,34 @@ class FileFinderOS(actions.ActionPlugin):
     self.stat_cache = utils.StatCache()
 
     action = self._ParseAction(args)
-    for path in self._GetExpandedPaths(args):
+    if isinstance(action, subactions.HashAction):
+      # Hashing is CPU and IO bound, so several files are hashed at once.
+      for result in action.ExecuteMany(self._GetValidatedPaths(args)):
+        self.SendReply(result)
+      return
+
+    for path, result in self._GetValidatedPaths(args):
+      action.Execute(path, result)
+      self.SendReply(result)
+
+  def _GetValidatedPaths(self, args):
+    """Yields `(path, result)` pairs for expanded paths passing all conditions.
+
+    Args:
+      args: A `FileFinderArgs` instance.
+
+    Yields:
+      Paths along with `FileFinderResult` instances with matches filled-in.
+    """
+    for path, entry in self._GetExpandedPaths(args):
       self.Progress()
       try:
-        matches = self._Validate(args, path)
-        result = rdf_file_finder.FileFinderResult()
-        result.matches = matches
-        action.Execute(path, result)
-        self.SendReply(result)
+        matches = self._Validate(args, path, entry=entry)
       except _SkipFileException:
-        pass
+        continue
+      result = rdf_file_finder.FileFinderResult()
+      result.matches = matches
+      yield path, result
 
   def _ParseAction(self, args):
     action_type = args.action.action_type
@@ -54,15 +72,16 @@ class FileFinderOS(actions.ActionPlugin):
           expansion.
 
     Yields:
-      Absolute paths (as string objects) derived from input patterns.
+      Absolute paths (as string objects) derived from input patterns along with
+      their directory entries (or `None` if not known).
     """
     opts = globbing.PathOpts(
         follow_links=args.follow_links,
         recursion_blacklist=_GetMountpointBlacklist(args.xdev))
 
     for path in args.paths:
-      for expanded_path in globbing.ExpandPath(utils.SmartStr(path), opts):
-        yield expanded_path
+      for result in globbing.ExpandPathEntries(utils.SmartStr(path), opts):
+        yield result
 
   def _GetStat(self, filepath, follow_symlink=True):
     try:
@@ -70,14 +89,21 @@ class FileFinderOS(actions.ActionPlugin):
     except OSError:
       raise _SkipFileException()
 
-  def _Validate(self, args, filepath):
+  def _Validate(self, args, filepath, entry=None):
     matches = []
-    self._ValidateRegularity(args, filepath)
+    self._ValidateRegularity(args, filepath, entry=entry)
     self._ValidateMetadata(args, filepath)
     self._ValidateContent(args, filepath, matches)
     return matches
 
-  def _ValidateRegularity(self, args, filepath):
+  def _ValidateRegularity(self, args, filepath, entry=None):
+    if entry is not None:
+      # File types are known from listing the directory, so irregular files can
+      # be rejected before issuing any `stat` calls.
+      if not args.process_non_regular_files and not _IsRegularEntry(entry):
+        raise _SkipFileException()
+      self.stat_cache.AddEntry(entry)
+
     stat = self._GetStat(filepath, follow_symlink=False)
 
     is_regular = stat.IsRegular() or stat.IsDirectory()
@@ -92,13 +118,26 @@ class FileFinderOS(actions.ActionPlugin):
         raise _SkipFileException()
 
   def _ValidateContent(self, args, filepath, matches):
-    for content_condition in _ParseContentConditions(args):
-      result = list(content_condition.Search(filepath))
+    content_conditions = list(_ParseContentConditions(args))
+    if not content_conditions:
+      return
+
+    results = conditions.ContentCondition.SearchMany(content_conditions,
+                                                     filepath)
+    for result in results:
       if not result:
         raise _SkipFileException()
       matches.extend(result)
 
 
+def _IsRegularEntry(entry):
+  try:
+    return entry.is_file(follow_symlinks=False) or entry.is_dir(
+        follow_symlinks=False)
+  except OSError:
+    return False
+
+
 def _ParseMetadataConditions(args):
   return conditions.MetadataCondition.Parse(args.conditions)
 
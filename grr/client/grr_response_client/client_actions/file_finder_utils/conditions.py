@@ -3,8 +3,10 @@
 
 import abc
 import collections
+import re
 
 
+from future.utils import iteritems
 from future.utils import with_metaclass
 
 from grr_response_client import streaming
@@ -136,18 +138,6 @@ class ExtFlagsCondition(MetadataCondition):
 class ContentCondition(with_metaclass(abc.ABCMeta, object)):
   """An abstract class representing conditions on the file contents."""
 
-  @abc.abstractmethod
-  def Search(self, path):
-    """Searches specified file for particular content.
-
-    Args:
-      path: A path to the file that is going to be searched.
-
-    Yields:
-      `BufferReference` objects pointing to file parts with matching content.
-    """
-    pass
-
   @staticmethod
   def Parse(conditions):
     """Parses the file finder condition types into the condition objects.
@@ -173,6 +163,23 @@ class ContentCondition(with_metaclass(abc.ABCMeta, object)):
   OVERLAP_SIZE = 1024 * 1024
   CHUNK_SIZE = 10 * 1024 * 1024
 
+  @abc.abstractmethod
+  def GetMatcher(self):
+    """Returns a `Matcher` instance for the pattern of this condition."""
+    pass
+
+  def Search(self, path):
+    """Searches specified file for particular content.
+
+    Args:
+      path: A path to the file that is going to be searched.
+
+    Yields:
+      `BufferReference` objects pointing to file parts with matching content.
+    """
+    for match in self.Scan(path, self.GetMatcher()):
+      yield match
+
   def Scan(self, path, matcher):
     """Scans given file searching for occurrences of given pattern.
 
@@ -190,18 +197,92 @@ class ContentCondition(with_metaclass(abc.ABCMeta, object)):
     amount = self.params.length
     for chunk in streamer.StreamFilePath(path, offset=offset, amount=amount):
       for span in chunk.Scan(matcher):
-        ctx_begin = max(span.begin - self.params.bytes_before, 0)
-        ctx_end = min(span.end + self.params.bytes_after, len(chunk.data))
-        ctx_data = chunk.data[ctx_begin:ctx_end]
-
-        yield rdf_client.BufferReference(
-            offset=chunk.offset + ctx_begin,
-            length=len(ctx_data),
-            data=ctx_data)
+        yield self._BufferReference(chunk, span)
 
         if self.params.mode == self.params.Mode.FIRST_HIT:
           return
 
+  def _BufferReference(self, chunk, span):
+    ctx_begin = max(span.begin - self.params.bytes_before, 0)
+    ctx_end = min(span.end + self.params.bytes_after, len(chunk.data))
+    ctx_data = chunk.data[ctx_begin:ctx_end]
+
+    return rdf_client.BufferReference(
+        offset=chunk.offset + ctx_begin, length=len(ctx_data), data=ctx_data)
+
+  @staticmethod
+  def SearchMany(conditions, path):
+    """Searches specified file for contents of several conditions at once.
+
+    Conditions searching the same range of the file share the chunks read from
+    it, so the file is read once per distinct range rather than once per
+    condition. Literal patterns are additionally looked up in a single pass over
+    each chunk. Results are exactly the same as these of `Search`.
+
+    Since a file is rejected as soon as any of the conditions is not met, the
+    search stops early once one of the conditions is known to have no hits.
+
+    Args:
+      conditions: A list of `ContentCondition` objects.
+      path: A path to the file that is going to be searched.
+
+    Returns:
+      A list with a list of `BufferReference` objects for each condition.
+    """
+    results = [[] for _ in conditions]
+
+    ranges = collections.OrderedDict()
+    for index, condition in enumerate(conditions):
+      key = (condition.params.start_offset, condition.params.length)
+      ranges.setdefault(key, []).append(index)
+
+    for (offset, amount), indices in iteritems(ranges):
+      ContentCondition._ScanMany(conditions, indices, path, offset, amount,
+                                 results)
+      if not all(results[index] for index in indices):
+        break
+
+    return results
+
+  @staticmethod
+  def _ScanMany(conditions, indices, path, offset, amount, results):
+    """Scans a range of given file for patterns of the specified conditions."""
+    matchers = {index: conditions[index].GetMatcher() for index in indices}
+
+    literal_indices = [
+        index for index in indices
+        if isinstance(matchers[index], LiteralMatcher)
+    ]
+    literal_matcher = MultiLiteralMatcher(
+        [matchers[index].literal for index in literal_indices])
+
+    streamer = streaming.Streamer(
+        chunk_size=ContentCondition.CHUNK_SIZE,
+        overlap_size=ContentCondition.OVERLAP_SIZE)
+
+    pending = list(indices)
+    for chunk in streamer.StreamFilePath(path, offset=offset, amount=amount):
+      spans = {}
+      if any(index in pending for index in literal_indices):
+        spans = dict(zip(literal_indices, literal_matcher.Scan(chunk)))
+
+      for index in list(pending):
+        condition = conditions[index]
+        if index in literal_indices:
+          index_spans = spans[index]
+        else:
+          index_spans = chunk.Scan(matchers[index])
+
+        for span in index_spans:
+          results[index].append(condition._BufferReference(chunk, span))
+
+          if condition.params.mode == condition.params.Mode.FIRST_HIT:
+            pending.remove(index)
+            break
+
+      if not pending:
+        return
+
 
 class LiteralMatchCondition(ContentCondition):
   """A content condition that lookups a literal pattern."""
@@ -210,10 +291,8 @@ class LiteralMatchCondition(ContentCondition):
     super(LiteralMatchCondition, self).__init__()
     self.params = params.contents_literal_match
 
-  def Search(self, path):
-    matcher = LiteralMatcher(utils.SmartStr(self.params.literal))
-    for match in self.Scan(path, matcher):
-      yield match
+  def GetMatcher(self):
+    return LiteralMatcher(utils.SmartStr(self.params.literal))
 
 
 class RegexMatchCondition(ContentCondition):
@@ -223,10 +302,8 @@ class RegexMatchCondition(ContentCondition):
     super(RegexMatchCondition, self).__init__()
     self.params = params.contents_regex_match
 
-  def Search(self, path):
-    matcher = RegexMatcher(self.params.regex)
-    for match in self.Scan(path, matcher):
-      yield match
+  def GetMatcher(self):
+    return RegexMatcher(self.params.regex)
 
 
 class Matcher(with_metaclass(abc.ABCMeta, object)):
@@ -288,3 +365,66 @@ class LiteralMatcher(Matcher):
       return None
 
     return Matcher.Span(begin=offset, end=offset + len(self.literal))
+
+
+class MultiLiteralMatcher(object):
+  """A matcher looking up many literals in a single pass over a chunk.
+
+  All positions at which any of the literals begins are found by a single
+  regular expression, so the data is scanned once regardless of the number of
+  literals.
+
+  Args:
+    literals: A list of byte string patterns to look up.
+  """
+
+  def __init__(self, literals):
+    super(MultiLiteralMatcher, self).__init__()
+    self.literals = literals
+
+    self._indices = collections.OrderedDict()
+    for index, literal in enumerate(literals):
+      self._indices.setdefault(literal, []).append(index)
+
+    alternatives = b"|".join(re.escape(literal) for literal in self._indices)
+    self._regex = re.compile(b"(?=" + alternatives + b")", re.S)
+
+  def Scan(self, chunk):
+    """Finds occurrences of all the literals within a given chunk.
+
+    For each literal the reported spans are the same as these yielded by
+    `Chunk.Scan` for the corresponding `LiteralMatcher`.
+
+    Args:
+      chunk: A `streaming.Chunk` instance to search.
+
+    Returns:
+      A list with a list of `Matcher.Span` objects for each of the literals.
+    """
+    spans = [[] for _ in self.literals]
+    if not self.literals:
+      return spans
+
+    positions = {literal: 0 for literal in self._indices}
+    literal_spans = {literal: [] for literal in self._indices}
+
+    data = chunk.data
+    for match in self._regex.finditer(data):
+      begin = match.start()
+      for literal in self._indices:
+        if begin < positions[literal] or not data.startswith(literal, begin):
+          continue
+
+        end = begin + len(literal)
+        # Matches within the overlap-only zone belong to the previous chunk.
+        if end <= chunk.overlap:
+          positions[literal] = begin + 1
+          continue
+
+        positions[literal] = end
+        literal_spans[literal].append(Matcher.Span(begin=begin, end=end))
+
+    for literal, indices in iteritems(self._indices):
+      for index in indices:
+        spans[index] = literal_spans[literal]
+    return spans
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Benchmarks for file finder content conditions."""
+
+import os
+import shutil
+import time
+
+from builtins import range  # pylint: disable=redefined-builtin
+
+from grr_response_client.client_actions.file_finder_utils import conditions
+from grr_response_core.lib import flags
+from grr_response_core.lib.rdfvalues import file_finder as rdf_file_finder
+from grr.test_lib import benchmark_test_lib
+from grr.test_lib import test_lib
+
+
+class ContentConditionsBenchmark(benchmark_test_lib.MicroBenchmarks):
+  """Measures time of searching a tree of files for many patterns."""
+
+  units = "s"
+
+  DIR_COUNT = 10
+  FILES_PER_DIR = 10
+  FILE_SIZE = 512 * 1024
+  LITERAL_COUNT = 40
+
+  def setUp(self):
+    super(ContentConditionsBenchmark, self).setUp()
+
+    self.literals = ["ioc-literal-%04d" % i for i in range(self.LITERAL_COUNT)]
+
+    self.temp_dirpath = test_lib.TempDirPath()
+    self.paths = []
+    for i in range(self.DIR_COUNT):
+      dirpath = os.path.join(self.temp_dirpath, "dir%d" % i)
+      os.mkdir(dirpath)
+
+      for j in range(self.FILES_PER_DIR):
+        path = os.path.join(dirpath, "file%d" % j)
+        with open(path, "wb") as fd:
+          fd.write(os.urandom(self.FILE_SIZE))
+          # Every tenth file contains one of the searched literals.
+          if j == 0:
+            fd.write(self.literals[i % self.LITERAL_COUNT])
+        self.paths.append(path)
+
+  def tearDown(self):
+    super(ContentConditionsBenchmark, self).tearDown()
+    shutil.rmtree(self.temp_dirpath)
+
+  def _Conditions(self):
+    result = []
+    for literal in self.literals:
+      params = rdf_file_finder.FileFinderCondition()
+      params.contents_literal_match.literal = literal
+      params.contents_literal_match.mode = "ALL_HITS"
+      result.append(conditions.LiteralMatchCondition(params))
+
+    params = rdf_file_finder.FileFinderCondition()
+    params.contents_regex_match.regex = "ioc-regex-[0-9]{4}"
+    params.contents_regex_match.mode = "ALL_HITS"
+    result.append(conditions.RegexMatchCondition(params))
+    return result
+
+  def _SearchOneByOne(self, content_conditions, path):
+    return [list(condition.Search(path)) for condition in content_conditions]
+
+  def testSearchTree(self):
+    """Time of searching the whole tree for all of the patterns."""
+    content_conditions = self._Conditions()
+
+    searches = [
+        ("One pass per condition", self._SearchOneByOne),
+        ("Single pass for all conditions",
+         conditions.ContentCondition.SearchMany),
+    ]
+    for name, search in searches:
+      start = time.time()
+      for path in self.paths:
+        search(content_conditions, path)
+      self.AddResult(name, time.time() - start, len(self.paths))
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
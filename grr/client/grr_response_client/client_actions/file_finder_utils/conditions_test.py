@@ -6,6 +6,7 @@ import unittest
 
 import unittest
 
+from grr_response_client import streaming
 from grr_response_client.client_actions.file_finder_utils import conditions
 from grr_response_core.lib import flags
 from grr_response_core.lib import rdfvalue
@@ -106,6 +107,42 @@ class LiteralMatcherTest(unittest.TestCase):
     self.assertFalse(span)
 
 
+class MultiLiteralMatcherTest(unittest.TestCase):
+
+  def testMatchLiterals(self):
+    matcher = conditions.MultiLiteralMatcher(["foo", "bar", "foo"])
+    chunk = streaming.Chunk(offset=0, data="foobarfoo")
+
+    spans = matcher.Scan(chunk)
+    self.assertEqual(len(spans), 3)
+    self.assertEqual(spans[0], [(0, 3), (6, 9)])
+    self.assertEqual(spans[1], [(3, 6)])
+    self.assertEqual(spans[2], [(0, 3), (6, 9)])
+
+  def testOverlappingLiterals(self):
+    matcher = conditions.MultiLiteralMatcher(["aa", "aab", "ab"])
+    chunk = streaming.Chunk(offset=0, data="aaaab")
+
+    spans = matcher.Scan(chunk)
+    self.assertEqual(spans[0], [(0, 2), (2, 4)])
+    self.assertEqual(spans[1], [(2, 5)])
+    self.assertEqual(spans[2], [(3, 5)])
+
+  def testSkipsOverlapOnlyMatches(self):
+    matcher = conditions.MultiLiteralMatcher(["foo", "obar"])
+    chunk = streaming.Chunk(offset=0, data="foobarfoo", overlap=4)
+
+    spans = matcher.Scan(chunk)
+    self.assertEqual(spans[0], [(6, 9)])
+    self.assertEqual(spans[1], [(2, 6)])
+
+  def testNoLiterals(self):
+    matcher = conditions.MultiLiteralMatcher([])
+    chunk = streaming.Chunk(offset=0, data="foobar")
+
+    self.assertEqual(matcher.Scan(chunk), [])
+
+
 class ConditionTestMixin(object):
 
   def setUp(self):
@@ -551,6 +588,65 @@ class RegexMatchCondition(ConditionTestMixin, unittest.TestCase):
     self.assertEqual(results[0].length, 4)
 
 
+class SearchManyTest(ConditionTestMixin, unittest.TestCase):
+
+  @staticmethod
+  def _LiteralCondition(literal, **kwargs):
+    params = rdf_file_finder.FileFinderCondition()
+    params.contents_literal_match.literal = literal
+    params.contents_literal_match.mode = "ALL_HITS"
+    for name, value in kwargs.items():
+      setattr(params.contents_literal_match, name, value)
+    return conditions.LiteralMatchCondition(params)
+
+  @staticmethod
+  def _RegexCondition(regex, **kwargs):
+    params = rdf_file_finder.FileFinderCondition()
+    params.contents_regex_match.regex = regex
+    params.contents_regex_match.mode = "ALL_HITS"
+    for name, value in kwargs.items():
+      setattr(params.contents_regex_match, name, value)
+    return conditions.RegexMatchCondition(params)
+
+  def testSameResultsAsSearch(self):
+    with open(self.temp_filepath, "wb") as fd:
+      fd.write("foo bar baz foo quux bar")
+
+    content_conditions = [
+        self._LiteralCondition("foo"),
+        self._LiteralCondition("bar", mode="FIRST_HIT", bytes_after=2),
+        self._RegexCondition("ba[rz]", bytes_before=1),
+        self._LiteralCondition("foo", start_offset=4),
+        self._RegexCondition("q.+x", mode="FIRST_HIT"),
+    ]
+
+    results = conditions.ContentCondition.SearchMany(content_conditions,
+                                                     self.temp_filepath)
+    self.assertEqual(len(results), len(content_conditions))
+    for condition, result in zip(content_conditions, results):
+      self.assertEqual(result, list(condition.Search(self.temp_filepath)))
+
+    self.assertEqual([ref.offset for ref in results[0]], [0, 12])
+    self.assertEqual([ref.data for ref in results[1]], ["bar b"])
+    self.assertEqual([ref.data for ref in results[2]],
+                     [" bar", " baz", " bar"])
+    self.assertEqual([ref.offset for ref in results[3]], [12])
+
+  def testStopsOnConditionWithoutHits(self):
+    with open(self.temp_filepath, "wb") as fd:
+      fd.write("foo bar")
+
+    content_conditions = [
+        self._LiteralCondition("quux"),
+        self._LiteralCondition("foo", start_offset=1),
+        self._LiteralCondition("bar", start_offset=1),
+    ]
+
+    results = conditions.ContentCondition.SearchMany(content_conditions,
+                                                     self.temp_filepath)
+    self.assertEqual(results, [[], [], []])
+
+
 def main(argv):
   test_lib.main(argv)
 
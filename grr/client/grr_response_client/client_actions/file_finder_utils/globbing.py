@@ -11,6 +11,15 @@ import platform
 import re
 from future.utils import with_metaclass
 
+# pylint: disable=g-import-not-at-top
+try:
+  from os import scandir
+except ImportError:
+  # pytype: disable=import-error
+  from scandir import scandir
+  # pytype: enable=import-error
+# pylint: enable=g-import-not-at-top
+
 
 class PathOpts(object):
   """Options used for path expansion.
@@ -35,9 +44,22 @@ class PathComponent(with_metaclass(abc.ABCMeta, object)):
   A path component is part of the path delimited by the directory separator.
   """
 
-  @abc.abstractmethod
   def Generate(self, dirpath):
     """Yields children of a given directory matching the component."""
+    for path, _ in self.GenerateEntries(dirpath):
+      yield path
+
+  @abc.abstractmethod
+  def GenerateEntries(self, dirpath):
+    """Yields children of a given directory matching the component.
+
+    Args:
+      dirpath: A path to the directory.
+
+    Yields:
+      `(path, entry)` pairs where `entry` is a directory entry as returned by
+      `scandir` or `None` if the path was not obtained by listing a directory.
+    """
 
 
 class RecursiveComponent(PathComponent):
@@ -58,29 +80,30 @@ class RecursiveComponent(PathComponent):
     self.max_depth = max_depth or self.DEFAULT_MAX_DEPTH
     self.opts = opts or PathOpts()
 
-  def Generate(self, dirpath):
+  def GenerateEntries(self, dirpath):
     return self._Generate(dirpath, 1)
 
   def _Generate(self, dirpath, depth):
     if depth > self.max_depth:
       return
 
-    for item in _ListDir(dirpath):
-      itempath = os.path.join(dirpath, item)
-      yield itempath
+    for entry in _ScanDir(dirpath):
+      yield entry.path, entry
 
-      if itempath in self.opts.recursion_blacklist:
+      if entry.path in self.opts.recursion_blacklist:
         continue
-      for childpath in self._Recurse(itempath, depth):
-        yield childpath
+      for child in self._Recurse(entry, depth):
+        yield child
 
-  def _Recurse(self, path, depth):
-    if not os.path.isdir(path):
+  def _Recurse(self, entry, depth):
+    # File types are known from listing the directory, so unless a symlink is
+    # encountered no additional `stat` calls are needed here.
+    if not _IsDir(entry):
       return
-    if not self.opts.follow_links and os.path.islink(path):
+    if not self.opts.follow_links and entry.is_symlink():
       return
-    for childpath in self._Generate(path, depth + 1):
-      yield childpath
+    for child in self._Generate(entry.path, depth + 1):
+      yield child
 
 
 class GlobComponent(PathComponent):
@@ -100,10 +123,10 @@ class GlobComponent(PathComponent):
     super(GlobComponent, self).__init__()
     self.regex = re.compile(fnmatch.translate(glob), re.I)
 
-  def Generate(self, dirpath):
-    for item in _ListDir(dirpath):
-      if self.regex.match(item):
-        yield os.path.join(dirpath, item)
+  def GenerateEntries(self, dirpath):
+    for entry in _ScanDir(dirpath):
+      if self.regex.match(entry.name):
+        yield entry.path, entry
 
 
 class CurrentComponent(PathComponent):
@@ -114,8 +137,8 @@ class CurrentComponent(PathComponent):
   with group expansion mechanism.
   """
 
-  def Generate(self, dirpath):
-    yield dirpath
+  def GenerateEntries(self, dirpath):
+    yield dirpath, None
 
 
 class ParentComponent(PathComponent):
@@ -126,8 +149,8 @@ class ParentComponent(PathComponent):
   and is an useful tool with group expansion.
   """
 
-  def Generate(self, dirpath):
-    yield os.path.dirname(dirpath)
+  def GenerateEntries(self, dirpath):
+    yield os.path.dirname(dirpath), None
 
 
 PATH_PARAM_REGEX = re.compile("%%(?P<name>[^%]+?)%%")
@@ -204,9 +227,28 @@ def ExpandPath(path, opts=None):
   Yields:
     All paths possible to obtain from a given path by performing expansions.
   """
+  for expanded_path, _ in ExpandPathEntries(path, opts=opts):
+    yield expanded_path
+
+
+def ExpandPathEntries(path, opts=None):
+  """Applies all expansion mechanisms to the given path.
+
+  Unlike `ExpandPath`, this also yields directory entries obtained while listing
+  directories. These carry the file type (and on some platforms the whole stat
+  result) so callers can avoid further system calls.
+
+  Args:
+    path: A path to expand.
+    opts: A `PathOpts` object.
+
+  Yields:
+    `(path, entry)` pairs where `entry` is a directory entry as returned by
+    `scandir` or `None` if the path was not obtained by listing a directory.
+  """
   for grouped_path in ExpandGroups(path):
-    for globbed_path in ExpandGlobs(grouped_path, opts=opts):
-      yield globbed_path
+    for result in _ExpandGlobEntries(grouped_path, opts=opts):
+      yield result
 
 
 def ExpandGroups(path):
@@ -252,6 +294,11 @@ def ExpandGlobs(path, opts=None):
   Raises:
     ValueError: If given path is empty or relative.
   """
+  return (globbed_path for globbed_path, _ in _ExpandGlobEntries(path, opts))
+
+
+def _ExpandGlobEntries(path, opts=None):
+  """Performs glob expansion on a given path yielding `(path, entry)` pairs."""
   if not path:
     raise ValueError("Path is empty")
 
@@ -264,29 +311,45 @@ def ExpandGlobs(path, opts=None):
   return _ExpandComponents(root_dir, components)
 
 
-def _ExpandComponents(basepath, components, index=0):
+def _ExpandComponents(basepath, components, index=0, entry=None):
   if index == len(components):
-    yield basepath
+    yield basepath, entry
     return
 
-  for childpath in components[index].Generate(basepath):
-    for path in _ExpandComponents(childpath, components, index + 1):
-      yield path
+  for childpath, childentry in components[index].GenerateEntries(basepath):
+    for result in _ExpandComponents(childpath, components, index + 1,
+                                    childentry):
+      yield result
 
 
-def _ListDir(dirpath):
-  """Returns children of a given directory.
+def _ScanDir(dirpath):
+  """Yields entries of a given directory.
 
   This function is intended to be used by the `PathComponent` subclasses to get
   initial list of potential children that then need to be filtered according to
   the rules of a specific component.
 
+  Entries are yielded as the directory is being read. They are `scandir`
+  directory entries, which know the type of the file they point to without
+  additional system calls on most platforms and cache results of `stat`.
+
   Args:
     dirpath: A path to the directory.
+
+  Yields:
+    Directory entries of children of the given directory.
   """
   try:
-    return os.listdir(dirpath)
+    for entry in scandir(dirpath):
+      yield entry
   except OSError as error:
     if error.errno == errno.EACCES:
       logging.info(error)
-    return []
+
+
+def _IsDir(entry):
+  """Checks whether a directory entry (or a symlink target) is a directory."""
+  try:
+    return entry.is_dir()
+  except OSError:
+    return False
@@ -4,6 +4,7 @@ import shutil
 
 
 from builtins import zip  # pylint: disable=redefined-builtin
+import mock
 
 import unittest
 from grr_response_client.client_actions.file_finder_utils import globbing
@@ -764,6 +765,42 @@ class ExpandPathTest(DirHierarchyTestMixin, unittest.TestCase):
     ])
 
 
+class ExpandPathEntriesTest(DirHierarchyTestMixin, unittest.TestCase):
+
+  def testEntries(self):
+    self.Touch("foo", "bar")
+    self.Touch("foo", "baz", "0")
+
+    path = self.Path("foo", "{.,*}")
+    results = dict(globbing.ExpandPathEntries(path))
+    self.assertItemsEqual(results, [
+        self.Path("foo"),
+        self.Path("foo", "bar"),
+        self.Path("foo", "baz"),
+    ])
+
+    self.assertIsNone(results[self.Path("foo")])
+    self.assertEqual(results[self.Path("foo", "bar")].name, "bar")
+    self.assertTrue(results[self.Path("foo", "bar")].is_file())
+    self.assertEqual(results[self.Path("foo", "baz")].name, "baz")
+    self.assertTrue(results[self.Path("foo", "baz")].is_dir())
+
+  def testRecursionUsesEntryTypes(self):
+    self.Touch("foo", "bar", "0")
+    self.Touch("foo", "baz")
+
+    with mock.patch.object(os.path, "isdir") as isdir_mock:
+      results = list(globbing.ExpandPath(self.Path("**")))
+      self.assertFalse(isdir_mock.called)
+
+    self.assertItemsEqual(results, [
+        self.Path("foo"),
+        self.Path("foo", "bar"),
+        self.Path("foo", "bar", "0"),
+        self.Path("foo", "baz"),
+    ])
+
+
 def main(argv):
   test_lib.main(argv)
 
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""Utility classes for hashing many files concurrently."""
+
+import collections
+import logging
+import Queue
+import threading
+
+from builtins import range  # pylint: disable=redefined-builtin
+
+from grr_response_client import client_utils_common
+
+
+class Error(Exception):
+  """Raised when files cannot be hashed anymore."""
+
+
+class _HashTask(object):
+  """A request to hash a single file, filled-in by one of the workers."""
+
+  def __init__(self, path, byte_count):
+    self.path = path
+    self.byte_count = byte_count
+    self.hash_entry = None
+    self.error = None
+    self.done = threading.Event()
+
+
+class ParallelHasher(object):
+  """An utility class for hashing several files at once.
+
+  Files are hashed by a pool of worker threads reading them in large blocks.
+  `hashlib` releases the GIL while hashing such blocks, so this scales with
+  the number of cores. Only a bounded number of files is read ahead of the
+  results that are being consumed.
+
+  The progress callback is only ever called from the thread consuming the
+  results, so that it may safely raise (e.g. if the CPU limit of the calling
+  action is exceeded). CPU time spent in the workers is accounted to the same
+  process and therefore counts towards that limit.
+
+  Args:
+    progress: A progress callback called while waiting for results.
+    max_workers: A number of files hashed concurrently.
+    read_size: A number of bytes read from a file at once.
+  """
+
+  DEFAULT_MAX_WORKERS = 4
+  DEFAULT_READ_SIZE = 4 * 1024 * 1024
+
+  # How long to wait for a result before reporting progress (in seconds).
+  _PROGRESS_INTERVAL = 1
+
+  def __init__(self, progress=None, max_workers=None, read_size=None):
+    self._progress = progress
+    self._max_workers = max_workers or self.DEFAULT_MAX_WORKERS
+    self._read_size = read_size or self.DEFAULT_READ_SIZE
+
+  def HashFilePaths(self, requests):
+    """Hashes given files, several of them at the same time.
+
+    Args:
+      requests: An iterable of `(key, path, byte_count)` tuples. Files with
+          `None` byte count are not hashed at all.
+
+    Yields:
+      `(key, hash_entry)` pairs in the order of requests. `hash_entry` is a
+      `Hash` object or `None` if the file was not hashed or could not be read.
+    """
+    tasks = Queue.Queue()
+    cancelled = threading.Event()
+
+    def Worker():
+      while True:
+        task = tasks.get()
+        if task is None:
+          return
+        try:
+          if not cancelled.is_set():
+            task.hash_entry = self._HashFilePath(task.path, task.byte_count)
+        except IOError as e:
+          logging.info("Failed to hash %s: %s", task.path, e)
+        except Exception as e:  # pylint: disable=broad-except
+          # Unexpected errors must not kill the worker, they are re-raised
+          # when the result of the task is consumed instead.
+          logging.exception("Failed to hash %s: %s", task.path, e)
+          task.error = e
+        finally:
+          task.done.set()
+
+    workers = []
+    for _ in range(self._max_workers):
+      worker = threading.Thread(target=Worker, name="ParallelHasher")
+      worker.daemon = True
+      worker.start()
+      workers.append(worker)
+
+    try:
+      pending = collections.deque()
+      for key, path, byte_count in requests:
+        task = None
+        if byte_count is not None:
+          task = _HashTask(path, byte_count)
+          tasks.put(task)
+        pending.append((key, task))
+
+        # Allow for a single file being read ahead per worker.
+        while len(pending) > 2 * self._max_workers:
+          yield self._Wait(workers, *pending.popleft())
+
+      while pending:
+        yield self._Wait(workers, *pending.popleft())
+    finally:
+      cancelled.set()
+      for _ in workers:
+        tasks.put(None)
+
+  def _Wait(self, workers, key, task):
+    """Waits for a task to be done, reporting progress in the meantime.
+
+    Args:
+      workers: Worker threads processing the tasks.
+      key: A key of the request of the task.
+      task: A `_HashTask` or `None` if the file is not hashed at all.
+
+    Returns:
+      A `(key, hash_entry)` pair.
+
+    Raises:
+      Error: If all the workers died before the task was done.
+      Exception: Any unexpected exception raised while hashing the file.
+    """
+    if task is None:
+      return key, None
+
+    while not task.done.wait(self._PROGRESS_INTERVAL):
+      if self._progress:
+        self._progress()
+      if not task.done.is_set() and not any(w.is_alive() for w in workers):
+        raise Error("No hashing worker is alive to hash %s." % task.path)
+    if self._progress:
+      self._progress()
+
+    if task.error is not None:
+      raise task.error
+
+    return key, task.hash_entry
+
+  def _HashFilePath(self, path, byte_count):
+    hasher = client_utils_common.MultiHasher()
+    hasher.HashFilePath(path, byte_count, buffer_size=self._read_size)
+    return hasher.GetHashObject()
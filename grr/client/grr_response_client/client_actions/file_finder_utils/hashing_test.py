@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+import hashlib
+import os
+
+from builtins import range  # pylint: disable=redefined-builtin
+
+import unittest
+from grr_response_client.client_actions.file_finder_utils import hashing
+from grr.test_lib import test_lib
+
+
+class ParallelHasherTest(unittest.TestCase):
+
+  def testResultsAreInOrder(self):
+    hasher = hashing.ParallelHasher(max_workers=3, read_size=5)
+
+    with test_lib.AutoTempDirPath(remove_non_empty=True) as temp_dirpath:
+      requests = []
+      for i in range(20):
+        path = os.path.join(temp_dirpath, "file%d" % i)
+        with open(path, "wb") as fd:
+          fd.write(b"x" * i)
+        requests.append((i, path, i))
+
+      results = list(hasher.HashFilePaths(requests))
+
+    self.assertEqual([key for key, _ in results], list(range(20)))
+    for i, hash_entry in results:
+      self.assertEqual(hash_entry.num_bytes, i)
+      self.assertEqual(hash_entry.sha256, hashlib.sha256(b"x" * i).digest())
+
+  def testTruncated(self):
+    hasher = hashing.ParallelHasher()
+
+    with test_lib.AutoTempFilePath() as temp_filepath:
+      with open(temp_filepath, "wb") as fd:
+        fd.write(b"foobar")
+
+      results = list(hasher.HashFilePaths([("foo", temp_filepath, 3)]))
+
+    self.assertEqual(len(results), 1)
+    self.assertEqual(results[0][1].num_bytes, 3)
+    self.assertEqual(results[0][1].md5, hashlib.md5(b"foo").digest())
+
+  def testSkippedAndMissingFiles(self):
+    hasher = hashing.ParallelHasher()
+
+    results = list(
+        hasher.HashFilePaths([
+            ("skipped", "/foo/bar/baz", None),
+            ("missing", "/foo/bar/baz", 42),
+        ]))
+
+    self.assertEqual(results, [("skipped", None), ("missing", None)])
+
+  def testProgressIsCalledFromConsumingThread(self):
+    calls = []
+    hasher = hashing.ParallelHasher(progress=lambda: calls.append(True))
+
+    with test_lib.AutoTempFilePath() as temp_filepath:
+      with open(temp_filepath, "wb") as fd:
+        fd.write(b"foobar")
+
+      list(hasher.HashFilePaths([("foo", temp_filepath, 6)]))
+
+    self.assertTrue(calls)
+
+  def testProgressExceptionIsPropagated(self):
+
+    def Progress():
+      raise RuntimeError("CPU limit exceeded")
+
+    hasher = hashing.ParallelHasher(progress=Progress)
+
+    with test_lib.AutoTempFilePath() as temp_filepath:
+      with self.assertRaises(RuntimeError):
+        list(hasher.HashFilePaths([("foo", temp_filepath, 0)]))
+
+  def testUnexpectedErrorIsPropagated(self):
+
+    class FailingHasher(hashing.ParallelHasher):
+
+      def _HashFilePath(self, path, byte_count):
+        raise ValueError("Unexpected error for %s" % path)
+
+    hasher = FailingHasher(max_workers=1)
+
+    with test_lib.AutoTempFilePath() as temp_filepath:
+      requests = [(i, temp_filepath, 0) for i in range(3)]
+      with self.assertRaises(ValueError):
+        list(hasher.HashFilePaths(requests))
+
+  def testFailsIfNoWorkerIsAlive(self):
+
+    class DyingHasher(hashing.ParallelHasher):
+
+      def _HashFilePath(self, path, byte_count):
+        raise SystemExit()
+
+    hasher = DyingHasher(max_workers=1)
+
+    with test_lib.AutoTempFilePath() as temp_filepath:
+      requests = [(i, temp_filepath, 0) for i in range(2)]
+      with self.assertRaises(hashing.Error):
+        list(hasher.HashFilePaths(requests))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -8,7 +8,10 @@ from future.utils import with_metaclass
 
 from grr_response_client import client_utils
 from grr_response_client import client_utils_common
+from grr_response_client import hash_cache
+from grr_response_client.client_actions.file_finder_utils import hashing
 from grr_response_client.client_actions.file_finder_utils import uploading
+from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
 from grr_response_core.lib.rdfvalues import paths as rdf_paths
 
 
@@ -78,17 +81,57 @@ class HashAction(Action):
     stat = self.flow.stat_cache.Get(filepath, follow_symlink=True)
     result.stat_entry = _StatEntry(stat, ext_attrs=self.opts.collect_ext_attrs)
 
+    byte_count = self._GetByteCount(stat)
+    if byte_count is not None:
+      result.hash_entry = _HashEntry(stat, self.flow, max_size=byte_count)
+
+  def ExecuteMany(self, items):
+    """Executes the action on given paths, hashing several files at once.
+
+    Args:
+      items: An iterable of `(filepath, result)` pairs, as for `Execute`.
+
+    Yields:
+      Filled-in `FileFinderResult` instances in the order of `items`.
+    """
+    hasher = hashing.ParallelHasher(progress=self.flow.Progress)
+
+    def Requests():
+      for filepath, result in items:
+        stat = self.flow.stat_cache.Get(filepath, follow_symlink=True)
+        result.stat_entry = _StatEntry(
+            stat, ext_attrs=self.opts.collect_ext_attrs)
+
+        byte_count = self._GetByteCount(stat)
+        if byte_count is not None:
+          hash_entry = hash_cache.GetCachedValue(stat, _HashKind(byte_count),
+                                                 rdf_crypto.Hash)
+          if hash_entry is not None:
+            result.hash_entry = hash_entry
+            byte_count = None
+
+        yield (result, stat, byte_count), stat.GetPath(), byte_count
+
+    for (result, stat, byte_count), hash_entry in hasher.HashFilePaths(
+        Requests()):
+      if hash_entry is not None:
+        result.hash_entry = hash_entry
+        hash_cache.CacheValue(stat, _HashKind(byte_count), hash_entry)
+      yield result
+
+  def _GetByteCount(self, stat):
+    """Returns number of bytes to hash for a given stat or `None` to skip."""
     if stat.IsDirectory():
-      return
+      return None
 
     policy = self.opts.oversized_file_policy
     max_size = self.opts.max_size
-    if stat.GetSize() <= self.opts.max_size:
-      result.hash_entry = _HashEntry(stat, self.flow)
+    if stat.GetSize() <= max_size:
+      return stat.GetSize()
     elif policy == self.opts.OversizedFilePolicy.HASH_TRUNCATED:
-      result.hash_entry = _HashEntry(stat, self.flow, max_size=max_size)
+      return max_size
     elif policy == self.opts.OversizedFilePolicy.SKIP:
-      return
+      return None
     else:
       raise ValueError("Unknown oversized file policy: %s" % policy)
 
@@ -134,6 +177,9 @@ class DownloadAction(Action):
     chunk_size = self.opts.chunk_size
 
     uploader = uploading.TransferStoreUploader(self.flow, chunk_size=chunk_size)
+    if self.opts.hash_first:
+      # The server requests the chunks it does not have on its own.
+      return uploader.HashFilePath(filepath, amount=max_size)
     return uploader.UploadFilePath(filepath, amount=max_size)
 
 
@@ -146,9 +192,19 @@ def _StatEntry(stat, ext_attrs):
 
 
 def _HashEntry(stat, flow, max_size=None):
-  hasher = client_utils_common.MultiHasher(progress=flow.Progress)
-  try:
-    hasher.HashFilePath(stat.GetPath(), max_size or stat.GetSize())
-    return hasher.GetHashObject()
-  except IOError:
-    return None
+  byte_count = max_size or stat.GetSize()
+
+  def Compute():
+    hasher = client_utils_common.MultiHasher(progress=flow.Progress)
+    try:
+      hasher.HashFilePath(stat.GetPath(), byte_count)
+      return hasher.GetHashObject()
+    except IOError:
+      return None
+
+  return hash_cache.GetOrCompute(stat, _HashKind(byte_count), rdf_crypto.Hash,
+                                 Compute)
+
+
+def _HashKind(byte_count):
+  return "FileFinderHash:%d" % byte_count
@@ -56,6 +56,29 @@ class TransferStoreUploader(object):
     return rdf_client.BlobImageDescriptor(
         chunks=chunks, chunk_size=self._streamer.chunk_size)
 
+  def HashFilePath(self, filepath, offset=0, amount=None):
+    """Describes chunks of a file on a given path without uploading them.
+
+    The returned descriptor lists the digests of all the chunks, so that the
+    server can request only these that it does not have yet.
+
+    Args:
+      filepath: A path to the file to describe.
+      offset: An integer offset at which the file description should start on.
+      amount: An upper bound on number of bytes to stream. If it is `None` then
+          the whole file is described.
+
+    Returns:
+      A `BlobImageDescriptor` object.
+    """
+    chunk_stream = self._streamer.StreamFilePath(
+        filepath, offset=offset, amount=amount)
+
+    chunks = [_ChunkDescriptor(chunk) for chunk in chunk_stream]
+
+    return rdf_client.BlobImageDescriptor(
+        chunks=chunks, chunk_size=self._streamer.chunk_size)
+
   def UploadChunk(self, chunk):
     """Uploads a single chunk to the transfer store flow.
 
@@ -70,10 +93,14 @@ class TransferStoreUploader(object):
     self._action.ChargeBytesToSession(len(chunk.data))
     self._action.SendReply(blob, session_id=self._TRANSFER_STORE_SESSION_ID)
 
-    return rdf_client.BlobImageChunkDescriptor(
-        digest=hashlib.sha256(chunk.data).digest(),
-        offset=chunk.offset,
-        length=len(chunk.data))
+    return _ChunkDescriptor(chunk)
+
+
+def _ChunkDescriptor(chunk):
+  return rdf_client.BlobImageChunkDescriptor(
+      digest=hashlib.sha256(chunk.data).digest(),
+      offset=chunk.offset,
+      length=len(chunk.data))
 
 
 def _CompressedDataBlob(chunk):
@@ -129,6 +129,28 @@ class UploaderTest(unittest.TestCase):
       self.assertEqual(blobdesc.chunks[2].length, 1)
       self.assertEqual(blobdesc.chunks[2].digest, Sha256("6"))
 
+  def testHashFilePathDoesNotUpload(self):
+    action = FakeAction()
+    uploader = uploading.TransferStoreUploader(action, chunk_size=3)
+
+    with test_lib.AutoTempFilePath() as temp_filepath:
+      with open(temp_filepath, "w") as temp_file:
+        temp_file.write("1234567")
+
+      blobdesc = uploader.HashFilePath(temp_filepath, amount=5)
+
+      self.assertEqual(action.charged_bytes, 0)
+      self.assertEqual(len(action.messages), 0)
+
+      self.assertEqual(len(blobdesc.chunks), 2)
+      self.assertEqual(blobdesc.chunk_size, 3)
+      self.assertEqual(blobdesc.chunks[0].offset, 0)
+      self.assertEqual(blobdesc.chunks[0].length, 3)
+      self.assertEqual(blobdesc.chunks[0].digest, Sha256("123"))
+      self.assertEqual(blobdesc.chunks[1].offset, 3)
+      self.assertEqual(blobdesc.chunks[1].length, 2)
+      self.assertEqual(blobdesc.chunks[1].digest, Sha256("45"))
+
   def testIncorrectFile(self):
     action = FakeAction()
     uploader = uploading.TransferStoreUploader(action, chunk_size=10)
@@ -5,6 +5,7 @@ import hashlib
 
 
 from grr_response_core.lib import fingerprint
+from grr_response_client import hash_cache
 from grr_response_client import vfs
 from grr_response_client.client_actions import standard
 from grr_response_core.lib.rdfvalues import client as rdf_client
@@ -42,53 +43,68 @@ class FingerprintFile(standard.ReadBuffer):
 
   def Run(self, args):
     """Fingerprint a file."""
+    if args.tuples:
+      tuples = args.tuples
+    else:
+      # There are none selected -- we will cover everything
+      tuples = list()
+      for k in self._fingerprint_types:
+        tuples.append(rdf_client.FingerprintTuple(fp_type=k))
+
+    # Fingerprints of unchanged local files are reused from the client hash
+    # cache, keyed by the requested fingerprint types and hashes.
+    serialized_tuples = b"".join(finger.SerializeToString() for finger in tuples)
+    kind = "FingerprintFile:%s" % hashlib.sha256(serialized_tuples).hexdigest()
+
     with vfs.VFSOpen(
         args.pathspec, progress_callback=self.Progress) as file_obj:
-      fingerprinter = Fingerprinter(self.Progress, file_obj)
-      response = rdf_client.FingerprintResponse()
+      response = hash_cache.GetOrCompute(
+          hash_cache.StatVFSFile(file_obj), kind,
+          rdf_client.FingerprintResponse,
+          lambda: self._Fingerprint(file_obj, tuples))
       response.pathspec = file_obj.pathspec
-      if args.tuples:
-        tuples = args.tuples
-      else:
-        # There are none selected -- we will cover everything
-        tuples = list()
-        for k in self._fingerprint_types:
-          tuples.append(rdf_client.FingerprintTuple(fp_type=k))
-
-      for finger in tuples:
-        hashers = [self._hash_types[h] for h in finger.hashers] or None
-        if finger.fp_type in self._fingerprint_types:
-          invoke = self._fingerprint_types[finger.fp_type]
-          res = invoke(fingerprinter, hashers)
-          if res:
-            response.matching_types.append(finger.fp_type)
-        else:
-          raise RuntimeError(
-              "Encountered unknown fingerprint type. %s" % finger.fp_type)
-
-      # Structure of the results is a list of dicts, each containing the
-      # name of the hashing method, hashes for enabled hash algorithms,
-      # and auxilliary data where present (e.g. signature blobs).
-      # Also see Fingerprint:HashIt()
-      response.results = fingerprinter.HashIt()
-
-      # We now return data in a more structured form.
-      for result in response.results:
-        if result.GetItem("name") == "generic":
-          for hash_type in ["md5", "sha1", "sha256"]:
-            value = result.GetItem(hash_type)
-            if value is not None:
-              setattr(response.hash, hash_type, value)
-
-        if result["name"] == "pecoff":
-          for hash_type in ["md5", "sha1", "sha256"]:
-            value = result.GetItem(hash_type)
-            if value:
-              setattr(response.hash, "pecoff_" + hash_type, value)
-
-          signed_data = result.GetItem("SignedData", [])
-          for data in signed_data:
-            response.hash.signed_data.Append(
-                revision=data[0], cert_type=data[1], certificate=data[2])
 
       self.SendReply(response)
+
+  def _Fingerprint(self, file_obj, tuples):
+    """Computes fingerprints of a given file."""
+    fingerprinter = Fingerprinter(self.Progress, file_obj)
+    response = rdf_client.FingerprintResponse()
+
+    for finger in tuples:
+      hashers = [self._hash_types[h] for h in finger.hashers] or None
+      if finger.fp_type in self._fingerprint_types:
+        invoke = self._fingerprint_types[finger.fp_type]
+        res = invoke(fingerprinter, hashers)
+        if res:
+          response.matching_types.append(finger.fp_type)
+      else:
+        raise RuntimeError(
+            "Encountered unknown fingerprint type. %s" % finger.fp_type)
+
+    # Structure of the results is a list of dicts, each containing the
+    # name of the hashing method, hashes for enabled hash algorithms,
+    # and auxilliary data where present (e.g. signature blobs).
+    # Also see Fingerprint:HashIt()
+    response.results = fingerprinter.HashIt()
+
+    # We now return data in a more structured form.
+    for result in response.results:
+      if result.GetItem("name") == "generic":
+        for hash_type in ["md5", "sha1", "sha256"]:
+          value = result.GetItem(hash_type)
+          if value is not None:
+            setattr(response.hash, hash_type, value)
+
+      if result["name"] == "pecoff":
+        for hash_type in ["md5", "sha1", "sha256"]:
+          value = result.GetItem(hash_type)
+          if value:
+            setattr(response.hash, "pecoff_" + hash_type, value)
+
+        signed_data = result.GetItem("SignedData", [])
+        for data in signed_data:
+          response.hash.signed_data.Append(
+              revision=data[0], cert_type=data[1], certificate=data[2])
+
+    return response
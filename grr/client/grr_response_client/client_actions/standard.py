@@ -19,6 +19,7 @@ import psutil
 
 from grr_response_client import actions
 from grr_response_client import client_utils_common
+from grr_response_client import hash_cache
 from grr_response_client import vfs
 from grr_response_client.client_actions import tempfiles
 from grr_response_core import config
@@ -139,17 +140,25 @@ class HashFile(actions.ActionPlugin):
       for hash_name in t.hashers:
         hash_types.add(str(hash_name).lower())
 
-    hasher = client_utils_common.MultiHasher(hash_types, progress=self.Progress)
+    # Hashes of unchanged local files are reused from the client hash cache.
+    kind = "HashFile:%s:%d" % (",".join(sorted(hash_types)),
+                               args.max_filesize)
     with vfs.VFSOpen(args.pathspec, progress_callback=self.Progress) as fd:
-      hasher.HashFile(fd, args.max_filesize)
+      hash_object = hash_cache.GetOrCompute(
+          hash_cache.StatVFSFile(fd), kind, rdf_crypto.Hash,
+          lambda: self._HashFile(fd, hash_types, args.max_filesize))
 
-    hash_object = hasher.GetHashObject()
     response = rdf_client.FingerprintResponse(
         pathspec=fd.pathspec,
         bytes_read=hash_object.num_bytes,
         hash=hash_object)
     self.SendReply(response)
 
+  def _HashFile(self, fd, hash_types, max_filesize):
+    hasher = client_utils_common.MultiHasher(hash_types, progress=self.Progress)
+    hasher.HashFile(fd, max_filesize)
+    return hasher.GetHashObject()
+
 
 class CopyPathToFile(actions.ActionPlugin):
   """Copy contents of a pathspec to a file on disk."""
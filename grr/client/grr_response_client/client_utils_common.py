@@ -222,25 +222,28 @@ class MultiHasher(object):
 
     self._progress = progress
 
-  def HashFilePath(self, path, byte_count):
+  def HashFilePath(self, path, byte_count, buffer_size=None):
     """Updates underlying hashers with file on a given path.
 
     Args:
       path: A path to the file that is going to be fed to the hashers.
       byte_count: A maximum numbers of bytes that are going to be processed.
+      buffer_size: An (optional) number of bytes read from the file at once.
     """
     with open(path, "rb") as fd:
-      self.HashFile(fd, byte_count)
+      self.HashFile(fd, byte_count, buffer_size=buffer_size)
 
-  def HashFile(self, fd, byte_count):
+  def HashFile(self, fd, byte_count, buffer_size=None):
     """Updates underlying hashers with a given file.
 
     Args:
       fd: A file object that is going to be fed to the hashers.
       byte_count: A maximum number of bytes that are going to be processed.
+      buffer_size: An (optional) number of bytes read from the file at once.
     """
+    buffer_size = buffer_size or constants.CLIENT_MAX_BUFFER_SIZE
     while byte_count > 0:
-      buf_size = min(byte_count, constants.CLIENT_MAX_BUFFER_SIZE)
+      buf_size = min(byte_count, buffer_size)
       buf = fd.read(buf_size)
       if not buf:
         break
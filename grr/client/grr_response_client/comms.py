@@ -578,9 +578,22 @@ class GRRClientWorker(threading.Thread):
     Returns:
        A MessageList protobuf
     """
-    messages = self._out_queue.GetMessages(soft_size_limit=max_size)
+    messages = self.DrainSerialized(max_size=max_size)
+    return rdf_flows.MessageList(job=messages.job)
+
+  def DrainSerialized(self, max_size=1024):
+    """Like Drain, but returns the messages without parsing them.
+
+    Args:
+       max_size: The size (in bytes) of the returned message list will be at
+       most one message length over this size.
+
+    Returns:
+       A communicator.SerializedMessageList.
+    """
+    messages = self._out_queue.GetSerializedMessages(soft_size_limit=max_size)
     stats.STATS.IncrementCounter(
-        "grr_client_sent_messages", delta=len(messages.job))
+        "grr_client_sent_messages", delta=len(messages))
 
     return messages
 
@@ -908,6 +921,9 @@ class SizeLimitedQueue(object):
         timeout is exceeded.
     """
     # We only queue already serialized objects so we know how large they are.
+    # The fast poll flag is kept alongside so that sending the messages never
+    # needs to parse them again.
+    require_fastpoll = message.require_fastpoll
     message = message.SerializeToString()
 
     if priority >= rdf_flows.GrrMessage.Priority.HIGH_PRIORITY:
@@ -927,7 +943,7 @@ class SizeLimitedQueue(object):
           raise Queue.Full
 
     with self._lock:
-      self._queues[priority].appendleft(message)
+      self._queues[priority].appendleft((message, require_fastpoll))
       self._total_size += len(message)
 
   def _GeneratePriority(self, priority):
@@ -948,8 +964,8 @@ class SizeLimitedQueue(object):
         self._GeneratePriority(rdf_flows.GrrMessage.Priority.MEDIUM_PRIORITY),
         self._GeneratePriority(rdf_flows.GrrMessage.Priority.LOW_PRIORITY))
 
-  def GetMessages(self, soft_size_limit=None):
-    """Retrieves and removes the messages from the queue in priority order.
+  def GetSerializedMessages(self, soft_size_limit=None):
+    """Retrieves and removes the serialized messages in priority order.
 
     Args:
       soft_size_limit: int If there is more data in the queue than
@@ -958,20 +974,40 @@ class SizeLimitedQueue(object):
         currently on the queue.
 
     Returns:
-      rdf_flows.MessageList A list of messages that were .Put on the queue
-      earlier in priority order; messages with equivalent priority are returned
-      FIFO.
+      communicator.SerializedMessageList A list of messages that were .Put on
+      the queue earlier, in the same order as returned by GetMessages.
     """
     with self._lock:
-      ret = rdf_flows.MessageList()
+      messages = []
+      require_fastpoll = False
       ret_size = 0
-      for message in self._Generate():
-        ret.job.append(rdf_flows.GrrMessage.FromSerializedString(message))
+      for message, message_fastpoll in self._Generate():
+        messages.append(message)
+        require_fastpoll |= message_fastpoll
         ret_size += len(message)
+        self._total_size -= len(message)
         if soft_size_limit is not None and ret_size > soft_size_limit:
           break
 
-      return ret
+      return communicator.SerializedMessageList(
+          messages, require_fastpoll=require_fastpoll)
+
+  def GetMessages(self, soft_size_limit=None):
+    """Retrieves and removes the messages from the queue in priority order.
+
+    Args:
+      soft_size_limit: int If there is more data in the queue than
+        soft_size_limit bytes, the returned list of messages will be
+        approximately this large. If None (default), returns all messages
+        currently on the queue.
+
+    Returns:
+      rdf_flows.MessageList A list of messages that were .Put on the queue
+      earlier in priority order; messages with equivalent priority are returned
+      FIFO.
+    """
+    messages = self.GetSerializedMessages(soft_size_limit=soft_size_limit)
+    return rdf_flows.MessageList(job=messages.job)
 
   def Size(self):
     return self._total_size
@@ -1168,16 +1204,14 @@ class GRRHTTPClient(object):
     # back so we don't expire our messages too fast.
     if self.http_manager.consecutive_connection_errors == 0:
       # Grab some messages to send
-      message_list = self.client_worker.Drain(
+      message_list = self.client_worker.DrainSerialized(
           max_size=config.CONFIG["Client.max_post_size"])
     else:
-      message_list = rdf_flows.MessageList()
+      message_list = communicator.SerializedMessageList()
 
     # If any outbound messages require fast poll we switch to fast poll mode.
-    for message in message_list.job:
-      if message.require_fastpoll:
-        self.timer.FastPoll()
-        break
+    if message_list.require_fastpoll:
+      self.timer.FastPoll()
 
     # Make new encrypted ClientCommunication rdfvalue.
     payload = rdf_flows.ClientCommunication()
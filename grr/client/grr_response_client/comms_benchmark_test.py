@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Benchmarks for sending queued messages from the client."""
+from __future__ import division
+
+import os
+import time
+
+from builtins import range  # pylint: disable=redefined-builtin
+
+from grr_response_client import comms
+from grr_response_core import config
+from grr_response_core.lib import flags
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
+from grr.test_lib import benchmark_test_lib
+from grr.test_lib import test_lib
+
+
+class OutboundQueueBenchmark(benchmark_test_lib.MicroBenchmarks):
+  """Measures CPU time spent on queueing and encoding uploaded data."""
+
+  units = "s"
+
+  MESSAGE_SIZE = 64 * 1024
+  MESSAGE_COUNT = 320  # 20MB in total.
+  POST_SIZE = 8 * 1024 * 1024
+
+  def setUp(self):
+    super(OutboundQueueBenchmark, self).setUp(["MB/s"], ["<10"])
+
+    self.communicator = comms.ClientCommunicator(
+        private_key=config.CONFIG["Client.private_key"])
+    self.communicator.LoadServerCertificate(
+        server_certificate=config.CONFIG["Frontend.certificate"],
+        ca_certificate=config.CONFIG["CA.certificate"])
+
+    # Blobs of random data, as uploaded by file finders, which do not compress.
+    self.messages = [
+        rdf_flows.GrrMessage(
+            session_id="aff4:/W:session",
+            request_id=i,
+            payload=rdf_protodict.DataBlob(
+                data=os.urandom(self.MESSAGE_SIZE)))
+        for i in range(self.MESSAGE_COUNT)
+    ]
+
+  def _Time(self, name, drain):
+    queue = comms.SizeLimitedQueue(
+        maxsize=2 * self.MESSAGE_SIZE * self.MESSAGE_COUNT,
+        heart_beat_cb=lambda: None)
+
+    start = time.clock()
+    for message in self.messages:
+      queue.Put(message)
+    while queue.Size():
+      message_list = drain(queue)
+      self.communicator.EncodeMessages(message_list,
+                                       rdf_flows.ClientCommunication())
+    time_taken = time.clock() - start
+
+    megabytes = self.MESSAGE_SIZE * self.MESSAGE_COUNT / 1024 / 1024
+    self.AddResult(name, time_taken / megabytes, self.MESSAGE_COUNT,
+                   int(megabytes / time_taken))
+
+  def testQueueAndEncode(self):
+    """CPU seconds per uploaded MB, with and without reparsing messages."""
+    self._Time(
+        "Parsed message lists (per MB)",
+        lambda queue: queue.GetMessages(soft_size_limit=self.POST_SIZE))
+    self._Time(
+        "Serialized message lists (per MB)",
+        lambda queue: queue.GetSerializedMessages(
+            soft_size_limit=self.POST_SIZE))
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
@@ -279,6 +279,33 @@ class SizeLimitedQueueTest(test_lib.GRRBaseTest):
     result.job.Extend(queue.GetMessages().job)
     self.assertEqual(list(result.job), [msg_c] * 10 + [msg_a, msg_b] * 10)
 
+  def testSizeLimitedQueueSerializedMessages(self):
+
+    queue = comms.SizeLimitedQueue(maxsize=10000000, heart_beat_cb=lambda: None)
+
+    msg_a = rdf_flows.GrrMessage(name="A")
+    msg_b = rdf_flows.GrrMessage(name="B", require_fastpoll=False)
+    msg_c = rdf_flows.GrrMessage(name="C" * 300)
+
+    queue.Put(msg_a, rdf_flows.GrrMessage.Priority.MEDIUM_PRIORITY)
+    queue.Put(msg_b, rdf_flows.GrrMessage.Priority.MEDIUM_PRIORITY)
+    queue.Put(msg_c, rdf_flows.GrrMessage.Priority.HIGH_PRIORITY)
+    self.assertGreater(queue.Size(), 0)
+
+    result = queue.GetSerializedMessages()
+    self.assertEqual(queue.Size(), 0)
+    self.assertEqual(len(result), 3)
+    self.assertTrue(result.require_fastpoll)
+
+    # The wire format must be identical to a regular MessageList.
+    expected = rdf_flows.MessageList(job=[msg_c, msg_a, msg_b])
+    self.assertEqual(result.SerializeToString(), expected.SerializeToString())
+    self.assertEqual(list(result.job), [msg_c, msg_a, msg_b])
+
+    queue.Put(msg_b, rdf_flows.GrrMessage.Priority.MEDIUM_PRIORITY)
+    result = queue.GetSerializedMessages()
+    self.assertFalse(result.require_fastpoll)
+
   def testSizeLimitedQueueOverflow(self):
 
     msg_a = rdf_flows.GrrMessage(name="A")
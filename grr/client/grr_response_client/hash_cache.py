@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+"""A persistent cache of hashes of unchanged files on the client."""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from grr_response_client.vfs_handlers import files
+from grr_response_core import config
+from grr_response_core.lib import utils
+
+
+class HashCache(object):
+  """An on-disk cache of values computed from contents of files.
+
+  Values are stored under the identity of the file they were computed from: its
+  device, inode, size, modification and inode change time. Hence, a cached value
+  is returned only for files that were not modified since.
+
+  The cache is bounded: once it grows above given number of entries, the least
+  recently used ones are evicted. Each entry is stored along with a checksum of
+  its key and value. Entries that fail the check are discarded and a database
+  that is found to be corrupted is recreated from scratch.
+
+  Args:
+    path: A path to the database file.
+    max_entries: A maximum number of entries stored in the cache.
+  """
+
+  # Number of writes after which least recently used entries are evicted.
+  _EVICTION_INTERVAL = 1000
+
+  # Files modified more recently than this (in seconds) are not cached, since
+  # subsequent modifications might not change their timestamps.
+  _RACY_INTERVAL = 2
+
+  def __init__(self, path, max_entries):
+    self.path = path
+    self.max_entries = max_entries
+
+    self._lock = threading.RLock()
+    self._writes = 0
+
+    try:
+      self._conn = self._Open()
+    except sqlite3.DatabaseError as e:
+      logging.warn("Recreating corrupted hash cache %s: %s", path, e)
+      os.remove(path)
+      self._conn = self._Open()
+
+    self._Evict()
+
+  def _Open(self):
+    """Opens the database, creating and checking it if necessary."""
+    conn = sqlite3.connect(self.path, check_same_thread=False)
+    try:
+      # Losing some of the recent entries on a crash is fine for a cache.
+      conn.execute("PRAGMA synchronous = OFF")
+
+      (result,) = conn.execute("PRAGMA quick_check").fetchone()
+      if result != "ok":
+        raise sqlite3.DatabaseError(result)
+
+      conn.execute("""
+        CREATE TABLE IF NOT EXISTS hashes(
+          device INTEGER NOT NULL,
+          inode INTEGER NOT NULL,
+          kind TEXT NOT NULL,
+          size INTEGER NOT NULL,
+          mtime REAL NOT NULL,
+          ctime REAL NOT NULL,
+          value BLOB NOT NULL,
+          checksum BLOB NOT NULL,
+          last_used REAL NOT NULL,
+          PRIMARY KEY (device, inode, kind))
+      """)
+      conn.execute("CREATE INDEX IF NOT EXISTS hashes_by_last_used "
+                   "ON hashes(last_used)")
+      conn.commit()
+    except sqlite3.Error:
+      conn.close()
+      raise
+
+    return conn
+
+  def Get(self, stat, kind):
+    """Returns a value cached for a given file.
+
+    Args:
+      stat: A `utils.Stat` object of the file.
+      kind: A string identifying the kind of the value (e.g. used hashes).
+
+    Returns:
+      A cached byte string or `None` if there is no valid value in the cache.
+    """
+    key = self._Key(stat, kind)
+    if key is None:
+      return None
+
+    try:
+      return self._Get(stat, key)
+    except sqlite3.Error as e:
+      logging.warn("Unable to read from hash cache %s: %s", self.path, e)
+      return None
+
+  def _Get(self, stat, key):
+    with self._lock:
+      row = self._conn.execute(
+          "SELECT value, checksum FROM hashes "
+          "WHERE device = ? AND inode = ? AND kind = ? "
+          "AND size = ? AND mtime = ? AND ctime = ?", key).fetchone()
+      if row is None:
+        return None
+
+      value, checksum = bytes(row[0]), bytes(row[1])
+      if checksum != self._Checksum(key, value):
+        logging.warn("Discarding corrupted hash cache entry for %s",
+                     stat.GetPath())
+        self._conn.execute(
+            "DELETE FROM hashes WHERE device = ? AND inode = ? AND kind = ?",
+            key[:3])
+        self._conn.commit()
+        return None
+
+      self._conn.execute(
+          "UPDATE hashes SET last_used = ? "
+          "WHERE device = ? AND inode = ? AND kind = ?",
+          (time.time(),) + key[:3])
+      self._conn.commit()
+
+    return value
+
+  def Put(self, stat, kind, value):
+    """Caches a value computed for a given file.
+
+    Args:
+      stat: A `utils.Stat` object of the file, taken before the value was
+          computed.
+      kind: A string identifying the kind of the value (e.g. used hashes).
+      value: A byte string to cache.
+    """
+    key = self._Key(stat, kind)
+    if key is None:
+      return
+
+    now = time.time()
+    if now - max(stat.GetModificationTime(),
+                 stat.GetChangeTime()) < self._RACY_INTERVAL:
+      return
+
+    try:
+      self._Put(key, value, now)
+    except sqlite3.Error as e:
+      logging.warn("Unable to write to hash cache %s: %s", self.path, e)
+
+  def _Put(self, key, value, now):
+    with self._lock:
+      self._conn.execute(
+          "INSERT OR REPLACE INTO hashes(device, inode, kind, size, mtime, "
+          "ctime, value, checksum, last_used) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+          key + (sqlite3.Binary(value),
+                 sqlite3.Binary(self._Checksum(key, value)), now))
+      self._conn.commit()
+
+      self._writes += 1
+      if self._writes >= self._EVICTION_INTERVAL:
+        self._Evict()
+
+  def _Evict(self):
+    """Removes least recently used entries above the size limit."""
+    with self._lock:
+      self._conn.execute(
+          "DELETE FROM hashes WHERE rowid IN ("
+          "SELECT rowid FROM hashes ORDER BY last_used DESC "
+          "LIMIT -1 OFFSET ?)", (self.max_entries,))
+      self._conn.commit()
+      self._writes = 0
+
+  def Close(self):
+    with self._lock:
+      self._conn.close()
+
+  @staticmethod
+  def _Key(stat, kind):
+    if not stat.IsRegular():
+      return None
+
+    raw = stat.GetRaw()
+    # Some platforms (e.g. Windows) do not report inode numbers, in which case
+    # files cannot be told apart reliably.
+    if not raw.st_ino:
+      return None
+    return (raw.st_dev, raw.st_ino, kind, raw.st_size, raw.st_mtime,
+            raw.st_ctime)
+
+  @staticmethod
+  def _Checksum(key, value):
+    serialized_key = utils.SmartStr("%d:%d:%s:%d:%r:%r" % key)
+    return hashlib.sha256(serialized_key + b"\x00" + value).digest()
+
+
+_hash_cache = None
+_hash_cache_lock = threading.Lock()
+
+
+def GetHashCache():
+  """Returns the hash cache of the client or `None` if caching is disabled."""
+  global _hash_cache
+
+  path = config.CONFIG["Client.hash_cache_path"]
+  if not path:
+    return None
+
+  with _hash_cache_lock:
+    if _hash_cache is None or _hash_cache.path != path:
+      max_entries = config.CONFIG["Client.hash_cache_max_entries"]
+      try:
+        _hash_cache = HashCache(path, max_entries)
+      except (OSError, sqlite3.Error) as e:
+        logging.warn("Unable to open hash cache %s: %s", path, e)
+        return None
+
+  return _hash_cache
+
+
+def GetCachedValue(stat, kind, rdf_cls):
+  """Returns a cached RDF value computed for a given file.
+
+  Args:
+    stat: A `utils.Stat` object of the file.
+    kind: A string identifying the kind of the value.
+    rdf_cls: A class of the cached RDF value.
+
+  Returns:
+    An instance of `rdf_cls` or `None` if caching is disabled or there is no
+    valid value in the cache.
+  """
+  cache = GetHashCache()
+  if cache is None or stat is None:
+    return None
+
+  serialized = cache.Get(stat, kind)
+  if serialized is None:
+    return None
+  return rdf_cls.FromSerializedString(serialized)
+
+
+def CacheValue(stat, kind, value):
+  """Caches an RDF value computed for a given file (if caching is enabled).
+
+  Args:
+    stat: A `utils.Stat` object of the file taken before computing the value.
+    kind: A string identifying the kind of the value.
+    value: An RDF value to cache.
+  """
+  cache = GetHashCache()
+  if cache is None or stat is None:
+    return
+
+  cache.Put(stat, kind, value.SerializeToString())
+
+
+def GetOrCompute(stat, kind, rdf_cls, compute):
+  """Returns a cached RDF value for a given file, computing it if necessary.
+
+  Args:
+    stat: A `utils.Stat` object of the file or `None` if it cannot be cached.
+    kind: A string identifying the kind of the value.
+    rdf_cls: A class of the cached RDF value.
+    compute: A function computing the value (or returning `None` on failure).
+
+  Returns:
+    An instance of `rdf_cls` or `None` if it could not be computed.
+  """
+  value = GetCachedValue(stat, kind, rdf_cls)
+  if value is None:
+    value = compute()
+    if value is not None:
+      CacheValue(stat, kind, value)
+  return value
+
+
+def StatVFSFile(fd):
+  """Returns a `utils.Stat` of a VFS file if values for it can be cached.
+
+  Args:
+    fd: A VFS file object.
+
+  Returns:
+    A `utils.Stat` object of the file or `None` if caching is disabled or the
+    file is not read directly from the local filesystem.
+  """
+  if GetHashCache() is None:
+    return None
+  if not isinstance(fd, files.File) or fd.file_offset:
+    return None
+
+  try:
+    return utils.Stat(fd.filename)
+  except OSError:
+    return None
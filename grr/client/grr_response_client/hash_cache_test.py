@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+import os
+import shutil
+import sqlite3
+import time
+
+import mock
+
+import unittest
+from grr_response_client import hash_cache
+from grr_response_core.lib import flags
+from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
+from grr.test_lib import test_lib
+
+
+class HashCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    super(HashCacheTest, self).setUp()
+    self.temp_dir = test_lib.TempDirPath()
+    self.db_path = os.path.join(self.temp_dir, "hashes.db")
+
+    # Files created by tests are too fresh to be cached otherwise.
+    racy_patcher = mock.patch.object(hash_cache.HashCache, "_RACY_INTERVAL", 0)
+    racy_patcher.start()
+    self.addCleanup(racy_patcher.stop)
+
+  def tearDown(self):
+    super(HashCacheTest, self).tearDown()
+    shutil.rmtree(self.temp_dir)
+
+  def Stat(self, name, content=None):
+    path = os.path.join(self.temp_dir, name)
+    if content is not None:
+      with open(path, "wb") as fd:
+        fd.write(content)
+    return utils.Stat(path)
+
+  def testPutAndGet(self):
+    cache = hash_cache.HashCache(self.db_path, max_entries=10)
+    foo_stat = self.Stat("foo", b"foo")
+    bar_stat = self.Stat("bar", b"bar")
+
+    cache.Put(foo_stat, "kind", b"foo-value")
+
+    self.assertEqual(cache.Get(foo_stat, "kind"), b"foo-value")
+    self.assertIsNone(cache.Get(foo_stat, "other-kind"))
+    self.assertIsNone(cache.Get(bar_stat, "kind"))
+
+  def testPersistence(self):
+    cache = hash_cache.HashCache(self.db_path, max_entries=10)
+    cache.Put(self.Stat("foo", b"foo"), "kind", b"value")
+    cache.Close()
+
+    cache = hash_cache.HashCache(self.db_path, max_entries=10)
+    self.assertEqual(cache.Get(self.Stat("foo"), "kind"), b"value")
+
+  def testModifiedFile(self):
+    cache = hash_cache.HashCache(self.db_path, max_entries=10)
+    cache.Put(self.Stat("foo", b"foo"), "kind", b"value")
+
+    stat = self.Stat("foo", b"foobar")
+    self.assertIsNone(cache.Get(stat, "kind"))
+
+  def testRecentlyModifiedFileIsNotCached(self):
+    cache = hash_cache.HashCache(self.db_path, max_entries=10)
+    stat = self.Stat("foo", b"foo")
+
+    with mock.patch.object(hash_cache.HashCache, "_RACY_INTERVAL", 3600):
+      cache.Put(stat, "kind", b"value")
+
+    self.assertIsNone(cache.Get(stat, "kind"))
+
+  def testLeastRecentlyUsedAreEvicted(self):
+    cache = hash_cache.HashCache(self.db_path, max_entries=2)
+    stats = [self.Stat("file%d" % i, b"x" * i) for i in range(3)]
+    now = time.time()
+
+    with mock.patch.object(hash_cache.HashCache, "_EVICTION_INTERVAL", 1):
+      with mock.patch("time.time", return_value=now + 1):
+        cache.Put(stats[0], "kind", b"0")
+      with mock.patch("time.time", return_value=now + 2):
+        cache.Put(stats[1], "kind", b"1")
+      with mock.patch("time.time", return_value=now + 3):
+        self.assertEqual(cache.Get(stats[0], "kind"), b"0")
+      with mock.patch("time.time", return_value=now + 4):
+        cache.Put(stats[2], "kind", b"2")
+
+    self.assertEqual(cache.Get(stats[0], "kind"), b"0")
+    self.assertIsNone(cache.Get(stats[1], "kind"))
+    self.assertEqual(cache.Get(stats[2], "kind"), b"2")
+
+  def testCorruptedEntryIsDiscarded(self):
+    cache = hash_cache.HashCache(self.db_path, max_entries=10)
+    stat = self.Stat("foo", b"foo")
+    cache.Put(stat, "kind", b"value")
+    cache.Close()
+
+    conn = sqlite3.connect(self.db_path)
+    conn.execute("UPDATE hashes SET value = ?", (sqlite3.Binary(b"eulav"),))
+    conn.commit()
+    conn.close()
+
+    cache = hash_cache.HashCache(self.db_path, max_entries=10)
+    self.assertIsNone(cache.Get(stat, "kind"))
+
+  def testCorruptedDatabaseIsRecreated(self):
+    with open(self.db_path, "wb") as fd:
+      fd.write(b"not a database" * 1024)
+
+    cache = hash_cache.HashCache(self.db_path, max_entries=10)
+    stat = self.Stat("foo", b"foo")
+    cache.Put(stat, "kind", b"value")
+    self.assertEqual(cache.Get(stat, "kind"), b"value")
+
+  def testDirectoriesAreNotCached(self):
+    cache = hash_cache.HashCache(self.db_path, max_entries=10)
+    os.mkdir(os.path.join(self.temp_dir, "foo"))
+    stat = self.Stat("foo")
+
+    cache.Put(stat, "kind", b"value")
+    self.assertIsNone(cache.Get(stat, "kind"))
+
+
+class GetOrComputeTest(unittest.TestCase):
+
+  def setUp(self):
+    super(GetOrComputeTest, self).setUp()
+    self.temp_dir = test_lib.TempDirPath()
+    self.path = os.path.join(self.temp_dir, "foo")
+    with open(self.path, "wb") as fd:
+      fd.write(b"foo")
+
+    racy_patcher = mock.patch.object(hash_cache.HashCache, "_RACY_INTERVAL", 0)
+    racy_patcher.start()
+    self.addCleanup(racy_patcher.stop)
+
+  def tearDown(self):
+    super(GetOrComputeTest, self).tearDown()
+    shutil.rmtree(self.temp_dir)
+
+  def testDisabled(self):
+    compute = mock.Mock(return_value=rdf_crypto.Hash(num_bytes=3))
+
+    with test_lib.ConfigOverrider({"Client.hash_cache_path": ""}):
+      stat = utils.Stat(self.path)
+      hash_cache.GetOrCompute(stat, "kind", rdf_crypto.Hash, compute)
+      hash_cache.GetOrCompute(stat, "kind", rdf_crypto.Hash, compute)
+
+    self.assertEqual(compute.call_count, 2)
+
+  def testEnabled(self):
+    compute = mock.Mock(return_value=rdf_crypto.Hash(num_bytes=3))
+    db_path = os.path.join(self.temp_dir, "hashes.db")
+
+    with test_lib.ConfigOverrider({"Client.hash_cache_path": db_path}):
+      stat = utils.Stat(self.path)
+      first = hash_cache.GetOrCompute(stat, "kind", rdf_crypto.Hash, compute)
+      second = hash_cache.GetOrCompute(stat, "kind", rdf_crypto.Hash, compute)
+
+    self.assertEqual(compute.call_count, 1)
+    self.assertEqual(first, second)
+    self.assertEqual(second.num_bytes, 3)
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
@@ -75,6 +75,7 @@ setup_args = dict(
         "grr-response-core==%s" % VERSION.get("Version", "packagedepends"),
         "rekall-core==1.7.2rc1",
         "pyinstaller==3.2.1",
+        "scandir==1.9.0",
     ],
     extras_require={
         # The following requirements are needed in Windows.
@@ -128,6 +128,18 @@ config_lib.DEFINE_string(
     help="Default subdirectory in the temp directory to use for GRR.",
     default="%(Client.name)")
 
+config_lib.DEFINE_string(
+    name="Client.hash_cache_path",
+    help=("A path to the file in which hashes of files are cached, so that "
+          "unchanged files are not hashed again by subsequent collections. "
+          "Caching is disabled if empty."),
+    default="")
+
+config_lib.DEFINE_integer(
+    name="Client.hash_cache_max_entries",
+    help="A maximum number of files in the client hash cache.",
+    default=100000)
+
 config_lib.DEFINE_list(
     name="Client.vfs_virtualroots",
     help=("If this is set for a VFS type, client VFS operations will always be"
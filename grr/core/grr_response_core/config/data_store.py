@@ -13,6 +13,29 @@ config_lib.DEFINE_string("Datastore.implementation", "FakeDataStore",
 config_lib.DEFINE_string("Blobstore.implementation", "MemoryStreamBlobstore",
                          "Blob storage subsystem to use.")
 
+config_lib.DEFINE_string(
+    "PackBlobstore.root_dir", "%(Config.prefix)/var/grr-blobs",
+    "Where the PackBlobstore keeps its pack and index files.")
+
+config_lib.DEFINE_integer(
+    "PackBlobstore.max_pack_size", 1024 * 1024 * 1024,
+    "Size in bytes at which a pack file is sealed and a new one is started.")
+
+config_lib.DEFINE_integer(
+    "PackBlobstore.bloom_filter_bits", 2**23,
+    "Minimum size of the in-memory Bloom filter of stored blobs. The filter "
+    "is rebuilt with a larger size when it gets below 10 bits per blob, "
+    "which keeps the false positive rate around 1%.")
+
+config_lib.DEFINE_bool(
+    "PackBlobstore.sync_writes", True,
+    "If True, pack files are fsynced before their index entries are written.")
+
+config_lib.DEFINE_integer(
+    "PackBlobstore.compaction_interval", 3600,
+    "Seconds between background compactions of the pack files. 0 disables "
+    "background compaction.")
+
 config_lib.DEFINE_string("Database.implementation", "",
                          "Relational database system to use.")
 
@@ -38,6 +61,10 @@ config_lib.DEFINE_bool("Database.useForReads.foreman", False,
 config_lib.DEFINE_bool("Database.useForReads.vfs", False,
                        "Use relational database for reading VFS information.")
 
+config_lib.DEFINE_bool(
+    "Database.useForReads.results", False,
+    "Use relational database for reading flow and hunt results.")
+
 DATASTORE_PATHING = [
     r"%{(?P<path>files/hash/generic/sha256/...).*}",
     r"%{(?P<path>files/hash/generic/sha1/...).*}",
@@ -151,6 +178,25 @@ config_lib.DEFINE_integer(
     10,
     help="Maximum number of retries (happens in case a query fails).")
 
+config_lib.DEFINE_bool(
+    "Mysql.bulk_writes",
+    False,
+    help=("Write buffered mutations (e.g. the ones from mutation pools) "
+          "using large multi-row statements, without checking for existing "
+          "rows first."))
+
+config_lib.DEFINE_integer(
+    "Mysql.bulk_write_batch_size",
+    1000,
+    help=("Maximum number of rows written or deleted by a single statement "
+          "in the bulk write mode."))
+
+config_lib.DEFINE_integer(
+    "Mysql.bulk_write_connections",
+    4,
+    help=("Number of pooled connections used concurrently to write buffered "
+          "mutations in the bulk write mode."))
+
 # CloudBigTable data store.
 config_lib.DEFINE_string(
     "CloudBigtable.project_id",
@@ -33,3 +33,21 @@ config_lib.DEFINE_integer("BigQuery.retry_multiplier", 2,
 config_lib.DEFINE_integer_list("BigQuery.retry_status_codes",
                                [404, 500, 502, 503, 504],
                                "HTTP status codes on which we should retry.")
+
+config_lib.DEFINE_integer(
+    "Export.conversion_processes", 0,
+    "Number of worker processes used by instant output plugins (e.g. CSV or "
+    "SQLite exports) to convert values to their exported form. If 0, values "
+    "are converted in the exporting thread.")
+
+config_lib.DEFINE_bool(
+    "Export.ordered_conversion", True,
+    "If False, values converted by worker processes are exported in the order "
+    "in which their conversion completes instead of the order in which they "
+    "are stored. Only applies if Export.conversion_processes is set.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration, "Export.conversion_timeout", "10m",
+    "Time to wait for a worker process to convert a batch of values. Batches "
+    "that are not converted in time (e.g. because the worker died) are "
+    "converted in the exporting thread instead.")
@@ -42,6 +42,23 @@ config_lib.DEFINE_list(
     "Allow these well known flows to run directly on the "
     "frontend. Other flows are scheduled as normal.")
 
+config_lib.DEFINE_bool(
+    "Worker.shard_affine", False,
+    "If True, workers split the queue notification shards between them and "
+    "process each of their shards in a separate loop with its own thread "
+    "pool.")
+
+config_lib.DEFINE_integer(
+    "Worker.shard_threads", 10,
+    "Number of threads processing flows of a single notification shard when "
+    "Worker.shard_affine is set.")
+
+config_lib.DEFINE_integer(
+    "Worker.shard_lease_time", 60,
+    "Seconds a worker leases a notification shard for when "
+    "Worker.shard_affine is set. Shards of a dead worker are taken over by "
+    "the others after this time.")
+
 # Smtp settings.
 config_lib.DEFINE_string("Worker.smtp_server", "localhost",
                          "The smtp server for sending email alerts.")
@@ -118,6 +135,49 @@ config_lib.DEFINE_integer(
     "Maximum time messages remain valid within the "
     "system.")
 
+config_lib.DEFINE_integer(
+    "Frontend.cipher_cache_size", 50000,
+    "Maximum number of session ciphers (and of client public keys) the "
+    "frontend keeps in memory.")
+
+config_lib.DEFINE_integer(
+    "Frontend.cipher_cache_max_age", 3600,
+    "Seconds the frontend keeps using a session cipher before it is decoded "
+    "or generated again.")
+
+config_lib.DEFINE_integer(
+    "Frontend.pub_key_cache_max_age", 86400,
+    "Seconds the frontend caches client public keys before rereading them "
+    "from the data store.")
+
+config_lib.DEFINE_bool(
+    "Frontend.pipelined", False,
+    "If True, the frontend handles client requests on a fixed number of "
+    "threads and stores and drains client messages concurrently in separate "
+    "bounded stages instead of using one thread per connection.")
+
+config_lib.DEFINE_integer(
+    "Frontend.http_threads", 100,
+    "Number of threads serving HTTP connections when Frontend.pipelined is "
+    "set.")
+
+config_lib.DEFINE_integer(
+    "Frontend.pipeline_receive_threads", 10,
+    "Number of threads writing received messages to the data store.")
+
+config_lib.DEFINE_integer(
+    "Frontend.pipeline_drain_threads", 10,
+    "Number of threads draining client queues.")
+
+config_lib.DEFINE_integer(
+    "Frontend.pipeline_queue_size", 100,
+    "Maximum number of requests waiting for each frontend stage.")
+
+config_lib.DEFINE_integer(
+    "Frontend.pipeline_enqueue_timeout", 30,
+    "Seconds a request waits for room in the full receive stage before it "
+    "is rejected with a 503 status.")
+
 config_lib.DEFINE_string("Frontend.upload_store", "FileUploadFileStore",
                          "The implementation of the upload file store.")
 
@@ -125,6 +185,20 @@ config_lib.DEFINE_string("FileUploadFileStore.root_dir",
                          "%(Config.prefix)/var/grr-filestore",
                          "Where to store files uploaded.")
 
+config_lib.DEFINE_bool(
+    "HuntResultSegments.enabled", False,
+    "If True, hunt results are additionally written to append-only segment "
+    "files which the UI and exports read from instead of the data store. "
+    "Segments are stored on the local disk of the worker processing the "
+    "results, so this is only supported on single-host deployments where "
+    "workers and the AdminUI share HuntResultSegments.root_dir. In any other "
+    "setup segments end up incomplete and the data store is used instead.")
+
+config_lib.DEFINE_string(
+    "HuntResultSegments.root_dir", "%(Config.prefix)/var/grr-hunt-results",
+    "Where to store hunt result segment files. Has to be on a local disk, "
+    "segments of deleted hunts are removed by the CleanHunts cron job.")
+
 config_lib.DEFINE_bool(
     "Server.initialized", False, "True once config_updater initialize has been "
     "run at least once.")
@@ -212,6 +286,18 @@ config_lib.DEFINE_integer(
     help="The number of bytes allowed for unbounded "
     "reads from a file object")
 
+config_lib.DEFINE_bool(
+    "Server.in_memory_client_index", False,
+    "If True, client searches are answered from an in-memory inverted index "
+    "of the client keywords in the relational database, which is loaded on "
+    "the first search.")
+
+config_lib.DEFINE_bool(
+    "Server.client_search_operators", False,
+    "If True, client searches support prefix (\"host:web*\"), OR and "
+    "negated (\"-keyword\") search terms. Only used with "
+    "Server.in_memory_client_index.")
+
 # Data retention policies.
 config_lib.DEFINE_semantic_value(
     rdfvalue.Duration,
@@ -18,6 +18,10 @@ from grr_response_core.lib import utils
 
 from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
+
+# Wire tag of the `job` field of a `MessageList` (field 1, length delimited).
+_MESSAGE_LIST_JOB_TAG = b"\x0a"
 
 
 class CommunicatorInit(registry.InitHook):
@@ -56,6 +60,41 @@ class UnknownClientCert(DecodingError):
   counter = "grr_client_unknown"
 
 
+class SerializedMessageList(object):
+  """A MessageList built directly from already serialized GrrMessages.
+
+  Serializing this list concatenates the messages with their field framing
+  instead of parsing them and serializing them again, so it can be passed to
+  `Communicator.EncodeMessages` in place of a `rdf_flows.MessageList`.
+
+  Attributes:
+    require_fastpoll: Whether any of the messages requires fast poll.
+  """
+
+  def __init__(self, serialized_messages=None, require_fastpoll=False):
+    self._serialized_messages = list(serialized_messages or [])
+    self._job = None
+    self.require_fastpoll = require_fastpoll
+
+  def __len__(self):
+    return len(self._serialized_messages)
+
+  @property
+  def job(self):
+    """The messages of the list, parsed on first access."""
+    if self._job is None:
+      self._job = [
+          rdf_flows.GrrMessage.FromSerializedString(message)
+          for message in self._serialized_messages
+      ]
+    return self._job
+
+  def SerializeToString(self):
+    return b"".join(
+        _MESSAGE_LIST_JOB_TAG + rdf_structs.VarintEncode(len(message)) + message
+        for message in self._serialized_messages)
+
+
 class Cipher(object):
   """Holds keying information."""
   cipher_name = "aes_128_cbc"
@@ -318,6 +357,11 @@ class Communicator(with_metaclass(abc.ABCMeta, object)):
     self.server_cipher_age = rdfvalue.RDFDatetime.Now()
     return self.server_cipher
 
+  def _GetCipherForDestination(self, destination):
+    """Returns a cipher for messages sent to destination."""
+    remote_public_key = self._GetRemotePublicKey(destination)
+    return Cipher(self.common_name, self.private_key, remote_public_key)
+
   def EncodeMessages(self,
                      message_list,
                      result,
@@ -330,7 +374,7 @@ class Communicator(with_metaclass(abc.ABCMeta, object)):
 
     Args:
        message_list: A MessageList rdfvalue containing a list of
-       GrrMessages.
+       GrrMessages or an equivalent SerializedMessageList.
 
        result: A ClientCommunication rdfvalue which will be filled in.
 
@@ -362,8 +406,7 @@ class Communicator(with_metaclass(abc.ABCMeta, object)):
       # it's the only cipher it ever uses.
       cipher = self._GetServerCipher()
     else:
-      remote_public_key = self._GetRemotePublicKey(destination)
-      cipher = Cipher(self.common_name, self.private_key, remote_public_key)
+      cipher = self._GetCipherForDestination(destination)
 
     # Make a nonce for this transaction
     if timestamp is None:
@@ -9,6 +9,7 @@ from future.utils import iteritems
 from grr_response_core.lib import flags
 from grr_response_core.lib import type_info
 from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_proto import jobs_pb2
 from grr_response_proto import knowledge_base_pb2
@@ -167,6 +168,55 @@ class RDFValueBenchmark(benchmark_test_lib.AverageMicroBenchmarks):
 
     self.TimeIt(ProtoDecode, "Protobuf Repeated Decode", repetitions=repeats)
 
+  def testDecodeStatEntryMessageList(self):
+    """Test decoding of GrrMessages carrying StatEntry payloads."""
+
+    repeats = self.REPEATS // 50
+    stat_entry = jobs_pb2.StatEntry(
+        st_mode=33188,
+        st_ino=1063090,
+        st_dev=64512,
+        st_nlink=1,
+        st_uid=139592,
+        st_gid=5000,
+        st_size=1024,
+        st_atime=1336469177,
+        st_mtime=1336129892,
+        st_ctime=1336129892)
+    stat_entry.pathspec.pathtype = jobs_pb2.PathSpec.OS
+    stat_entry.pathspec.path = "/home/user/file.txt"
+    payload = stat_entry.SerializeToString()
+
+    s = jobs_pb2.MessageList()
+    for i in range(self.REPEATS):
+      s.job.add(
+          session_id="aff4:/C.1000000000000000/flows/F:ABCDEF12",
+          name="ListDirectory",
+          request_id=i,
+          args_rdf_name="StatEntry",
+          args=payload)
+
+    test_data = s.SerializeToString()
+
+    def ProtoDecode():
+      s = jobs_pb2.MessageList()
+      s.ParseFromString(test_data)
+      for job in s.job:
+        jobs_pb2.StatEntry.FromString(job.args)
+
+    def SProtoDecode():
+      s = rdf_flows.MessageList.FromSerializedString(test_data)
+      for job in s.job:
+        _ = job.payload
+
+    self.TimeIt(
+        SProtoDecode, "SProto StatEntry MessageList Decode",
+        repetitions=repeats)
+
+    self.TimeIt(
+        ProtoDecode, "Protobuf StatEntry MessageList Decode",
+        repetitions=repeats)
+
   def testRepeatedFields(self):
     """Test serialization and construction of repeated fields."""
 
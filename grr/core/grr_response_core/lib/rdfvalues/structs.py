@@ -219,17 +219,16 @@ def SerializeEntries(entries):
 def ReadIntoObject(buff, index, value_obj, length=0):
   """Reads all tags until the next end group and store in the value_obj."""
   raw_data = value_obj.GetRawData()
+  decoder_table = value_obj.GetDecoderTable()
   count = 0
+  # Repeated fields are collected here and added to their containers in bulk
+  # once the whole buffer is split.
+  repeated_fields = {}
 
   # Split the buffer into tags and wire_format representations, then collect
   # these into the raw data cache.
-  for (encoded_tag, encoded_length, encoded_field) in SplitBuffer(
-      buff, index=index, length=length):
-
-    type_info_obj = value_obj.type_infos_by_encoded_tag.get(encoded_tag)
-
-    # Internal format to store parsed fields.
-    wire_format = (encoded_tag, encoded_length, encoded_field)
+  for wire_format in SplitBuffer(buff, index=index, length=length):
+    decoder = decoder_table.get(wire_format[0])
 
     # If the tag is not found we need to skip it. Skipped fields are
     # inaccessible to this actual object, because they have no type info
@@ -240,7 +239,7 @@ def ReadIntoObject(buff, index, value_obj, length=0):
     # the application. In order to avoid having to worry about repeated fields
     # here, we just insert them into the raw data dict with a key which should
     # be unique.
-    if type_info_obj is None:
+    if decoder is None:
       # Record an unknown field. The key is unique and ensures we do not collide
       # the dict on repeated fields of the encoded tag. Note that this field is
       # not really accessible using Get() and does not have a python format
@@ -249,14 +248,17 @@ def ReadIntoObject(buff, index, value_obj, length=0):
       raw_data[count] = (None, wire_format, None)
 
       count += 1
+      continue
 
-    # Repeated fields are handled especially.
-    elif type_info_obj.__class__ is ProtoList:
-      value_obj.Get(type_info_obj.name).wrapped_list.append((None, wire_format))
-
+    name, type_info_obj, repeated = decoder
+    if repeated:
+      repeated_fields.setdefault(name, []).append((None, wire_format))
     else:
       # Set the python_format as None so it gets converted lazily on access.
-      raw_data[type_info_obj.name] = (None, wire_format, type_info_obj)
+      raw_data[name] = (None, wire_format, type_info_obj)
+
+  for name, wire_formats in iteritems(repeated_fields):
+    value_obj.Get(name).wrapped_list.extend(wire_formats)
 
   value_obj.SetRawData(raw_data)
 
@@ -1264,8 +1266,8 @@ class ProtoList(ProtoType):
 
   def ConvertFromWireFormat(self, value, container=None):
     result = RepeatedFieldHelper(type_descriptor=self.delegate)
-    for wire_format in SplitBuffer(value[2]):
-      result.wrapped_list.append((None, wire_format))
+    result.wrapped_list.extend(
+        (None, wire_format) for wire_format in SplitBuffer(value[2]))
 
     return result
 
@@ -1502,6 +1504,7 @@ class RDFStructMetaclass(rdfvalue.RDFValueMetaclass):
 
     cls.type_infos_by_field_number = {}
     cls.type_infos_by_encoded_tag = {}
+    cls._decoder_table = None  # pylint: disable=protected-access
 
     # Build the class by parsing an existing protobuf class.
     if cls.protobuf is not None:
@@ -1695,6 +1698,28 @@ class RDFStruct(with_metaclass(RDFStructMetaclass, rdfvalue.RDFValue)):
     self._data = data
     self.dirty = True
 
+  @classmethod
+  def GetDecoderTable(cls):
+    """Returns the table ReadIntoObject uses to decode this class.
+
+    The table maps encoded tags to (field name, type descriptor, repeated)
+    tuples. It is compiled once from the type descriptors and recompiled only
+    after a new descriptor is added (e.g. when a late bound field resolves).
+
+    Returns:
+      A dict keyed by encoded tag.
+    """
+    table = cls._decoder_table
+    if table is None:
+      table = {}
+      for encoded_tag, type_descriptor in iteritems(
+          cls.type_infos_by_encoded_tag):
+        table[encoded_tag] = (type_descriptor.name, type_descriptor,
+                              type_descriptor.__class__ is ProtoList)
+      cls._decoder_table = table
+
+    return table
+
   def SerializeToString(self):
     return SerializeEntries(itervalues(self._data))
 
@@ -2224,6 +2249,7 @@ class RDFProtoStruct(RDFStruct):
     # We store an index of the type info by tag values to speed up parsing.
     cls.type_infos_by_field_number[field_desc.field_number] = field_desc
     cls.type_infos_by_encoded_tag[field_desc.encoded_tag] = field_desc
+    cls._decoder_table = None
 
     cls.type_infos.Append(field_desc)
     cls.late_bound_type_infos.pop(field_desc.name, None)
@@ -693,6 +693,110 @@ class RDFStructsTest(rdf_test_base.RDFValueTestMixin, test_lib.GRRBaseTest):
         test_struct.ToPrimitiveDict(serialize_leaf_fields=True), expected_dict)
 
 
+def _ReferenceReadIntoObject(buff, value_obj):
+  """Tag by tag decoder the compiled decoder tables must be compatible with."""
+  raw_data = value_obj.GetRawData()
+  count = 0
+  for encoded_tag, encoded_length, encoded_field in rdf_structs.SplitBuffer(
+      buff):
+    type_info_obj = value_obj.type_infos_by_encoded_tag.get(encoded_tag)
+    wire_format = (encoded_tag, encoded_length, encoded_field)
+    if type_info_obj is None:
+      raw_data[count] = (None, wire_format, None)
+      count += 1
+    elif type_info_obj.__class__ is rdf_structs.ProtoList:
+      value_obj.Get(type_info_obj.name).wrapped_list.append((None, wire_format))
+    else:
+      raw_data[type_info_obj.name] = (None, wire_format, type_info_obj)
+  value_obj.SetRawData(raw_data)
+  return value_obj
+
+
+class DecoderCompatibilityTest(test_lib.GRRBaseTest):
+  """Checks that parsing produces exactly what the tag by tag decoder did."""
+
+  def _RawWireData(self, value_obj):
+    result = {}
+    for key, value in value_obj.GetRawData().items():
+      if isinstance(value, rdf_structs.RepeatedFieldHelper):
+        result[key] = [wire_format for _, wire_format in value.wrapped_list]
+      else:
+        result[key] = value[1]
+    return result
+
+  def _CheckCompatible(self, cls, data):
+    parsed = cls.FromSerializedString(data)
+    reference = _ReferenceReadIntoObject(data, cls())
+
+    self.assertEqual(self._RawWireData(parsed), self._RawWireData(reference))
+    self.assertEqual(parsed.SerializeToString(),
+                     reference.SerializeToString())
+    self.assertEqual(parsed, reference)
+
+  def _FullTestStruct(self):
+    tested = TestStruct(foobar="hello", int=5, type="SECOND", float=2.5)
+    tested.repeated = ["a", "b", "c"]
+    tested.nested.foobar = "nested"
+    for i in range(20):
+      tested.repeat_nested.Append(foobar="Nest%s" % i, int=i)
+    return tested
+
+  def testAllFieldTypes(self):
+    self._CheckCompatible(TestStruct,
+                          self._FullTestStruct().SerializeToString())
+
+  def testEmptyBuffer(self):
+    self._CheckCompatible(TestStruct, "")
+
+  def testUnknownFieldsAreKeptInOrder(self):
+    self._CheckCompatible(PartialTest1,
+                          self._FullTestStruct().SerializeToString())
+
+  def testGrrMessage(self):
+    message = rdf_flows.GrrMessage(
+        session_id="aff4:/flows/W:1234",
+        request_id=1,
+        response_id=2,
+        name="foo",
+        payload=rdf_client.ClientSummary(system_uptime=42))
+    self._CheckCompatible(rdf_flows.GrrMessage, message.SerializeToString())
+
+  def testLargeMessageList(self):
+    message_list = rdf_flows.MessageList()
+    for i in range(1000):
+      message_list.job.Append(session_id="aff4:/flows/W:1234", request_id=i)
+
+    data = message_list.SerializeToString()
+    self._CheckCompatible(rdf_flows.MessageList, data)
+
+    parsed = rdf_flows.MessageList.FromSerializedString(data)
+    self.assertEqual([job.request_id for job in parsed.job], list(range(1000)))
+
+  def testParsingIntoExistingRepeatedFieldAppends(self):
+    first = TestStruct(repeated=["a", "b"]).SerializeToString()
+    second = TestStruct(repeated=["c"]).SerializeToString()
+
+    tested = TestStruct.FromSerializedString(first)
+    tested.ParseFromString(second)
+    self.assertEqual(list(tested.repeated), ["a", "b", "c"])
+
+  def testDecoderTableIsRebuiltWhenDescriptorIsAdded(self):
+
+    class GrowingStruct(rdf_structs.RDFProtoStruct):
+      type_description = type_info.TypeDescriptorSet(
+          rdf_structs.ProtoString(name="foobar", field_number=1),)
+
+    data = TestStruct(foobar="hello", int=5).SerializeToString()
+
+    self.assertEqual(GrowingStruct.FromSerializedString(data).foobar, "hello")
+    self.assertRaises(AttributeError, getattr,
+                      GrowingStruct.FromSerializedString(data), "int")
+
+    GrowingStruct.AddDescriptor(
+        rdf_structs.ProtoUnsignedInteger(name="int", field_number=2))
+    self.assertEqual(GrowingStruct.FromSerializedString(data).int, 5)
+
+
 def main(argv):
   test_lib.main(argv)
 
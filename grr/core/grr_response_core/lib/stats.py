@@ -47,6 +47,7 @@ methods.
 """
 
 
+import abc
 import bisect
 import functools
 import threading
@@ -55,6 +56,7 @@ import time
 
 from builtins import zip  # pylint: disable=redefined-builtin
 from future.utils import iterkeys
+from future.utils import with_metaclass
 from past.builtins import long
 
 from grr_response_core.lib import utils
@@ -157,10 +159,13 @@ class _Metric(object):
                         fields))
 
     try:
-      return self._values[self._FieldsToKey(fields)]
+      return self._GetValue(self._FieldsToKey(fields))
     except KeyError:
       return self._DefaultValue()
 
+  def _GetValue(self, key):
+    return self._values[key]
+
   def ListFieldsValues(self):
     """Lists all fields values that were used with this metric."""
     if self.fields_defs:
@@ -169,22 +174,153 @@ class _Metric(object):
       return []
 
 
-class _CounterMetric(_Metric):
+class _ThreadShards(object):
+  """Dictionaries of metric values kept separately by every thread.
+
+  Each thread only updates its own shard, so recording values requires no
+  locking. Creating a shard is cheap, even for servers starting a thread per
+  request: shards of threads that have exited are folded into a common one
+  only when the metric is read or when the number of shards has doubled since
+  they were last folded, so the number of shards stays proportional to the
+  number of live threads.
+
+  Args:
+    merge: A function merging a value into a dictionary under a given key,
+        called as merge(values, key, value).
+  """
+
+  # Number of shards below which shards of exited threads are only folded when
+  # the metric is read.
+  _MIN_SHARDS_TO_FOLD = 64
+
+  def __init__(self, merge):
+    self._merge = merge
+    self._local = threading.local()
+    self._lock = threading.Lock()
+    self._live = []
+    self._retired = {}
+    self._fold_at = self._MIN_SHARDS_TO_FOLD
+
+  def Local(self):
+    """Returns the shard of the current thread."""
+    try:
+      return self._local.values
+    except AttributeError:
+      pass
+
+    values = {}
+    with self._lock:
+      self._live.append((threading.current_thread(), values))
+      if len(self._live) >= self._fold_at:
+        self._FoldExited()
+
+    self._local.values = values
+    return values
+
+  def _FoldExited(self):
+    """Folds shards of exited threads into the common one (lock held)."""
+    live = []
+    for thread, thread_values in self._live:
+      if thread.is_alive():
+        live.append((thread, thread_values))
+      else:
+        for key, value in list(thread_values.items()):
+          self._merge(self._retired, key, value)
+    self._live = live
+    self._fold_at = max(2 * len(live), self._MIN_SHARDS_TO_FOLD)
+
+  def Get(self, key):
+    """Returns values recorded under a given key merged from all the shards.
+
+    Args:
+      key: A key of the value.
+
+    Returns:
+      The merged value.
+
+    Raises:
+      KeyError: if no value was recorded under the key.
+    """
+    result = {}
+    with self._lock:
+      self._FoldExited()
+      for values in [self._retired] + [values for _, values in self._live]:
+        if key in values:
+          self._merge(result, key, values[key])
+    return result[key]
+
+  def Keys(self):
+    """Returns a set of keys used in any of the shards."""
+    with self._lock:
+      self._FoldExited()
+      keys = set(self._retired)
+      for _, values in self._live:
+        keys.update(list(values))
+    return keys
+
+
+class _AccumulatingMetric(with_metaclass(abc.ABCMeta, _Metric)):
+  """Base class for metrics accumulating recorded values (counters, events).
+
+  Values are either kept in a single dictionary guarded by a lock or, if
+  thread_shards is set, in per-thread dictionaries that are merged only when
+  the metric is read.
+  """
+
+  def __init__(self, fields_defs, docstring, units, thread_shards=False):
+    super(_AccumulatingMetric, self).__init__(fields_defs, docstring, units)
+    self._lock = threading.Lock()
+    if thread_shards:
+      self._shards = _ThreadShards(self._MergeValue)
+    else:
+      self._shards = None
+
+  @abc.abstractmethod
+  def _MergeValue(self, values, key, value):
+    """Merges a value into a dictionary of values under a given key."""
+
+  def _Accumulate(self, key, value):
+    if self._shards is None:
+      with self._lock:
+        self._MergeValue(self._values, key, value)
+    else:
+      self._MergeValue(self._shards.Local(), key, value)
+
+  def _GetValue(self, key):
+    if self._shards is None:
+      with self._lock:
+        result = {}
+        self._MergeValue(result, key, self._values[key])
+        return result[key]
+    else:
+      return self._shards.Get(key)
+
+  def ListFieldsValues(self):
+    """Lists all fields values that were used with this metric."""
+    if not self.fields_defs:
+      return []
+    if self._shards is None:
+      with self._lock:
+        return list(self._values)
+    else:
+      return list(self._shards.Keys())
+
+
+class _CounterMetric(_AccumulatingMetric):
   """Simple counter metric."""
 
   def _DefaultValue(self):
     return 0
 
+  def _MergeValue(self, values, key, value):
+    values[key] = values.get(key, 0) + value
+
   def Increment(self, delta, fields=None):
     """Increments counter value by a given delta."""
     if delta < 0:
       raise ValueError("Delta should be > 0 (not %d)" % delta)
 
-    key = self._FieldsToKey(fields)
-    if key in self._values:
-      self._values[key] += delta
-    else:
-      self._values[key] = delta
+    self._Accumulate(self._FieldsToKey(fields), delta)
 
 
 class Distribution(rdf_structs.RDFProtoStruct):
@@ -220,28 +356,95 @@ class Distribution(rdf_structs.RDFProtoStruct):
     return dict(zip(self.bins, self.heights))
 
 
-class _EventMetric(_Metric):
+class _Histogram(object):
+  """A plain Python counterpart of Distribution used for recording values.
+
+  Recording a value in a Distribution goes through protobuf field descriptors,
+  which is too slow for metrics recorded on hot paths. Histograms are converted
+  to Distributions only when metrics are read.
+
+  Args:
+    bins: Bins of the histogram (starting with -Infinity).
+  """
+
+  __slots__ = ("bins", "heights", "sum", "count")
+
+  def __init__(self, bins):
+    self.bins = bins
+    self.heights = [0] * len(bins)
+    self.sum = 0.0
+    self.count = 0
+
+  def Record(self, value):
+    """Records given value."""
+    self.sum += value
+    self.count += 1
+
+    pos = bisect.bisect(self.bins, value) - 1
+    if pos < 0:
+      pos = 0
+    self.heights[pos] += 1
+
+  def Merge(self, other):
+    """Adds values recorded in another histogram with the same bins."""
+    self.sum += other.sum
+    self.count += other.count
+
+    heights = self.heights
+    for i, height in enumerate(other.heights):
+      heights[i] += height
+
+  def ToDistribution(self):
+    result = Distribution(bins=self.bins[1:])
+    result.sum = self.sum
+    result.count = self.count
+    result.heights = list(self.heights)
+    return result
+
+
+class _EventMetric(_AccumulatingMetric):
   """EventMetric provides detailed stats, like averages, distribution, etc."""
 
   def _DefaultValue(self):
-    return Distribution(bins=self._bins)
+    return Distribution(bins=self._bins[1:])
 
-  def __init__(self, bins, fields, docstring, units):
-    self._bins = bins or [
+  def __init__(self, bins, fields, docstring, units, thread_shards=False):
+    bins = bins or [
         0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.75, 1, 1.5, 2, 2.5, 3, 4, 5, 6, 7, 8, 9,
         10, 15, 20, 50, 100
     ]
-    super(_EventMetric, self).__init__(fields, docstring, units)
+    self._bins = [-float("inf")] + bins
+    super(_EventMetric, self).__init__(
+        fields, docstring, units, thread_shards=thread_shards)
+
+  def _MergeValue(self, values, key, value):
+    try:
+      entry = values[key]
+    except KeyError:
+      entry = _Histogram(self._bins)
+      values[key] = entry
+
+    entry.Merge(value)
+
+  def _GetValue(self, key):
+    return super(_EventMetric, self)._GetValue(key).ToDistribution()
 
   def Record(self, value, fields=None):
     """Records given value."""
     key = self._FieldsToKey(fields)
 
+    if self._shards is None:
+      with self._lock:
+        self._RecordInto(self._values, key, value)
+    else:
+      self._RecordInto(self._shards.Local(), key, value)
+
+  def _RecordInto(self, values, key, value):
     try:
-      entry = self._values[key]
+      entry = values[key]
     except KeyError:
-      entry = Distribution(bins=self._bins)
-      self._values[key] = entry
+      entry = _Histogram(self._bins)
+      values[key] = entry
 
     entry.Record(value)
 
@@ -352,7 +555,8 @@ class StatsCollector(object):
                             varname,
                             fields=None,
                             docstring=None,
-                            units=None):
+                            units=None,
+                            thread_shards=False):
     """Registers a counter metric (integer value that never decreases).
 
     Args:
@@ -362,10 +566,14 @@ class StatsCollector(object):
               tuples, like: [("renderer_name", string)].
       docstring: Metric description.
       units: Metric units (see stats.MetricUnits for details).
+      thread_shards: If True, every thread increments its own copy of the
+              counter without locking and the copies are summed up when the
+              metric is read. Meant for metrics updated on hot paths.
 
     If metric with the same name was registered before, it will be overwritten.
     """
-    self._metrics[varname] = _CounterMetric(fields, docstring, units)
+    self._metrics[varname] = _CounterMetric(
+        fields, docstring, units, thread_shards=thread_shards)
     self._metrics_metadata[varname] = MetricMetadata(
         varname=varname,
         metric_type=MetricMetadata.MetricType.COUNTER,
@@ -374,7 +582,6 @@ class StatsCollector(object):
         docstring=docstring,
         units=units)
 
-  @utils.Synchronized
   def IncrementCounter(self, varname, delta=1, fields=None):
     """Increments a counter metric by a given delta.
 
@@ -398,7 +605,8 @@ class StatsCollector(object):
                           bins=None,
                           fields=None,
                           docstring=None,
-                          units=None):
+                          units=None,
+                          thread_shards=False):
     """Registers metric that records distribution of values.
 
     Args:
@@ -411,10 +619,14 @@ class StatsCollector(object):
               tuples, like: [("renderer_name", string)].
       docstring: Metric description.
       units: Metric units (see stats.MetricUnits for details).
+      thread_shards: If True, every thread records values into its own
+              distribution without locking and the distributions are merged
+              when the metric is read. Meant for metrics recorded on hot paths.
 
     If metric with the same name was registered before, it will be overwritten.
     """
-    self._metrics[varname] = _EventMetric(bins, fields, docstring, units)
+    self._metrics[varname] = _EventMetric(
+        bins, fields, docstring, units, thread_shards=thread_shards)
     self._metrics_metadata[varname] = MetricMetadata(
         varname=varname,
         metric_type=MetricMetadata.MetricType.EVENT,
@@ -423,7 +635,6 @@ class StatsCollector(object):
         docstring=docstring,
         units=units)
 
-  @utils.Synchronized
   def RecordEvent(self, varname, value, fields=None):
     """Records value corresponding to the given event metric.
 
@@ -2,6 +2,7 @@
 # Copyright 2011 Google Inc. All Rights Reserved.
 """Tests for the stats classes."""
 
+import threading
 import time
 
 
@@ -195,6 +196,90 @@ class StatsTests(test_lib.GRRBaseTest):
     self.assertEqual([-inf, 0.0, 0.1, 0.2], data.bins)
     self.assertEqual({-inf: 0, 0.0: 0, 0.1: 0, 0.2: 1}, data.bins_heights)
 
+  def testEventMetricValueIsASnapshot(self):
+    stats.STATS.RegisterEventMetric("test_event_metric", bins=[0.0, 0.1, 0.2])
+
+    stats.STATS.RecordEvent("test_event_metric", 0.15)
+    data = stats.STATS.GetMetricValue("test_event_metric")
+    stats.STATS.RecordEvent("test_event_metric", 0.15)
+
+    self.assertEqual(1, data.count)
+    self.assertEqual(1, data.bins_heights[0.1])
+    self.assertEqual(
+        2,
+        stats.STATS.GetMetricValue("test_event_metric").bins_heights[0.1])
+
+  def _RunInThreads(self, func, num_threads=5):
+    threads = [threading.Thread(target=func) for _ in range(num_threads)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+  def testThreadShardedCounter(self):
+    stats.STATS.RegisterCounterMetric(
+        "test_counter", fields=[("dimension", str)], thread_shards=True)
+
+    self.assertEqual(0, stats.STATS.GetMetricValue(
+        "test_counter", fields=["a"]))
+
+    def Increment():
+      for _ in range(100):
+        stats.STATS.IncrementCounter("test_counter", fields=["a"])
+      stats.STATS.IncrementCounter("test_counter", 2, fields=["b"])
+
+    self._RunInThreads(Increment)
+    # Values of threads that have exited are retained.
+    self._RunInThreads(Increment)
+    stats.STATS.IncrementCounter("test_counter", fields=["a"])
+
+    self.assertEqual(1001, stats.STATS.GetMetricValue(
+        "test_counter", fields=["a"]))
+    self.assertEqual(20, stats.STATS.GetMetricValue(
+        "test_counter", fields=["b"]))
+    self.assertEqual([("a",), ("b",)],
+                     sorted(stats.STATS.GetMetricFields("test_counter")))
+
+  def testThreadShardsOfExitedThreadsAreFolded(self):
+
+    def Merge(values, key, value):
+      values[key] = values.get(key, 0) + value
+
+    shards = stats._ThreadShards(Merge)
+
+    def Increment():
+      shard = shards.Local()
+      Merge(shard, "a", 1)
+
+    for _ in range(200):
+      self._RunInThreads(Increment, num_threads=1)
+
+    # Threads starting while others keep exiting don't grow the shards.
+    self.assertLess(len(shards._live), stats._ThreadShards._MIN_SHARDS_TO_FOLD)
+
+    self.assertEqual(200, shards.Get("a"))
+    self.assertEqual([], shards._live)
+
+  def testThreadShardedEventMetric(self):
+    inf = float("inf")
+
+    stats.STATS.RegisterEventMetric(
+        "test_event_metric", bins=[0.0, 0.1, 0.2], thread_shards=True)
+
+    def Record():
+      for _ in range(10):
+        stats.STATS.RecordEvent("test_event_metric", 0.15)
+        stats.STATS.RecordEvent("test_event_metric", -0.1)
+
+    self._RunInThreads(Record)
+    self._RunInThreads(Record)
+
+    data = stats.STATS.GetMetricValue("test_event_metric")
+    self.assertAlmostEqual(5.0, data.sum)
+    self.assertEqual(200, data.count)
+    self.assertEqual([-inf, 0.0, 0.1, 0.2], data.bins)
+    self.assertEqual({-inf: 100, 0.0: 0, 0.1: 100, 0.2: 0}, data.bins_heights)
+
   def testRaisesOnImproperFieldsUsage1(self):
     # Check for counters
     stats.STATS.RegisterCounterMetric("test_counter")
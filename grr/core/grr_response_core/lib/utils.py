@@ -1584,11 +1584,15 @@ class Stat(object):
     path: A path to the file to perform `stat` on.
     follow_symlink: True if `stat` of a symlink should be returned instead of a
         file that it points to. For non-symlinks this setting has no effect.
+    entry: An (optional) `scandir` directory entry of the file. Entries cache
+        `stat` results and on Windows obtain them without any system calls.
   """
 
-  def __init__(self, path, follow_symlink=True):
+  def __init__(self, path, follow_symlink=True, entry=None):
     self._path = path
-    if not follow_symlink:
+    if entry is not None:
+      self._stat = entry.stat(follow_symlinks=follow_symlink)
+    elif not follow_symlink:
       self._stat = os.lstat(path)
     else:
       self._stat = os.stat(path)
@@ -1698,6 +1702,15 @@ class StatCache(object):
 
   def __init__(self):
     self._cache = {}
+    self._entries = {}
+
+  def AddEntry(self, entry):
+    """Registers a `scandir` directory entry to use instead of `[l]stat` calls.
+
+    Args:
+      entry: A directory entry as returned by `scandir`.
+    """
+    self._entries[entry.path] = entry
 
   def Get(self, path, follow_symlink=True):
     """Stats given file or returns a cached result if available.
@@ -1714,7 +1727,8 @@ class StatCache(object):
     try:
       return self._cache[key]
     except KeyError:
-      value = Stat(path, follow_symlink=follow_symlink)
+      entry = self._entries.pop(path, None)
+      value = Stat(path, follow_symlink=follow_symlink, entry=entry)
       self._cache[key] = value
 
       # If we are not following symlinks and the file is a not symlink then
@@ -744,6 +744,23 @@ class StatCacheTest(unittest.TestCase):
       self.assertEqual(other_foo_stat.GetSize(), 5)
       self.assertFalse(stat_mock.called)
 
+  def testEntry(self):
+    with open(self.Path("foo"), "w") as fd:
+      fd.write("1234")
+
+    entry = mock.Mock(path=self.Path("foo"))
+    entry.stat.return_value = os.lstat(self.Path("foo"))
+
+    stat_cache = utils.StatCache()
+    stat_cache.AddEntry(entry)
+
+    with mock.patch.object(os, "lstat", wraps=os.lstat) as lstat_mock:
+      foo_stat = stat_cache.Get(self.Path("foo"), follow_symlink=False)
+      self.assertEqual(foo_stat.GetSize(), 4)
+      self.assertFalse(lstat_mock.called)
+
+    entry.stat.assert_called_once_with(follow_symlinks=False)
+
 
 class IterableStartsWith(unittest.TestCase):
 
@@ -12,6 +12,7 @@ A UserManager class has the following responsibilities :
 
 
 import logging
+import threading
 import time
 
 
@@ -52,6 +53,23 @@ class ExpiryError(Error):
   counter = "grr_expired_tokens"
 
 
+# Incremented every time approvals are granted or revoked in this process.
+_approvals_generation = 0
+_approvals_generation_lock = threading.Lock()
+
+
+def NotifyApprovalsChanged():
+  """Invalidates access decisions cached before approvals were changed."""
+  global _approvals_generation
+  with _approvals_generation_lock:
+    _approvals_generation += 1
+
+
+def GetApprovalsGeneration():
+  """Returns a number that changes every time approvals are changed."""
+  return _approvals_generation
+
+
 class AccessControlManager(with_metaclass(registry.MetaclassRegistry, object)):
   """A class for managing access to data resources.
 
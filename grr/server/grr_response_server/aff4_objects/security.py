@@ -551,6 +551,7 @@ class ApprovalGrantor(AbstractApprovalBase):
       approval_request.AddAttribute(
           approval_request.Schema.APPROVER(self.token.username))
 
+    access_control.NotifyApprovalsChanged()
     return found_approval_urn
 
 
@@ -17,6 +17,7 @@ import re
 
 
 from builtins import map  # pylint: disable=redefined-builtin
+from builtins import range  # pylint: disable=redefined-builtin
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import registry
@@ -208,14 +209,25 @@ def CheckFlowAuthorizedLabels(token, flow_name):
 class CheckAccessHelper(object):
   """Helps with access checks (See FullAccessControlManager for details)."""
 
-  def __init__(self, helper_name):
+  # Python 2 regular expressions are limited to 100 groups, each "allow"
+  # check takes one.
+  _CHECKS_PER_REGEX = 90
+
+  def __init__(self, helper_name, decision_cache=None):
     """Constructor for CheckAccessHelper.
 
     Args:
       helper_name: String identifier of this helper (used for logging).
+      decision_cache: Optional utils.FastStore-like cache of the results of
+          "require" checks. If given, such results are reused for subjects
+          matching the same check and sharing the first two path components
+          (e.g. aff4:/C.0123456789abcdef/fs or aff4:/users/foo), as long as
+          the username and reason of the token are the same.
     """
     self.helper_name = helper_name
+    self.decision_cache = decision_cache
     self.checks = []
+    self._regexes = None
 
   def Allow(self, path, require=None, *args, **kwargs):
     """Checks if given path pattern fits the subject passed in constructor.
@@ -251,6 +263,66 @@ class CheckAccessHelper(object):
     regex_text = fnmatch.translate(path)
     regex = re.compile(regex_text)
     self.checks.append((regex_text, regex, require, args, kwargs))
+    self._regexes = None
+
+  def _CompileRegexes(self):
+    """Combines regexes of the checks into a few alternations.
+
+    Alternatives are tried in order, so the first alternative matching the
+    whole subject corresponds to the first matching check. Each of them is
+    wrapped in a group, so that the matching check can be told by the index
+    of the last matched group.
+
+    Returns:
+      A list of (index of the first check, compiled regex) tuples.
+    """
+    regexes = []
+    for offset in range(0, len(self.checks), self._CHECKS_PER_REGEX):
+      alternatives = []
+      for check in self.checks[offset:offset + self._CHECKS_PER_REGEX]:
+        regex_text = check[0]
+        # Python 2 fnmatch puts the end anchor and global flags at the end of
+        # the pattern, they are applied to the whole alternation instead.
+        if regex_text.endswith("\\Z(?ms)"):
+          regex_text = regex_text[:-len("\\Z(?ms)")] + "\\Z"
+        alternatives.append("(%s)" % regex_text)
+      regexes.append((offset,
+                      re.compile("|".join(alternatives), re.M | re.S)))
+    return regexes
+
+  def _FindCheck(self, subject_str):
+    """Returns the index of the first check matching a subject or None."""
+    if self._regexes is None:
+      self._regexes = self._CompileRegexes()
+
+    for offset, regex in self._regexes:
+      match = regex.match(subject_str)
+      if match:
+        return offset + match.lastindex - 1
+
+    return None
+
+  def _Require(self, index, subject, token):
+    """Runs the "require" check of a given check, caching its result."""
+    _, _, require, require_args, require_kwargs = self.checks[index]
+
+    if self.decision_cache is None:
+      require(subject, token, *require_args, **require_kwargs)
+      return
+
+    prefix = subject.Path().split("/", 3)[:3]
+    cache_key = (self.helper_name, index, "/".join(prefix), token.username,
+                 token.reason)
+    try:
+      # Checks such as the approval check also fill in the reason of the token.
+      token.reason, token.is_emergency = self.decision_cache.Get(cache_key)
+      return
+    except KeyError:
+      pass
+
+    # If require() fails, it raises access_control.UnauthorizedAccess.
+    require(subject, token, *require_args, **require_kwargs)
+    self.decision_cache.Put(cache_key, (token.reason, token.is_emergency))
 
   def CheckAccess(self, subject, token):
     """Checks for access to given subject with a given token.
@@ -273,17 +345,19 @@ class CheckAccessHelper(object):
     subject = rdfvalue.RDFURN(subject)
     subject_str = subject.SerializeToString()
 
-    for check_tuple in self.checks:
-      regex_text, regex, require, require_args, require_kwargs = check_tuple
-
-      match = regex.match(subject_str)
-      if not match:
-        continue
+    index = self._FindCheck(subject_str)
+    if index is None:
+      logging.warn("Datastore access denied to %s (no matched rules)",
+                   subject_str)
+      raise access_control.UnauthorizedAccess(
+          "Access to %s rejected: (no matched rules)." % subject,
+          subject=subject)
 
-      if require:
-        # If require() fails, it raises access_control.UnauthorizedAccess.
-        require(subject, token, *require_args, **require_kwargs)
+    regex_text, _, require, require_args, require_kwargs = self.checks[index]
+    if require:
+      self._Require(index, subject, token)
 
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
       logging.debug(u"Datastore access granted to %s on %s by pattern: %s "
                     u"with reason: %s (require=%s, require_args=%s, "
                     u"require_kwargs=%s, helper_name=%s)",
@@ -292,12 +366,7 @@ class CheckAccessHelper(object):
                     utils.SmartUnicode(regex_text),
                     utils.SmartUnicode(token.reason), require, require_args,
                     require_kwargs, self.helper_name)
-      return True
-
-    logging.warn("Datastore access denied to %s (no matched rules)",
-                 subject_str)
-    raise access_control.UnauthorizedAccess(
-        "Access to %s rejected: (no matched rules)." % subject, subject=subject)
+    return True
 
 
 class FullAccessControlManager(access_control.AccessControlManager):
@@ -310,12 +379,18 @@ class FullAccessControlManager(access_control.AccessControlManager):
   CLIENT_URN_PATTERN = "aff4:/C." + "[0-9a-fA-F]" * 16
 
   approval_cache_time = 600
+  decision_cache_size = 100000
 
   def __init__(self):
     super(FullAccessControlManager, self).__init__()
 
     self.acl_cache = utils.AgeBasedCache(
         max_size=10000, max_age=self.approval_cache_time)
+    # Results of the checks run by the helpers for data store access, e.g. of
+    # client approvals for paths below a client.
+    self.decision_cache = utils.AgeBasedCache(
+        max_size=self.decision_cache_size, max_age=self.approval_cache_time)
+    self.approvals_generation = access_control.GetApprovalsGeneration()
     self.super_token = access_control.ACLToken(username="GRRSystem").SetUID()
 
     self.helpers = {
@@ -349,7 +424,7 @@ class FullAccessControlManager(access_control.AccessControlManager):
 
   def _CreateWriteAccessHelper(self):
     """Creates a CheckAccessHelper for controlling write access."""
-    h = CheckAccessHelper("write")
+    h = CheckAccessHelper("write", decision_cache=self.decision_cache)
 
     # Users are allowed to modify artifacts live.
     h.Allow("aff4:/artifact_store")
@@ -370,7 +445,7 @@ class FullAccessControlManager(access_control.AccessControlManager):
     Returns:
       CheckAccessHelper for controlling read access.
     """
-    h = CheckAccessHelper("read")
+    h = CheckAccessHelper("read", decision_cache=self.decision_cache)
 
     h.Allow("aff4:/")
 
@@ -472,7 +547,7 @@ class FullAccessControlManager(access_control.AccessControlManager):
     Returns:
       CheckAccessHelper for controlling query access.
     """
-    h = CheckAccessHelper("query")
+    h = CheckAccessHelper("query", decision_cache=self.decision_cache)
 
     # User is allowed to do anything in their home dir.
     h.Allow("aff4:/users/*", self._IsHomeDir)
@@ -540,7 +615,15 @@ class FullAccessControlManager(access_control.AccessControlManager):
 
     return h
 
+  def _FlushCachesIfApprovalsChanged(self):
+    generation = access_control.GetApprovalsGeneration()
+    if generation != self.approvals_generation:
+      self.acl_cache.Flush()
+      self.decision_cache.Flush()
+      self.approvals_generation = generation
+
   def _CheckAccessWithHelpers(self, token, subjects, requested_access):
+    self._FlushCachesIfApprovalsChanged()
     for subject in subjects:
       for access in requested_access:
         try:
@@ -578,6 +661,7 @@ class FullAccessControlManager(access_control.AccessControlManager):
       return True
 
   def _CheckApprovals(self, token, target):
+    self._FlushCachesIfApprovalsChanged()
     return self._CheckApprovalsForTokenWithoutReason(token, target)
 
   @LoggedACL("client_access")
@@ -1,6 +1,9 @@
 #!/usr/bin/env python
+from builtins import range  # pylint: disable=redefined-builtin
+
 from grr_response_core.lib import flags
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
 from grr_response_server import access_control
 from grr_response_server import aff4
 from grr_response_server.aff4_objects import user_managers
@@ -124,6 +127,72 @@ class CheckAccessHelperTest(test_lib.GRRBaseTest):
                       rdfvalue.RDFURN("aff4:/some/other/path"), self.token)
     self.assertTrue(self.helper.CheckAccess(self.subject, self.token))
 
+  def testFirstMatchingCheckIsUsed(self):
+
+    def CustomCheck(unused_subject, unused_token):
+      raise access_control.UnauthorizedAccess("Problem")
+
+    self.helper.Allow("aff4:/some/*", CustomCheck)
+    self.helper.Allow("aff4:/some/path")
+    self.assertRaises(access_control.UnauthorizedAccess,
+                      self.helper.CheckAccess, self.subject, self.token)
+
+  def testManyChecks(self):
+    for i in range(250):
+      self.helper.Allow("aff4:/path%d" % i)
+      self.helper.Allow("aff4:/path%d/*" % i)
+
+    self.assertTrue(
+        self.helper.CheckAccess(rdfvalue.RDFURN("aff4:/path0"), self.token))
+    self.assertTrue(
+        self.helper.CheckAccess(
+            rdfvalue.RDFURN("aff4:/path249/foo"), self.token))
+    self.assertRaises(access_control.UnauthorizedAccess,
+                      self.helper.CheckAccess, rdfvalue.RDFURN("aff4:/path250"),
+                      self.token)
+
+  def testCustomCheckResultsAreCachedPerPrefix(self):
+    checked = []
+
+    def CustomCheck(subject, unused_token):
+      checked.append(subject)
+      return True
+
+    helper = user_managers.CheckAccessHelper(
+        "test", decision_cache=utils.FastStore(max_size=10))
+    helper.Allow("aff4:/some/*", CustomCheck)
+
+    self.assertTrue(
+        helper.CheckAccess(rdfvalue.RDFURN("aff4:/some/path/foo"), self.token))
+    self.assertTrue(
+        helper.CheckAccess(rdfvalue.RDFURN("aff4:/some/path/bar"), self.token))
+    self.assertEqual(len(checked), 1)
+
+    self.assertTrue(
+        helper.CheckAccess(rdfvalue.RDFURN("aff4:/some/other"), self.token))
+    self.assertEqual(len(checked), 2)
+
+    other_token = access_control.ACLToken(username="other", reason="Because")
+    self.assertTrue(
+        helper.CheckAccess(rdfvalue.RDFURN("aff4:/some/path/foo"), other_token))
+    self.assertEqual(len(checked), 3)
+
+  def testFailedCustomChecksAreNotCached(self):
+    checked = []
+
+    def CustomCheck(subject, unused_token):
+      checked.append(subject)
+      raise access_control.UnauthorizedAccess("Problem")
+
+    helper = user_managers.CheckAccessHelper(
+        "test", decision_cache=utils.FastStore(max_size=10))
+    helper.Allow("aff4:/some/*", CustomCheck)
+
+    for _ in range(2):
+      self.assertRaises(access_control.UnauthorizedAccess, helper.CheckAccess,
+                        self.subject, self.token)
+    self.assertEqual(len(checked), 2)
+
 
 class FullAccessControlManagerTest(test_lib.GRRBaseTest,
                                    acl_test_lib.AclTestMixin):
@@ -280,6 +349,18 @@ class FullAccessControlManagerTest(test_lib.GRRBaseTest,
     # Check that token's reason got modified in the process:
     self.assertEqual(token_without_reason.reason, "I have one!")
 
+  def testCachedDecisionsAreFlushedWhenApprovalsChange(self):
+    client_id = self.SetupClient(0)
+    self.RequestAndGrantClientApproval(client_id, requestor=self.token.username)
+
+    self.Ok(client_id.Add("fs/os"))
+    self.assertEqual(len(self.access_manager.decision_cache), 1)
+
+    access_control.NotifyApprovalsChanged()
+    self.Ok(client_id.Add("flows/F:12345678"))
+    # The cache was flushed before the new decision was cached.
+    self.assertEqual(len(self.access_manager.decision_cache), 1)
+
 
 class ValidateTokenTest(test_lib.GRRBaseTest):
   """Tests for ValidateToken()."""
@@ -6,6 +6,7 @@ import cgi
 import io
 import logging
 import pdb
+import Queue
 import socket
 import SocketServer
 import threading
@@ -46,7 +47,8 @@ class GRRHTTPServerHandler(http_server.BaseHTTPRequestHandler):
       200: "200 OK",
       404: "404 Not Found",
       406: "406 Not Acceptable",
-      500: "500 Internal Server Error"
+      500: "500 Internal Server Error",
+      503: "503 Service Unavailable"
   }
 
   active_counter_lock = threading.Lock()
@@ -303,6 +305,13 @@ class GRRHTTPServerHandler(http_server.BaseHTTPRequestHandler):
       # client appropriately.
       self.Send("Enrollment required", status=406)
 
+    except frontend_lib.FrontendOverloadedError:
+      # None of the client's messages were stored, the client will resend them
+      # after backing off.
+      stats.STATS.IncrementCounter(
+          "frontend_rejected_request_count", fields=["http"])
+      self.Send("Frontend overloaded", status=503)
+
     finally:
       with GRRHTTPServerHandler.active_counter_lock:
         GRRHTTPServerHandler.active_counter -= 1
@@ -346,16 +355,96 @@ class GRRHTTPServer(SocketServer.ThreadingMixIn, http_server.HTTPServer):
                                     **kwargs)
 
 
+class PooledRequestMixIn(object):
+  """Serves requests on a fixed number of threads.
+
+  SocketServer.ThreadingMixIn starts a thread per connection. With tens of
+  thousands of polling clients this results in thousands of threads competing
+  for the cpu and the data store. Here, accepted connections are queued up for
+  a fixed pool of threads instead. Connections accepted while the queue is
+  full are answered with a 503 status right away, so that the thread accepting
+  connections never blocks.
+  """
+
+  num_request_threads = 100
+
+  OVERLOADED_RESPONSE = ("HTTP/1.0 503 Service Unavailable\r\n"
+                         "Server: GRR Server\r\n"
+                         "Content-Length: 0\r\n"
+                         "\r\n")
+
+  def _StartRequestThreads(self):
+    self._requests = Queue.Queue(maxsize=self.num_request_threads)
+    self._request_threads = []
+    for i in range(self.num_request_threads):
+      thread = threading.Thread(
+          target=self._ProcessRequests, name="HTTPServerThread-%d" % i)
+      thread.daemon = True
+      thread.start()
+      self._request_threads.append(thread)
+
+  def _ProcessRequests(self):
+    while True:
+      item = self._requests.get()
+      if item is None:
+        return
+
+      request, client_address = item
+      try:
+        self.finish_request(request, client_address)
+      except Exception:  # pylint: disable=broad-except
+        self.handle_error(request, client_address)
+      finally:
+        self.shutdown_request(request)
+
+  def process_request(self, request, client_address):  # pylint: disable=g-bad-name
+    try:
+      self._requests.put_nowait((request, client_address))
+    except Queue.Full:
+      stats.STATS.IncrementCounter(
+          "frontend_rejected_request_count", fields=["http"])
+      try:
+        request.sendall(self.OVERLOADED_RESPONSE)
+      except socket.error:
+        pass
+      self.shutdown_request(request)
+
+  def server_close(self):  # pylint: disable=g-bad-name
+    """Closes the listening socket and stops the request threads."""
+    super(PooledRequestMixIn, self).server_close()
+
+    # Requests already queued are still served.
+    for _ in self._request_threads:
+      self._requests.put(None)
+    for thread in self._request_threads:
+      thread.join()
+    self._request_threads = []
+
+
+class PooledGRRHTTPServer(PooledRequestMixIn, GRRHTTPServer):
+  """The GRR HTTP frontend server using a fixed number of threads."""
+
+  def __init__(self, *args, **kwargs):
+    self.num_request_threads = config.CONFIG["Frontend.http_threads"]
+    GRRHTTPServer.__init__(self, *args, **kwargs)
+    self._StartRequestThreads()
+
+
 def CreateServer(frontend=None):
   """Start frontend http server."""
   max_port = config.CONFIG.Get("Frontend.port_max",
                                config.CONFIG["Frontend.bind_port"])
 
+  if config.CONFIG["Frontend.pipelined"]:
+    server_cls = PooledGRRHTTPServer
+  else:
+    server_cls = GRRHTTPServer
+
   for port in range(config.CONFIG["Frontend.bind_port"], max_port + 1):
 
     server_address = (config.CONFIG["Frontend.bind_address"], port)
     try:
-      httpd = GRRHTTPServer(
+      httpd = server_cls(
           server_address, GRRHTTPServerHandler, frontend=frontend)
       break
     except socket.error as e:
@@ -5,9 +5,11 @@ import hashlib
 import os
 import socket
 import threading
+import time
 
 
 from future.utils import iteritems
+from http import server as http_server
 import ipaddr
 import portpicker
 import requests
@@ -282,6 +284,100 @@ class GRRHTTPServerTest(test_lib.GRRBaseTest):
     self.assertEqual(profile.data[:2], "\x1f\x8b")
 
 
+class PooledGRRHTTPServerTest(test_lib.GRRBaseTest):
+  """Tests the HTTP server serving requests on a fixed number of threads."""
+
+  def setUp(self):
+    super(PooledGRRHTTPServerTest, self).setUp()
+
+    # Frontend must be initialized to register all the stats counters.
+    frontend_lib.FrontendInit().RunOnce()
+
+    self.started = threading.Event()
+    self.release = threading.Event()
+    test = self
+
+    class BlockingHandler(http_server.BaseHTTPRequestHandler):
+
+      def do_GET(self):  # pylint: disable=g-bad-name
+        test.started.set()
+        test.release.wait()
+        self.send_response(200)
+        self.end_headers()
+
+      def log_message(self, *unused_args):
+        pass
+
+    port = portpicker.PickUnusedPort()
+    ip = utils.ResolveHostnameToIP("localhost", port)
+    with test_lib.ConfigOverrider({"Frontend.http_threads": 1}):
+      # Passing a frontend prevents the server from creating a real one.
+      self.httpd = frontend.PooledGRRHTTPServer(
+          (ip, port), BlockingHandler, frontend=object())
+
+    if ipaddr.IPAddress(ip).version == 6:
+      self.base_url = "http://[%s]:%d/" % (ip, port)
+    else:
+      self.base_url = "http://%s:%d/" % (ip, port)
+
+    self.httpd_thread = threading.Thread(target=self.httpd.serve_forever)
+    self.httpd_thread.daemon = True
+    self.httpd_thread.start()
+
+    self.status_codes = []
+    self.request_threads = []
+
+  def tearDown(self):
+    self.release.set()
+    self.httpd.shutdown()
+    self.httpd.server_close()
+    for thread in self.request_threads:
+      thread.join()
+    super(PooledGRRHTTPServerTest, self).tearDown()
+
+  def _StartRequest(self):
+    thread = threading.Thread(
+        target=lambda: self.status_codes.append(
+            requests.get(self.base_url).status_code))
+    thread.start()
+    self.request_threads.append(thread)
+
+  def _SaturateServer(self):
+    # The single request thread is busy with the first request...
+    self._StartRequest()
+    self.started.wait()
+    # ... and the second one fills the queue.
+    self._StartRequest()
+    while not self.httpd._requests.full():  # pylint: disable=protected-access
+      time.sleep(0.01)
+
+  def testRequestsAreRejectedWhenOverloaded(self):
+    self._SaturateServer()
+
+    self.assertEqual(requests.get(self.base_url).status_code, 503)
+
+    self.release.set()
+    for thread in self.request_threads:
+      thread.join()
+    self.assertEqual(self.status_codes, [200, 200])
+
+  def testServerShutsDownWhenOverloaded(self):
+    self._SaturateServer()
+
+    self.httpd.shutdown()
+    self.httpd_thread.join()
+
+    request_threads = self.httpd._request_threads  # pylint: disable=protected-access
+    self.release.set()
+    self.httpd.server_close()
+    for thread in request_threads:
+      self.assertFalse(thread.is_alive())
+    for thread in self.request_threads:
+      thread.join()
+    # Requests accepted before the shutdown are still served.
+    self.assertEqual(self.status_codes, [200, 200])
+
+
 def main(args):
   test_lib.main(args)
 
@@ -1144,6 +1144,130 @@ class GrrWorkerTest(flow_test_lib.FlowTestsBaseclass):
 
         instr.assert_called_once_with(client_id)
 
+  def testShardAffineWorkerProcessesMessages(self):
+    flow_obj = self.FlowSetup("WorkerSendingTestFlow")
+    session_id_1 = flow_obj.session_id
+    flow_obj.Close()
+
+    flow_obj = self.FlowSetup("WorkerSendingTestFlow2")
+    session_id_2 = flow_obj.session_id
+    flow_obj.Close()
+
+    self.SendResponse(session_id_1, "Hello1")
+    self.SendResponse(session_id_2, "Hello2")
+
+    worker_obj = worker_lib.GRRWorker(token=self.token, shard_affine=True)
+    for shard_index in range(config.CONFIG["Worker.queue_shards"]):
+      worker_obj.ProcessShardOnce(queues.FLOWS, shard_index,
+                                  worker_obj.thread_pool)
+
+    self.assertEqual(sorted(RESULTS), ["Hello1", "Hello2"])
+
+  def testShardLoopIsReplacedWhenShardIsReacquired(self):
+    worker_obj = worker_lib.GRRWorker(token=self.token, shard_affine=True)
+    shard = (queues.FLOWS, 0)
+    rebalances = [([shard], []), ([shard], [shard])]
+
+    with mock.patch.object(
+        worker_obj.shard_leaser, "Rebalance", side_effect=rebalances):
+      worker_obj.RunOnce()
+      first_loop = worker_obj.shard_loops[shard]
+      self.assertTrue(first_loop.is_alive())
+
+      worker_obj.last_shard_rebalance = 0
+      worker_obj.RunOnce()
+      second_loop = worker_obj.shard_loops[shard]
+
+    self.assertIsNot(second_loop, first_loop)
+    self.assertFalse(first_loop.is_alive())
+    self.assertTrue(second_loop.is_alive())
+    # The loops share the shard's thread pool, but never run at the same time.
+    self.assertIs(second_loop.thread_pool, first_loop.thread_pool)
+    self.assertTrue(second_loop.thread_pool.started)
+
+    worker_obj._StopShardLoops()
+    self.assertEqual(worker_obj.shard_loops, {})
+    self.assertFalse(second_loop.is_alive())
+    self.assertFalse(second_loop.thread_pool.started)
+
+  def testRunStopsShardLoopsOnExit(self):
+    worker_obj = worker_lib.GRRWorker(token=self.token, shard_affine=True)
+    worker_obj.POLLING_INTERVAL = worker_obj.SHORT_POLLING_INTERVAL = 0
+    shard = (queues.FLOWS, 0)
+    loops = []
+
+    run_once = worker_obj.RunOnce
+
+    def RunOnce():
+      if loops:
+        raise KeyboardInterrupt()
+      result = run_once()
+      loops.append(worker_obj.shard_loops[shard])
+      return result
+
+    with utils.MultiStubber((worker_obj, "RunOnce", RunOnce),
+                            (worker_obj.shard_leaser, "Rebalance",
+                             lambda: ([shard], []))):
+      worker_obj.Run()
+
+    self.assertEqual(worker_obj.shard_loops, {})
+    self.assertFalse(loops[0].is_alive())
+    self.assertFalse(loops[0].thread_pool.started)
+
+
+class NotificationShardLeaserTest(test_lib.GRRBaseTest):
+
+  def _Leaser(self, worker_id):
+    return worker_lib.NotificationShardLeaser(
+        [queues.FLOWS], lease_time=60, worker_id=worker_id)
+
+  def testShardsAreSplitBetweenWorkers(self):
+    num_shards = config.CONFIG["Worker.queue_shards"]
+
+    with test_lib.FakeTime(1000):
+      first = self._Leaser("first")
+      acquired, _ = first.Rebalance()
+      # Alone, the first worker gets all the shards.
+      self.assertEqual(len(acquired), num_shards)
+
+      second = self._Leaser("second")
+      acquired, _ = second.Rebalance()
+      self.assertEqual(acquired, [])
+
+      # The first worker gives back what's above its share...
+      _, released = first.Rebalance()
+      self.assertEqual(len(released), num_shards // 2)
+      # ...which the second worker then picks up.
+      acquired, _ = second.Rebalance()
+      self.assertEqual(len(acquired), num_shards // 2)
+
+    self.assertEqual(
+        set(first.leases) | set(second.leases), set(first.shards))
+    self.assertFalse(set(first.leases) & set(second.leases))
+
+  def testShardsOfDeadWorkersAreTakenOver(self):
+    num_shards = config.CONFIG["Worker.queue_shards"]
+
+    with test_lib.FakeTime(1000):
+      first = self._Leaser("first")
+      first.Rebalance()
+      second = self._Leaser("second")
+      second.Rebalance()
+
+    # The first worker stops renewing its leases and heartbeat.
+    with test_lib.FakeTime(1000 + 3 * 60):
+      acquired, _ = second.Rebalance()
+      self.assertEqual(len(acquired), num_shards)
+
+  def testReleaseAll(self):
+    first = self._Leaser("first")
+    first.Rebalance()
+    first.ReleaseAll()
+
+    second = self._Leaser("second")
+    acquired, _ = second.Rebalance()
+    self.assertEqual(len(acquired), config.CONFIG["Worker.queue_shards"])
+
 
 def main(argv):
   test_lib.main(argv)
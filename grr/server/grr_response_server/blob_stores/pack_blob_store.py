@@ -0,0 +1,720 @@
+#!/usr/bin/env python
+"""A content-addressed blob store backed by local pack files.
+
+Blobs are appended to large pack files, every process writing to its own pack:
+
+  packs/<number>.pack: A sequence of records, each a fixed size header
+    (sha256 digest, length) followed by the blob contents.
+  packs/<number>.journal: Index entries (digest, pack number, offset, length)
+    for the records of a pack that is still being written to.
+  index/<name>.idx: Index entries sorted by digest. The journal of a pack is
+    turned into one when the pack is sealed, compaction merges them.
+
+The writer of a pack holds an exclusive lock on it, which tells compaction
+whether a pack with a journal is still in use or was left behind by a process
+that died. Every process keeps a Bloom filter of all stored digests, so that
+checking for blobs that were never stored doesn't touch the disk.
+"""
+
+import collections
+import errno
+import fcntl
+import hashlib
+import heapq
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+
+from builtins import range  # pylint: disable=redefined-builtin
+from future.utils import iteritems
+from future.utils import itervalues
+
+from grr_response_core import config
+from grr_response_core.lib import utils
+from grr_response_server import blob_store
+
+# sha256 digest, content length.
+_RECORD_HEADER = struct.Struct(">32sI")
+# sha256 digest, pack number, offset of the contents, content length.
+_INDEX_ENTRY = struct.Struct(">32sIQI")
+
+PACK_EXTENSION = ".pack"
+JOURNAL_EXTENSION = ".journal"
+INDEX_EXTENSION = ".idx"
+
+
+def _ListDir(path):
+  try:
+    return os.listdir(path)
+  except OSError as e:
+    if e.errno == errno.ENOENT:
+      return []
+    raise
+
+
+def _Unlink(path):
+  try:
+    os.unlink(path)
+  except OSError as e:
+    if e.errno != errno.ENOENT:
+      raise
+
+
+def _TryLock(fd):
+  """Returns True if an exclusive lock on fd could be taken without waiting."""
+  try:
+    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    return True
+  except IOError as e:
+    if e.errno in (errno.EAGAIN, errno.EACCES):
+      return False
+    raise
+
+
+def _WriteIndex(path, entries):
+  """Atomically writes index entries, which must be sorted, to path."""
+  tmp_path = "%s.%s.tmp" % (path, uuid.uuid4().hex)
+  with open(tmp_path, "wb") as fd:
+    for entry in entries:
+      fd.write(_INDEX_ENTRY.pack(*entry))
+    fd.flush()
+    os.fsync(fd.fileno())
+  os.rename(tmp_path, path)
+
+
+def _CoalesceReads(reads, max_gap, max_size):
+  """Groups (offset, length, key) reads sorted by offset into runs.
+
+  Args:
+    reads: A list of (offset, length, key) tuples sorted by offset.
+    max_gap: Reads separated by at most this many bytes share a run.
+    max_size: Maximum number of bytes a run spans, unless a single read is
+      larger.
+
+  Yields:
+    Lists of reads that can be served with a single read of the file.
+  """
+  run = []
+  for read in reads:
+    if run:
+      start = run[0][0]
+      end = run[-1][0] + run[-1][1]
+      if read[0] - end > max_gap or read[0] + read[1] - start > max_size:
+        yield run
+        run = []
+    run.append(read)
+  if run:
+    yield run
+
+
+class BloomFilter(object):
+  """A Bloom filter for sha256 digests."""
+
+  def __init__(self, num_bits, num_hashes=7):
+    if num_hashes > 8:
+      raise ValueError("At most 8 hashes can be taken from a sha256 digest.")
+    self.num_bits = num_bits
+    self.num_hashes = num_hashes
+    self.bits = bytearray((num_bits + 7) // 8)
+
+  def _Positions(self, digest):
+    # Digests are uniformly distributed, so their 32 bit words are as good as
+    # independent hash functions.
+    for i in range(self.num_hashes):
+      yield struct.unpack_from(">I", digest, 4 * i)[0] % self.num_bits
+
+  def Add(self, digest):
+    for position in self._Positions(digest):
+      self.bits[position >> 3] |= 1 << (position & 7)
+
+  def __contains__(self, digest):
+    for position in self._Positions(digest):
+      if not self.bits[position >> 3] & (1 << (position & 7)):
+        return False
+    return True
+
+
+class SortedIndex(object):
+  """A memory-mapped index file with entries sorted by digest."""
+
+  def __init__(self, path):
+    self.path = path
+    with open(path, "rb") as fd:
+      size = os.fstat(fd.fileno()).st_size
+      if size:
+        self.buf = mmap.mmap(fd.fileno(), size, access=mmap.ACCESS_READ)
+      else:
+        self.buf = None
+    self.count = size // _INDEX_ENTRY.size
+
+  def __len__(self):
+    return self.count
+
+  def __iter__(self):
+    for i in range(self.count):
+      yield _INDEX_ENTRY.unpack_from(self.buf, i * _INDEX_ENTRY.size)
+
+  def Lookup(self, digest):
+    """Returns the index entry for digest or None if it's not in the index."""
+    lo, hi = 0, self.count
+    while lo < hi:
+      mid = (lo + hi) // 2
+      offset = mid * _INDEX_ENTRY.size
+      key = self.buf[offset:offset + 32]
+      if key < digest:
+        lo = mid + 1
+      elif key > digest:
+        hi = mid
+      else:
+        return _INDEX_ENTRY.unpack_from(self.buf, offset)
+    return None
+
+  def Close(self):
+    if self.buf is not None:
+      self.buf.close()
+      self.buf = None
+
+
+class PackWriter(object):
+  """Appends records to a new pack file and its journal."""
+
+  def __init__(self, pack_dir, sync=True):
+    self.pack_dir = pack_dir
+    self.sync = sync
+    self.size = 0
+    self.entries = []
+
+    numbers = [
+        int(name[:-len(PACK_EXTENSION)])
+        for name in _ListDir(pack_dir)
+        if name.endswith(PACK_EXTENSION)
+    ]
+    self.number = max(numbers or [0]) + 1
+    while True:
+      try:
+        self.fd = os.open(
+            self._Path(PACK_EXTENSION),
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o600)
+        break
+      except OSError as e:
+        if e.errno != errno.EEXIST:
+          raise
+        self.number += 1
+
+    # The lock has to be held before the journal exists, compaction seals
+    # every pack with a journal it can lock.
+    fcntl.flock(self.fd, fcntl.LOCK_EX)
+    self.journal = open(self._Path(JOURNAL_EXTENSION), "ab")
+
+  def _Path(self, extension):
+    return os.path.join(self.pack_dir, "%d%s" % (self.number, extension))
+
+  @property
+  def journal_name(self):
+    return "%d%s" % (self.number, JOURNAL_EXTENSION)
+
+  def Write(self, blobs):
+    """Appends (digest, content) pairs, returns their index entries."""
+    data = []
+    entries = []
+    offset = self.size
+    for digest, content in blobs:
+      data.append(_RECORD_HEADER.pack(digest, len(content)))
+      data.append(content)
+      offset += _RECORD_HEADER.size
+      entries.append((digest, self.number, offset, len(content)))
+      offset += len(content)
+
+    data = "".join(data)
+    written = 0
+    while written < len(data):
+      written += os.write(self.fd, data[written:])
+    if self.sync:
+      os.fsync(self.fd)
+
+    self.journal.write("".join(_INDEX_ENTRY.pack(*e) for e in entries))
+    self.journal.flush()
+
+    self.size = offset
+    self.entries.extend(entries)
+    return entries
+
+  def Sync(self):
+    os.fsync(self.fd)
+
+  def Seal(self, index_dir):
+    """Writes the index of the pack and closes it, returns the index name."""
+    self.Sync()
+    name = "pack-%d%s" % (self.number, INDEX_EXTENSION)
+    _WriteIndex(os.path.join(index_dir, name), sorted(self.entries))
+    self.DiscardJournal()
+    return name
+
+  def DiscardJournal(self):
+    """Closes the pack for entries that are already in a sorted index."""
+    _Unlink(self._Path(JOURNAL_EXTENSION))
+    self.Close()
+
+  def Close(self):
+    if self.journal is not None:
+      self.journal.close()
+      self.journal = None
+      os.close(self.fd)
+
+
+class PackBlobstore(blob_store.Blobstore):
+  """A blob store keeping blobs in append-only pack files on local disk."""
+
+  # Seconds between rescans for index and journal files of other processes.
+  REFRESH_INTERVAL = 10
+  # Minimum seconds between rescans caused by reads of unknown blobs.
+  MISS_REFRESH_INTERVAL = 1
+  # The Bloom filter is rebuilt twice as large when it has fewer bits than
+  # this per stored digest.
+  BLOOM_BITS_PER_ENTRY = 10
+  # Reads of records at most this far apart are coalesced into one.
+  READ_GAP = 64 * 1024
+  MAX_READ_SIZE = 16 * 1024 * 1024
+  # Compaction rewrites sealed packs with less live data than this fraction.
+  MIN_LIVE_FRACTION = 0.5
+
+  def __init__(self, root_dir=None):
+    super(PackBlobstore, self).__init__()
+    self.root_dir = root_dir or config.CONFIG["PackBlobstore.root_dir"]
+    self.pack_dir = os.path.join(self.root_dir, "packs")
+    self.index_dir = os.path.join(self.root_dir, "index")
+    utils.EnsureDirExists(self.pack_dir)
+    utils.EnsureDirExists(self.index_dir)
+
+    self.max_pack_size = config.CONFIG["PackBlobstore.max_pack_size"]
+    self.sync_writes = config.CONFIG["PackBlobstore.sync_writes"]
+
+    self.lock = threading.RLock()
+    self.min_bloom_bits = config.CONFIG["PackBlobstore.bloom_filter_bits"]
+    self.bloom = BloomFilter(self.min_bloom_bits)
+    # Index file name to SortedIndex.
+    self.indexes = {}
+    # Entries read from the journals of packs that are not sealed yet.
+    self.journal_entries = {}
+    self.journal_digests = {}
+    self.journal_offsets = {}
+    self.next_refresh = 0
+    self.next_miss_refresh = 0
+    self.writer = None
+
+    with self.lock:
+      self._Refresh()
+
+    self.compaction_thread = None
+    interval = config.CONFIG["PackBlobstore.compaction_interval"]
+    if interval:
+      self.compaction_thread = utils.InterruptableThread(
+          name="PackBlobstore compaction thread",
+          target=self.Compact,
+          sleep_time=interval)
+      self.compaction_thread.start()
+
+  def _PackPath(self, number):
+    return os.path.join(self.pack_dir, "%d%s" % (number, PACK_EXTENSION))
+
+  def _ReadJournal(self, name):
+    """Reads entries appended to a journal since we last looked at it."""
+    offset = self.journal_offsets.get(name, 0)
+    try:
+      with open(os.path.join(self.pack_dir, name), "rb") as fd:
+        fd.seek(offset)
+        data = fd.read()
+    except IOError as e:
+      if e.errno == errno.ENOENT:
+        # The pack was sealed in the meantime.
+        return
+      raise
+
+    # The writer may be in the middle of appending an entry.
+    usable = len(data) - len(data) % _INDEX_ENTRY.size
+    digests = self.journal_digests.setdefault(name, [])
+    for pos in range(0, usable, _INDEX_ENTRY.size):
+      entry = _INDEX_ENTRY.unpack_from(data, pos)
+      self.journal_entries[entry[0]] = entry
+      self.bloom.Add(entry[0])
+      digests.append(entry[0])
+    self.journal_offsets[name] = offset + usable
+
+  def _ForgetJournal(self, name):
+    number = int(name[:-len(JOURNAL_EXTENSION)])
+    for digest in self.journal_digests.pop(name, []):
+      entry = self.journal_entries.get(digest)
+      if entry is not None and entry[1] == number:
+        del self.journal_entries[digest]
+    self.journal_offsets.pop(name, None)
+
+  def _Refresh(self):
+    """Picks up journal and index files written by other processes."""
+    self.next_refresh = time.time() + self.REFRESH_INTERVAL
+
+    # Journals have to be read before the index: a pack sealed in between is
+    # then either still in its journal or already in the index.
+    journals = set(
+        name for name in _ListDir(self.pack_dir)
+        if name.endswith(JOURNAL_EXTENSION))
+    for name in set(self.journal_offsets) - journals:
+      self._ForgetJournal(name)
+    for name in journals:
+      self._ReadJournal(name)
+
+    names = set(
+        name for name in _ListDir(self.index_dir)
+        if name.endswith(INDEX_EXTENSION))
+    for name in set(self.indexes) - names:
+      self.indexes.pop(name).Close()
+    for name in names - set(self.indexes):
+      try:
+        index = SortedIndex(os.path.join(self.index_dir, name))
+      except IOError as e:
+        if e.errno == errno.ENOENT:
+          # Merged away by compaction in the meantime.
+          continue
+        raise
+      for entry in index:
+        self.bloom.Add(entry[0])
+      self.indexes[name] = index
+
+    self._MaybeResizeBloomFilter()
+
+  def _MaybeResizeBloomFilter(self):
+    """Rebuilds the Bloom filter if it's too small for the stored digests."""
+    count = len(self.journal_entries) + sum(
+        len(index) for index in itervalues(self.indexes))
+    if count * self.BLOOM_BITS_PER_ENTRY <= self.bloom.num_bits:
+      return
+
+    bloom = BloomFilter(
+        max(self.min_bloom_bits, 2 * count * self.BLOOM_BITS_PER_ENTRY))
+    for digest in self.journal_entries:
+      bloom.Add(digest)
+    for index in itervalues(self.indexes):
+      for entry in index:
+        bloom.Add(entry[0])
+    self.bloom = bloom
+
+  def _MaybeRefresh(self):
+    if time.time() >= self.next_refresh:
+      self._Refresh()
+
+  def _Lookup(self, digest):
+    """Returns the index entry for a binary digest or None."""
+    if digest not in self.bloom:
+      return None
+
+    entry = self.journal_entries.get(digest)
+    if entry is not None:
+      return entry
+
+    for index in itervalues(self.indexes):
+      entry = index.Lookup(digest)
+      if entry is not None:
+        return entry
+    return None
+
+  def _SealWriter(self):
+    writer, self.writer = self.writer, None
+    name = writer.Seal(self.index_dir)
+    self.indexes[name] = SortedIndex(os.path.join(self.index_dir, name))
+    self._ForgetJournal(writer.journal_name)
+
+  def StoreBlobs(self, contents, token=None):
+    """Creates or overwrites blobs."""
+    del token  # Unused.
+
+    digests = [hashlib.sha256(content).digest() for content in contents]
+
+    with self.lock:
+      self._MaybeRefresh()
+
+      new_blobs = collections.OrderedDict()
+      for digest, content in zip(digests, contents):
+        if digest not in new_blobs and self._Lookup(digest) is None:
+          new_blobs[digest] = content
+
+      if new_blobs:
+        if self.writer is None:
+          self.writer = PackWriter(self.pack_dir, sync=self.sync_writes)
+
+        entries = self.writer.Write(iteritems(new_blobs))
+
+        name = self.writer.journal_name
+        journal_digests = self.journal_digests.setdefault(name, [])
+        for entry in entries:
+          self.journal_entries[entry[0]] = entry
+          self.bloom.Add(entry[0])
+          journal_digests.append(entry[0])
+        self.journal_offsets[name] = (
+            self.journal_offsets.get(name, 0) +
+            len(entries) * _INDEX_ENTRY.size)
+        self._MaybeResizeBloomFilter()
+
+        if self.writer.size >= self.max_pack_size:
+          self._SealWriter()
+
+    return [digest.encode("hex") for digest in digests]
+
+  def _ReadEntries(self, entries, result):
+    """Reads blobs for index entries, returns digests that weren't read."""
+    reads_by_pack = collections.defaultdict(list)
+    failed = []
+    for digest, entry in iteritems(entries):
+      if entry is None:
+        failed.append(digest)
+      else:
+        _, number, offset, length = entry
+        reads_by_pack[number].append((offset, length, digest))
+
+    for number, reads in iteritems(reads_by_pack):
+      try:
+        fd = open(self._PackPath(number), "rb")
+      except IOError as e:
+        if e.errno != errno.ENOENT:
+          raise
+        # Rewritten by compaction since we last read the index.
+        failed.extend(digest for _, _, digest in reads)
+        continue
+
+      with fd:
+        reads.sort()
+        for run in _CoalesceReads(reads, self.READ_GAP, self.MAX_READ_SIZE):
+          start = run[0][0]
+          fd.seek(start)
+          data = fd.read(run[-1][0] + run[-1][1] - start)
+          for offset, length, digest in run:
+            result[digest] = data[offset - start:offset - start + length]
+
+    return failed
+
+  def ReadBlobs(self, digests, token=None):
+    del token  # Unused.
+
+    result = {digest: None for digest in digests}
+
+    with self.lock:
+      self._MaybeRefresh()
+      entries = {d: self._Lookup(d.decode("hex")) for d in result}
+    failed = self._ReadEntries(entries, result)
+
+    if not failed:
+      return result
+
+    # The blobs might have been written or moved by another process since we
+    # last looked at the index. Blobs we know of but couldn't read were moved
+    # by compaction, we always have to look for them again. Reads of unknown
+    # blobs only rescan once in a while, they are mostly reads of blobs that
+    # were never stored.
+    moved = any(entries[digest] is not None for digest in failed)
+    with self.lock:
+      if not moved and time.time() < self.next_miss_refresh:
+        return result
+
+      self.next_miss_refresh = time.time() + self.MISS_REFRESH_INTERVAL
+      self._Refresh()
+      entries = {d: self._Lookup(d.decode("hex")) for d in failed}
+    self._ReadEntries(entries, result)
+
+    return result
+
+  def BlobsExist(self, digests, token=None):
+    """Check if blobs for the given digests already exist."""
+    del token  # Unused.
+
+    with self.lock:
+      self._MaybeRefresh()
+      return {
+          digest: self._Lookup(digest.decode("hex")) is not None
+          for digest in digests
+      }
+
+  def Close(self):
+    """Seals the pack this process writes to and stops compaction."""
+    if self.compaction_thread is not None:
+      self.compaction_thread.Stop()
+      self.compaction_thread = None
+
+    with self.lock:
+      if self.writer is not None:
+        self._SealWriter()
+      for index in itervalues(self.indexes):
+        index.Close()
+      self.indexes = {}
+
+  def Compact(self):
+    """Seals abandoned packs, merges the index and rewrites wasteful packs."""
+    with open(os.path.join(self.index_dir, "compaction.lock"), "a") as lock_fd:
+      if not _TryLock(lock_fd):
+        # Another process is compacting.
+        return
+
+      try:
+        self._SealAbandonedPacks()
+        with self.lock:
+          self._Refresh()
+          indexes = dict(self.indexes)
+        self._MergeIndexes(indexes)
+      finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+  def _SealAbandonedPacks(self):
+    """Seals the packs of processes that died while writing to them."""
+    for name in _ListDir(self.pack_dir):
+      if not name.endswith(JOURNAL_EXTENSION):
+        continue
+
+      number = int(name[:-len(JOURNAL_EXTENSION)])
+      with self.lock:
+        if self.writer is not None and self.writer.number == number:
+          continue
+
+      try:
+        fd = os.open(self._PackPath(number), os.O_RDWR)
+      except OSError as e:
+        if e.errno != errno.ENOENT:
+          raise
+        _Unlink(os.path.join(self.pack_dir, name))
+        continue
+
+      try:
+        if not _TryLock(fd):
+          # Still being written to.
+          continue
+
+        # The journal may lack entries for the last records written, so the
+        # pack itself is scanned.
+        entries = []
+        offset = 0
+        size = os.fstat(fd).st_size
+        while offset + _RECORD_HEADER.size <= size:
+          os.lseek(fd, offset, os.SEEK_SET)
+          digest, length = _RECORD_HEADER.unpack(
+              os.read(fd, _RECORD_HEADER.size))
+          if offset + _RECORD_HEADER.size + length > size:
+            break
+          entries.append(
+              (digest, number, offset + _RECORD_HEADER.size, length))
+          offset += _RECORD_HEADER.size + length
+
+        if offset != size:
+          logging.warning("Truncating incomplete record in pack %d.", number)
+          os.ftruncate(fd, offset)
+
+        if entries:
+          _WriteIndex(
+              os.path.join(self.index_dir,
+                           "pack-%d%s" % (number, INDEX_EXTENSION)),
+              sorted(entries))
+        else:
+          _Unlink(self._PackPath(number))
+        _Unlink(os.path.join(self.pack_dir, name))
+      finally:
+        os.close(fd)
+
+  def _MergeIndexes(self, indexes):
+    """Merges sorted indexes into one, rewriting packs with little live data.
+
+    Args:
+      indexes: A dict of index file names to SortedIndex objects.
+    """
+
+    def Merged():
+      last = None
+      for entry in heapq.merge(*itervalues(indexes)):
+        if entry[0] != last:
+          last = entry[0]
+          yield entry
+
+    # Digests stored in more than one pack (written concurrently by different
+    # processes) are only live in the lowest numbered one.
+    indexed_packs = set()
+    live_bytes = collections.Counter()
+    for index in itervalues(indexes):
+      for _, number, _, _ in index:
+        indexed_packs.add(number)
+    for _, number, _, length in Merged():
+      live_bytes[number] += _RECORD_HEADER.size + length
+
+    # Packs whose journal still exists are not fully indexed yet.
+    unsealed = set(
+        int(name[:-len(JOURNAL_EXTENSION)])
+        for name in _ListDir(self.pack_dir)
+        if name.endswith(JOURNAL_EXTENSION))
+
+    pack_sizes = {}
+    for number in indexed_packs - unsealed:
+      try:
+        pack_sizes[number] = os.path.getsize(self._PackPath(number))
+      except OSError as e:
+        if e.errno != errno.ENOENT:
+          raise
+
+    rewrite = set(
+        number for number, size in iteritems(pack_sizes)
+        if live_bytes[number] < size * self.MIN_LIVE_FRACTION)
+    small = [
+        number for number, size in iteritems(pack_sizes)
+        if size < self.max_pack_size // 4 and number not in rewrite
+    ]
+    if len(small) > 1:
+      rewrite.update(small)
+
+    if len(indexes) < 2 and not rewrite:
+      return
+
+    writers = []
+    pack_fds = {}
+    name = "merged-%d-%s%s" % (time.time(), uuid.uuid4().hex[:8],
+                               INDEX_EXTENSION)
+
+    def Rewritten():
+      for entry in Merged():
+        digest, number, offset, length = entry
+        if number not in rewrite:
+          yield entry
+          continue
+
+        if number not in pack_fds:
+          pack_fds[number] = open(self._PackPath(number), "rb")
+        pack_fd = pack_fds[number]
+        pack_fd.seek(offset)
+        content = pack_fd.read(length)
+
+        if not writers or writers[-1].size >= self.max_pack_size:
+          writers.append(PackWriter(self.pack_dir, sync=False))
+        yield writers[-1].Write([(digest, content)])[0]
+
+      # The new packs have to be on disk before the index pointing into them
+      # is renamed into place.
+      for writer in writers:
+        writer.Sync()
+
+    # Every digest is only in the merged index once, so rewriting its entry
+    # keeps the entries sorted and the index can be written while merging.
+    try:
+      _WriteIndex(
+          os.path.join(self.index_dir, name),
+          Rewritten() if rewrite else Merged())
+    finally:
+      for pack_fd in itervalues(pack_fds):
+        pack_fd.close()
+
+    for writer in writers:
+      writer.DiscardJournal()
+    for old_name in indexes:
+      _Unlink(os.path.join(self.index_dir, old_name))
+    for number in rewrite:
+      _Unlink(self._PackPath(number))
+
+    logging.info("Merged %d blob indexes, rewrote %d packs into %d.",
+                 len(indexes), len(rewrite), len(writers))
+
+    with self.lock:
+      self._Refresh()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""Tests for grr_response_server.blob_stores.pack_blob_store."""
+
+import hashlib
+import os
+
+from builtins import range  # pylint: disable=redefined-builtin
+
+from grr_response_core.lib import flags
+from grr_response_core.lib import utils
+from grr_response_server.blob_stores import pack_blob_store
+from grr.test_lib import test_lib
+
+
+class BloomFilterTest(test_lib.GRRBaseTest):
+
+  def testContainsAddedDigests(self):
+    bloom = pack_blob_store.BloomFilter(1024)
+    digests = [hashlib.sha256(str(i)).digest() for i in range(20)]
+    for digest in digests[:10]:
+      bloom.Add(digest)
+
+    for digest in digests[:10]:
+      self.assertIn(digest, bloom)
+    # With 1024 bits and 10 entries false positives are very unlikely.
+    self.assertLess(sum(digest in bloom for digest in digests[10:]), 2)
+
+
+class CoalesceReadsTest(test_lib.GRRBaseTest):
+
+  def testCoalescesNearbyReads(self):
+    reads = [(0, 10, "a"), (15, 10, "b"), (100, 10, "c"), (112, 10, "d")]
+    runs = list(pack_blob_store._CoalesceReads(reads, 10, 1000))
+    self.assertEqual(runs, [reads[:2], reads[2:]])
+
+  def testLimitsRunSize(self):
+    reads = [(0, 10, "a"), (10, 10, "b"), (20, 10, "c")]
+    runs = list(pack_blob_store._CoalesceReads(reads, 10, 20))
+    self.assertEqual(runs, [reads[:2], reads[2:]])
+
+
+class PackBlobstoreTest(test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super(PackBlobstoreTest, self).setUp()
+    self.config_overrider = test_lib.ConfigOverrider({
+        "PackBlobstore.root_dir": self.temp_dir,
+        "PackBlobstore.bloom_filter_bits": 2**16,
+        "PackBlobstore.compaction_interval": 0,
+        "PackBlobstore.max_pack_size": 1024 * 1024,
+        "PackBlobstore.sync_writes": False,
+    })
+    self.config_overrider.Start()
+    self.stores = []
+
+  def tearDown(self):
+    for store in self.stores:
+      store.Close()
+    self.config_overrider.Stop()
+    super(PackBlobstoreTest, self).tearDown()
+
+  def _Store(self):
+    store = pack_blob_store.PackBlobstore()
+    self.stores.append(store)
+    return store
+
+  def _List(self, subdir, extension):
+    return sorted(
+        name for name in os.listdir(os.path.join(self.temp_dir, subdir))
+        if name.endswith(extension))
+
+  def testStoreAndReadBlobs(self):
+    store = self._Store()
+    contents = ["blob%d" % i for i in range(10)]
+    digests = store.StoreBlobs(contents)
+
+    self.assertEqual(digests, [hashlib.sha256(c).hexdigest() for c in contents])
+    self.assertEqual(store.ReadBlobs(digests), dict(zip(digests, contents)))
+
+  def testReadingMissingBlobReturnsNone(self):
+    store = self._Store()
+    digest = hashlib.sha256("missing").hexdigest()
+
+    self.assertEqual(store.ReadBlobs([digest]), {digest: None})
+    self.assertEqual(store.BlobsExist([digest]), {digest: False})
+
+  def testBlobsExist(self):
+    store = self._Store()
+    existing = store.StoreBlobs(["foo"])[0]
+    missing = hashlib.sha256("bar").hexdigest()
+
+    self.assertEqual(
+        store.BlobsExist([existing, missing]), {
+            existing: True,
+            missing: False
+        })
+
+  def testContentsAreOnlyStoredOnce(self):
+    store = self._Store()
+    store.StoreBlobs(["foo", "foo"])
+    size = store.writer.size
+    store.StoreBlobs(["foo"])
+
+    self.assertEqual(store.writer.size, size)
+
+  def testBlobsOfOtherProcessesAreVisible(self):
+    writer = self._Store()
+    reader = self._Store()
+    digest = writer.StoreBlobs(["foo"])[0]
+
+    # A miss forces a rescan of the journals.
+    self.assertEqual(reader.ReadBlobs([digest]), {digest: "foo"})
+
+    reader.next_refresh = 0
+    self.assertEqual(reader.BlobsExist([digest]), {digest: True})
+
+  def testMissesOfUnknownBlobsAreRateLimited(self):
+    store = self._Store()
+    digest = hashlib.sha256("missing").hexdigest()
+    refreshes = []
+
+    def Refresh():
+      refreshes.append(digest)
+
+    with utils.Stubber(store, "_Refresh", Refresh):
+      with test_lib.FakeTime(1000):
+        store.ReadBlobs([digest])
+        store.ReadBlobs([digest])
+      self.assertEqual(len(refreshes), 1)
+
+      with test_lib.FakeTime(1000 + store.MISS_REFRESH_INTERVAL):
+        store.ReadBlobs([digest])
+      self.assertEqual(len(refreshes), 2)
+
+  def testBloomFilterGrowsWithStoredBlobs(self):
+    with test_lib.ConfigOverrider({"PackBlobstore.bloom_filter_bits": 64}):
+      store = self._Store()
+      contents = ["blob%d" % i for i in range(100)]
+      digests = store.StoreBlobs(contents)
+
+      self.assertGreaterEqual(store.bloom.num_bits,
+                              100 * store.BLOOM_BITS_PER_ENTRY)
+      self.assertEqual(store.ReadBlobs(digests), dict(zip(digests, contents)))
+
+      store.Close()
+      # Stores opening existing indexes size their filter right away.
+      reader = self._Store()
+      self.assertGreaterEqual(reader.bloom.num_bits,
+                              100 * reader.BLOOM_BITS_PER_ENTRY)
+      self.assertEqual(
+          reader.BlobsExist(digests), {digest: True for digest in digests})
+
+  def testFullPacksAreSealed(self):
+    store = self._Store()
+    contents = ["%d" % i * 1024 for i in range(1, 1500)]
+    digests = store.StoreBlobs(contents)
+
+    self.assertEqual(self._List("index", ".idx"), ["pack-1.idx"])
+    self.assertEqual(self._List("packs", ".journal"), [])
+    self.assertIsNone(store.writer)
+
+    reader = self._Store()
+    self.assertEqual(reader.ReadBlobs(digests), dict(zip(digests, contents)))
+
+  def testCompactionSealsAbandonedPacks(self):
+    store = self._Store()
+    digests = store.StoreBlobs(["foo", "bar"])
+    # Simulates the writer going away without sealing its pack.
+    store.writer.Close()
+    store.writer = None
+    with open(os.path.join(self.temp_dir, "packs", "1.pack"), "ab") as fd:
+      fd.write("\x00" * 10)
+
+    compactor = self._Store()
+    compactor.Compact()
+
+    self.assertEqual(self._List("packs", ".journal"), [])
+    self.assertEqual(self._List("index", ".idx"), ["pack-1.idx"])
+    self.assertEqual(
+        compactor.ReadBlobs(digests), dict(zip(digests, ["foo", "bar"])))
+
+  def testCompactionDoesNotSealActivePacks(self):
+    store = self._Store()
+    store.StoreBlobs(["foo"])
+
+    self._Store().Compact()
+
+    self.assertEqual(self._List("packs", ".journal"), ["1.journal"])
+
+  def testCompactionMergesIndexesAndRewritesDuplicates(self):
+    first = self._Store()
+    second = self._Store()
+    # Both stores write the same blob before seeing each other's writes.
+    first.StoreBlobs(["foo", "bar"])
+    second.StoreBlobs(["foo", "baz"])
+    first.Close()
+    second.Close()
+    self.assertEqual(
+        self._List("index", ".idx"), ["pack-1.idx", "pack-2.idx"])
+
+    compactor = self._Store()
+    compactor.Compact()
+
+    indexes = self._List("index", ".idx")
+    self.assertEqual(len(indexes), 1)
+    self.assertTrue(indexes[0].startswith("merged-"))
+    # Both small packs got rewritten into a single new one.
+    self.assertEqual(self._List("packs", ".pack"), ["3.pack"])
+
+    digests = [hashlib.sha256(c).hexdigest() for c in ["foo", "bar", "baz"]]
+    expected = dict(zip(digests, ["foo", "bar", "baz"]))
+    self.assertEqual(compactor.ReadBlobs(digests), expected)
+    self.assertEqual(self._Store().ReadBlobs(digests), expected)
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
@@ -6,3 +6,4 @@
 # The memory stream object based blob store.
 from grr_response_server.blob_stores import db_blob_store
 from grr_response_server.blob_stores import memory_stream_bs
+from grr_response_server.blob_stores import pack_blob_store
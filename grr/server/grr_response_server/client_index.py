@@ -4,12 +4,17 @@
 An index of client machines, associating likely identifiers to client IDs.
 """
 
+import array
+import bisect
+import threading
+import time
 
 from builtins import map  # pylint: disable=redefined-builtin
 from builtins import range  # pylint: disable=redefined-builtin
 from future.utils import iteritems
 from future.utils import itervalues
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import client as rdf_client
@@ -322,6 +327,479 @@ def GetMostRecentClient(client_list, token=None):
   return client_urn
 
 
+def _AppendVarint(value, out):
+  while value > 0x7f:
+    out.append((value & 0x7f) | 0x80)
+    value >>= 7
+  out.append(value)
+
+
+class PostingList(object):
+  """A sorted set of integer ids, stored delta and varint encoded.
+
+  Client numbers are handed out in increasing order, so adding a new client to
+  a keyword appends a few bytes to the end of the list. Only additions of
+  older clients and removals need to re-encode it.
+  """
+
+  __slots__ = ("_data", "_last", "_count")
+
+  def __init__(self, ids=None):
+    self._Encode(sorted(set(ids or [])))
+
+  def __len__(self):
+    return self._count
+
+  def _Encode(self, ids):
+    self._data = bytearray()
+    self._last = 0
+    self._count = 0
+    for value in ids:
+      self._Append(value)
+
+  def _Append(self, value):
+    _AppendVarint(value - self._last, self._data)
+    self._last = value
+    self._count += 1
+
+  def Decode(self, max_id=None):
+    """Returns the sorted list of ids, optionally only up to max_id."""
+    ids = []
+    append = ids.append
+    last = value = shift = 0
+    for byte in self._data:
+      if byte & 0x80:
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        continue
+      last += value | (byte << shift)
+      if max_id is not None and last > max_id:
+        break
+      append(last)
+      value = shift = 0
+    return ids
+
+  def Add(self, value):
+    if not self._count or value > self._last:
+      self._Append(value)
+      return
+
+    ids = self.Decode()
+    i = bisect.bisect_left(ids, value)
+    if i == len(ids) or ids[i] != value:
+      ids.insert(i, value)
+      self._Encode(ids)
+
+  def Remove(self, value):
+    ids = self.Decode()
+    i = bisect.bisect_left(ids, value)
+    if i < len(ids) and ids[i] == value:
+      del ids[i]
+      self._Encode(ids)
+
+
+# Every indexed client is associated with this keyword.
+UNIVERSAL_KEYWORD = "."
+# Refreshed when keywords are removed from a client, so that other processes
+# notice the change.
+CHANGED_KEYWORD = ".changed"
+
+
+class ClientPostingLists(object):
+  """An inverted index from keywords to the clients associated with them.
+
+  Clients are identified internally by small integers in the order they were
+  first added, so that the posting lists compress well. For every client we
+  also keep the keywords it is associated with and when they were associated,
+  which makes re-indexing a client a cheap diff against what is already there.
+  """
+
+  # How many fully decoded posting lists to keep around.
+  DECODED_CACHE_SIZE = 128
+
+  def __init__(self):
+    self.client_ids = []
+    self.client_numbers = {}
+    # Sorted keyword numbers of each client and, at the same positions, the
+    # microseconds since epoch they were associated with the client at.
+    self.client_keywords = []
+    self.client_keyword_timestamps = []
+
+    self.keywords = []
+    self.keyword_numbers = {}
+    self.postings = []
+    # Keywords are kept sorted for prefix lookups. New keywords are buffered
+    # and merged in on the next prefix lookup.
+    self.sorted_keywords = []
+    self.unsorted_keywords = []
+
+    self.decoded = utils.FastStore(max_size=self.DECODED_CACHE_SIZE)
+
+  def __len__(self):
+    return len(self.client_ids)
+
+  def _ClientNumber(self, client_id):
+    try:
+      return self.client_numbers[client_id]
+    except KeyError:
+      number = len(self.client_ids)
+      self.client_numbers[client_id] = number
+      self.client_ids.append(client_id)
+      self.client_keywords.append(array.array("I"))
+      self.client_keyword_timestamps.append(array.array("d"))
+      return number
+
+  def _KeywordNumber(self, keyword):
+    try:
+      return self.keyword_numbers[keyword]
+    except KeyError:
+      number = len(self.keywords)
+      self.keyword_numbers[keyword] = number
+      self.keywords.append(keyword)
+      self.postings.append(PostingList())
+      self.unsorted_keywords.append(keyword)
+      return number
+
+  def _GetClientKeywords(self, number):
+    """Returns a dict mapping keyword numbers of a client to timestamps."""
+    return dict(
+        zip(self.client_keywords[number],
+            self.client_keyword_timestamps[number]))
+
+  def _SetClientKeywords(self, number, keyword_timestamps):
+    keyword_numbers = sorted(keyword_timestamps)
+    self.client_keywords[number] = array.array("I", keyword_numbers)
+    self.client_keyword_timestamps[number] = array.array(
+        "d", [keyword_timestamps[n] for n in keyword_numbers])
+
+  def AddClientKeywords(self, client_id, keyword_timestamps):
+    """Associates keywords with a client.
+
+    Args:
+      client_id: The client id.
+      keyword_timestamps: A dict mapping normalized keyword strings to the
+        rdfvalue.RDFDatetime they were associated with the client at.
+    """
+    number = self._ClientNumber(client_id)
+    current = self._GetClientKeywords(number)
+    for keyword, timestamp in iteritems(keyword_timestamps):
+      keyword_number = self._KeywordNumber(utils.SmartStr(keyword))
+      if keyword_number not in current:
+        self.postings[keyword_number].Add(number)
+        self.decoded.ExpireObject(keyword_number)
+      current[keyword_number] = timestamp.AsMicrosecondsSinceEpoch()
+
+    self._SetClientKeywords(number, current)
+
+  def RemoveClientKeywords(self, client_id, keywords):
+    """Removes the association of keywords to a client."""
+    number = self.client_numbers.get(client_id)
+    if number is None:
+      return
+
+    current = self._GetClientKeywords(number)
+    for keyword in keywords:
+      keyword_number = self.keyword_numbers.get(utils.SmartStr(keyword))
+      if keyword_number in current:
+        self.postings[keyword_number].Remove(number)
+        self.decoded.ExpireObject(keyword_number)
+        del current[keyword_number]
+
+    self._SetClientKeywords(number, current)
+
+  def ReplaceClientKeywords(self, client_id, keyword_timestamps):
+    """Replaces all keywords of a client with the ones read from the db.
+
+    Args:
+      client_id: The client id.
+      keyword_timestamps: A dict mapping keywords to the
+        rdfvalue.RDFDatetime they were last associated with the client.
+    """
+    number = self.client_numbers.get(client_id)
+    if number is not None:
+      stale = (
+          set(self.keywords[n] for n in self.client_keywords[number]) -
+          set(keyword_timestamps))
+      self.RemoveClientKeywords(client_id, stale)
+
+    if keyword_timestamps:
+      self.AddClientKeywords(client_id, keyword_timestamps)
+
+  def _MatchingKeywords(self, keyword, prefix):
+    """Returns the numbers of all keywords matching a query term."""
+    if not prefix:
+      number = self.keyword_numbers.get(keyword)
+      return [] if number is None else [number]
+
+    if self.unsorted_keywords:
+      # Timsort merges the two sorted runs in linear time.
+      self.unsorted_keywords.sort()
+      self.sorted_keywords.extend(self.unsorted_keywords)
+      self.sorted_keywords.sort()
+      self.unsorted_keywords = []
+
+    numbers = []
+    i = bisect.bisect_left(self.sorted_keywords, keyword)
+    while (i < len(self.sorted_keywords) and
+           self.sorted_keywords[i].startswith(keyword)):
+      numbers.append(self.keyword_numbers[self.sorted_keywords[i]])
+      i += 1
+    return numbers
+
+  def _Decode(self, keyword_number, max_id=None):
+    try:
+      return self.decoded.Get(keyword_number)
+    except KeyError:
+      pass
+
+    ids = self.postings[keyword_number].Decode(max_id=max_id)
+    if max_id is None:
+      self.decoded.Put(keyword_number, ids)
+    return ids
+
+  def _ClauseSize(self, keyword_numbers):
+    return sum(len(self.postings[n]) for n in keyword_numbers)
+
+  def _Resolve(self, keyword_numbers, max_id=None):
+    """Returns the sorted union of the posting lists of some keywords."""
+    if len(keyword_numbers) == 1:
+      return self._Decode(keyword_numbers[0], max_id=max_id)
+
+    ids = set()
+    for n in keyword_numbers:
+      ids.update(self._Decode(n, max_id=max_id))
+    return sorted(ids)
+
+  def _AddedSince(self, number, keyword_numbers, min_timestamp):
+    """Checks if a client got any of the keywords after min_timestamp."""
+    if min_timestamp is None:
+      return True
+
+    client_keywords = self.client_keywords[number]
+    timestamps = self.client_keyword_timestamps[number]
+    for keyword_number in keyword_numbers:
+      i = bisect.bisect_left(client_keywords, keyword_number)
+      if (i < len(client_keywords) and client_keywords[i] == keyword_number and
+          timestamps[i] >= min_timestamp):
+        return True
+    return False
+
+  def Query(self, clauses, start_time=None):
+    """Finds the clients matching all clauses of a query.
+
+    Args:
+      clauses: A list of QueryClause objects.
+      start_time: If set, keywords associated with a client before this
+        rdfvalue.RDFDatetime are ignored.
+
+    Returns:
+      A list of client ids.
+    """
+    resolved = []
+    for clause in clauses:
+      keyword_numbers = []
+      for keyword, prefix in clause.terms:
+        keyword_numbers.extend(self._MatchingKeywords(keyword, prefix))
+
+      if not keyword_numbers:
+        if clause.negated:
+          continue
+        return []
+      resolved.append((clause.negated, keyword_numbers))
+
+    if start_time is None:
+      min_timestamp = None
+    else:
+      min_timestamp = start_time.AsMicrosecondsSinceEpoch()
+
+    # Intersect the smallest lists first, this keeps the candidate list short
+    # and lets us stop decoding the longer lists early. Negated clauses go
+    # last.
+    resolved.sort(key=lambda c: (c[0], self._ClauseSize(c[1])))
+    if resolved and not resolved[0][0]:
+      _, keyword_numbers = resolved.pop(0)
+      candidates = [
+          c for c in self._Resolve(keyword_numbers)
+          if self._AddedSince(c, keyword_numbers, min_timestamp)
+      ]
+    else:
+      candidates = self._Resolve(
+          self._MatchingKeywords(UNIVERSAL_KEYWORD, False))
+
+    for negated, keyword_numbers in resolved:
+      if not candidates:
+        return []
+      members = set(self._Resolve(keyword_numbers, max_id=candidates[-1]))
+      candidates = [
+          c for c in candidates
+          if (c in members and self._AddedSince(c, keyword_numbers,
+                                                min_timestamp)) != negated
+      ]
+
+    return [self.client_ids[c] for c in candidates]
+
+
+class QueryClause(object):
+  """A disjunction of keyword terms, optionally negated."""
+
+  def __init__(self, negated=False):
+    self.negated = negated
+    # A list of (keyword, is_prefix) tuples.
+    self.terms = []
+
+
+class InMemoryClientIndex(object):
+  """A process-wide in-memory copy of the client keywords in the database.
+
+  The index is loaded on first use and kept current with the changes this
+  process makes through ClientIndex. Every REFRESH_INTERVAL seconds, the
+  clients other processes reindexed or removed keywords from are read again,
+  ClientIndex refreshes UNIVERSAL_KEYWORD or CHANGED_KEYWORD for them. The
+  whole index is rebuilt every REBUILD_INTERVAL seconds.
+
+  Building the index doesn't hold the lock, the previous index is used until
+  the new one is ready.
+  """
+
+  REFRESH_INTERVAL = 10
+  REBUILD_INTERVAL = 3600
+  # Clock skew we tolerate between processes writing keywords.
+  REFRESH_OVERLAP = rdfvalue.Duration("1m")
+  # Number of clients to read keywords for in a single database call.
+  LOAD_BATCH_SIZE = 1000
+
+  def __init__(self):
+    self.lock = threading.RLock()
+    self._built = threading.Condition(self.lock)
+    # Incremented by Invalidate(), builds started before are discarded.
+    self._generation = 0
+    self.Invalidate()
+
+  @utils.Synchronized
+  def Invalidate(self):
+    self._postings = None
+    self._db = None
+    self._next_refresh = 0
+    self._next_rebuild = 0
+    self._synced_at = None
+    self._building = False
+    # Changes made while the index is being built. They are applied to the new
+    # index once it's ready.
+    self._pending = None
+    self._generation += 1
+    self._built.notify_all()
+
+  def _Load(self, db, postings, client_ids):
+    for batch in utils.Grouper(client_ids, self.LOAD_BATCH_SIZE):
+      keywords = db.MultiReadClientKeywords(batch)
+      for client_id in batch:
+        client_keywords = keywords[client_id]
+        client_keywords.pop(CHANGED_KEYWORD, None)
+        # Clients removed from the index only keep CHANGED_KEYWORD.
+        if UNIVERSAL_KEYWORD not in client_keywords:
+          client_keywords = {}
+        postings.ReplaceClientKeywords(client_id, client_keywords)
+
+  def _IsLoaded(self):
+    return self._postings is not None and self._db is data_store.REL_DB
+
+  def _Refresh(self):
+    """Reads the clients changed by other processes since the last sync."""
+    synced_at = rdfvalue.RDFDatetime.Now()
+    changed = data_store.REL_DB.ListClientsForKeywords(
+        [UNIVERSAL_KEYWORD, CHANGED_KEYWORD],
+        start_time=self._synced_at - self.REFRESH_OVERLAP)
+    self._Load(data_store.REL_DB, self._postings,
+               set(changed[UNIVERSAL_KEYWORD]) | set(changed[CHANGED_KEYWORD]))
+    self._next_refresh = time.time() + self.REFRESH_INTERVAL
+    self._synced_at = synced_at
+
+  def _Get(self):
+    """Returns the up to date posting lists."""
+    with self.lock:
+      while True:
+        if self._IsLoaded() and (self._building or
+                                 time.time() < self._next_rebuild):
+          if time.time() >= self._next_refresh:
+            self._Refresh()
+          return self._postings
+
+        if not self._building:
+          break
+        # Nothing to use until the running build finishes.
+        self._built.wait()
+
+      self._building = True
+      self._pending = []
+      generation = self._generation
+      db = data_store.REL_DB
+
+    postings = ClientPostingLists()
+    built = False
+    try:
+      synced_at = rdfvalue.RDFDatetime.Now()
+      self._Load(db, postings, db.ReadAllClientIDs())
+      built = True
+    finally:
+      with self.lock:
+        if generation == self._generation:
+          if built:
+            for method, args in self._pending:
+              method(postings, *args)
+            self._postings = postings
+            self._db = db
+            self._next_rebuild = time.time() + self.REBUILD_INTERVAL
+            self._next_refresh = time.time() + self.REFRESH_INTERVAL
+            self._synced_at = synced_at
+          self._building = False
+          self._pending = None
+          self._built.notify_all()
+
+    return postings
+
+  def _Update(self, method, *args):
+    """Applies a change to the loaded index and the one being built."""
+    if self._pending is not None:
+      self._pending.append((method, args))
+    # Nothing else to do if the index isn't loaded, the next load reads the
+    # change from the database.
+    if self._IsLoaded():
+      method(self._postings, *args)
+
+  def Query(self, clauses, start_time=None):
+    postings = self._Get()
+    with self.lock:
+      return postings.Query(clauses, start_time=start_time)
+
+  def ReadPostingLists(self, keywords, start_time=None):
+    postings = self._Get()
+    with self.lock:
+      return {
+          kw: postings.Query([_ExactClause(kw)], start_time=start_time)
+          for kw in keywords
+      }
+
+  @utils.Synchronized
+  def AddClientKeywords(self, client_id, keywords):
+    now = rdfvalue.RDFDatetime.Now()
+    self._Update(ClientPostingLists.AddClientKeywords, client_id,
+                 {keyword: now for keyword in keywords})
+
+  @utils.Synchronized
+  def RemoveClientKeywords(self, client_id, keywords):
+    self._Update(ClientPostingLists.RemoveClientKeywords, client_id,
+                 list(keywords))
+
+
+IN_MEMORY_INDEX = InMemoryClientIndex()
+
+
+def _ExactClause(keyword):
+  clause = QueryClause()
+  clause.terms.append((utils.SmartStr(keyword), False))
+  return clause
+
+
 class ClientIndex(object):
   """An index of client machines."""
 
@@ -351,14 +829,50 @@ class ClientIndex(object):
 
     return start_time, filtered_keywords
 
+  def _ParseQuery(self, keywords):
+    """Parses a list of keywords into a list of QueryClause objects."""
+    if not config.CONFIG["Server.client_search_operators"]:
+      return [_ExactClause(self._NormalizeKeyword(k)) for k in keywords]
+
+    clauses = []
+    join = False
+    for keyword in keywords:
+      if keyword == "OR" and clauses and not join:
+        join = True
+        continue
+
+      negated = False
+      if not join and len(keyword) > 1 and keyword.startswith("-"):
+        negated = True
+        keyword = keyword[1:]
+
+      prefix = len(keyword) > 1 and keyword.endswith("*")
+      if prefix:
+        keyword = keyword[:-1]
+
+      if not join:
+        clauses.append(QueryClause(negated=negated))
+      clauses[-1].terms.append(
+          (utils.SmartStr(self._NormalizeKeyword(keyword)), prefix))
+      join = False
+
+    return clauses
+
   def LookupClients(self, keywords):
-    """Returns a list of client URNs associated with keywords.
+    """Returns a list of client ids associated with keywords.
+
+    All keywords have to match. When the in-memory index and
+    Server.client_search_operators are enabled, the keywords can also be
+    combined as in ["host:web*", "OR", "label:db", "-windows"]: "OR" between
+    two keywords matches either of them, a leading "-" excludes clients
+    matching the keyword (or the "OR" group it starts) and a trailing "*"
+    matches all keywords starting with the given prefix.
 
     Args:
       keywords: The list of keywords to search by.
 
     Returns:
-      A list of client URNs.
+      A list of client ids.
 
     Raises:
       ValueError: A string (single keyword) was passed instead of an iterable.
@@ -369,6 +883,10 @@ class ClientIndex(object):
 
     start_time, filtered_keywords = self._AnalyzeKeywords(keywords)
 
+    if config.CONFIG["Server.in_memory_client_index"]:
+      clauses = self._ParseQuery(filtered_keywords)
+      return sorted(IN_MEMORY_INDEX.Query(clauses, start_time=start_time))
+
     keyword_map = data_store.REL_DB.ListClientsForKeywords(
         list(map(self._NormalizeKeyword, filtered_keywords)),
         start_time=start_time)
@@ -395,6 +913,10 @@ class ClientIndex(object):
 
     start_time, filtered_keywords = self._AnalyzeKeywords(keywords)
 
+    if config.CONFIG["Server.in_memory_client_index"]:
+      return IN_MEMORY_INDEX.ReadPostingLists(
+          filtered_keywords, start_time=start_time)
+
     return data_store.REL_DB.ListClientsForKeywords(
         filtered_keywords, start_time=start_time)
 
@@ -493,6 +1015,7 @@ class ClientIndex(object):
     keywords.add(self._NormalizeKeyword(client.client_id))
 
     data_store.REL_DB.AddClientKeywords(client.client_id, keywords)
+    IN_MEMORY_INDEX.AddClientKeywords(client.client_id, keywords)
 
   def AddClientLabels(self, client_id, labels):
     keywords = set()
@@ -501,7 +1024,10 @@ class ClientIndex(object):
       keywords.add(keyword_string)
       keywords.add("label:" + keyword_string)
 
-    data_store.REL_DB.AddClientKeywords(client_id, keywords)
+    # CHANGED_KEYWORD lets other processes' in-memory indexes know about the
+    # new labels.
+    data_store.REL_DB.AddClientKeywords(client_id, keywords | {CHANGED_KEYWORD})
+    IN_MEMORY_INDEX.AddClientKeywords(client_id, keywords)
 
   def RemoveAllClientLabels(self, client_id):
     """Removes all labels for a given client.
@@ -520,12 +1046,34 @@ class ClientIndex(object):
       client_id: The client_id.
       labels: A list of labels to remove.
     """
+    keywords = []
     for label in labels:
       keyword = self._NormalizeKeyword(utils.SmartStr(label))
       # This might actually delete a keyword with the same name as the label (if
       # there is one).
       data_store.REL_DB.RemoveClientKeyword(client_id, keyword)
       data_store.REL_DB.RemoveClientKeyword(client_id, "label:%s" % keyword)
+      keywords.extend([keyword, "label:%s" % keyword])
+
+    if keywords:
+      # Lets other processes' in-memory indexes know about the removal.
+      data_store.REL_DB.AddClientKeywords(client_id, [CHANGED_KEYWORD])
+    IN_MEMORY_INDEX.RemoveClientKeywords(client_id, keywords)
+
+  def RemoveClient(self, client_id):
+    """Removes a client from the index.
+
+    The client is no longer found by any search, until it's added again.
+
+    Args:
+      client_id: The client_id.
+    """
+    keywords = list(
+        data_store.REL_DB.MultiReadClientKeywords([client_id])[client_id])
+    for keyword in keywords:
+      data_store.REL_DB.RemoveClientKeyword(client_id, keyword)
+    data_store.REL_DB.AddClientKeywords(client_id, [CHANGED_KEYWORD])
+    IN_MEMORY_INDEX.RemoveClientKeywords(client_id, keywords)
 
 
 def BulkLabel(label, hostnames, owner=None, token=None, client_index=None):
@@ -3,6 +3,7 @@
 from __future__ import unicode_literals
 
 import socket
+import threading
 
 
 from builtins import range  # pylint: disable=redefined-builtin
@@ -11,6 +12,7 @@ from future.utils import iterkeys
 
 from grr_response_core.lib import flags
 from grr_response_core.lib import ipv6_utils
+from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_server import aff4
@@ -432,6 +434,36 @@ class ClientIndexTest(aff4_test_lib.AFF4ObjectTest):
     self.assertEqual(index.LookupClients(["testlabel_1"]), [])
     self.assertEqual(index.LookupClients(["testlabel_2"]), [])
 
+  def testStartTimeIsCheckedPerKeyword(self):
+    index = client_index.ClientIndex()
+    client_id, client = next(iteritems(self._SetupClients(1)))
+    data_store.REL_DB.WriteClientMetadata(client_id, fleetspeak_enabled=False)
+
+    # 1413807132 = Mon, 20 Oct 2014 12:12:12 GMT
+    with test_lib.FakeTime(1413807132):
+      index.AddClient(client)
+    with test_lib.FakeTime(1413807132 + 2 * 24 * 3600):
+      index.AddClientLabels(client_id, ["new"])
+
+    self.assertEqual(
+        index.LookupClients(["label:new", "start_date:2014-10-21"]),
+        [client_id])
+    self.assertEqual(
+        index.LookupClients(["host-1", "start_date:2014-10-21"]), [])
+    self.assertEqual(
+        index.LookupClients(["host-1", "label:new", "start_date:2014-10-21"]),
+        [])
+
+  def testSearchOperatorsAreKeywords(self):
+    index = client_index.ClientIndex()
+    client_id, client = next(iteritems(self._SetupClients(1)))
+    data_store.REL_DB.WriteClientMetadata(client_id, fleetspeak_enabled=False)
+    index.AddClient(client)
+
+    self.assertEqual(index.LookupClients(["host-1", "OR", "host-2"]), [])
+    self.assertEqual(index.LookupClients(["host-*"]), [])
+    self.assertEqual(index.LookupClients(["windows", "-host-2"]), [])
+
   def _HostsHaveLabel(self, expected_hosts, label, index):
     client_ids = index.LookupClients(["label:%s" % label])
     client_data = data_store.REL_DB.MultiReadClientSnapshot(client_ids)
@@ -445,6 +477,200 @@ class ClientIndexTest(aff4_test_lib.AFF4ObjectTest):
     self.assertItemsEqual(expected_hosts, labelled_hosts)
 
 
+class ClientIndexWithInMemoryIndexTest(ClientIndexTest):
+  """Runs the ClientIndex tests against the in-memory index."""
+
+  def setUp(self):
+    super(ClientIndexWithInMemoryIndexTest, self).setUp()
+    self.config_overrider = test_lib.ConfigOverrider({
+        "Server.in_memory_client_index": True
+    })
+    self.config_overrider.Start()
+
+  def tearDown(self):
+    self.config_overrider.Stop()
+    super(ClientIndexWithInMemoryIndexTest, self).tearDown()
+
+
+class PostingListTest(test_lib.GRRBaseTest):
+
+  def testEncodesSortedUniqueIds(self):
+    ids = [0, 1, 127, 128, 300, 2**40, 5, 5, 1]
+    posting_list = client_index.PostingList(ids)
+
+    self.assertEqual(len(posting_list), 7)
+    self.assertEqual(posting_list.Decode(), sorted(set(ids)))
+    self.assertEqual(posting_list.Decode(max_id=128), [0, 1, 5, 127, 128])
+
+  def testAddAndRemove(self):
+    posting_list = client_index.PostingList()
+    for value in [10, 20, 30]:
+      posting_list.Add(value)
+    # Out of order and duplicate additions.
+    posting_list.Add(15)
+    posting_list.Add(20)
+    posting_list.Add(0)
+
+    self.assertEqual(posting_list.Decode(), [0, 10, 15, 20, 30])
+
+    posting_list.Remove(15)
+    posting_list.Remove(30)
+    posting_list.Remove(42)
+    self.assertEqual(posting_list.Decode(), [0, 10, 20])
+    self.assertEqual(len(posting_list), 3)
+
+    posting_list.Add(25)
+    self.assertEqual(posting_list.Decode(), [0, 10, 20, 25])
+
+
+class InMemoryClientIndexTest(aff4_test_lib.AFF4ObjectTest):
+
+  def setUp(self):
+    super(InMemoryClientIndexTest, self).setUp()
+    self.config_overrider = test_lib.ConfigOverrider({
+        "Server.in_memory_client_index": True,
+        "Server.client_search_operators": True
+    })
+    self.config_overrider.Start()
+
+  def tearDown(self):
+    self.config_overrider.Stop()
+    super(InMemoryClientIndexTest, self).tearDown()
+
+  def _SetupClients(self, n):
+    index = client_index.ClientIndex()
+    client_ids = []
+    for i in range(1, n + 1):
+      client_id = "C.100000000000000%d" % i
+      client = rdf_objects.ClientSnapshot(client_id=client_id)
+      client.knowledge_base.os = "Windows" if i % 2 else "Linux"
+      client.knowledge_base.fqdn = "host-%d.example.com" % i
+      data_store.REL_DB.WriteClientMetadata(client_id, fleetspeak_enabled=False)
+      index.AddClient(client)
+      client_ids.append(client_id)
+    return index, client_ids
+
+  def testPrefixQueries(self):
+    index, (c1, c2, c3) = self._SetupClients(3)
+
+    self.assertEqual(index.LookupClients(["host-*"]), [c1, c2, c3])
+    self.assertEqual(index.LookupClients(["HOST:host-2*"]), [c2])
+    self.assertEqual(index.LookupClients(["c.10000000000000*"]), [c1, c2, c3])
+    self.assertEqual(index.LookupClients(["nothing*"]), [])
+
+  def testBooleanQueries(self):
+    index, (c1, c2, c3) = self._SetupClients(3)
+    index.AddClientLabels(c1, ["web"])
+
+    self.assertEqual(index.LookupClients(["host-1", "OR", "host-3"]), [c1, c3])
+    self.assertEqual(index.LookupClients(["windows", "-host-1"]), [c3])
+    self.assertEqual(index.LookupClients(["-label:web"]), [c2, c3])
+    self.assertEqual(index.LookupClients(["-host-1", "OR", "host-2"]), [c3])
+    self.assertEqual(
+        index.LookupClients(["label:web", "OR", "linux", "-host-2*"]), [c1])
+    self.assertEqual(
+        index.LookupClients(["label:web", "OR", "linux", "host-*"]), [c1, c2])
+    self.assertEqual(index.LookupClients(["windows", "missing"]), [])
+    self.assertEqual(index.LookupClients(["windows", "-missing"]), [c1, c3])
+
+  def testIndexIsUpdatedIncrementally(self):
+    index, (c1, c2) = self._SetupClients(2)
+    self.assertEqual(index.LookupClients(["label:db"]), [])
+
+    index.AddClientLabels(c2, ["db"])
+    self.assertEqual(index.LookupClients(["label:db"]), [c2])
+
+    index.RemoveClientLabels(c2, ["db"])
+    self.assertEqual(index.LookupClients(["label:db"]), [])
+
+    # Keywords written by other processes show up after a refresh.
+    data_store.REL_DB.AddClientKeywords(c1, [".", "foo"])
+    self.assertEqual(index.LookupClients(["foo"]), [])
+
+    with test_lib.FakeTime(rdfvalue.RDFDatetime.Now() + rdfvalue.Duration(
+        "%ds" % client_index.InMemoryClientIndex.REFRESH_INTERVAL)):
+      self.assertEqual(index.LookupClients(["foo"]), [c1])
+
+  def _AfterRefresh(self):
+    return test_lib.FakeTime(rdfvalue.RDFDatetime.Now() + rdfvalue.Duration(
+        "%ds" % client_index.InMemoryClientIndex.REFRESH_INTERVAL))
+
+  def testRemovalsByOtherProcessesShowUpAfterRefresh(self):
+    index, (c1, c2) = self._SetupClients(2)
+    index.AddClientLabels(c1, ["db"])
+    self.assertEqual(index.LookupClients(["label:db"]), [c1])
+    self.assertEqual(index.LookupClients(["."]), [c1, c2])
+
+    # Another process doesn't update our in-memory index.
+    with utils.Stubber(client_index.IN_MEMORY_INDEX, "RemoveClientKeywords",
+                       lambda *_: None):
+      index.RemoveClientLabels(c1, ["db"])
+      index.RemoveClient(c2)
+
+    self.assertEqual(index.LookupClients(["label:db"]), [c1])
+    self.assertEqual(index.LookupClients(["."]), [c1, c2])
+
+    with self._AfterRefresh():
+      self.assertEqual(index.LookupClients(["label:db"]), [])
+      self.assertEqual(index.LookupClients(["."]), [c1])
+      self.assertEqual(index.LookupClients(["-host-1"]), [])
+
+    # Until it's added again, a removed client isn't found after a rebuild
+    # either.
+    client_index.IN_MEMORY_INDEX.Invalidate()
+    self.assertEqual(index.LookupClients(["host-*"]), [c1])
+
+  def testLabelsAddedByOtherProcessesShowUpAfterRefresh(self):
+    index, (c1, _) = self._SetupClients(2)
+    self.assertEqual(index.LookupClients(["label:db"]), [])
+
+    # Another process doesn't update our in-memory index.
+    with utils.Stubber(client_index.IN_MEMORY_INDEX, "AddClientKeywords",
+                       lambda *_: None):
+      index.AddClientLabels(c1, ["db"])
+
+    self.assertEqual(index.LookupClients(["label:db"]), [])
+
+    with self._AfterRefresh():
+      self.assertEqual(index.LookupClients(["label:db"]), [c1])
+      self.assertEqual(index.LookupClients(["db"]), [c1])
+
+  def testIndexIsBuiltWithoutHoldingTheLock(self):
+    index, (c1, c2) = self._SetupClients(2)
+    client_index.IN_MEMORY_INDEX.Invalidate()
+
+    multi_read_client_keywords = data_store.REL_DB.MultiReadClientKeywords
+
+    def MultiReadClientKeywords(client_ids):
+      result = multi_read_client_keywords(client_ids)
+      # Another thread changes the index while it's being built, the change
+      # has to make it into the new index.
+      thread = threading.Thread(
+          target=index.AddClientLabels, args=(c2, ["db"]))
+      thread.start()
+      thread.join(10)
+      self.assertFalse(thread.is_alive())
+      return result
+
+    with utils.Stubber(data_store.REL_DB, "MultiReadClientKeywords",
+                       MultiReadClientKeywords):
+      self.assertEqual(index.LookupClients(["label:db"]), [c2])
+
+    self.assertEqual(index.LookupClients(["host-1"]), [c1])
+
+  def testReadClientPostingLists(self):
+    index, (c1, c2, c3) = self._SetupClients(3)
+
+    self.assertEqual(
+        index.ReadClientPostingLists(["linux", "host:host-3", "missing"]), {
+            "linux": [c2],
+            "host:host-3": [c3],
+            "missing": []
+        })
+    self.assertEqual(
+        index.ReadClientPostingLists(["windows"])["windows"], [c1, c3])
+
+
 def main(argv):
   test_lib.main(argv)
 
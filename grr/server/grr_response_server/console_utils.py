@@ -289,6 +289,7 @@ def ApprovalRevokeRaw(aff4_path, token):
       approval_urn, mode="rw", token=super_token)
   approval_request.DeleteAttribute(approval_request.Schema.APPROVER)
   approval_request.Close()
+  access_control.NotifyApprovalsChanged()
 
 
 def ClientIdToHostname(client_id, token=None):
@@ -3,6 +3,8 @@
 """An implementation of a data store based on mysql."""
 from __future__ import division
 
+import collections
+import itertools
 import logging
 import os
 import Queue
@@ -177,6 +179,13 @@ class MySQLAdvancedDataStore(data_store.DataStore):
     self.max_values_per_query = config.CONFIG["Mysql.max_values_per_query"]
     self.max_retries = config.CONFIG["Mysql.max_retries"]
 
+    self.bulk_writes = config.CONFIG["Mysql.bulk_writes"]
+    self.bulk_write_batch_size = config.CONFIG["Mysql.bulk_write_batch_size"]
+    self.bulk_write_connections = config.CONFIG["Mysql.bulk_write_connections"]
+    # Maps (query prefix, row template, row count) to query text, so that the
+    # text of the (mostly full-sized) bulk statements is only built once.
+    self._bulk_queries = {}
+
     super(MySQLAdvancedDataStore, self).__init__()
 
   def Initialize(self):
@@ -427,7 +436,12 @@ class MySQLAdvancedDataStore(data_store.DataStore):
 
         # Replacing means to delete all versions of the attribute first.
         if replace or attribute in to_delete:
-          existing = self._CountExistingRows(subject, attribute)
+          # In the bulk write mode, the deletes are batched on flush without
+          # looking for existing rows first.
+          if self.bulk_writes and not sync:
+            existing = True
+          else:
+            existing = self._CountExistingRows(subject, attribute)
           if existing:
             to_replace.append([subject, attribute, data, entry_timestamp])
           else:
@@ -486,6 +500,10 @@ class MySQLAdvancedDataStore(data_store.DataStore):
       self.to_replace = []
       self.to_insert = []
 
+    if self.bulk_writes:
+      self._BulkWrite(to_replace, to_insert)
+      return
+
     transaction = []
     if to_replace:
       transaction.extend(self._BuildReplaces(to_replace))
@@ -494,6 +512,128 @@ class MySQLAdvancedDataStore(data_store.DataStore):
     if transaction:
       self._ExecuteTransaction(transaction)
 
+  def _BulkWrite(self, to_replace, to_insert):
+    """Writes buffered rows using multi-row statements.
+
+    Rows are partitioned by subject and each partition is written in its own
+    transaction, concurrently on separate pooled connections. Within a
+    partition, existing versions of replaced attributes are deleted first,
+    then all the rows are inserted, both in batches of up to
+    Mysql.bulk_write_batch_size rows per statement.
+
+    Args:
+      to_replace: A list of [subject, attribute, data, timestamp] rows
+          replacing all existing versions of their attributes.
+      to_insert: A list of [subject, attribute, data, timestamp] rows to add.
+    """
+    if not to_replace and not to_insert:
+      return
+
+    # As in _BuildReplaces, only the last value of a replaced attribute is
+    # kept.
+    replaced = collections.OrderedDict()
+    for subject, attribute, data, timestamp in to_replace:
+      replaced[(subject, attribute)] = [subject, attribute, data, timestamp]
+
+    partition_count = max(1, self.bulk_write_connections)
+    partitions = [([], []) for _ in range(partition_count)]
+    for row in itervalues(replaced):
+      partitions[hash(row[0]) % partition_count][0].append(row)
+    for row in to_insert:
+      partitions[hash(row[0]) % partition_count][1].append(row)
+
+    # The subjects and attributes indices are shared by all partitions, so
+    # they are updated up front to avoid lock contention between them.
+    self._ExecuteQueries(
+        self._BuildBulkIndexInserts(
+            itertools.chain(itervalues(replaced), to_insert)))
+
+    transactions = []
+    for partition_replace, partition_insert in partitions:
+      transaction = self._BuildBulkDeletes(partition_replace)
+      transaction.extend(
+          self._BuildBulkInserts(partition_replace + partition_insert))
+      if transaction:
+        transactions.append(transaction)
+
+    self._ExecuteTransactions(transactions)
+
+  def _BulkQuery(self, prefix, row_template, row_count, separator=", "):
+    """Returns the text of a statement with a given number of rows."""
+    key = (prefix, row_template, row_count, separator)
+    try:
+      return self._bulk_queries[key]
+    except KeyError:
+      query = prefix + separator.join([row_template] * row_count)
+      self._bulk_queries[key] = query
+      return query
+
+  def _BatchRows(self, rows, size_fn=None):
+    """Splits rows into batches that fit into a single statement."""
+    batch = []
+    batch_size = 0
+    for row in rows:
+      batch.append(row)
+      if size_fn is not None:
+        batch_size += size_fn(row)
+      if (len(batch) >= self.bulk_write_batch_size or
+          batch_size > self.max_query_size):
+        yield batch
+        batch = []
+        batch_size = 0
+
+    if batch:
+      yield batch
+
+  def _BuildBulkIndexInserts(self, rows):
+    """Builds statements adding subjects and attributes of rows to indices."""
+    subjects = set()
+    attributes = set()
+    for subject, attribute, _, _ in rows:
+      subjects.add(subject)
+      attributes.add(attribute)
+
+    queries = []
+    for table, names in (("attributes", attributes), ("subjects", subjects)):
+      for batch in self._BatchRows(sorted(names), size_fn=len):
+        args = []
+        for name in batch:
+          args.extend([name, name])
+        query = self._BulkQuery(
+            "INSERT IGNORE INTO %s (hash, %s) VALUES " % (table, table[:-1]),
+            "(unhex(md5(%s)), %s)", len(batch))
+        queries.append(dict(query=query, args=args))
+    return queries
+
+  def _BuildBulkDeletes(self, rows):
+    """Builds statements deleting all versions of attributes of rows."""
+    queries = []
+    for batch in self._BatchRows(rows):
+      args = []
+      for subject, attribute, _, _ in batch:
+        args.extend([subject, attribute])
+      query = self._BulkQuery(
+          "DELETE FROM aff4 WHERE ",
+          "(subject_hash=unhex(md5(%s)) AND attribute_hash=unhex(md5(%s)))",
+          len(batch),
+          separator=" OR ")
+      queries.append(dict(query=query, args=args))
+    return queries
+
+  def _BuildBulkInserts(self, rows):
+    """Builds statements inserting rows into the aff4 table."""
+    queries = []
+    for batch in self._BatchRows(rows, size_fn=lambda row: len(row[2])):
+      args = []
+      for subject, attribute, data, timestamp in batch:
+        args.extend([subject, attribute, timestamp, data])
+      query = self._BulkQuery(
+          "INSERT INTO aff4 (subject_hash, attribute_hash, timestamp, value) "
+          "VALUES ", "(unhex(md5(%s)), unhex(md5(%s)), %s, unhex(%s))",
+          len(batch))
+      queries.append(dict(query=query, args=args))
+    return queries
+
   def _BuildReplaces(self, values):
     transaction = []
     updates = {}
@@ -636,6 +776,33 @@ class MySQLAdvancedDataStore(data_store.DataStore):
 
     return self._RetryWrapper(Action)
 
+  def _ExecuteTransactions(self, transactions):
+    """Executes independent transactions concurrently on pooled connections."""
+    if len(transactions) == 1:
+      self._ExecuteTransaction(transactions[0])
+      return
+
+    errors = []
+
+    def Worker(transaction):
+      try:
+        self._ExecuteTransaction(transaction)
+      except Exception as e:  # pylint: disable=broad-except
+        errors.append(e)
+
+    writers = []
+    for transaction in transactions:
+      writer = threading.Thread(
+          target=Worker, args=(transaction,), name="MySQLBulkWriter")
+      writer.start()
+      writers.append(writer)
+
+    for writer in writers:
+      writer.join()
+
+    if errors:
+      raise errors[0]
+
   def _CalculateAttributeStorageTypes(self):
     """Build a mapping between column names and types."""
     self.attribute_types = {}
@@ -1,10 +1,16 @@
 #!/usr/bin/env python
 """Benchmark tests for MySQL advanced data store."""
 
+import time
+
+from builtins import range  # pylint: disable=redefined-builtin
 
 from grr_response_core.lib import flags
+from grr_response_core.lib import utils
+from grr_response_server import data_store
 from grr_response_server import data_store_test
 from grr_response_server.data_stores import mysql_advanced_data_store_test
+from grr.test_lib import benchmark_test_lib
 from grr.test_lib import test_lib
 
 
@@ -20,6 +26,45 @@ class MysqlAdvancedDataStoreCSVBenchmarks(
   """Benchmark the mysql data store abstraction."""
 
 
+class MysqlAdvancedDataStoreWriteBenchmarks(
+    mysql_advanced_data_store_test.MysqlAdvancedTestMixin,
+    benchmark_test_lib.MicroBenchmarks):
+  """Benchmark writing mutation pools with and without bulk writes."""
+
+  units = "s"
+
+  SUBJECTS = 2000
+  ATTRIBUTES = 5
+  VALUE_SIZE = 100
+
+  def setUp(self):
+    super(MysqlAdvancedDataStoreWriteBenchmarks, self).setUp()
+    data_store.DB.ClearTestDB()
+
+  def _WritePool(self, name):
+    value = "x" * self.VALUE_SIZE
+
+    start = time.time()
+    with data_store.DB.GetMutationPool() as pool:
+      for i in range(self.SUBJECTS):
+        subject = "aff4:/benchmark/%s/subject%d" % (name, i)
+        values = {}
+        for j in range(self.ATTRIBUTES):
+          values["metadata:attribute%d" % j] = [value]
+        pool.MultiSet(subject, values)
+    elapsed = time.time() - start
+
+    self.AddResult("%s (writes/s)" % name,
+                   self.SUBJECTS * self.ATTRIBUTES / elapsed,
+                   self.SUBJECTS * self.ATTRIBUTES)
+
+  def testMutationPoolWrites(self):
+    """Number of attributes written per second through a mutation pool."""
+    self._WritePool("Regular writes")
+    with utils.Stubber(data_store.DB, "bulk_writes", True):
+      self._WritePool("Bulk writes")
+
+
 def main(args):
   test_lib.main(args)
 
@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 """Tests the mysql data store."""
 
+from builtins import range  # pylint: disable=redefined-builtin
+
 from grr_response_core.lib import flags
+from grr_response_core.lib import utils
 from grr_response_server import data_store
 from grr_response_server import data_store_test
 from grr_response_server.data_stores import mysql_advanced_data_store
@@ -36,6 +39,42 @@ class MysqlAdvancedDataStoreTest(data_store_test.DataStoreTestMixin,
       self.fail("GRR needs MySQL >= 5.6")
 
 
+class MysqlAdvancedBulkWritesDataStoreTest(data_store_test.DataStoreTestMixin,
+                                           MysqlAdvancedTestMixin,
+                                           test_lib.GRRBaseTest):
+  """Test the mysql data store abstraction with bulk writes enabled."""
+
+  def setUp(self):
+    super(MysqlAdvancedBulkWritesDataStoreTest, self).setUp()
+    bulk_writes_stubber = utils.Stubber(data_store.DB, "bulk_writes", True)
+    bulk_writes_stubber.Start()
+    self.addCleanup(bulk_writes_stubber.Stop)
+
+    # Small batches, so that the tests write multiple statements.
+    batch_size_stubber = utils.Stubber(data_store.DB, "bulk_write_batch_size",
+                                       3)
+    batch_size_stubber.Start()
+    self.addCleanup(batch_size_stubber.Stop)
+
+  def testBulkWritesReplaceExistingValues(self):
+    subject = "aff4:/bulk/subject"
+    with data_store.DB.GetMutationPool() as pool:
+      for i in range(10):
+        pool.Set(subject, "metadata:attribute%d" % i, "foo", timestamp=1000)
+
+    with data_store.DB.GetMutationPool() as pool:
+      for i in range(10):
+        pool.Set(subject, "metadata:attribute%d" % i, "bar", timestamp=2000)
+
+    for i in range(10):
+      values = list(
+          data_store.DB.ResolvePrefix(
+              subject,
+              "metadata:attribute%d" % i,
+              timestamp=data_store.DB.ALL_TIMESTAMPS))
+      self.assertEqual(values, [("metadata:attribute%d" % i, "bar", 2000)])
+
+
 def main(args):
   test_lib.main(args)
 
@@ -36,10 +36,14 @@ class InMemoryDB(mem_blobs.InMemoryDBBlobsMixin,
     super(InMemoryDB, self).__init__()
     self._Init()
     self.lock = threading.RLock()
+    self.handler_wakeup = threading.Event()
 
   def _Init(self):
     self.approvals_by_username = {}
     self.clients = {}
+    # Maps client ids to the keywords associated with them, the inverse of
+    # self.keywords.
+    self.client_keywords = {}
     self.client_messages = {}
     self.client_message_leases = {}
     self.crash_history = {}
@@ -53,6 +57,7 @@ class InMemoryDB(mem_blobs.InMemoryDBBlobsMixin,
     self.message_handler_requests = {}
     self.metadatas = {}
     self.notifications_by_username = {}
+    self.results = {}
     self.startup_history = {}
     # TODO(hanuszczak): Consider chaning this to nested dicts for improved
     # debugging experience.
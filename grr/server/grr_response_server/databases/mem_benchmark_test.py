@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+"""Benchmark tests for the in memory database."""
+
+
+from grr_response_core.lib import flags
+from grr_response_server import db_test_mixin
+from grr_response_server.databases import mem
+from grr.test_lib import benchmark_test_lib
+from grr.test_lib import test_lib
+
+
+class MemoryDBBenchmarks(db_test_mixin.DatabaseBenchmarkMixin,
+                         benchmark_test_lib.MicroBenchmarks):
+  """Benchmark the in memory database."""
+
+  def CreateDatabase(self):
+    return mem.InMemoryDB(), None
+
+
+def main(args):
+  test_lib.main(args)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
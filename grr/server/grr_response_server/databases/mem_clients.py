@@ -176,9 +176,11 @@ class InMemoryDBClientMixin(object):
       raise db.UnknownClientError(client_id)
 
     keywords = [utils.SmartStr(k) for k in keywords]
+    client_keywords = self.client_keywords.setdefault(client_id, {})
     for k in keywords:
       self.keywords.setdefault(k, {})
       self.keywords[k][client_id] = rdfvalue.RDFDatetime.Now()
+      client_keywords[k] = self.keywords[k][client_id]
 
   @utils.Synchronized
   def ListClientsForKeywords(self, keywords, start_time=None):
@@ -202,6 +204,15 @@ class InMemoryDBClientMixin(object):
     """Removes the association of a particular client to a keyword."""
     if keyword in self.keywords and client_id in self.keywords[keyword]:
       del self.keywords[keyword][client_id]
+      del self.client_keywords[client_id][keyword]
+
+  @utils.Synchronized
+  def MultiReadClientKeywords(self, client_ids):
+    """Reads the keywords associated with a list of clients."""
+    return {
+        client_id: dict(self.client_keywords.get(client_id, {}))
+        for client_id in client_ids
+    }
 
   @utils.Synchronized
   def AddClientLabels(self, client_id, owner, labels):
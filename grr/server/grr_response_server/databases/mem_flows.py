@@ -9,6 +9,7 @@ from future.utils import itervalues
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_server import db_utils
 
 
@@ -24,6 +25,7 @@ class InMemoryDBFlowMixin(object):
       cloned_request = r.Copy()
       cloned_request.timestamp = now
       flow_dict[cloned_request.request_id] = cloned_request
+    self.handler_wakeup.set()
 
   @utils.Synchronized
   def ReadMessageHandlerRequests(self):
@@ -66,20 +68,30 @@ class InMemoryDBFlowMixin(object):
     """Unregisters any registered message handler."""
     if self.handler_thread:
       self.handler_stop = True
+      self.handler_wakeup.set()
       self.handler_thread.join()
       self.handler_thread = None
 
   def _MessageHandlerLoop(self, handler, lease_time, limit):
+    """Leases and handles requests until the handler is unregistered."""
+    scheduler = db_utils.MessageHandlerLeaseScheduler(
+        lease_time, limit, max_poll_interval=0.2)
     while not self.handler_stop:
+      self.handler_wakeup.clear()
       try:
-        msgs = self._LeaseMessageHandlerRequests(lease_time, limit)
+        msgs = self._LeaseMessageHandlerRequests(lease_time,
+                                                 scheduler.batch_size)
         if msgs:
+          start = time.time()
           handler(msgs)
-        else:
-          time.sleep(0.2)
+          scheduler.RecordBatch(len(msgs), time.time() - start)
+          continue
       except Exception as e:  # pylint: disable=broad-except
         logging.exception("_LeaseMessageHandlerRequests raised %s.", e)
 
+      if self.handler_wakeup.wait(scheduler.NextPollInterval()):
+        scheduler.Reset()
+
   @utils.Synchronized
   def _LeaseMessageHandlerRequests(self, lease_time, limit):
     """Read and lease some outstanding message handler requests."""
@@ -173,3 +185,26 @@ class InMemoryDBFlowMixin(object):
     for m in messages:
       client_id = db_utils.ClientIdFromGrrMessage(m)
       self.client_messages.setdefault(client_id, {})[m.task_id] = m
+
+  @utils.Synchronized
+  def WriteResults(self, collection_id, results):
+    """Appends results to a result collection of a flow or a hunt."""
+    now = rdfvalue.RDFDatetime.Now()
+    collection = self.results.setdefault(collection_id, [])
+    for result in results:
+      collection.append((now, result.SerializeToString()))
+
+  @utils.Synchronized
+  def ReadResults(self, collection_id, offset, count):
+    """Reads results from a result collection of a flow or a hunt."""
+    res = []
+    for timestamp, serialized in self.results.get(collection_id,
+                                                  [])[offset:offset + count]:
+      res.append(
+          rdf_flows.GrrMessage.FromSerializedString(serialized, age=timestamp))
+    return res
+
+  @utils.Synchronized
+  def CountResults(self, collection_id):
+    """Returns the number of results in a result collection."""
+    return len(self.results.get(collection_id, []))
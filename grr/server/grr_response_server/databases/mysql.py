@@ -8,6 +8,7 @@ import contextlib
 import logging
 import math
 import random
+import threading
 import time
 import warnings
 
@@ -94,8 +95,10 @@ class MysqlDB(mysql_blobs.MySQLDBBlobsMixin,
         self._MariaDBCompatibility(cursor)
         self._SetBinlogFormat(cursor)
         self._InitializeSchema(cursor)
+        self.max_allowed_packet = self._ReadMaxAllowedPacket(cursor)
     self.handler_thread = None
     self.handler_stop = True
+    self.handler_wakeup = threading.Event()
 
   def Close(self):
     self.pool.close()
@@ -131,6 +134,12 @@ class MysqlDB(mysql_blobs.MySQLDBBlobsMixin,
       cursor.execute("SET @@OLD_MODE = CONCAT(@@OLD_MODE, "
                      "',NO_DUP_KEY_WARNINGS_WITH_IGNORE');")
 
+  def _ReadMaxAllowedPacket(self, cursor):
+    """Reads the largest packet (and thus statement) accepted by the server."""
+    cursor.execute("SELECT @@max_allowed_packet")
+    max_allowed_packet, = cursor.fetchone()
+    return int(max_allowed_packet)
+
   def _InitializeSchema(self, cursor):
     """Initialize the database's schema."""
     for command in mysql_ddl.SCHEMA_SETUP:
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+"""Benchmark tests for the MySQL database.
+
+These run against the server configured through the MYSQL_TEST_* environment
+variables (a local MySQL or MariaDB instance is sufficient) and are skipped if
+it is not set up.
+"""
+
+
+from grr_response_core.lib import flags
+from grr_response_server import db_test_mixin
+from grr_response_server.databases import mysql_test
+from grr.test_lib import benchmark_test_lib
+from grr.test_lib import test_lib
+
+
+class MysqlDBBenchmarks(db_test_mixin.DatabaseBenchmarkMixin,
+                        benchmark_test_lib.MicroBenchmarks):
+  """Benchmark the MySQL database."""
+
+  def CreateDatabase(self):
+    return mysql_test.CreateTestDatabase()
+
+
+def main(args):
+  test_lib.main(args)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
@@ -1,21 +1,211 @@
 #!/usr/bin/env python
 """The MySQL database methods for blobs handling."""
 
+import threading
+
+from builtins import range  # pylint: disable=redefined-builtin
+from future.utils import iteritems
+import MySQLdb
+
+from grr_response_core.lib import utils
+from grr_response_server import db
+from grr_response_server.databases import mysql_utils
+from grr_response_server.rdfvalues import objects as rdf_objects
+
+# Blobs are stored split into chunks of at most this size, so that a single
+# row always fits into a packet regardless of the blob size.
+_BLOB_CHUNK_SIZE = 1024 * 1024
+
+# Number of bytes reserved in each packet for the statement text and the
+# escaping overhead of the values.
+_PACKET_OVERHEAD = 64 * 1024
+
+# Maximum number of rows in a single multi-row statement or `IN` query.
+_MAX_ROWS_PER_QUERY = 1000
+
+# Maximum number of transactions used concurrently by a single `WriteBlobs`
+# call. Kept below the connection pool size so that other callers are not
+# starved while a large batch is being written.
+_MAX_PARALLEL_WRITES = 4
+
+
+def _ChunkBlob(blob_id, blob_data, chunk_size):
+  """Yields (blob_id, chunk_index, chunk) rows for a single blob."""
+  # Empty blobs are stored as a single empty chunk so that they still exist.
+  if not blob_data:
+    yield blob_id, 0, b""
+    return
+
+  for chunk_index, offset in enumerate(range(0, len(blob_data), chunk_size)):
+    yield blob_id, chunk_index, blob_data[offset:offset + chunk_size]
+
+
+def _PartitionChunks(rows, max_batch_bytes):
+  """Groups chunk rows into batches that fit into a single packet."""
+  batch = []
+  batch_bytes = 0
+  for row in rows:
+    # Binary data is sent escaped, which in the worst case doubles its size.
+    row_bytes = 2 * len(row[2]) + 2 * len(row[0]) + 32
+    if batch and (batch_bytes + row_bytes > max_batch_bytes or
+                  len(batch) >= _MAX_ROWS_PER_QUERY):
+      yield batch
+      batch = []
+      batch_bytes = 0
+    batch.append(row)
+    batch_bytes += row_bytes
+  if batch:
+    yield batch
+
 
 class MySQLDBBlobsMixin(object):
   """MySQLDB mixin for blobs related functions."""
 
-  def WriteClientPathBlobReferences(self, references_by_path):
-    raise NotImplementedError()
+  @mysql_utils.WithTransaction()
+  def WriteClientPathBlobReferences(self,
+                                    references_by_client_path_id,
+                                    cursor=None):
+    """Writes blob references for given client path ids."""
+    values = []
+    for client_path_id, blob_refs in iteritems(references_by_client_path_id):
+      for blob_ref in blob_refs:
+        values.append([
+            mysql_utils.ClientIDToInt(client_path_id.client_id),
+            int(client_path_id.path_type),
+            client_path_id.path_id.AsBytes(),
+            blob_ref.offset,
+            blob_ref.size,
+            blob_ref.blob_id.AsBytes(),
+        ])
+
+    for batch in utils.Grouper(values, _MAX_ROWS_PER_QUERY):
+      query = ("INSERT INTO client_path_blob_references(client_id, path_type, "
+               "path_id, blob_offset, blob_size, blob_id) VALUES {} "
+               "ON DUPLICATE KEY UPDATE blob_size = VALUES(blob_size), "
+               "blob_id = VALUES(blob_id)").format(", ".join(
+                   ["(%s, %s, %s, %s, %s, %s)"] * len(batch)))
+      try:
+        cursor.execute(query, [value for row in batch for value in row])
+      except MySQLdb.IntegrityError as e:
+        raise db.AtLeastOneUnknownPathError(
+            list(references_by_client_path_id), cause=e)
 
-  def ReadClientPathBlobReferences(self, paths):
-    raise NotImplementedError()
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadClientPathBlobReferences(self, client_path_ids, cursor=None):
+    """Reads blob references of given client path ids."""
+    result = {cpid: [] for cpid in client_path_ids}
+    by_key = {(mysql_utils.ClientIDToInt(cpid.client_id), int(cpid.path_type),
+               cpid.path_id.AsBytes()): cpid for cpid in client_path_ids}
+
+    for batch in utils.Grouper(list(by_key), _MAX_ROWS_PER_QUERY):
+      query = ("SELECT client_id, path_type, path_id, blob_offset, blob_size, "
+               "blob_id FROM client_path_blob_references "
+               "WHERE (client_id, path_type, path_id) IN ({}) "
+               "ORDER BY client_id, path_type, path_id, blob_offset").format(
+                   ", ".join(["(%s, %s, %s)"] * len(batch)))
+      cursor.execute(query, [value for key in batch for value in key])
+
+      for (client_id, path_type, path_id, offset, size,
+           blob_id) in cursor.fetchall():
+        cpid = by_key[(client_id, path_type, path_id)]
+        result[cpid].append(
+            rdf_objects.BlobReference(
+                offset=offset,
+                size=size,
+                blob_id=rdf_objects.BlobID.FromBytes(blob_id)))
+
+    return result
 
   def WriteBlobs(self, blob_id_data_pairs):
-    raise NotImplementedError()
+    """Writes given blobs."""
+    max_batch_bytes = self.max_allowed_packet - _PACKET_OVERHEAD
+    chunk_size = min(_BLOB_CHUNK_SIZE, max_batch_bytes // 2)
+
+    # All chunks of a blob are written in the same transaction, so a blob is
+    # either fully present or missing. Each transaction holds about a packet
+    # worth of blobs, a single larger blob gets a transaction of its own.
+    transactions = []
+    rows = []
+    rows_bytes = 0
+    for blob_id, blob_data in iteritems(blob_id_data_pairs):
+      if rows and rows_bytes + 2 * len(blob_data) > max_batch_bytes:
+        transactions.append(rows)
+        rows = []
+        rows_bytes = 0
+      rows.extend(_ChunkBlob(blob_id.AsBytes(), blob_data, chunk_size))
+      rows_bytes += 2 * len(blob_data)
+    if rows:
+      transactions.append(rows)
+
+    if len(transactions) <= 1:
+      for rows in transactions:
+        self._WriteBlobChunks(rows, max_batch_bytes)
+      return
+
+    lock = threading.Lock()
+    pending = list(reversed(transactions))
+    errors = []
+
+    def Worker():
+      while True:
+        with lock:
+          if not pending or errors:
+            return
+          rows = pending.pop()
+        try:
+          self._WriteBlobChunks(rows, max_batch_bytes)
+        except Exception as e:  # pylint: disable=broad-except
+          with lock:
+            errors.append(e)
+          return
+
+    threads = [
+        threading.Thread(target=Worker, name="MysqlBlobWriter")
+        for _ in range(min(_MAX_PARALLEL_WRITES, len(transactions)))
+    ]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    if errors:
+      raise errors[0]
+
+  @mysql_utils.WithTransaction()
+  def _WriteBlobChunks(self, rows, max_batch_bytes, cursor=None):
+    """Writes blob chunks with multi-row statements fitting into a packet."""
+    for batch in _PartitionChunks(rows, max_batch_bytes):
+      query = ("INSERT IGNORE INTO blobs(blob_id, chunk_index, blob_chunk) "
+               "VALUES {}").format(", ".join(["(%s, %s, %s)"] * len(batch)))
+      cursor.execute(query, [value for row in batch for value in row])
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadBlobs(self, blob_ids, cursor=None):
+    """Reads given blobs."""
+    chunks_by_id = {}
+    for batch in utils.Grouper(blob_ids, _MAX_ROWS_PER_QUERY):
+      query = ("SELECT blob_id, chunk_index, blob_chunk FROM blobs "
+               "WHERE blob_id IN ({}) "
+               "ORDER BY blob_id, chunk_index").format(", ".join(
+                   ["%s"] * len(batch)))
+      cursor.execute(query, [blob_id.AsBytes() for blob_id in batch])
+      for blob_id, _, chunk in cursor.fetchall():
+        chunks_by_id.setdefault(blob_id, []).append(chunk)
+
+    result = {}
+    for blob_id in blob_ids:
+      chunks = chunks_by_id.get(blob_id.AsBytes())
+      result[blob_id] = None if chunks is None else b"".join(chunks)
+    return result
 
-  def ReadBlobs(self, blob_ids):
-    raise NotImplementedError()
+  @mysql_utils.WithTransaction(readonly=True)
+  def CheckBlobsExist(self, blob_ids, cursor=None):
+    """Checks if given blobs exist."""
+    existing = set()
+    for batch in utils.Grouper(blob_ids, _MAX_ROWS_PER_QUERY):
+      query = ("SELECT blob_id FROM blobs WHERE blob_id IN ({}) "
+               "AND chunk_index = 0").format(", ".join(["%s"] * len(batch)))
+      cursor.execute(query, [blob_id.AsBytes() for blob_id in batch])
+      existing.update(blob_id for blob_id, in cursor.fetchall())
 
-  def CheckBlobsExist(self, blob_ids):
-    raise NotImplementedError()
+    return {blob_id: blob_id.AsBytes() in existing for blob_id in blob_ids}
@@ -444,6 +444,25 @@ class MySQLDBClientMixin(object):
       result[keyword_mapping[kw]].append(mysql_utils.IntToClientID(cid))
     return result
 
+  @mysql_utils.WithTransaction(readonly=True)
+  def MultiReadClientKeywords(self, client_ids, cursor=None):
+    """Reads the keywords associated with a list of clients."""
+    ret = {client_id: {} for client_id in client_ids}
+    if not client_ids:
+      return ret
+
+    int_ids = [mysql_utils.ClientIDToInt(cid) for cid in client_ids]
+    query = ("SELECT client_id, keyword, timestamp "
+             "FROM client_keywords "
+             "WHERE client_id IN ({})").format(", ".join(
+                 ["%s"] * len(client_ids)))
+
+    cursor.execute(query, int_ids)
+    for client_id, keyword, timestamp in cursor.fetchall():
+      ret[mysql_utils.IntToClientID(client_id)][utils.SmartStr(keyword)] = (
+          mysql_utils.MysqlToRDFDatetime(timestamp))
+    return ret
+
   @mysql_utils.WithTransaction()
   def AddClientLabels(self, client_id, owner, labels, cursor=None):
     """Attaches a list of user labels to a client."""
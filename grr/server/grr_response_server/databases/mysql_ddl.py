@@ -108,6 +108,9 @@ CREATE TABLE IF NOT EXISTS message_handler_requests(
     leased_by VARCHAR(128),
     PRIMARY KEY (handlername, request_id)
 )""", """
+CREATE INDEX IF NOT EXISTS message_handler_requests_by_lease
+ON message_handler_requests(leased_until, leased_by)
+""", """
 CREATE TABLE IF NOT EXISTS foreman_rules(
     hunt_id VARCHAR(128),
     expiration_time DATETIME(6),
@@ -144,5 +147,73 @@ CREATE TABLE IF NOT EXISTS client_messages(
     leased_until DATETIME(6),
     leased_by VARCHAR(128),
     PRIMARY KEY (client_id, message_id)
+)""", """
+CREATE TABLE IF NOT EXISTS client_paths(
+    client_id BIGINT UNSIGNED,
+    path_type INT UNSIGNED,
+    path_id BINARY(32),
+    path BLOB,
+    depth INT UNSIGNED,
+    parent_path_id BINARY(32),
+    directory BOOL,
+    timestamp DATETIME(6),
+    last_stat_entry_timestamp DATETIME(6),
+    last_hash_entry_timestamp DATETIME(6),
+    PRIMARY KEY (client_id, path_type, path_id),
+    FOREIGN KEY (client_id) REFERENCES clients(client_id)
+)""", """
+CREATE INDEX IF NOT EXISTS client_paths_by_parent
+ON client_paths(client_id, path_type, parent_path_id)
+""", """
+CREATE INDEX IF NOT EXISTS client_paths_by_path
+ON client_paths(client_id, path_type, path(255))
+""", """
+CREATE TABLE IF NOT EXISTS client_path_stat_entries(
+    client_id BIGINT UNSIGNED,
+    path_type INT UNSIGNED,
+    path_id BINARY(32),
+    timestamp DATETIME(6),
+    stat_entry MEDIUMBLOB,
+    PRIMARY KEY (client_id, path_type, path_id, timestamp),
+    FOREIGN KEY (client_id, path_type, path_id)
+    REFERENCES client_paths(client_id, path_type, path_id)
+)""", """
+CREATE TABLE IF NOT EXISTS client_path_hash_entries(
+    client_id BIGINT UNSIGNED,
+    path_type INT UNSIGNED,
+    path_id BINARY(32),
+    timestamp DATETIME(6),
+    hash_entry MEDIUMBLOB,
+    PRIMARY KEY (client_id, path_type, path_id, timestamp),
+    FOREIGN KEY (client_id, path_type, path_id)
+    REFERENCES client_paths(client_id, path_type, path_id)
+)""", """
+CREATE TABLE IF NOT EXISTS client_path_blob_references(
+    client_id BIGINT UNSIGNED,
+    path_type INT UNSIGNED,
+    path_id BINARY(32),
+    blob_offset BIGINT UNSIGNED,
+    blob_size BIGINT UNSIGNED,
+    blob_id BINARY(32),
+    PRIMARY KEY (client_id, path_type, path_id, blob_offset),
+    FOREIGN KEY (client_id, path_type, path_id)
+    REFERENCES client_paths(client_id, path_type, path_id)
+)""", """
+CREATE TABLE IF NOT EXISTS blobs(
+    blob_id BINARY(32),
+    chunk_index INT UNSIGNED,
+    blob_chunk LONGBLOB,
+    PRIMARY KEY (blob_id, chunk_index)
+)""", """
+CREATE TABLE IF NOT EXISTS results(
+    collection_id VARCHAR(128),
+    result_id BIGINT UNSIGNED,
+    timestamp DATETIME(6),
+    result MEDIUMBLOB,
+    PRIMARY KEY (collection_id, result_id)
+)""", """
+CREATE TABLE IF NOT EXISTS result_counts(
+    collection_id VARCHAR(128) PRIMARY KEY,
+    count BIGINT UNSIGNED
 )"""
 ]
@@ -15,12 +15,44 @@ from grr_response_server import db_utils
 from grr_response_server.databases import mysql_utils
 from grr_response_server.rdfvalues import objects as rdf_objects
 
+# Number of bytes reserved in each packet for the statement text and the
+# escaping overhead of the values.
+_PACKET_OVERHEAD = 64 * 1024
+
+# Maximum number of rows in a single multi-row statement.
+_MAX_ROWS_PER_QUERY = 1000
+
+
+def _PartitionResults(rows, max_batch_bytes):
+  """Groups result rows into batches that fit into a single packet."""
+  batch = []
+  batch_bytes = 0
+  for row in rows:
+    # Binary data is sent escaped, which in the worst case doubles its size.
+    row_bytes = 2 * len(row[3]) + 2 * len(row[0]) + 64
+    if batch and (batch_bytes + row_bytes > max_batch_bytes or
+                  len(batch) >= _MAX_ROWS_PER_QUERY):
+      yield batch
+      batch = []
+      batch_bytes = 0
+    batch.append(row)
+    batch_bytes += row_bytes
+  if batch:
+    yield batch
+
 
 class MySQLDBFlowMixin(object):
   """MySQLDB mixin for flow handling."""
 
+  def WriteMessageHandlerRequests(self, requests):
+    """Writes a list of message handler requests to the database."""
+    self._WriteMessageHandlerRequests(requests)
+    # Wake up a message handler running in this process so that it doesn't
+    # have to wait for its next poll to pick up the new requests.
+    self.handler_wakeup.set()
+
   @mysql_utils.WithTransaction()
-  def WriteMessageHandlerRequests(self, requests, cursor=None):
+  def _WriteMessageHandlerRequests(self, requests, cursor=None):
     """Writes a list of message handler requests to the database."""
     query = ("INSERT IGNORE INTO message_handler_requests "
              "(handlername, timestamp, request_id, request) VALUES ")
@@ -80,20 +112,31 @@ class MySQLDBFlowMixin(object):
     """Unregisters any registered message handler."""
     if self.handler_thread:
       self.handler_stop = True
+      self.handler_wakeup.set()
       self.handler_thread.join()
       self.handler_thread = None
 
   def _MessageHandlerLoop(self, handler, lease_time, limit):
+    """Leases and handles requests until the handler is unregistered."""
+    scheduler = db_utils.MessageHandlerLeaseScheduler(lease_time, limit)
     while not self.handler_stop:
+      # Writes that happen while we are leasing must trigger another poll, so
+      # the event is cleared before the lease and not after it.
+      self.handler_wakeup.clear()
       try:
-        msgs = self._LeaseMessageHandlerRequests(lease_time, limit)
+        msgs = self._LeaseMessageHandlerRequests(lease_time,
+                                                 scheduler.batch_size)
         if msgs:
+          start = time.time()
           handler(msgs)
-        else:
-          time.sleep(5)
+          scheduler.RecordBatch(len(msgs), time.time() - start)
+          continue
       except Exception as e:  # pylint: disable=broad-except
         logging.exception("_LeaseMessageHandlerRequests raised %s.", e)
 
+      if self.handler_wakeup.wait(scheduler.NextPollInterval()):
+        scheduler.Reset()
+
   @mysql_utils.WithTransaction()
   def _LeaseMessageHandlerRequests(self, lease_time, limit, cursor=None):
     """Leases a number of message handler requests up to the indicated limit."""
@@ -233,3 +276,59 @@ class MySQLDBFlowMixin(object):
       cursor.execute(query, args)
     except MySQLdb.IntegrityError as e:
       raise db.UnknownClientError(cause=e)
+
+  @mysql_utils.WithTransaction()
+  def WriteResults(self, collection_id, results, cursor=None):
+    """Appends results to a result collection of a flow or a hunt."""
+    if not results:
+      return
+
+    # The counter row serializes concurrent writers to the same collection
+    # until the transaction commits, so result ids never have gaps. Its new
+    # value is passed back through LAST_INSERT_ID() to avoid a second lookup.
+    cursor.execute(
+        "INSERT INTO result_counts (collection_id, count) "
+        "VALUES (%s, LAST_INSERT_ID(%s)) "
+        "ON DUPLICATE KEY UPDATE count=LAST_INSERT_ID(count + VALUES(count))",
+        [collection_id, len(results)])
+    cursor.execute("SELECT LAST_INSERT_ID()")
+    (total_count,) = cursor.fetchone()
+    first_id = total_count - len(results)
+
+    now = mysql_utils.RDFDatetimeToMysqlString(rdfvalue.RDFDatetime.Now())
+
+    rows = [(collection_id, first_id + i, now, result.SerializeToString())
+            for i, result in enumerate(results)]
+    max_batch_bytes = self.max_allowed_packet - _PACKET_OVERHEAD
+    for batch in _PartitionResults(rows, max_batch_bytes):
+      query = ("INSERT INTO results "
+               "(collection_id, result_id, timestamp, result) "
+               "VALUES {}").format(", ".join(["(%s, %s, %s, %s)"] * len(batch)))
+      cursor.execute(query, [value for row in batch for value in row])
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadResults(self, collection_id, offset, count, cursor=None):
+    """Reads results from a result collection of a flow or a hunt."""
+    # Result ids are consecutive, so the offset is a key in the primary index
+    # and no preceding rows have to be skipped.
+    query = ("SELECT timestamp, result FROM results "
+             "WHERE collection_id=%s AND result_id >= %s "
+             "ORDER BY result_id LIMIT %s")
+    cursor.execute(query, [collection_id, offset, count])
+
+    res = []
+    for timestamp, result in cursor.fetchall():
+      res.append(
+          rdf_flows.GrrMessage.FromSerializedString(
+              result, age=mysql_utils.MysqlToRDFDatetime(timestamp)))
+    return res
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def CountResults(self, collection_id, cursor=None):
+    """Returns the number of results in a result collection."""
+    cursor.execute("SELECT count FROM result_counts WHERE collection_id=%s",
+                   [collection_id])
+    row = cursor.fetchone()
+    if row is None:
+      return 0
+    return row[0]
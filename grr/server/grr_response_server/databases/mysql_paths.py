@@ -1,34 +1,403 @@
 #!/usr/bin/env python
 """The MySQL database methods for path handling."""
 
+from future.utils import iteritems
+import MySQLdb
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
+from grr_response_server import db
+from grr_response_server.databases import mysql_utils
+from grr_response_server.rdfvalues import objects as rdf_objects
+
+# Maximum number of rows written by a single multi-row INSERT statement. Keeps
+# statements well below the default `max_allowed_packet` for large batches.
+_INSERT_BATCH_SIZE = 1000
+
+# Paths are stored as their components joined (and prefixed) by `/`, so that
+# the root is an empty string and all descendants of some path `p` fall into
+# the `[p + "/", p + "0")` range (`0` is the character following `/`). Path
+# components never contain `/` as they are produced by splitting on it.
+_PATH_SEP = b"/"
+_PATH_SEP_NEXT = b"0"
+
+_PATH_INFO_COLUMNS = ("p.path_type, p.path, p.directory, p.timestamp, "
+                      "s.stat_entry, s.timestamp, h.hash_entry, h.timestamp")
+
+# Latest stat and hash entries of a path, as recorded on the path row itself.
+_LATEST_ENTRIES_JOIN = """
+LEFT JOIN client_path_stat_entries AS s
+  ON s.client_id = p.client_id AND s.path_type = p.path_type
+  AND s.path_id = p.path_id AND s.timestamp = p.last_stat_entry_timestamp
+LEFT JOIN client_path_hash_entries AS h
+  ON h.client_id = p.client_id AND h.path_type = p.path_type
+  AND h.path_id = p.path_id AND h.timestamp = p.last_hash_entry_timestamp
+"""
+
+# Latest stat and hash entries of a path not newer than some timestamp.
+_ENTRIES_AT_TIMESTAMP_JOIN = """
+LEFT JOIN client_path_stat_entries AS s
+  ON s.client_id = p.client_id AND s.path_type = p.path_type
+  AND s.path_id = p.path_id AND s.timestamp = (
+    SELECT MAX(timestamp) FROM client_path_stat_entries
+    WHERE client_id = p.client_id AND path_type = p.path_type
+    AND path_id = p.path_id AND timestamp <= %s)
+LEFT JOIN client_path_hash_entries AS h
+  ON h.client_id = p.client_id AND h.path_type = p.path_type
+  AND h.path_id = p.path_id AND h.timestamp = (
+    SELECT MAX(timestamp) FROM client_path_hash_entries
+    WHERE client_id = p.client_id AND path_type = p.path_type
+    AND path_id = p.path_id AND timestamp <= %s)
+"""
+
+
+def _ComponentsToPath(components):
+  return b"".join(_PATH_SEP + utils.SmartStr(c) for c in components)
+
+
+def _PathToComponents(path):
+  return [utils.SmartUnicode(c) for c in path.split(_PATH_SEP)[1:]]
+
+
+def _PathID(components):
+  return rdf_objects.PathID.FromComponents(components).AsBytes()
+
+
+def _PathInfoFromRow(row):
+  """Builds a `rdf_objects.PathInfo` from a row selected with the joins above."""
+  (path_type, path, directory, timestamp, stat_entry, stat_timestamp,
+   hash_entry, hash_timestamp) = row
+
+  result = rdf_objects.PathInfo(
+      path_type=path_type,
+      components=_PathToComponents(path),
+      directory=bool(directory),
+      timestamp=mysql_utils.MysqlToRDFDatetime(timestamp))
+  if stat_entry is not None:
+    result.stat_entry = rdf_client.StatEntry.FromSerializedString(stat_entry)
+    result.last_stat_entry_timestamp = mysql_utils.MysqlToRDFDatetime(
+        stat_timestamp)
+  if hash_entry is not None:
+    result.hash_entry = rdf_crypto.Hash.FromSerializedString(hash_entry)
+    result.last_hash_entry_timestamp = mysql_utils.MysqlToRDFDatetime(
+        hash_timestamp)
+  return result
+
 
 class MySQLDBPathMixin(object):
   """MySQLDB mixin for path related functions."""
 
-  def ReadPathInfo(self, client_id, path_type, components, timestamp=None):
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadPathInfo(self,
+                   client_id,
+                   path_type,
+                   components,
+                   timestamp=None,
+                   cursor=None):
     """Retrieves a path info record for a given path."""
-    raise NotImplementedError()
+    args = []
+    query = "SELECT " + _PATH_INFO_COLUMNS + " FROM client_paths AS p "
+    if timestamp is None:
+      query += _LATEST_ENTRIES_JOIN
+    else:
+      query += _ENTRIES_AT_TIMESTAMP_JOIN
+      timestamp_str = mysql_utils.RDFDatetimeToMysqlString(timestamp)
+      args.extend([timestamp_str, timestamp_str])
+    query += "WHERE p.client_id = %s AND p.path_type = %s AND p.path_id = %s"
+    args.extend([
+        mysql_utils.ClientIDToInt(client_id),
+        int(path_type),
+        _PathID(components)
+    ])
 
-  def ReadPathInfos(self, client_id, path_type, components_list):
+    cursor.execute(query, args)
+    row = cursor.fetchone()
+    if row is None:
+      raise db.UnknownPathError(
+          client_id=client_id, path_type=path_type, components=components)
+
+    return _PathInfoFromRow(row)
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadPathInfos(self, client_id, path_type, components_list, cursor=None):
     """Retrieves path info records for given paths."""
-    raise NotImplementedError()
+    result = {components: None for components in components_list}
+    if not components_list:
+      return result
 
-  def WritePathInfos(self, client_id, path_infos):
-    """Writes a collection of path_info records for a client."""
-    raise NotImplementedError()
+    path_ids = [_PathID(components) for components in components_list]
+    query = ("SELECT " + _PATH_INFO_COLUMNS + " FROM client_paths AS p " +
+             _LATEST_ENTRIES_JOIN +
+             "WHERE p.client_id = %s AND p.path_type = %s "
+             "AND p.path_id IN ({})").format(", ".join(["%s"] * len(path_ids)))
+    cursor.execute(query, [mysql_utils.ClientIDToInt(client_id),
+                           int(path_type)] + path_ids)
 
+    path_infos = [_PathInfoFromRow(row) for row in cursor.fetchall()]
+    by_path = {tuple(pi.components): pi for pi in path_infos}
+    for components in components_list:
+      result[components] = by_path.get(tuple(components))
+    return result
+
+  @mysql_utils.WithTransaction(readonly=True)
   def ListDescendentPathInfos(self,
                               client_id,
                               path_type,
                               components,
-                              max_depth=None):
+                              max_depth=None,
+                              cursor=None):
     """Lists path info records that correspond to descendants of given path."""
-    raise NotImplementedError()
+    query = "SELECT " + _PATH_INFO_COLUMNS + " FROM client_paths AS p "
+    query += _LATEST_ENTRIES_JOIN
+    query += "WHERE p.client_id = %s AND p.path_type = %s "
+    args = [mysql_utils.ClientIDToInt(client_id), int(path_type)]
+
+    if max_depth == 1:
+      # Direct children are served by the parent index.
+      query += "AND p.parent_path_id = %s AND p.depth = %s"
+      args.extend([_PathID(components), len(components) + 1])
+    else:
+      # All descendants are a single range over the path index, the depth
+      # column just trims that range.
+      path = _ComponentsToPath(components)
+      query += "AND p.path >= %s AND p.path < %s AND p.depth > %s"
+      args.extend([path + _PATH_SEP, path + _PATH_SEP_NEXT, len(components)])
+      if max_depth is not None:
+        query += " AND p.depth <= %s"
+        args.append(len(components) + max_depth)
+
+    cursor.execute(query, args)
+
+    result = [_PathInfoFromRow(row) for row in cursor.fetchall()]
+    result.sort(key=lambda _: tuple(_.components))
+    return result
+
+  def _UpsertPaths(self, client_id, rows, cursor):
+    """Inserts or updates path rows with batched multi-row statements.
+
+    Args:
+      client_id: A client for which the paths should be written.
+      rows: A list of tuples `(path_type, components, directory, timestamp,
+        last_stat_entry_timestamp, last_hash_entry_timestamp)`. Timestamps are
+        MySQL strings or `None` if the value should not be updated.
+      cursor: A MySQL cursor to use.
 
-  def MultiWritePathHistory(self, client_id, stat_entries, hash_entries):
-    raise NotImplementedError()
+    Raises:
+      db.UnknownClientError: If the client does not exist.
+    """
+    int_client_id = mysql_utils.ClientIDToInt(client_id)
 
-  def ReadPathInfosHistories(self, client_id, path_type, components_list):
+    for batch in utils.Grouper(rows, _INSERT_BATCH_SIZE):
+      args = []
+      for path_type, components, directory, timestamp, stat_ts, hash_ts in batch:
+        parent_path_id = _PathID(components[:-1]) if components else None
+        args.extend([
+            int_client_id,
+            int(path_type),
+            _PathID(components),
+            _ComponentsToPath(components),
+            len(components),
+            parent_path_id,
+            int(directory),
+            timestamp,
+            stat_ts,
+            hash_ts,
+        ])
+
+      query = """
+      INSERT INTO client_paths(client_id, path_type, path_id, path, depth,
+                               parent_path_id, directory, timestamp,
+                               last_stat_entry_timestamp,
+                               last_hash_entry_timestamp)
+      VALUES {}
+      ON DUPLICATE KEY UPDATE
+        directory = directory OR VALUES(directory),
+        timestamp = COALESCE(VALUES(timestamp), timestamp),
+        last_stat_entry_timestamp = GREATEST(
+          COALESCE(last_stat_entry_timestamp, VALUES(last_stat_entry_timestamp)),
+          COALESCE(VALUES(last_stat_entry_timestamp), last_stat_entry_timestamp)),
+        last_hash_entry_timestamp = GREATEST(
+          COALESCE(last_hash_entry_timestamp, VALUES(last_hash_entry_timestamp)),
+          COALESCE(VALUES(last_hash_entry_timestamp), last_hash_entry_timestamp))
+      """.format(", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] *
+                           len(batch)))
+      try:
+        cursor.execute(query, args)
+      except MySQLdb.IntegrityError as e:
+        raise db.UnknownClientError(client_id, cause=e)
+
+  def _InsertPathEntries(self, client_id, table, column, entries, cursor):
+    """Inserts stat or hash history entries with batched multi-row statements.
+
+    Args:
+      client_id: A client for which the entries should be written.
+      table: A name of the history table to write to.
+      column: A name of the column holding the serialized entry.
+      entries: A list of tuples `(path_type, components, timestamp, entry)`.
+      cursor: A MySQL cursor to use.
+
+    Raises:
+      db.Error: If an entry for some path and timestamp already exists.
+    """
+    int_client_id = mysql_utils.ClientIDToInt(client_id)
+
+    for batch in utils.Grouper(entries, _INSERT_BATCH_SIZE):
+      args = []
+      for path_type, components, timestamp, entry in batch:
+        args.extend([
+            int_client_id,
+            int(path_type),
+            _PathID(components), timestamp,
+            entry.SerializeToString()
+        ])
+
+      query = ("INSERT INTO {table}(client_id, path_type, path_id, timestamp, "
+               "{column}) VALUES {values}").format(
+                   table=table,
+                   column=column,
+                   values=", ".join(["(%s, %s, %s, %s, %s)"] * len(batch)))
+      try:
+        cursor.execute(query, args)
+      except MySQLdb.IntegrityError as e:
+        raise db.Error("Duplicated %s write for client '%s': %s" %
+                       (column, client_id, e))
+
+  @mysql_utils.WithTransaction()
+  def WritePathInfos(self, client_id, path_infos, cursor=None):
+    """Writes a collection of path_info records for a client."""
+    now = mysql_utils.RDFDatetimeToMysqlString(rdfvalue.RDFDatetime.Now())
+
+    # Paths (including all ancestors) are deduplicated first so that every
+    # path ends up as exactly one row of the multi-row upsert.
+    directories = {}
+    stat_entries = {}
+    hash_entries = {}
+    for path_info in path_infos:
+      key = (path_info.path_type, tuple(path_info.components))
+      directories[key] = directories.get(key, False) or path_info.directory
+      if path_info.HasField("stat_entry"):
+        stat_entries[key] = path_info.stat_entry
+      if path_info.HasField("hash_entry"):
+        hash_entries[key] = path_info.hash_entry
+
+      for ancestor in path_info.GetAncestors():
+        directories[(ancestor.path_type, tuple(ancestor.components))] = True
+
+    if not directories:
+      return
+
+    path_rows = []
+    for key, directory in iteritems(directories):
+      path_type, components = key
+      path_rows.append((path_type, components, directory, now,
+                        now if key in stat_entries else None,
+                        now if key in hash_entries else None))
+    self._UpsertPaths(client_id, path_rows, cursor)
+
+    self._InsertPathEntries(
+        client_id, "client_path_stat_entries", "stat_entry",
+        [(t, c, now, e) for (t, c), e in iteritems(stat_entries)], cursor)
+    self._InsertPathEntries(
+        client_id, "client_path_hash_entries", "hash_entry",
+        [(t, c, now, e) for (t, c), e in iteritems(hash_entries)], cursor)
+
+  @mysql_utils.WithTransaction()
+  def MultiWritePathHistory(self,
+                            client_id,
+                            stat_entries,
+                            hash_entries,
+                            cursor=None):
+    """Writes a collection of hash and stat entries observed for given paths."""
+    if not stat_entries and not hash_entries:
+      return
+
+    # The path rows only need to know about the newest of the written entries.
+    last_stat_timestamps = {}
+    stat_rows = []
+    for path_info, stat_entry in iteritems(stat_entries):
+      key = (path_info.path_type, tuple(path_info.components))
+      timestamp = path_info.timestamp
+      last_stat_timestamps[key] = max(timestamp,
+                                      last_stat_timestamps.get(key, timestamp))
+      stat_rows.append(
+          key + (mysql_utils.RDFDatetimeToMysqlString(timestamp), stat_entry))
+
+    last_hash_timestamps = {}
+    hash_rows = []
+    for path_info, hash_entry in iteritems(hash_entries):
+      key = (path_info.path_type, tuple(path_info.components))
+      timestamp = path_info.timestamp
+      last_hash_timestamps[key] = max(timestamp,
+                                      last_hash_timestamps.get(key, timestamp))
+      hash_rows.append(
+          key + (mysql_utils.RDFDatetimeToMysqlString(timestamp), hash_entry))
+
+    path_rows = []
+    for key in set(last_stat_timestamps) | set(last_hash_timestamps):
+      path_type, components = key
+      path_rows.append((path_type, components, False, None,
+                        mysql_utils.RDFDatetimeToMysqlString(
+                            last_stat_timestamps.get(key)),
+                        mysql_utils.RDFDatetimeToMysqlString(
+                            last_hash_timestamps.get(key))))
+    self._UpsertPaths(client_id, path_rows, cursor)
+
+    self._InsertPathEntries(client_id, "client_path_stat_entries", "stat_entry",
+                            stat_rows, cursor)
+    self._InsertPathEntries(client_id, "client_path_hash_entries", "hash_entry",
+                            hash_rows, cursor)
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadPathInfosHistories(self,
+                             client_id,
+                             path_type,
+                             components_list,
+                             cursor=None):
     """Reads a collection of hash and stat entries for given paths."""
+    results = {components: [] for components in components_list}
+    if not components_list:
+      return results
+
+    components_by_path_id = {
+        _PathID(components): components for components in components_list
+    }
+    path_ids = list(components_by_path_id)
+    args = [mysql_utils.ClientIDToInt(client_id), int(path_type)] + path_ids
+
+    entries_by_path_id = {}
+    for table, column in [("client_path_stat_entries", "stat_entry"),
+                          ("client_path_hash_entries", "hash_entry")]:
+      query = ("SELECT path_id, timestamp, {column} FROM {table} "
+               "WHERE client_id = %s AND path_type = %s "
+               "AND path_id IN ({path_ids})").format(
+                   column=column,
+                   table=table,
+                   path_ids=", ".join(["%s"] * len(path_ids)))
+      cursor.execute(query, args)
+
+      for path_id, timestamp, entry in cursor.fetchall():
+        components = components_by_path_id[path_id]
+        timestamp = mysql_utils.MysqlToRDFDatetime(timestamp)
+        entries_by_ts = entries_by_path_id.setdefault(path_id, {})
+        try:
+          path_info = entries_by_ts[timestamp]
+        except KeyError:
+          path_info = rdf_objects.PathInfo(
+              path_type=path_type, components=components, timestamp=timestamp)
+          entries_by_ts[timestamp] = path_info
+
+        if column == "stat_entry":
+          path_info.stat_entry = rdf_client.StatEntry.FromSerializedString(
+              entry)
+        else:
+          path_info.hash_entry = rdf_crypto.Hash.FromSerializedString(entry)
+
+    for path_id, entries_by_ts in iteritems(entries_by_path_id):
+      components = components_by_path_id[path_id]
+      results[components] = [
+          entries_by_ts[ts] for ts in sorted(entries_by_ts)
+      ]
 
-    raise NotImplementedError()
+    return results
@@ -23,6 +23,39 @@ def _GetEnvironOrSkip(key):
   return value
 
 
+def CreateTestDatabase():
+  """Creates a MysqlDB backed by a fresh database on the test server.
+
+  Returns:
+    A pair (db, cleanup) as expected by `DatabaseTestMixin.CreateDatabase`.
+
+  Raises:
+    unittest.SkipTest: If the test server is not configured.
+  """
+  user = _GetEnvironOrSkip("MYSQL_TEST_USER")
+  host = _GetEnvironOrSkip("MYSQL_TEST_HOST")
+  port = _GetEnvironOrSkip("MYSQL_TEST_PORT")
+  passwd = _GetEnvironOrSkip("MYSQL_TEST_PASS")
+  dbname = "".join(
+      random.choice(string.ascii_uppercase + string.digits) for _ in range(10))
+
+  connection = MySQLdb.Connect(host=host, port=port, user=user, passwd=passwd)
+  cursor = connection.cursor()
+  cursor.execute("CREATE DATABASE " + dbname)
+  logging.info("Created test database: %s", dbname)
+
+  conn = mysql.MysqlDB(
+      host=host, port=port, user=user, passwd=passwd, db=dbname)
+
+  def Fin():
+    cursor.execute("DROP DATABASE " + dbname)
+    cursor.close()
+    connection.close()
+    conn.Close()
+
+  return conn, Fin
+
+
 class TestMysqlDB(stats_test_lib.StatsTestMixin,
                   db_test_mixin.DatabaseTestMixin, unittest.TestCase):
   """Test the mysql.MysqlDB class.
@@ -32,31 +65,7 @@ class TestMysqlDB(stats_test_lib.StatsTestMixin,
   """
 
   def CreateDatabase(self):
-    # pylint: disable=unreachable
-    user = _GetEnvironOrSkip("MYSQL_TEST_USER")
-    host = _GetEnvironOrSkip("MYSQL_TEST_HOST")
-    port = _GetEnvironOrSkip("MYSQL_TEST_PORT")
-    passwd = _GetEnvironOrSkip("MYSQL_TEST_PASS")
-    dbname = "".join(
-        random.choice(string.ascii_uppercase + string.digits)
-        for _ in range(10))
-
-    connection = MySQLdb.Connect(host=host, port=port, user=user, passwd=passwd)
-    cursor = connection.cursor()
-    cursor.execute("CREATE DATABASE " + dbname)
-    logging.info("Created test database: %s", dbname)
-
-    conn = mysql.MysqlDB(
-        host=host, port=port, user=user, passwd=passwd, db=dbname)
-
-    def Fin():
-      cursor.execute("DROP DATABASE " + dbname)
-      cursor.close()
-      connection.close()
-      conn.Close()
-
-    return conn, Fin
-    # pylint: enable=unreachable
+    return CreateTestDatabase()
 
   def testIsRetryable(self):
     self.assertFalse(mysql._IsRetryable(Exception("Some general error.")))
@@ -200,24 +209,6 @@ class TestMysqlDB(stats_test_lib.StatsTestMixin,
   def testWriteHashHistory(self):
     pass
 
-  def testMultiWriteHistoryEmpty(self):
-    pass
-
-  def testMultiWriteHistoryStatAndHash(self):
-    pass
-
-  def testMultiWriteHistoryTwoPathTypes(self):
-    pass
-
-  def testMultiWriteHistoryTwoPaths(self):
-    pass
-
-  def testMultiWriteHistoryDoesNotAllowOverridingStat(self):
-    pass
-
-  def testMultiWriteHistoryDoesNotAllowOverridingHash(self):
-    pass
-
   def testReadPathInfosNonExistent(self):
     pass
 
@@ -388,6 +388,19 @@ class Database(with_metaclass(abc.ABCMeta, object)):
       keyword: The keyword to delete.
     """
 
+  @abc.abstractmethod
+  def MultiReadClientKeywords(self, client_ids):
+    """Reads the keywords associated with a list of clients.
+
+    Args:
+      client_ids: a collection of GRR client ids, e.g. ["C.ea3b2b71840d6fa7",
+        "C.ea3b2b71840d6fa8"]
+
+    Returns:
+      A map from client_id to a dict mapping each keyword associated with the
+      client to the rdfvalue.RDFDatetime it was last associated at.
+    """
+
   @abc.abstractmethod
   def AddClientLabels(self, client_id, owner, labels):
     """Attaches a user label to a client.
@@ -1115,6 +1128,45 @@ class Database(with_metaclass(abc.ABCMeta, object)):
       messages: A list of GrrMessage objects to delete.
     """
 
+  @abc.abstractmethod
+  def WriteResults(self, collection_id, results):
+    """Appends results to a result collection of a flow or a hunt.
+
+    Every collection numbers its results consecutively, starting at 0, in the
+    order they were written. Since the numbering has no gaps, the position of
+    a result in the collection is also its key.
+
+    Args:
+      collection_id: A string identifying the collection, i.e. the urn of the
+                     flow or hunt results collection.
+      results: A list of GrrMessage objects wrapping the results.
+    """
+
+  @abc.abstractmethod
+  def ReadResults(self, collection_id, offset, count):
+    """Reads results from a result collection of a flow or a hunt.
+
+    Args:
+      collection_id: A string identifying the collection.
+      offset: The position of the first result to read.
+      count: The maximum number of results to read.
+
+    Returns:
+      A list of GrrMessage objects, in the order they were written. The age of
+      each of them is set to the time the result was written.
+    """
+
+  @abc.abstractmethod
+  def CountResults(self, collection_id):
+    """Returns the number of results in a result collection.
+
+    Args:
+      collection_id: A string identifying the collection.
+
+    Returns:
+      The number of results written to the collection so far.
+    """
+
 
 class DatabaseValidationWrapper(Database):
   """Database wrapper that validates the arguments."""
@@ -1122,6 +1174,11 @@ class DatabaseValidationWrapper(Database):
   def __init__(self, delegate):
     super(DatabaseValidationWrapper, self).__init__()
     self.delegate = delegate
+    # Bumped whenever foreman rules are changed through this wrapper so that
+    # in-process caches of the rules know when to reread them. It's bumped
+    # after the change is written: a cache reading the rules concurrently
+    # could otherwise store the old rules under the new generation.
+    self.foreman_rules_generation = 0
 
   @staticmethod
   def _ValidateType(value, expected_type):
@@ -1372,6 +1429,12 @@ class DatabaseValidationWrapper(Database):
 
     return self.delegate.RemoveClientKeyword(client_id, keyword)
 
+  def MultiReadClientKeywords(self, client_ids):
+    for client_id in client_ids:
+      self._ValidateClientId(client_id)
+
+    return self.delegate.MultiReadClientKeywords(client_ids)
+
   def AddClientLabels(self, client_id, owner, labels):
     self._ValidateClientId(client_id)
     self._ValidateUsername(owner)
@@ -1402,17 +1465,26 @@ class DatabaseValidationWrapper(Database):
     if not rule.hunt_id:
       raise ValueError("Foreman rule has no hunt_id: %s" % rule)
 
-    return self.delegate.WriteForemanRule(rule)
+    try:
+      return self.delegate.WriteForemanRule(rule)
+    finally:
+      self.foreman_rules_generation += 1
 
   def RemoveForemanRule(self, hunt_id):
     self._ValidateHuntId(hunt_id)
-    return self.delegate.RemoveForemanRule(hunt_id)
+    try:
+      return self.delegate.RemoveForemanRule(hunt_id)
+    finally:
+      self.foreman_rules_generation += 1
 
   def ReadAllForemanRules(self):
     return self.delegate.ReadAllForemanRules()
 
   def RemoveExpiredForemanRules(self):
-    return self.delegate.RemoveExpiredForemanRules()
+    try:
+      return self.delegate.RemoveExpiredForemanRules()
+    finally:
+      self.foreman_rules_generation += 1
 
   def WriteGRRUser(self,
                    username,
@@ -1751,3 +1823,21 @@ class DatabaseValidationWrapper(Database):
     for message in messages:
       self._ValidateType(message, rdf_flows.GrrMessage)
     return self.delegate.DeleteClientMessages(messages)
+
+  def WriteResults(self, collection_id, results):
+    self._ValidateStringId("collection_id", collection_id)
+    for result in results:
+      self._ValidateType(result, rdf_flows.GrrMessage)
+    return self.delegate.WriteResults(collection_id, results)
+
+  def ReadResults(self, collection_id, offset, count):
+    self._ValidateStringId("collection_id", collection_id)
+    if offset < 0:
+      raise ValueError("offset must be non-negative, got %d" % offset)
+    if count < 0:
+      raise ValueError("count must be non-negative, got %d" % count)
+    return self.delegate.ReadResults(collection_id, offset, count)
+
+  def CountResults(self, collection_id):
+    self._ValidateStringId("collection_id", collection_id)
+    return self.delegate.CountResults(collection_id)
@@ -130,3 +130,19 @@ class DatabaseTestBlobsMixin(object):
     other_blob_id = rdf_objects.BlobID(b"abcdefgh" * 4)
     result = d.CheckBlobsExist([blob_id, other_blob_id])
     self.assertEqual(result, {blob_id: True, other_blob_id: False})
+
+  def testLargeBlobsCanBeWrittenAndThenRead(self):
+    d = self.db
+
+    # Large enough to be chunked and split over several transactions.
+    blob_data = [(b"%d" % i) * (3 * 1024 * 1024) for i in range(5)]
+    blob_data.append(b"")
+    blob_ids = [rdf_objects.BlobID.FromBlobData(data) for data in blob_data]
+
+    d.WriteBlobs(dict(zip(blob_ids, blob_data)))
+
+    result = d.ReadBlobs(blob_ids)
+    self.assertEqual(result, dict(zip(blob_ids, blob_data)))
+
+    result = d.CheckBlobsExist(blob_ids)
+    self.assertEqual(result, {blob_id: True for blob_id in blob_ids})
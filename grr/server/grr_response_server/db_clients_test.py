@@ -614,6 +614,28 @@ class DatabaseTestClientsMixin(object):
     self.assertEqual(d.ListClientsForKeywords([temporary_kw])[temporary_kw], [])
     self.assertEqual(d.ListClientsForKeywords(["joe"])["joe"], [client_id])
 
+  def testMultiReadClientKeywords(self):
+    d = self.db
+    client_id_1 = self.InitializeClient()
+    client_id_2 = self.InitializeClient()
+    client_id_3 = self.InitializeClient()
+
+    d.AddClientKeywords(client_id_1, ["joe", "machine"])
+    change_time = rdfvalue.RDFDatetime.Now()
+    d.AddClientKeywords(client_id_1, ["joe"])
+    d.AddClientKeywords(client_id_2, ["fred"])
+
+    res = d.MultiReadClientKeywords([client_id_1, client_id_2, client_id_3])
+    self.assertItemsEqual(res[client_id_1], ["joe", "machine"])
+    self.assertGreaterEqual(res[client_id_1]["joe"], change_time)
+    self.assertLessEqual(res[client_id_1]["machine"], change_time)
+    self.assertItemsEqual(res[client_id_2], ["fred"])
+    self.assertEqual(res[client_id_3], {})
+
+    d.RemoveClientKeyword(client_id_1, "machine")
+    res = d.MultiReadClientKeywords([client_id_1])
+    self.assertItemsEqual(res[client_id_1], ["joe"])
+
   def testClientLabels(self):
     d = self.db
     client_id = self.InitializeClient()
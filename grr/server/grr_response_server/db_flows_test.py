@@ -114,3 +114,110 @@ class DatabaseTestFlowMixin(object):
       leased = self.db.LeaseClientMessages(client_id, lease_time=lease_time)
 
       self.assertEqual(len(leased), 10)
+
+  def _MakeResults(self, count, start=0):
+    return [
+        rdf_flows.GrrMessage(
+            payload=rdfvalue.RDFInteger(i), source="C.1000000000000000")
+        for i in range(start, start + count)
+    ]
+
+  def testResultsWriteAndRead(self):
+    collection_id = u"aff4:/C.1000000000000000/flows/F:123456/Results"
+    results = self._MakeResults(10)
+
+    timestamp = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(100000)
+    with test_lib.FakeTime(timestamp):
+      self.db.WriteResults(collection_id, results)
+
+    read = self.db.ReadResults(collection_id, 0, 100)
+    self.assertEqual(read, results)
+    for result in read:
+      self.assertEqual(result.age, timestamp)
+
+    self.assertEqual(self.db.CountResults(collection_id), 10)
+
+  def testResultsAreAppended(self):
+    collection_id = u"aff4:/hunts/H:123456/Results"
+    results = self._MakeResults(10)
+
+    for i in range(0, 10, 3):
+      self.db.WriteResults(collection_id, results[i:i + 3])
+
+    self.assertEqual(self.db.ReadResults(collection_id, 0, 100), results)
+    self.assertEqual(self.db.CountResults(collection_id), 10)
+
+  def testReadResultsWithOffsetAndCount(self):
+    collection_id = u"aff4:/hunts/H:123456/Results"
+    results = self._MakeResults(10)
+    self.db.WriteResults(collection_id, results)
+
+    self.assertEqual(self.db.ReadResults(collection_id, 3, 4), results[3:7])
+    self.assertEqual(self.db.ReadResults(collection_id, 8, 4), results[8:])
+    self.assertEqual(self.db.ReadResults(collection_id, 10, 4), [])
+    self.assertEqual(self.db.ReadResults(collection_id, 3, 0), [])
+
+    with self.assertRaises(ValueError):
+      self.db.ReadResults(collection_id, -1, 4)
+
+  def testResultsOfDifferentCollectionsAreSeparate(self):
+    results = self._MakeResults(5)
+    other_results = self._MakeResults(3, start=5)
+
+    self.db.WriteResults(u"aff4:/hunts/H:123456/Results", results)
+    self.db.WriteResults(u"aff4:/hunts/H:654321/Results", other_results)
+    self.db.WriteResults(u"aff4:/hunts/H:123456/Results", other_results)
+
+    self.assertEqual(
+        self.db.ReadResults(u"aff4:/hunts/H:123456/Results", 0, 100),
+        results + other_results)
+    self.assertEqual(
+        self.db.ReadResults(u"aff4:/hunts/H:654321/Results", 0, 100),
+        other_results)
+    self.assertEqual(self.db.CountResults(u"aff4:/hunts/H:123456/Results"), 8)
+    self.assertEqual(self.db.CountResults(u"aff4:/hunts/H:654321/Results"), 3)
+
+  def testReadResultsOfUnknownCollection(self):
+    collection_id = u"aff4:/hunts/H:123456/Results"
+
+    self.assertEqual(self.db.ReadResults(collection_id, 0, 100), [])
+    self.assertEqual(self.db.CountResults(collection_id), 0)
+
+    self.db.WriteResults(collection_id, [])
+    self.assertEqual(self.db.CountResults(collection_id), 0)
+
+
+class ResultsBenchmarksMixin(object):
+  """Benchmarks for the flow and hunt results of db.Database classes.
+
+  This mixin is used by DatabaseBenchmarkMixin, which provides the database
+  and the timing helpers.
+  """
+
+  BATCH_SIZE = 100
+  BATCH_COUNT = 100
+  PAGE_SIZE = 50
+
+  def testWriteAndPaginate(self):
+    """Time to write results in batches and to read pages at any offset."""
+    collection_id = u"aff4:/hunts/H:123456/Results"
+    batch = [
+        rdf_flows.GrrMessage(
+            payload=rdfvalue.RDFInteger(i), source="C.1000000000000000")
+        for i in range(self.BATCH_SIZE)
+    ]
+
+    self._Time("Write a batch of %d results" % self.BATCH_SIZE,
+               lambda: self.db.WriteResults(collection_id, batch),
+               repetitions=self.BATCH_COUNT)
+
+    total_count = self.BATCH_SIZE * self.BATCH_COUNT
+    self._Time("Count %d results" % total_count,
+               lambda: self.db.CountResults(collection_id), repetitions=100)
+    self._Time("Read the first page",
+               lambda: self.db.ReadResults(collection_id, 0, self.PAGE_SIZE),
+               repetitions=100)
+    self._Time(
+        "Read the last page", lambda: self.db.ReadResults(
+            collection_id, total_count - self.PAGE_SIZE, self.PAGE_SIZE),
+        repetitions=100)
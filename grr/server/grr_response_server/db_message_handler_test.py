@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 """Tests for the message handler database api."""
+from __future__ import division
 
 import Queue
+import time
 
 from builtins import range  # pylint: disable=redefined-builtin
 
@@ -86,3 +88,64 @@ class DatabaseTestHandlerMixin(object):
 
     got.sort(key=lambda req: req.request_id)
     self.assertEqual(requests, got)
+
+
+class MessageHandlerBenchmarksMixin(object):
+  """Benchmarks for the message handler lease loop of db.Database classes.
+
+  This mixin is used by DatabaseBenchmarkMixin, which provides the database
+  and the timing helpers.
+  """
+
+  LATENCY_SAMPLES = 20
+  DRAIN_REQUESTS = 2000
+
+  def _MakeRequests(self, count, start_id=0):
+    return [
+        rdf_objects.MessageHandlerRequest(
+            client_id="C.1000000000000000",
+            handler_name="Testhandler",
+            request_id=i,
+            request=rdfvalue.RDFInteger(i))
+        for i in range(start_id, start_id + count)
+    ]
+
+  def _Drain(self, leased, count):
+    got = []
+    while len(got) < count:
+      got.extend(leased.get(True, timeout=30))
+    self.db.DeleteMessageHandlerRequests(got)
+    return got
+
+  def testWriteToHandleLatency(self):
+    """Time from writing a request until an idle handler receives it."""
+    leased = Queue.Queue()
+    self.db.RegisterMessageHandler(leased.put, rdfvalue.Duration("5m"))
+
+    latencies = []
+    for i in range(self.LATENCY_SAMPLES):
+      # Give the lease loop time to go idle and back off.
+      time.sleep(0.5)
+      start = time.time()
+      self.db.WriteMessageHandlerRequests(self._MakeRequests(1, start_id=i))
+      self._Drain(leased, 1)
+      latencies.append(time.time() - start)
+
+    self.AddResult("Write to handle latency (avg)",
+                   sum(latencies) / len(latencies), len(latencies))
+    self.AddResult("Write to handle latency (max)", max(latencies),
+                   len(latencies))
+
+  def testDrainThroughput(self):
+    """Time per request to lease and handle a large backlog."""
+    self.db.WriteMessageHandlerRequests(
+        self._MakeRequests(self.DRAIN_REQUESTS))
+
+    leased = Queue.Queue()
+    start = time.time()
+    self.db.RegisterMessageHandler(leased.put, rdfvalue.Duration("5m"))
+    self._Drain(leased, self.DRAIN_REQUESTS)
+    time_taken = time.time() - start
+
+    self.AddResult("Drain time per request", time_taken / self.DRAIN_REQUESTS,
+                   self.DRAIN_REQUESTS)
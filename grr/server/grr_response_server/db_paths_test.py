@@ -3,6 +3,8 @@
 
 import hashlib
 
+from builtins import range  # pylint: disable=redefined-builtin
+
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
@@ -602,6 +604,26 @@ class DatabaseTestPathsMixin(object):
       hash_entry = rdf_crypto.Hash(sha256=b"norf")
       self.db.MultiWritePathHistory(client_id, {}, {path_info: hash_entry})
 
+  def testMultiWriteHistoryDoesNotWriteAncestors(self):
+    datetime = rdfvalue.RDFDatetime.FromHumanReadable
+
+    client_id = self.InitializeClient()
+
+    path_info = rdf_objects.PathInfo.OS(
+        components=("foo", "bar"), timestamp=datetime("2003-03-03"))
+    stat_entry = rdf_client.StatEntry(st_size=42)
+    self.db.MultiWritePathHistory(client_id, {path_info: stat_entry}, {})
+
+    result = self.db.ReadPathInfo(
+        client_id, rdf_objects.PathInfo.PathType.OS, components=("foo", "bar"))
+    self.assertFalse(result.directory)
+    self.assertEqual(result.stat_entry.st_size, 42)
+    self.assertEqual(result.last_stat_entry_timestamp, datetime("2003-03-03"))
+
+    with self.assertRaises(db.UnknownPathError):
+      self.db.ReadPathInfo(
+          client_id, rdf_objects.PathInfo.PathType.OS, components=("foo",))
+
   def testReadPathInfosNonExistent(self):
     client_id = self.InitializeClient()
 
@@ -1177,3 +1199,83 @@ class DatabaseTestPathsMixin(object):
     self.assertEqual(pi[1].stat_entry.st_mode, 1338)
     self.assertEqual(pi[1].timestamp,
                      rdfvalue.RDFDatetime.FromHumanReadable("1999-01-02"))
+
+
+class PathsBenchmarksMixin(object):
+  """Benchmarks for the path handling of db.Database classes.
+
+  This mixin is used by DatabaseBenchmarkMixin, which provides the database
+  and the timing helpers.
+  """
+
+  # The tree written below has FANOUT**DEPTH leaves.
+  FANOUT = 10
+  DEPTH = 3
+  HISTORY_SIZE = 1000
+
+  def _MakeTree(self):
+    components_list = [[]]
+    for _ in range(self.DEPTH):
+      components_list = [
+          components + ["dir%d" % i]
+          for components in components_list
+          for i in range(self.FANOUT)
+      ]
+
+    path_infos = []
+    for components in components_list:
+      path_info = rdf_objects.PathInfo.OS(components=components)
+      path_info.stat_entry.st_size = 42
+      path_infos.append(path_info)
+    return path_infos
+
+  def testWriteAndListTree(self):
+    """Time to write a tree of paths and to list it back at various depths."""
+    client_id = self.InitializeClient()
+    path_infos = self._MakeTree()
+    path_type = rdf_objects.PathInfo.PathType.OS
+
+    self._Time("Write path infos (per path)",
+               lambda: self.db.WritePathInfos(client_id, path_infos),
+               items=len(path_infos))
+
+    self._Time("List children of root",
+               lambda: self.db.ListChildPathInfos(client_id, path_type, ()))
+    self._Time(
+        "List descendants of root (max_depth=2)",
+        lambda: self.db.ListDescendentPathInfos(
+            client_id, path_type, (), max_depth=2))
+    result = self._Time(
+        "List all descendants of root",
+        lambda: self.db.ListDescendentPathInfos(client_id, path_type, ()))
+    self.assertEqual(
+        len(result), sum(self.FANOUT**i for i in range(1, self.DEPTH + 1)))
+
+  def testWriteAndReadHistory(self):
+    """Time to write and read back a long stat and hash history of a path."""
+    client_id = self.InitializeClient()
+    path_info = rdf_objects.PathInfo.OS(components=("foo", "bar"))
+    self.db.WritePathInfos(client_id, [path_info])
+
+    start = rdfvalue.RDFDatetime.FromHumanReadable("2000-01-01")
+    stat_entries = {}
+    hash_entries = {}
+    for i in range(self.HISTORY_SIZE):
+      entry_path_info = path_info.Copy()
+      entry_path_info.timestamp = start + rdfvalue.Duration("%ds" % i)
+      stat_entries[entry_path_info] = rdf_client.StatEntry(st_size=i)
+      hash_entries[entry_path_info] = rdf_crypto.Hash(
+          sha256=hashlib.sha256(str(i)).digest())
+
+    self._Time(
+        "Write path history (per entry)",
+        lambda: self.db.MultiWritePathHistory(client_id, stat_entries,
+                                              hash_entries),
+        items=self.HISTORY_SIZE)
+
+    result = self._Time(
+        "Read path history (per entry)",
+        lambda: self.db.ReadPathInfosHistories(
+            client_id, path_info.path_type, [("foo", "bar")]),
+        items=self.HISTORY_SIZE)
+    self.assertEqual(len(result[("foo", "bar")]), self.HISTORY_SIZE)
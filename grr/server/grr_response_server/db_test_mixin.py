@@ -3,6 +3,7 @@
 
 import abc
 import random
+import time
 
 
 from builtins import range  # pylint: disable=redefined-builtin
@@ -20,23 +21,11 @@ from grr_response_server import db_paths_test
 from grr_response_server import db_users_test
 
 
-class DatabaseTestMixin(
-    with_metaclass(abc.ABCMeta, db_blobs_test.DatabaseTestBlobsMixin,
-                   db_clients_test.DatabaseTestClientsMixin,
-                   db_cronjob_test.DatabaseTestCronJobMixin,
-                   db_events_test.DatabaseEventsTestMixin,
-                   db_flows_test.DatabaseTestFlowMixin,
-                   db_foreman_rules_test.DatabaseTestForemanRulesMixin,
-                   db_message_handler_test.DatabaseTestHandlerMixin,
-                   db_paths_test.DatabaseTestPathsMixin,
-                   db_users_test.DatabaseTestUsersMixin)):
-  """An abstract class for testing db.Database implementations.
+class _DatabaseMixin(with_metaclass(abc.ABCMeta, object)):
+  """Sets up the database used by DatabaseTestMixin and DatabaseBenchmarkMixin.
 
-  Implementations should override CreateDatabase in order to produce
-  a test suite for a particular implementation of db.Database.
-
-  This class does not inherit from `TestCase` to prevent the test runner from
-  executing its method. Instead it should be mixed into the actual test classes.
+  Implementations should override CreateDatabase in order to produce a test
+  suite for a particular implementation of db.Database.
   """
 
   @abc.abstractmethod
@@ -50,19 +39,15 @@ class DatabaseTestMixin(
     """
 
   def setUp(self):
-    super(DatabaseTestMixin, self).setUp()
+    super(_DatabaseMixin, self).setUp()
     db_obj, self.cleanup = self.CreateDatabase()
     self.db = db.DatabaseValidationWrapper(db_obj)
 
   def tearDown(self):
+    self.db.UnregisterMessageHandler()
     if self.cleanup:
       self.cleanup()
-    self.db.UnregisterMessageHandler()
-    super(DatabaseTestMixin, self).tearDown()
-
-  def testDatabaseType(self):
-    d = self.db
-    self.assertIsInstance(d, db.Database)
+    super(_DatabaseMixin, self).tearDown()
 
   def InitializeClient(self, client_id=None):
     """Initializes a test client.
@@ -81,3 +66,59 @@ class DatabaseTestMixin(
 
     self.db.WriteClientMetadata(client_id, fleetspeak_enabled=True)
     return client_id
+
+
+class DatabaseTestMixin(
+    with_metaclass(abc.ABCMeta, db_blobs_test.DatabaseTestBlobsMixin,
+                   db_clients_test.DatabaseTestClientsMixin,
+                   db_cronjob_test.DatabaseTestCronJobMixin,
+                   db_events_test.DatabaseEventsTestMixin,
+                   db_flows_test.DatabaseTestFlowMixin,
+                   db_foreman_rules_test.DatabaseTestForemanRulesMixin,
+                   db_message_handler_test.DatabaseTestHandlerMixin,
+                   db_paths_test.DatabaseTestPathsMixin,
+                   db_users_test.DatabaseTestUsersMixin, _DatabaseMixin)):
+  """An abstract class for testing db.Database implementations.
+
+  Implementations should override CreateDatabase in order to produce
+  a test suite for a particular implementation of db.Database.
+
+  This class does not inherit from `TestCase` to prevent the test runner from
+  executing its method. Instead it should be mixed into the actual test classes.
+  """
+
+  def testDatabaseType(self):
+    d = self.db
+    self.assertIsInstance(d, db.Database)
+
+
+class DatabaseBenchmarkMixin(
+    with_metaclass(abc.ABCMeta, db_flows_test.ResultsBenchmarksMixin,
+                   db_message_handler_test.MessageHandlerBenchmarksMixin,
+                   db_paths_test.PathsBenchmarksMixin, _DatabaseMixin)):
+  """An abstract class for benchmarking db.Database implementations.
+
+  Implementations should be mixed with benchmark_test_lib.MicroBenchmarks and
+  override CreateDatabase the same way as for DatabaseTestMixin.
+  """
+
+  units = "ms"
+
+  def _Time(self, name, func, repetitions=1, items=1):
+    """Times calls of a function and records the average time per item.
+
+    Args:
+      name: A name of the benchmark result.
+      func: A function to time.
+      repetitions: A number of times func is called.
+      items: A number of items processed by every call of func.
+
+    Returns:
+      The result of the last call of func.
+    """
+    start = time.time()
+    for _ in range(repetitions):
+      result = func()
+    count = repetitions * items
+    self.AddResult(name, (time.time() - start) / count, count)
+    return result
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 """Utility functions/decorators for DB implementations."""
+from __future__ import division
 
 import functools
 import logging
@@ -44,6 +45,70 @@ def CallLoggedAndAccounted(f):
   return Decorator
 
 
+class MessageHandlerLeaseScheduler(object):
+  """Decides how many message handler requests to lease and when to poll.
+
+  Lease batches are sized so that the handler can process a whole batch well
+  within the lease time, based on the throughput observed so far. When no
+  requests are available, the poll interval backs off exponentially up to a
+  maximum and is reset as soon as requests show up again.
+  """
+
+  # Exponential moving average weight of the most recent throughput sample.
+  THROUGHPUT_SMOOTHING = 0.3
+
+  def __init__(self,
+               lease_time,
+               limit,
+               min_poll_interval=0.1,
+               max_poll_interval=5.0):
+    """Constructor.
+
+    Args:
+      lease_time: rdfvalue.Duration for which requests are leased.
+      limit: Maximum number of requests to lease at once.
+      min_poll_interval: Seconds to wait after the first empty poll.
+      max_poll_interval: Upper bound for the poll interval in seconds.
+    """
+    self.lease_seconds = lease_time.seconds
+    self.limit = limit
+    self.min_poll_interval = min_poll_interval
+    self.max_poll_interval = max_poll_interval
+
+    self.batch_size = limit
+    self.poll_interval = min_poll_interval
+    # Requests processed per second, None until the first batch is done.
+    self.throughput = None
+
+  def RecordBatch(self, count, processing_time):
+    """Updates the throughput estimate after a batch has been handled."""
+    self.poll_interval = self.min_poll_interval
+    if not count:
+      return
+
+    sample = count / max(processing_time, 1e-6)
+    if self.throughput is None:
+      self.throughput = sample
+    else:
+      self.throughput = (self.THROUGHPUT_SMOOTHING * sample +
+                         (1 - self.THROUGHPUT_SMOOTHING) * self.throughput)
+
+    # Aim to finish a batch in half the lease time so that requests don't get
+    # leased again by another process while they are still being handled.
+    target = int(self.throughput * self.lease_seconds / 2)
+    self.batch_size = max(1, min(self.limit, target))
+
+  def NextPollInterval(self):
+    """Returns seconds to wait after an empty poll and backs off further."""
+    interval = self.poll_interval
+    self.poll_interval = min(self.max_poll_interval, self.poll_interval * 2)
+    return interval
+
+  def Reset(self):
+    """Resets the poll interval, e.g. after new requests were written."""
+    self.poll_interval = self.min_poll_interval
+
+
 def ClientIdFromGrrMessage(m):
   if m.queue:
     return m.queue.Split()[0]
@@ -4,6 +4,7 @@ import logging
 import mock
 
 import unittest
+from grr_response_core.lib import rdfvalue
 from grr_response_server import db
 from grr_response_server import db_utils
 from grr.test_lib import stats_test_lib
@@ -88,5 +89,61 @@ class CallLoggedAndAccountedTest(stats_test_lib.StatsTestMixin,
     self.assertEqual(got[1], "SampleCallWithDBError")
 
 
+class MessageHandlerLeaseSchedulerTest(unittest.TestCase):
+
+  def testPollIntervalBacksOffExponentially(self):
+    scheduler = db_utils.MessageHandlerLeaseScheduler(
+        rdfvalue.Duration("5m"), 100, min_poll_interval=0.1,
+        max_poll_interval=1.0)
+
+    intervals = [scheduler.NextPollInterval() for _ in range(6)]
+    self.assertEqual(intervals, [0.1, 0.2, 0.4, 0.8, 1.0, 1.0])
+
+  def testResetRestoresMinimalPollInterval(self):
+    scheduler = db_utils.MessageHandlerLeaseScheduler(
+        rdfvalue.Duration("5m"), 100, min_poll_interval=0.1)
+    for _ in range(5):
+      scheduler.NextPollInterval()
+
+    scheduler.Reset()
+    self.assertEqual(scheduler.NextPollInterval(), 0.1)
+
+  def testHandledBatchRestoresMinimalPollInterval(self):
+    scheduler = db_utils.MessageHandlerLeaseScheduler(
+        rdfvalue.Duration("5m"), 100, min_poll_interval=0.1)
+    for _ in range(5):
+      scheduler.NextPollInterval()
+
+    scheduler.RecordBatch(10, 1.0)
+    self.assertEqual(scheduler.NextPollInterval(), 0.1)
+
+  def testBatchSizeStartsAtLimit(self):
+    scheduler = db_utils.MessageHandlerLeaseScheduler(
+        rdfvalue.Duration("5m"), 100)
+    self.assertEqual(scheduler.batch_size, 100)
+
+  def testSlowHandlerGetsSmallerBatches(self):
+    scheduler = db_utils.MessageHandlerLeaseScheduler(
+        rdfvalue.Duration("10s"), 1000)
+
+    # 10 requests per second, half of the lease time is 5 seconds.
+    scheduler.RecordBatch(100, 10.0)
+    self.assertEqual(scheduler.batch_size, 50)
+
+  def testFastHandlerIsCappedAtLimit(self):
+    scheduler = db_utils.MessageHandlerLeaseScheduler(
+        rdfvalue.Duration("10s"), 1000)
+
+    scheduler.RecordBatch(1000, 0.01)
+    self.assertEqual(scheduler.batch_size, 1000)
+
+  def testBatchSizeIsAtLeastOne(self):
+    scheduler = db_utils.MessageHandlerLeaseScheduler(
+        rdfvalue.Duration("1s"), 1000)
+
+    scheduler.RecordBatch(1, 100.0)
+    self.assertEqual(scheduler.batch_size, 1)
+
+
 if __name__ == "__main__":
   unittest.main()
@@ -218,6 +218,11 @@ class ExportConverter(with_metaclass(registry.MetaclassRegistry, object)):
   # Type of values that this converter accepts.
   input_rdf_type = None
 
+  # Whether the converter only transforms values passed to it, without
+  # accessing the data store. Such converters may be run in worker processes
+  # (see instant_output_plugin.InstantOutputPluginWithExportConversion).
+  subprocess_safe = False
+
   # Cache used for GetConvertersByValue() lookups.
   converters_cache = {}
 
@@ -410,6 +415,10 @@ class StatEntryToExportedFileConverter(ExportConverter):
     self.open_file_for_read = (
         self.options.export_files_hashes or self.options.export_files_contents)
 
+  @property
+  def subprocess_safe(self):
+    return not self.open_file_for_read
+
   @staticmethod
   def ParseSignedData(signed_data, result):
     """Parses signed certificate data and updates result rdfvalue."""
@@ -600,6 +609,7 @@ class StatEntryToExportedRegistryKeyConverter(ExportConverter):
   """Converts StatEntry to ExportedRegistryKey."""
 
   input_rdf_type = "StatEntry"
+  subprocess_safe = True
 
   def Convert(self, metadata, stat_entry, token=None):
     """Converts StatEntry to ExportedRegistryKey.
@@ -645,6 +655,7 @@ class NetworkConnectionToExportedNetworkConnectionConverter(ExportConverter):
   """Converts NetworkConnection to ExportedNetworkConnection."""
 
   input_rdf_type = "NetworkConnection"
+  subprocess_safe = True
 
   def Convert(self, metadata, conn, token=None):
     """Converts NetworkConnection to ExportedNetworkConnection."""
@@ -665,6 +676,7 @@ class ProcessToExportedProcessConverter(ExportConverter):
   """Converts Process to ExportedProcess."""
 
   input_rdf_type = "Process"
+  subprocess_safe = True
 
   def Convert(self, metadata, process, token=None):
     """Converts Process to ExportedProcess."""
@@ -702,6 +714,7 @@ class ProcessToExportedNetworkConnectionConverter(ExportConverter):
   """Converts Process to ExportedNetworkConnection."""
 
   input_rdf_type = "Process"
+  subprocess_safe = True
 
   def Convert(self, metadata, process, token=None):
     """Converts Process to ExportedNetworkConnection."""
@@ -716,6 +729,7 @@ class ProcessToExportedOpenFileConverter(ExportConverter):
   """Converts Process to ExportedOpenFile."""
 
   input_rdf_type = "Process"
+  subprocess_safe = True
 
   def Convert(self, metadata, process, token=None):
     """Converts Process to ExportedOpenFile."""
@@ -726,6 +740,7 @@ class ProcessToExportedOpenFileConverter(ExportConverter):
 
 class InterfaceToExportedNetworkInterfaceConverter(ExportConverter):
   input_rdf_type = "Interface"
+  subprocess_safe = True
 
   def Convert(self, metadata, interface, token=None):
     """Converts Interface to ExportedNetworkInterfaces."""
@@ -753,6 +768,7 @@ class InterfaceToExportedNetworkInterfaceConverter(ExportConverter):
 
 class DNSClientConfigurationToExportedDNSClientConfiguration(ExportConverter):
   input_rdf_type = "DNSClientConfiguration"
+  subprocess_safe = True
 
   def Convert(self, metadata, config, token=None):
     """Converts DNSClientConfiguration to ExportedDNSClientConfiguration."""
@@ -766,6 +782,7 @@ class DNSClientConfigurationToExportedDNSClientConfiguration(ExportConverter):
 class ClientSummaryToExportedNetworkInterfaceConverter(
     InterfaceToExportedNetworkInterfaceConverter):
   input_rdf_type = "ClientSummary"
+  subprocess_safe = True
 
   def Convert(self, metadata, client_summary, token=None):
     """Converts ClientSummary to ExportedNetworkInterfaces."""
@@ -777,6 +794,7 @@ class ClientSummaryToExportedNetworkInterfaceConverter(
 
 class ClientSummaryToExportedClientConverter(ExportConverter):
   input_rdf_type = "ClientSummary"
+  subprocess_safe = True
 
   def Convert(self, metadata, unused_client_summary, token=None):
     return [ExportedClient(metadata=metadata)]
@@ -786,6 +804,7 @@ class BufferReferenceToExportedMatchConverter(ExportConverter):
   """Export converter for BufferReference instances."""
 
   input_rdf_type = "BufferReference"
+  subprocess_safe = True
 
   def Convert(self, metadata, buffer_reference, token=None):
     yield ExportedMatch(
@@ -975,6 +994,7 @@ class VFSFileToExportedFileConverter(ExportConverter):
 class RDFBytesToExportedBytesConverter(ExportConverter):
 
   input_rdf_type = "RDFBytes"
+  subprocess_safe = True
 
   def Convert(self, metadata, data, token=None):
     result = ExportedBytes(
@@ -985,6 +1005,7 @@ class RDFBytesToExportedBytesConverter(ExportConverter):
 class RDFStringToExportedStringConverter(ExportConverter):
 
   input_rdf_type = "RDFString"
+  subprocess_safe = True
 
   def Convert(self, metadata, data, token=None):
     return [ExportedString(metadata=metadata, data=data.SerializeToString())]
@@ -994,6 +1015,7 @@ class DictToExportedDictItemsConverter(ExportConverter):
   """Export converter that converts Dict to ExportedDictItems."""
 
   input_rdf_type = "Dict"
+  subprocess_safe = True
 
   def _IterateDict(self, d, key=""):
     if isinstance(d, (list, tuple)):
@@ -1183,6 +1205,7 @@ class FileStoreHashConverter(ExportConverter):
 
 class CheckResultConverter(ExportConverter):
   input_rdf_type = "CheckResult"
+  subprocess_safe = True
 
   def Convert(self, metadata, checkresult, token=None):
     """Converts a single CheckResult.
@@ -1339,6 +1362,7 @@ class ArtifactFilesDownloaderResultConverter(ExportConverter):
 
 class YaraProcessScanResponseConverter(ExportConverter):
   input_rdf_type = "YaraProcessScanMatch"
+  subprocess_safe = True
 
   def Convert(self, metadata, yara_match, token=None):
     """Convert a single YaraProcessScanMatch."""
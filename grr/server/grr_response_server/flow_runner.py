@@ -236,6 +236,7 @@ class FlowRunner(object):
         current_state="Start",
         output_plugins_states=output_plugins_states,
         state=rdf_flow_runner.FlowContext.State.RUNNING,
+        relational_db_has_all_results=data_store.RelationalDBWriteEnabled(),
     )
 
     return context
@@ -873,6 +874,21 @@ class FlowRunner(object):
               self.flow_obj.output_urn, response, mutation_pool=pool)
           multi_type_collection.MultiTypeCollection.StaticAdd(
               self.flow_obj.multi_type_output_urn, response, mutation_pool=pool)
+
+      if data_store.RelationalDBWriteEnabled():
+        messages = []
+        for response in self.queued_replies:
+          message = rdf_flows.GrrMessage(payload=response)
+          if self.runner_args.client_id:
+            message.source = self.runner_args.client_id
+          messages.append(message)
+        data_store.REL_DB.WriteResults(
+            utils.SmartUnicode(self.flow_obj.output_urn), messages)
+      else:
+        # The relational database misses these results for good, even if
+        # relational writes get enabled again later.
+        self.context.relational_db_has_all_results = False
+
       self.queued_replies = []
 
   def FlushMessages(self):
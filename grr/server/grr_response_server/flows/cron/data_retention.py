@@ -12,6 +12,7 @@ from grr_response_server import flow
 from grr_response_server.aff4_objects import aff4_grr
 from grr_response_server.aff4_objects import cronjobs as aff4_cronjobs
 from grr_response_server.hunts import implementation
+from grr_response_server.hunts import results_segments
 
 
 class CleanHuntsMixin(object):
@@ -47,6 +48,16 @@ class CleanHuntsMixin(object):
         self.HeartBeat()
     self.Log("Deleted %d hunts." % hunts_deleted)
 
+  def CleanHuntResultSegments(self):
+    """Deletes result segments of hunts that no longer exist."""
+    if not results_segments.IsEnabled():
+      return
+
+    hunts_root = aff4.FACTORY.Open("aff4:/hunts", token=self.token)
+    segments_deleted = results_segments.DeleteOrphanedSegments(
+        hunts_root.ListChildren())
+    self.Log("Deleted result segments of %d hunts." % segments_deleted)
+
 
 class CleanHunts(aff4_cronjobs.SystemCronFlow, CleanHuntsMixin):
   """Cleaner that deletes old hunts."""
@@ -57,6 +68,7 @@ class CleanHunts(aff4_cronjobs.SystemCronFlow, CleanHuntsMixin):
   @flow.StateHandler()
   def Start(self):
     self.CleanAff4Hunts()
+    self.CleanHuntResultSegments()
 
 
 class CleanHuntsCronJob(cronjobs.CronJobBase, CleanHuntsMixin):
@@ -66,6 +78,7 @@ class CleanHuntsCronJob(cronjobs.CronJobBase, CleanHuntsMixin):
 
   def Run(self):
     self.CleanAff4Hunts()
+    self.CleanHuntResultSegments()
 
 
 class CleanCronJobs(aff4_cronjobs.SystemCronFlow):
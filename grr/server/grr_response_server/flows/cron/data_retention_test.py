@@ -11,6 +11,7 @@ from grr_response_core import config
 from grr_response_core.lib import flags
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_server import aff4
 from grr_response_server import data_store
 from grr_response_server import flow
@@ -133,6 +134,29 @@ class CleanHuntsFlowTest(flow_test_lib.FlowTestsBaseclass):
           aff4.FACTORY.Open("aff4:/hunts", token=self.token).ListChildren())
       self.assertEqual(len(hunts_urns), 3)
 
+  def testDeletesResultSegmentsOfDeletedHunts(self):
+    with test_lib.ConfigOverrider({
+        "DataRetention.hunts_ttl": rdfvalue.Duration("150s"),
+        "HuntResultSegments.enabled": True,
+        "HuntResultSegments.root_dir": self.temp_dir
+    }):
+      orphaned_urn = rdfvalue.RDFURN("aff4:/hunts/H:000000")
+      for hunt_urn in self.hunts_urns + [orphaned_urn]:
+        implementation.GRRHunt.ResultSegmentStoreForHID(hunt_urn).AddMessages(
+            [rdf_flows.GrrMessage(payload=rdfvalue.RDFString("foo"))],
+            rdfvalue.RDFDatetime.Now())
+
+      with test_lib.FakeTime(40 + 60 * self.NUM_HUNTS):
+        self._RunCleanup()
+
+      remaining = set(
+          aff4.FACTORY.Open("aff4:/hunts", token=self.token).ListChildren())
+      self.assertEqual(len(remaining), 2)
+      for hunt_urn in self.hunts_urns + [orphaned_urn]:
+        store = implementation.GRRHunt.ResultSegmentStoreForHID(hunt_urn)
+        self.assertEqual(store.Exists(), hunt_urn in remaining)
+    self._CheckLog("Deleted result segments of 9")
+
 
 class CleanHuntsJobTest(db_test_lib.RelationalDBEnabledMixin,
                         CleanHuntsFlowTest):
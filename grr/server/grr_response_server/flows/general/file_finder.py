@@ -4,6 +4,7 @@
 import stat
 
 from grr_response_core.lib import artifact_utils
+from grr_response_core.lib import constants
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import file_finder as rdf_file_finder
@@ -345,7 +346,18 @@ class ClientFileFinder(flow.GRRFlow):
     if self.args.pathtype != "OS":
       raise ValueError("Only supported pathtype is OS.")
 
+    action = self.args.action
+    if (action.action_type == rdf_file_finder.FileFinderAction.Action.DOWNLOAD
+        and action.download.hash_first and
+        action.download.chunk_size > constants.CLIENT_MAX_BUFFER_SIZE):
+      # Missing chunks are transferred with a single TransferBuffer call each.
+      raise ValueError("Chunk size %d exceeds the maximum of %d bytes." %
+                       (action.download.chunk_size,
+                        constants.CLIENT_MAX_BUFFER_SIZE))
+
     self.args.paths = list(self._InterpolatePaths(self.args.paths))
+    self.state.pending_files = {}
+    self.state.pending_chunks = {}
 
     self.CallClient(
         server_stubs.FileFinderOS, request=self.args, next_state="StoreResults")
@@ -365,6 +377,15 @@ class ClientFileFinder(flow.GRRFlow):
       raise flow.FlowError(responses.status)
 
     self.state.files_found = len(responses)
+
+    action = self.args.action
+    if (action.action_type == rdf_file_finder.FileFinderAction.Action.DOWNLOAD
+        and action.download.hash_first):
+      responses = self._FetchMissingChunks(responses)
+
+    self._StoreResponses(responses)
+
+  def _StoreResponses(self, responses):
     files_to_publish = []
     with data_store.DB.GetMutationPool() as pool:
       for response in responses:
@@ -384,6 +405,103 @@ class ClientFileFinder(flow.GRRFlow):
           "FileStore.AddFileToStore": files_to_publish
       })
 
+  def _FetchMissingChunks(self, responses):
+    """Requests chunks missing from the blob store from the client.
+
+    With `hash_first` the client only reports the digests of the chunks of the
+    downloaded files. Chunks that are already known are not transferred again,
+    the rest is requested one by one with `TransferBuffer`. Chunks with the
+    same digest are transferred only once, no matter how many files (or
+    offsets within a file) they occur at.
+
+    Args:
+      responses: File finder results of the client.
+
+    Returns:
+      A list of results for which all the chunks are already stored.
+    """
+    blob_hashes = set()
+    for response in responses:
+      for chunk in response.transferred_file.chunks:
+        blob_hashes.add(chunk.digest.encode("hex"))
+
+    existing_blobs = {}
+    if blob_hashes:
+      existing_blobs = data_store.DB.BlobsExist(
+          list(blob_hashes), token=self.token)
+
+    complete = []
+    for index, response in enumerate(responses):
+      missing_chunks = [
+          chunk for chunk in response.transferred_file.chunks
+          if not existing_blobs[chunk.digest.encode("hex")]
+      ]
+      if not missing_chunks:
+        complete.append(response)
+        continue
+
+      self.state.pending_files[index] = dict(
+          response=response, chunks_pending=len(missing_chunks))
+      for chunk in missing_chunks:
+        digest = chunk.digest.encode("hex")
+        waiting = self.state.pending_chunks.setdefault(digest, [])
+        waiting.append((index, chunk.offset, chunk.length))
+        if len(waiting) == 1:
+          self._RequestChunk(digest, index, chunk.offset, chunk.length)
+
+    return complete
+
+  def _RequestChunk(self, digest, index, offset, length):
+    response = self.state.pending_files[index]["response"]
+    self.CallClient(
+        server_stubs.TransferBuffer,
+        rdf_client.BufferReference(
+            pathspec=response.stat_entry.pathspec,
+            offset=offset,
+            length=length),
+        next_state="WriteMissingChunk",
+        request_data=dict(digest=digest))
+
+  @flow.StateHandler()
+  def WriteMissingChunk(self, responses):
+    """Stores files once all of their missing chunks are transferred."""
+    digest = responses.request_data["digest"]
+    waiting = self.state.pending_chunks.pop(digest)
+
+    if not responses.success:
+      index = waiting[0][0]
+      response = self.state.pending_files[index]["response"]
+      raise flow.FlowError("Failed to transfer %s: %s" %
+                           (response.stat_entry.pathspec.path,
+                            responses.status))
+
+    # The file might have changed since it was hashed, so the digest of what
+    # was actually transferred is the one to keep. Other occurrences of the
+    # chunk can only share it if it didn't change, otherwise the next one has
+    # to be transferred on its own.
+    buffer_reference = responses.First()
+    if buffer_reference.data.encode("hex") == digest:
+      transferred, remaining = waiting, []
+    else:
+      transferred, remaining = waiting[:1], waiting[1:]
+
+    if remaining:
+      self.state.pending_chunks[digest] = remaining
+      self._RequestChunk(digest, *remaining[0])
+
+    for index, offset, _ in transferred:
+      file_tracker = self.state.pending_files[index]
+      response = file_tracker["response"]
+      for chunk in response.transferred_file.chunks:
+        if chunk.offset == offset:
+          chunk.digest = buffer_reference.data
+          chunk.length = buffer_reference.length
+
+      file_tracker["chunks_pending"] -= 1
+      if file_tracker["chunks_pending"] == 0:
+        del self.state.pending_files[index]
+        self._StoreResponses([response])
+
   # TODO(hanuszczak): Change name of this function since now it also writes to
   # the relational database.
   def _CreateAff4BlobImage(self, response, mutation_pool=None):
@@ -11,6 +11,7 @@ from builtins import zip  # pylint: disable=redefined-builtin
 from future.utils import itervalues
 
 from grr_response_client import vfs
+from grr_response_core.lib import constants
 from grr_response_core.lib import flags
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
@@ -874,6 +875,88 @@ class TestClientFileFinderFlow(flow_test_lib.FlowTestsBaseclass):
     ]
     self.assertItemsEqual(relpaths, [u"厨房/卫浴洁.txt"])
 
+  def testClientFileFinderHashFirstDownload(self):
+    path = os.path.join(self.base_path, "test.plist")
+    action = rdf_file_finder.FileFinderAction.Download(hash_first=True)
+    client_mock = action_mocks.ClientFileFinderClientMock()
+
+    def RunFlow():
+      session_id = flow_test_lib.TestFlowHelper(
+          file_finder.ClientFileFinder.__name__,
+          client_mock,
+          client_id=self.client_id,
+          paths=[path],
+          pathtype=rdf_paths.PathSpec.PathType.OS,
+          action=action,
+          token=self.token)
+      return list(flow.GRRFlow.ResultCollectionForFID(session_id))
+
+    results = RunFlow()
+    self.assertEqual(len(results), 1)
+    self.assertGreater(client_mock.action_counts["TransferBuffer"], 0)
+
+    urn = results[0].stat_entry.pathspec.AFF4Path(self.client_id)
+    with open(path, "rb") as fd:
+      expected_data = fd.read()
+    fd = aff4.FACTORY.Open(urn, token=self.token)
+    self.assertEqual(fd.read(), expected_data)
+
+    # All the chunks are known now, so collecting the file again must not
+    # transfer anything.
+    transfer_count = client_mock.action_counts["TransferBuffer"]
+    results = RunFlow()
+    self.assertEqual(len(results), 1)
+    self.assertEqual(client_mock.action_counts["TransferBuffer"],
+                     transfer_count)
+
+  def testClientFileFinderHashFirstDownloadTransfersIdenticalChunksOnce(self):
+    action = rdf_file_finder.FileFinderAction.Download(
+        hash_first=True, chunk_size=1024)
+    client_mock = action_mocks.ClientFileFinderClientMock()
+
+    data = b"quux" * 1024
+    with test_lib.AutoTempDirPath(remove_non_empty=True) as temp_dirpath:
+      paths = [
+          os.path.join(temp_dirpath, "foo"),
+          os.path.join(temp_dirpath, "bar")
+      ]
+      for path in paths:
+        with open(path, "wb") as fd:
+          fd.write(data)
+
+      session_id = flow_test_lib.TestFlowHelper(
+          file_finder.ClientFileFinder.__name__,
+          client_mock,
+          client_id=self.client_id,
+          paths=paths,
+          pathtype=rdf_paths.PathSpec.PathType.OS,
+          action=action,
+          token=self.token)
+
+    # Both files consist of four copies of the same chunk.
+    self.assertEqual(client_mock.action_counts["TransferBuffer"], 1)
+
+    results = list(flow.GRRFlow.ResultCollectionForFID(session_id))
+    self.assertEqual(len(results), 2)
+    for result in results:
+      urn = result.stat_entry.pathspec.AFF4Path(self.client_id)
+      fd = aff4.FACTORY.Open(urn, token=self.token)
+      self.assertEqual(fd.read(), data)
+
+  def testClientFileFinderHashFirstDownloadRejectsLargeChunks(self):
+    action = rdf_file_finder.FileFinderAction.Download(
+        hash_first=True, chunk_size=constants.CLIENT_MAX_BUFFER_SIZE + 1)
+
+    with self.assertRaisesRegexp(RuntimeError, "Chunk size"):
+      flow_test_lib.TestFlowHelper(
+          file_finder.ClientFileFinder.__name__,
+          action_mocks.ClientFileFinderClientMock(),
+          client_id=self.client_id,
+          paths=[os.path.join(self.base_path, "test.plist")],
+          pathtype=rdf_paths.PathSpec.PathType.OS,
+          action=action,
+          token=self.token)
+
   def testPathInterpolation(self):
     self.client_id = self.SetupClient(0)
 
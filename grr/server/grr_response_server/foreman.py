@@ -1,12 +1,16 @@
 #!/usr/bin/env python
 """The GRR Foreman."""
 
+import bisect
 import logging
+import threading
+import time
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import registry
 from grr_response_server import aff4
 from grr_response_server import data_store
+from grr_response_server import foreman_rules
 from grr_response_server import message_handlers
 
 
@@ -17,6 +21,127 @@ def GetForeman(token=None):
     return aff4.FACTORY.Open("aff4:/foreman", mode="rw", token=token)
 
 
+class CompiledForemanRule(object):
+  """A foreman rule together with its compiled evaluation function."""
+
+  def __init__(self, rule):
+    self.rule = rule
+    self.creation_time = rule.creation_time
+    self.expiration_time = rule.expiration_time
+    # OS families a client has to belong to for the rule to fire, None if the
+    # rule is not restricted to particular OSes.
+    self.os_families = rule.client_rule_set.OsFamilies()
+    self._evaluate = rule.client_rule_set.Compile()
+
+  def Evaluate(self, fields):
+    """Evaluates the rule on a `foreman_rules.ClientFieldCache`."""
+    return self._evaluate(fields)
+
+
+class _RulesByCreationTime(object):
+  """Compiled foreman rules sorted by their creation time."""
+
+  def __init__(self, rules):
+    self.rules = sorted(rules, key=lambda compiled: compiled.creation_time)
+    self._creation_times = [compiled.creation_time for compiled in self.rules]
+
+  def CreatedAfter(self, timestamp):
+    """Returns compiled rules created strictly after timestamp."""
+    return self.rules[bisect.bisect_right(self._creation_times, timestamp):]
+
+
+class ForemanRulesPlan(object):
+  """All foreman rules precompiled for evaluation.
+
+  Rules are bucketed by the OS families they are restricted to, so that rules
+  which can't fire for a client are never evaluated. Rules that fail to
+  compile are logged and skipped.
+  """
+
+  def __init__(self, rules):
+    compiled_rules = []
+    for rule in rules:
+      try:
+        compiled_rules.append(CompiledForemanRule(rule))
+      except ValueError as e:
+        logging.error("Skipping invalid foreman rule of hunt %s: %s",
+                      rule.hunt_id, e)
+
+    self._all = _RulesByCreationTime(compiled_rules)
+    self.rules = self._all.rules
+
+    # Clients of an unknown OS family only match unrestricted rules.
+    self._by_os_family = {}
+    for family in foreman_rules.OS_FAMILIES + (None,):
+      self._by_os_family[family] = _RulesByCreationTime(
+          compiled for compiled in compiled_rules
+          if compiled.os_families is None or family in compiled.os_families)
+
+    # Invalid rules are taken into account as well, so that they still get
+    # removed once they expire.
+    self.earliest_expiration_time = min(
+        [rule.expiration_time for rule in rules] or [None])
+
+  @property
+  def latest_creation_time(self):
+    return self.rules[-1].creation_time if self.rules else None
+
+  def RulesCreatedAfter(self, timestamp):
+    """Returns compiled rules created strictly after timestamp."""
+    return self._all.CreatedAfter(timestamp)
+
+  def RulesForOsFamily(self, os_family, created_after):
+    """Returns compiled rules that can fire for clients of an OS family.
+
+    Args:
+      os_family: An element of `foreman_rules.OS_FAMILIES` or None.
+      created_after: Only rules created strictly after this RDFDatetime are
+        returned.
+
+    Returns:
+      A list of `CompiledForemanRule`s sorted by creation time.
+    """
+    return self._by_os_family[os_family].CreatedAfter(created_after)
+
+
+class ForemanRuleCache(object):
+  """An in-process cache of the foreman rules read from the database.
+
+  The cache is reread whenever this process writes or removes a rule. Rules
+  written by other processes are picked up after at most MAX_AGE seconds.
+  """
+
+  MAX_AGE = 10
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._plan = None
+    self._expires = 0
+    self._db = None
+    self._generation = None
+
+  def Get(self):
+    """Returns a `ForemanRulesPlan` with the current rules."""
+    with self._lock:
+      now = time.time()
+      db = data_store.REL_DB
+      generation = db.foreman_rules_generation
+      if (self._plan is None or now >= self._expires or self._db is not db or
+          self._generation != generation):
+        self._plan = ForemanRulesPlan(db.ReadAllForemanRules())
+        self._expires = now + self.MAX_AGE
+        self._db = db
+        self._generation = generation
+      return self._plan
+
+  def Invalidate(self):
+    with self._lock:
+      self._plan = None
+
+
+RULE_CACHE = ForemanRuleCache()
+
+
 # TODO(amoser): Now that Foreman rules are directly stored in the db,
 # consider removing this class altogether once the AFF4 Foreman has
 # been removed.
@@ -82,13 +207,13 @@ class Foreman(object):
     Returns:
       Number of assigned tasks.
     """
-    rules = data_store.REL_DB.ReadAllForemanRules()
-    if not rules:
+    plan = RULE_CACHE.Get()
+    if not plan.rules:
       return 0
 
     last_foreman_run = self._GetLastForemanRunTime(client_id)
 
-    latest_rule_creation_time = max(rule.creation_time for rule in rules)
+    latest_rule_creation_time = plan.latest_creation_time
 
     if latest_rule_creation_time <= last_foreman_run:
       return 0
@@ -96,19 +221,12 @@ class Foreman(object):
     # Update the latest checked rule on the client.
     self._SetLastForemanRunTime(client_id, latest_rule_creation_time)
 
-    relevant_rules = []
-    expired_rules = False
-
     now = rdfvalue.RDFDatetime.Now()
+    expired_rules = plan.earliest_expiration_time < now
 
-    for rule in rules:
-      if rule.expiration_time < now:
-        expired_rules = True
-        continue
-      if rule.creation_time <= last_foreman_run:
-        continue
-
-      relevant_rules.append(rule)
+    relevant_rules = any(
+        compiled.expiration_time >= now
+        for compiled in plan.RulesCreatedAfter(last_foreman_run))
 
     actions_count = 0
     if relevant_rules:
@@ -116,9 +234,13 @@ class Foreman(object):
       if client_data is None:
         return
 
-      for rule in relevant_rules:
-        if rule.Evaluate(client_data):
-          actions_count += self._RunAction(rule, client_id)
+      fields = foreman_rules.ClientFieldCache(client_data)
+      for compiled in plan.RulesForOsFamily(fields.os_family, last_foreman_run):
+        if compiled.expiration_time < now:
+          continue
+
+        if compiled.Evaluate(fields):
+          actions_count += self._RunAction(compiled.rule, client_id)
 
     if expired_rules:
       data_store.REL_DB.RemoveExpiredForemanRules()
@@ -132,10 +254,6 @@ class ForemanMessageHandler(message_handlers.MessageHandler):
   handler_name = "ForemanHandler"
 
   def ProcessMessages(self, msgs):
-    # TODO(amoser): The foreman reads the rules from the database for each
-    # client. In the old implementation we used to have a cache. If this is a
-    # performance hit, lets consider putting the cache back.
-
     foreman_obj = Foreman()
     for msg in msgs:
       foreman_obj.AssignTasksToClient(msg.client_id)
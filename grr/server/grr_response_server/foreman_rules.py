@@ -32,10 +32,76 @@ class ForemanClientRuleBase(rdf_structs.RDFProtoStruct):
     """
     raise NotImplementedError
 
+  def Compile(self):
+    """Compiles the rule for repeated evaluation on the relational db.
+
+    Returns:
+      A function taking a `ClientFieldCache` and returning a bool value of the
+      evaluation.
+    """
+    raise NotImplementedError
+
   def Validate(self):
     raise NotImplementedError
 
 
+# Values of the knowledge base "os" field recognized by ForemanOsClientRule.
+OS_FAMILIES = ("Windows", "Linux", "Darwin")
+
+
+class ClientFieldCache(object):
+  """Resolves client fields for compiled rules, each at most once per client."""
+
+  def __init__(self, client_info):
+    """Constructor.
+
+    Args:
+      client_info: A `db.ClientFullInfo` instance.
+    """
+    self.client_info = client_info
+    self._os_family = None
+    self._os_family_resolved = False
+    self._labels = None
+    self._regex_fields = {}
+    self._integer_fields = {}
+
+  @property
+  def os_family(self):
+    """The element of OS_FAMILIES the client's OS starts with or None."""
+    if not self._os_family_resolved:
+      value = self.client_info.last_snapshot.knowledge_base.os
+      value = utils.SmartStr(value) if value else ""
+      for family in OS_FAMILIES:
+        if value.startswith(family):
+          self._os_family = family
+          break
+      self._os_family_resolved = True
+
+    return self._os_family
+
+  @property
+  def labels(self):
+    if self._labels is None:
+      self._labels = frozenset(label.name for label in self.client_info.labels)
+    return self._labels
+
+  def RegexField(self, field):
+    try:
+      return self._regex_fields[field]
+    except KeyError:
+      value = ForemanRegexClientRule.ResolveField(field, self.client_info)
+      self._regex_fields[field] = value
+      return value
+
+  def IntegerField(self, field):
+    try:
+      return self._integer_fields[field]
+    except KeyError:
+      value = ForemanIntegerClientRule.ResolveField(field, self.client_info)
+      self._integer_fields[field] = value
+      return value
+
+
 class ForemanOsClientRule(ForemanClientRuleBase):
   """This rule will fire if the client OS is marked as true in the proto."""
   protobuf = jobs_pb2.ForemanOsClientRule
@@ -55,6 +121,16 @@ class ForemanOsClientRule(ForemanClientRuleBase):
             (self.os_linux and value.startswith("Linux")) or
             (self.os_darwin and value.startswith("Darwin")))
 
+  def OsFamilies(self):
+    """Returns the set of OS_FAMILIES this rule fires for."""
+    enabled = (self.os_windows, self.os_linux, self.os_darwin)
+    return frozenset(
+        family for family, flag in zip(OS_FAMILIES, enabled) if flag)
+
+  def Compile(self):
+    families = self.OsFamilies()
+    return lambda fields: fields.os_family in families
+
   def Validate(self):
     pass
 
@@ -82,6 +158,20 @@ class ForemanLabelClientRule(ForemanClientRuleBase):
 
     return quantifier((name in client_label_names) for name in self.label_names)
 
+  def Compile(self):
+    names = frozenset(self.label_names)
+    mode = self.match_mode
+    if mode == ForemanLabelClientRule.MatchMode.MATCH_ALL:
+      return lambda fields: names.issubset(fields.labels)
+    elif mode == ForemanLabelClientRule.MatchMode.MATCH_ANY:
+      return lambda fields: not names.isdisjoint(fields.labels)
+    elif mode == ForemanLabelClientRule.MatchMode.DOES_NOT_MATCH_ALL:
+      return lambda fields: not names.issubset(fields.labels)
+    elif mode == ForemanLabelClientRule.MatchMode.DOES_NOT_MATCH_ANY:
+      return lambda fields: names.isdisjoint(fields.labels)
+    else:
+      raise ValueError("Unexpected match mode value: %s" % mode)
+
   def Validate(self):
     pass
 
@@ -139,7 +229,9 @@ class ForemanRegexClientRule(ForemanClientRuleBase):
       return ""
     return utils.SmartStr(res)
 
-  def _ResolveField(self, field, client_info):
+  @classmethod
+  def ResolveField(cls, field, client_info):
+    """Returns the string value of field for a `db.ClientFullInfo`."""
 
     fsf = ForemanRegexClientRule.ForemanStringField
     client_obj = client_info.last_snapshot
@@ -181,12 +273,22 @@ class ForemanRegexClientRule(ForemanClientRuleBase):
 
   def Evaluate(self, client_obj):
     if RelationalDBReadEnabled():
-      value = self._ResolveField(self.field, client_obj)
+      value = self.ResolveField(self.field, client_obj)
     else:
       value = self._ResolveFieldAFF4(self.field, client_obj)
 
     return self.attribute_regex.Search(value)
 
+  def Compile(self):
+    field = self.field
+    if field == ForemanRegexClientRule.ForemanStringField.UNSET:
+      raise ValueError("Received regex rule without a valid field "
+                       "specification.")
+
+    # Accessing attribute_regex compiles the expression, do it only once.
+    search = self.attribute_regex.Search
+    return lambda fields: bool(search(fields.RegexField(field)))
+
   def Validate(self):
     if self.field == ForemanRegexClientRule.ForemanStringField.UNSET:
       raise ValueError("ForemanRegexClientRule rule invalid - field not set.")
@@ -220,7 +322,9 @@ class ForemanIntegerClientRule(ForemanClientRuleBase):
       return
     return res.AsSecondsSinceEpoch()
 
-  def _ResolveField(self, field, client_info):
+  @classmethod
+  def ResolveField(cls, field, client_info):
+    """Returns the integer value of field for a `db.ClientFullInfo`."""
     if field == ForemanIntegerClientRule.ForemanIntegerField.UNSET:
       raise ValueError(
           "Received integer rule without a valid field specification.")
@@ -243,7 +347,7 @@ class ForemanIntegerClientRule(ForemanClientRuleBase):
 
   def Evaluate(self, client_obj):
     if RelationalDBReadEnabled():
-      value = self._ResolveField(self.field, client_obj)
+      value = self.ResolveField(self.field, client_obj)
     else:
       value = self._ResolveFieldAFF4(self.field, client_obj)
 
@@ -261,6 +365,30 @@ class ForemanIntegerClientRule(ForemanClientRuleBase):
       # Unknown operator.
       raise ValueError("Unknown operator: %d" % op)
 
+  def Compile(self):
+    field = self.field
+    if field == ForemanIntegerClientRule.ForemanIntegerField.UNSET:
+      raise ValueError(
+          "Received integer rule without a valid field specification.")
+
+    op = self.operator
+    value = self.value
+    if op == ForemanIntegerClientRule.Operator.LESS_THAN:
+      compare = lambda x: x < value
+    elif op == ForemanIntegerClientRule.Operator.GREATER_THAN:
+      compare = lambda x: x > value
+    elif op == ForemanIntegerClientRule.Operator.EQUAL:
+      compare = lambda x: x == value
+    else:
+      # Unknown operator.
+      raise ValueError("Unknown operator: %d" % op)
+
+    def Evaluate(fields):
+      field_value = fields.IntegerField(field)
+      return field_value is not None and compare(field_value)
+
+    return Evaluate
+
   def Validate(self):
     if self.field == ForemanIntegerClientRule.ForemanIntegerField.UNSET:
       raise ValueError("ForemanIntegerClientRule rule invalid - field not set.")
@@ -287,6 +415,9 @@ class ForemanClientRule(ForemanClientRuleBase):
   def Evaluate(self, client_obj):
     return self.UnionCast().Evaluate(client_obj)
 
+  def Compile(self):
+    return self.UnionCast().Compile()
+
   def Validate(self):
     self.UnionCast().Validate()
 
@@ -321,6 +452,35 @@ class ForemanClientRuleSet(rdf_structs.RDFProtoStruct):
 
     return quantifier(rule.Evaluate(client_obj) for rule in self.rules)
 
+  def Compile(self):
+    """Compiles the rule set, see `ForemanClientRuleBase.Compile`."""
+    if self.match_mode == ForemanClientRuleSet.MatchMode.MATCH_ALL:
+      quantifier = all
+    elif self.match_mode == ForemanClientRuleSet.MatchMode.MATCH_ANY:
+      quantifier = any
+    else:
+      raise ValueError("Unexpected match mode value: %s" % self.match_mode)
+
+    compiled = [rule.Compile() for rule in self.rules]
+    return lambda fields: quantifier(rule(fields) for rule in compiled)
+
+  def OsFamilies(self):
+    """Returns the OS_FAMILIES a client must belong to for this set to fire.
+
+    Returns:
+      A frozenset, or None if the rule set can fire for clients of any OS.
+    """
+    if self.match_mode != ForemanClientRuleSet.MatchMode.MATCH_ALL:
+      return None
+
+    result = None
+    for rule in self.rules:
+      if rule.rule_type != ForemanClientRule.Type.OS:
+        continue
+      families = rule.os.OsFamilies()
+      result = families if result is None else result & families
+    return result
+
   def Validate(self):
     for rule in self.rules:
       rule.Validate()
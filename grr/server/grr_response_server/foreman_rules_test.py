@@ -615,6 +615,79 @@ class ForemanIntegerClientRuleTestRelational(
       r.Evaluate(info)
 
 
+class ForemanClientRuleSetCompileTest(db_test_lib.RelationalDBEnabledMixin,
+                                      test_lib.GRRBaseTest):
+
+  def _RuleSets(self):
+    os_rule = foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.OS,
+        os=foreman_rules.ForemanOsClientRule(os_linux=True, os_darwin=True))
+    label_mode = foreman_rules.ForemanLabelClientRule.MatchMode.MATCH_ANY
+    label_rule = foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.LABEL,
+        label=foreman_rules.ForemanLabelClientRule(
+            label_names=[u"hello", u"foo"], match_mode=label_mode))
+    regex_rule = foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.REGEX,
+        regex=foreman_rules.ForemanRegexClientRule(
+            field="FQDN", attribute_regex="Host-1"))
+    integer_rule = foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.INTEGER,
+        integer=foreman_rules.ForemanIntegerClientRule(
+            field="INSTALL_TIME",
+            operator=foreman_rules.ForemanIntegerClientRule.Operator.
+            GREATER_THAN,
+            value=1000))
+
+    for mode in foreman_rules.ForemanClientRuleSet.MatchMode.enum_dict:
+      for rules in [[], [os_rule], [os_rule, label_rule],
+                    [regex_rule, integer_rule],
+                    [os_rule, label_rule, regex_rule, integer_rule]]:
+        yield foreman_rules.ForemanClientRuleSet(match_mode=mode, rules=rules)
+
+  def testCompiledRulesAgreeWithEvaluate(self):
+    for i, system in enumerate(["Linux", "Windows", "Darwin", "Linux"]):
+      client = self.SetupTestClientObject(
+          i,
+          system=system,
+          install_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(
+              2000 if i % 2 else 500),
+          labels=[u"hello"] if i < 2 else None)
+
+      info = data_store.REL_DB.ReadClientFullInfo(client.client_id)
+      fields = foreman_rules.ClientFieldCache(info)
+      for rule_set in self._RuleSets():
+        self.assertEqual(
+            rule_set.Compile()(fields), rule_set.Evaluate(info), rule_set)
+
+  def testOsFamilies(self):
+    linux = foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.OS,
+        os=foreman_rules.ForemanOsClientRule(os_linux=True, os_darwin=True))
+    darwin = foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.OS,
+        os=foreman_rules.ForemanOsClientRule(os_darwin=True))
+
+    rule_set = foreman_rules.ForemanClientRuleSet(rules=[linux, darwin])
+    self.assertEqual(rule_set.OsFamilies(), frozenset(["Darwin"]))
+
+    # Any other rule could fire for clients of a different OS.
+    rule_set.match_mode = (
+        foreman_rules.ForemanClientRuleSet.MatchMode.MATCH_ANY)
+    self.assertIsNone(rule_set.OsFamilies())
+
+    self.assertIsNone(foreman_rules.ForemanClientRuleSet().OsFamilies())
+
+  def testUnsetFieldRaisesOnCompilation(self):
+    rule = foreman_rules.ForemanRegexClientRule(attribute_regex="foo")
+    with self.assertRaises(ValueError):
+      rule.Compile()
+
+    rule = foreman_rules.ForemanIntegerClientRule(value=42)
+    with self.assertRaises(ValueError):
+      rule.Compile()
+
+
 def main(argv):
   # Run the full test suite
   test_lib.main(argv)
@@ -486,6 +486,152 @@ class RelationalForemanTests(db_test_lib.RelationalDBEnabledMixin,
         rules = data_store.REL_DB.ReadAllForemanRules()
         self.assertEqual(len(rules), num_rules)
 
+  def _WriteMatchAllRule(self, hunt_id, creation_time):
+    rule = foreman_rules.ForemanCondition(
+        creation_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(
+            creation_time),
+        expiration_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(
+            creation_time + 3600),
+        description="Test rule",
+        hunt_name=standard.GenericHunt.__name__,
+        hunt_id=hunt_id,
+        client_rule_set=foreman_rules.ForemanClientRuleSet())
+    data_store.REL_DB.WriteForemanRule(rule)
+
+  def testRuleCacheIsInvalidatedOnWrite(self):
+    client_id = self.SetupTestClientObject(0x31).client_id
+
+    with utils.Stubber(implementation.GRRHunt, "StartClients",
+                       self.StartClients):
+      foreman_obj = foreman.GetForeman()
+      self.clients_started = []
+
+      with test_lib.FakeTime(1000):
+        self._WriteMatchAllRule("H:111111", 1000)
+        foreman_obj.AssignTasksToClient(client_id)
+
+      with test_lib.FakeTime(1001):
+        self._WriteMatchAllRule("H:222222", 1001)
+        foreman_obj.AssignTasksToClient(client_id)
+
+      self.assertEqual([hunt_id.Basename() for hunt_id, _ in
+                        self.clients_started], ["H:111111", "H:222222"])
+
+      with test_lib.FakeTime(1002):
+        data_store.REL_DB.RemoveForemanRule("H:111111")
+        data_store.REL_DB.RemoveForemanRule("H:222222")
+        self.assertEqual(foreman.RULE_CACHE.Get().rules, [])
+
+  def testRuleCacheReadDuringWriteIsInvalidated(self):
+    delegate = data_store.REL_DB.delegate
+    write_foreman_rule = delegate.WriteForemanRule
+
+    def WriteForemanRule(rule):
+      # Another thread reads the rules while this one is writing.
+      foreman.RULE_CACHE.Get()
+      write_foreman_rule(rule)
+
+    with test_lib.FakeTime(1000):
+      with utils.Stubber(delegate, "WriteForemanRule", WriteForemanRule):
+        self._WriteMatchAllRule("H:111111", 1000)
+
+      rules = foreman.RULE_CACHE.Get().rules
+      self.assertEqual([compiled.rule.hunt_id for compiled in rules],
+                       ["H:111111"])
+
+  def testRulesPlan(self):
+    rules = []
+    for hunt_id, creation_time in [("H:222222", 2000), ("H:111111", 1000),
+                                   ("H:333333", 3000)]:
+      rules.append(
+          foreman_rules.ForemanCondition(
+              creation_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(
+                  creation_time),
+              expiration_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(
+                  creation_time + 100),
+              hunt_id=hunt_id,
+              client_rule_set=foreman_rules.ForemanClientRuleSet()))
+
+    plan = foreman.ForemanRulesPlan(rules)
+    self.assertEqual(plan.latest_creation_time.AsSecondsSinceEpoch(), 3000)
+    self.assertEqual(plan.earliest_expiration_time.AsSecondsSinceEpoch(), 1100)
+
+    newer = plan.RulesCreatedAfter(
+        rdfvalue.RDFDatetime.FromSecondsSinceEpoch(1000))
+    self.assertEqual([compiled.rule.hunt_id for compiled in newer],
+                     ["H:222222", "H:333333"])
+
+    self.assertIsNone(foreman.ForemanRulesPlan([]).latest_creation_time)
+
+  def _Condition(self, hunt_id, *client_rules):
+    return foreman_rules.ForemanCondition(
+        creation_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(1000),
+        expiration_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(2000),
+        hunt_name=standard.GenericHunt.__name__,
+        hunt_id=hunt_id,
+        client_rule_set=foreman_rules.ForemanClientRuleSet(
+            rules=list(client_rules)))
+
+  def testRulesPlanBucketsRulesByOsFamily(self):
+    windows_rule = foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.OS,
+        os=foreman_rules.ForemanOsClientRule(os_windows=True))
+    plan = foreman.ForemanRulesPlan([
+        self._Condition("H:111111", windows_rule),
+        self._Condition("H:222222"),
+    ])
+
+    created_after = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(0)
+    self.assertEqual([
+        compiled.rule.hunt_id
+        for compiled in plan.RulesForOsFamily("Windows", created_after)
+    ], ["H:111111", "H:222222"])
+    self.assertEqual([
+        compiled.rule.hunt_id
+        for compiled in plan.RulesForOsFamily("Linux", created_after)
+    ], ["H:222222"])
+    self.assertEqual([
+        compiled.rule.hunt_id
+        for compiled in plan.RulesForOsFamily(None, created_after)
+    ], ["H:222222"])
+
+  def testRulesPlanSkipsInvalidRules(self):
+    invalid_rule = foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.INTEGER,
+        integer=foreman_rules.ForemanIntegerClientRule(value=1))
+    plan = foreman.ForemanRulesPlan([
+        self._Condition("H:111111", invalid_rule),
+        self._Condition("H:222222"),
+    ])
+
+    self.assertEqual([compiled.rule.hunt_id for compiled in plan.rules],
+                     ["H:222222"])
+    self.assertEqual(plan.earliest_expiration_time.AsSecondsSinceEpoch(),
+                     2000)
+
+  def testInvalidRuleDoesNotPreventOtherRulesFromFiring(self):
+    client_id = self.SetupTestClientObject(0x41).client_id
+
+    with utils.Stubber(implementation.GRRHunt, "StartClients",
+                       self.StartClients):
+      foreman_obj = foreman.GetForeman()
+      self.clients_started = []
+
+      with test_lib.FakeTime(1000):
+        data_store.REL_DB.WriteForemanRule(
+            self._Condition(
+                "H:111111",
+                foreman_rules.ForemanClientRule(
+                    rule_type=foreman_rules.ForemanClientRule.Type.REGEX,
+                    regex=foreman_rules.ForemanRegexClientRule(
+                        attribute_regex="foo"))))
+        self._WriteMatchAllRule("H:222222", 1000)
+        foreman_obj.AssignTasksToClient(client_id)
+
+    self.assertEqual(
+        [hunt_id.Basename() for hunt_id, _ in self.clients_started],
+        ["H:222222"])
+
 
 def main(argv):
   # Run the full test suite
@@ -3,10 +3,15 @@
 
 import logging
 import operator
+import Queue
+import sys
+import threading
 import time
 
 
+from builtins import range  # pylint: disable=redefined-builtin
 from future.utils import iteritems
+from future.utils import raise_
 
 from grr_response_core import config
 from grr_response_core.lib import communicator
@@ -31,7 +36,56 @@ from grr_response_server import threadpool
 from grr_response_server.aff4_objects import aff4_grr
 
 
-class ServerCommunicator(communicator.Communicator):
+class ServerCommunicatorBase(communicator.Communicator):
+  """Caches shared by the server side communicators.
+
+  Clients reuse their session cipher for many polls, so decoded ciphers are
+  cached by their encrypted blob and the RSA decryption and signature check
+  only happen for the first bundle of a session. Likewise, the cipher used to
+  answer a client is kept for Frontend.cipher_cache_max_age seconds, which
+  saves the RSA signing and encryption on our side and lets the client hit its
+  own cipher cache when decoding our responses.
+  """
+
+  def __init__(self, certificate, private_key):
+    super(ServerCommunicatorBase, self).__init__(
+        certificate=certificate, private_key=private_key)
+
+    cache_size = config.CONFIG["Frontend.cipher_cache_size"]
+    cipher_max_age = config.CONFIG["Frontend.cipher_cache_max_age"]
+    self.encrypted_cipher_cache = utils.AgeBasedCache(
+        max_size=cache_size, max_age=cipher_max_age)
+    # Maps client common names to (remote public key, cipher) pairs.
+    self.outgoing_cipher_cache = utils.AgeBasedCache(
+        max_size=cache_size, max_age=cipher_max_age)
+    self.pub_key_cache = utils.AgeBasedCache(
+        max_size=cache_size,
+        max_age=config.CONFIG["Frontend.pub_key_cache_max_age"])
+
+  def _GetCipherForDestination(self, destination):
+    remote_public_key = self._GetRemotePublicKey(destination)
+
+    key = str(destination)
+    try:
+      cached_public_key, cipher = self.outgoing_cipher_cache.Get(key)
+      # Public key cache entries are long lived, a different object means the
+      # key was reread and possibly changed.
+      if cached_public_key is remote_public_key:
+        stats.STATS.IncrementCounter(
+            "grr_outgoing_cipher_cache", fields=["hits"])
+        return cipher
+    except KeyError:
+      pass
+
+    stats.STATS.IncrementCounter(
+        "grr_outgoing_cipher_cache", fields=["misses"])
+    cipher = communicator.Cipher(self.common_name, self.private_key,
+                                 remote_public_key)
+    self.outgoing_cipher_cache.Put(key, (remote_public_key, cipher))
+    return cipher
+
+
+class ServerCommunicator(ServerCommunicatorBase):
   """A communicator which stores certificates using AFF4."""
 
   def __init__(self, certificate, private_key, token=None):
@@ -39,7 +93,6 @@ class ServerCommunicator(communicator.Communicator):
     self.token = token
     super(ServerCommunicator, self).__init__(
         certificate=certificate, private_key=private_key)
-    self.pub_key_cache = utils.FastStore(max_size=50000)
     # Our common name as an RDFURN.
     self.common_name = rdfvalue.RDFURN(self.certificate.GetCN())
 
@@ -72,7 +125,7 @@ class ServerCommunicator(communicator.Communicator):
                               len(self.client_cache))
 
     pub_key = cert.GetPublicKey()
-    self.pub_key_cache.Put(common_name, pub_key)
+    self.pub_key_cache.Put(str(common_name), pub_key)
     return pub_key
 
   def VerifyMessageSignature(self, response_comms, packed_message_list, cipher,
@@ -181,13 +234,12 @@ class ServerCommunicator(communicator.Communicator):
     return rdf_flows.GrrMessage.AuthorizationState.AUTHENTICATED
 
 
-class RelationalServerCommunicator(communicator.Communicator):
+class RelationalServerCommunicator(ServerCommunicatorBase):
   """A communicator which stores certificates using the relational db."""
 
   def __init__(self, certificate, private_key):
     super(RelationalServerCommunicator, self).__init__(
         certificate=certificate, private_key=private_key)
-    self.pub_key_cache = utils.FastStore(max_size=50000)
     self.common_name = self.certificate.GetCN()
 
   def _GetRemotePublicKey(self, common_name):
@@ -211,7 +263,7 @@ class RelationalServerCommunicator(communicator.Communicator):
       raise communicator.UnknownClientCert("Stored cert mismatch")
 
     pub_key = cert.GetPublicKey()
-    self.pub_key_cache.Put(common_name, pub_key)
+    self.pub_key_cache.Put(remote_client_id, pub_key)
     return pub_key
 
   def VerifyMessageSignature(self, response_comms, packed_message_list, cipher,
@@ -295,6 +347,169 @@ class RelationalServerCommunicator(communicator.Communicator):
     return rdf_flows.GrrMessage.AuthorizationState.AUTHENTICATED
 
 
+class FrontendOverloadedError(Exception):
+  """Raised when a frontend stage can't accept more work in time.
+
+  Requests are only rejected before any of their messages are stored, so
+  clients can safely resend them.
+  """
+
+
+class _StageTask(object):
+  """A unit of work handed to a FrontendStage together with its result."""
+
+  def __init__(self, target, args):
+    self.target = target
+    self.args = args
+    self.queueing_time = time.time()
+    self.done = threading.Event()
+    self.result = None
+    self.exc_info = None
+
+  def Run(self):
+    try:
+      self.result = self.target(*self.args)
+    except Exception:  # pylint: disable=broad-except
+      self.exc_info = sys.exc_info()
+    finally:
+      self.done.set()
+
+  def Wait(self):
+    self.done.wait()
+    if self.exc_info is not None:
+      raise_(*self.exc_info)
+    return self.result
+
+
+class FrontendStage(object):
+  """A processing stage of the pipelined frontend.
+
+  Each stage has a fixed number of worker threads consuming a bounded work
+  queue. When the queue is full, callers block for up to enqueue_timeout
+  seconds, which propagates backpressure to the connections feeding the stage
+  instead of letting bursts of requests pile up on the data store.
+  """
+
+  def __init__(self, name, num_threads, queue_size, enqueue_timeout=None):
+    self.name = name
+    self.enqueue_timeout = enqueue_timeout
+    self._queue = Queue.Queue(maxsize=queue_size)
+    self._threads = []
+    for i in range(num_threads):
+      thread = threading.Thread(
+          target=self._Work, name="FrontendStage-%s-%d" % (name, i))
+      thread.daemon = True
+      thread.start()
+      self._threads.append(thread)
+
+  def _Work(self):
+    while True:
+      task = self._queue.get()
+      if task is None:
+        return
+
+      stats.STATS.SetGaugeValue(
+          "grr_frontend_stage_pending_tasks",
+          self._queue.qsize(),
+          fields=[self.name])
+      start_time = time.time()
+      stats.STATS.RecordEvent(
+          "grr_frontend_stage_queueing_time",
+          start_time - task.queueing_time,
+          fields=[self.name])
+      task.Run()
+      stats.STATS.RecordEvent(
+          "grr_frontend_stage_latency",
+          time.time() - start_time,
+          fields=[self.name])
+
+  def Submit(self, target, *args):
+    """Schedules target(*args) to run on one of the stage's threads.
+
+    Args:
+      target: The callable to run.
+      *args: Arguments passed to target.
+
+    Returns:
+      A task object. Its Wait() method returns the return value of target or
+      raises the exception raised by it.
+
+    Raises:
+      FrontendOverloadedError: If the stage's queue stayed full for longer than
+        enqueue_timeout seconds.
+    """
+    task = _StageTask(target, args)
+    try:
+      self._queue.put(task, timeout=self.enqueue_timeout)
+    except Queue.Full:
+      stats.STATS.IncrementCounter(
+          "grr_frontend_stage_rejected_tasks", fields=[self.name])
+      raise FrontendOverloadedError(
+          "Frontend stage %s is overloaded." % self.name)
+
+    return task
+
+  def Run(self, target, *args):
+    """Runs target(*args) on one of the stage's threads and returns its result.
+
+    Args:
+      target: The callable to run.
+      *args: Arguments passed to target.
+
+    Returns:
+      The return value of target.
+
+    Raises:
+      FrontendOverloadedError: If the stage's queue stayed full for longer than
+        enqueue_timeout seconds.
+    """
+    return self.Submit(target, *args).Wait()
+
+  def Stop(self):
+    for _ in self._threads:
+      self._queue.put(None)
+    for thread in self._threads:
+      thread.join()
+    self._threads = []
+
+
+class FrontendPipeline(object):
+  """The stages of the pipelined frontend.
+
+  - receive: writing received messages to the data store.
+  - drain: leasing the messages destined for the client from its queue.
+
+  Both stages run concurrently for a single request while the connection
+  thread decrypts the request and encrypts the response. The number of
+  threads in each stage bounds the load the frontend puts on the data store,
+  independently of the number of connected clients.
+  """
+
+  def __init__(self,
+               receive_threads=None,
+               drain_threads=None,
+               queue_size=None,
+               enqueue_timeout=None):
+    if receive_threads is None:
+      receive_threads = config.CONFIG["Frontend.pipeline_receive_threads"]
+    if drain_threads is None:
+      drain_threads = config.CONFIG["Frontend.pipeline_drain_threads"]
+    if queue_size is None:
+      queue_size = config.CONFIG["Frontend.pipeline_queue_size"]
+    if enqueue_timeout is None:
+      enqueue_timeout = config.CONFIG["Frontend.pipeline_enqueue_timeout"]
+
+    self.receive = FrontendStage("receive", receive_threads, queue_size,
+                                 enqueue_timeout)
+    # Draining is optional for a request, a client simply gets its messages
+    # with one of the next polls, so there is no point in waiting for room.
+    self.drain = FrontendStage("drain", drain_threads, queue_size, 0)
+
+  def Stop(self):
+    for stage in [self.receive, self.drain]:
+      stage.Stop()
+
+
 class FrontEndServer(object):
   """This is the front end server.
 
@@ -315,7 +530,21 @@ class FrontEndServer(object):
                max_queue_size=50,
                message_expiry_time=120,
                max_retransmission_time=10,
-               threadpool_prefix="grr_threadpool"):
+               threadpool_prefix="grr_threadpool",
+               pipelined=None):
+    """Constructor.
+
+    Args:
+      certificate: The server's certificate.
+      private_key: The server's private key.
+      max_queue_size: Maximum number of messages handed to a client at once.
+      message_expiry_time: Lease time of messages handed to clients.
+      max_retransmission_time: Maximum number of retransmissions of a message.
+      threadpool_prefix: Name of the thread pool used by this frontend.
+      pipelined: If True, bundles are processed by the bounded stages of a
+        `FrontendPipeline` instead of the calling thread. Defaults to the
+        Frontend.pipelined config option.
+    """
     # Identify ourselves as the server.
     self.token = access_control.ACLToken(
         username="GRRFrontEnd", reason="Implied.")
@@ -337,6 +566,10 @@ class FrontEndServer(object):
         max_threads=config.CONFIG["Threadpool.size"])
     self.thread_pool.Start()
 
+    if pipelined is None:
+      pipelined = config.CONFIG["Frontend.pipelined"]
+    self.pipeline = FrontendPipeline() if pipelined else None
+
     # There is only a single session id that we accept unauthenticated
     # messages for, the one to enroll new clients.
     self.unauth_allowed_session_id = rdfvalue.SessionID(
@@ -381,39 +614,71 @@ class FrontEndServer(object):
         request_comms)
 
     now = time.time()
+    receive_task = None
     if messages:
-      # Receive messages in line.
-      self.ReceiveMessages(source, messages)
-
-    # We send the client a maximum of self.max_queue_size messages
-    required_count = max(0, self.max_queue_size - request_comms.queue_size)
-    tasks = []
-
-    message_list = rdf_flows.MessageList()
-    # Only give the client messages if we are able to receive them in a
-    # reasonable time.
-    if time.time() - now < 10:
-      tasks = self.DrainTaskSchedulerQueueForClient(source, required_count)
-      message_list.job = tasks
-
-    # Encode the message_list in the response_comms using the same API version
-    # the client used.
+      if self.pipeline is None:
+        # Receive messages in line.
+        self.ReceiveMessages(source, messages)
+      else:
+        # This is the only point at which a pipelined frontend rejects a
+        # request: none of its messages have been stored yet.
+        receive_task = self.pipeline.receive.Submit(self.ReceiveMessages,
+                                                    source, messages)
+
     try:
-      self._communicator.EncodeMessages(
-          message_list,
-          response_comms,
-          destination=source,
-          timestamp=timestamp,
-          api_version=request_comms.api_version)
-    except communicator.UnknownClientCert:
-      # We can not encode messages to the client yet because we do not have the
-      # client certificate - return them to the queue so we can try again later.
-      with data_store.DB.GetMutationPool() as pool:
-        queue_manager.QueueManager(token=self.token).Schedule(tasks, pool)
-      raise
+      # We send the client a maximum of self.max_queue_size messages
+      required_count = max(0, self.max_queue_size - request_comms.queue_size)
+      tasks = []
+
+      message_list = rdf_flows.MessageList()
+      # Only give the client messages if we are able to receive them in a
+      # reasonable time.
+      if time.time() - now < 10:
+        tasks = self._DrainTaskSchedulerQueue(source, required_count)
+        message_list.job = tasks
+
+      # Encode the message_list in the response_comms using the same API
+      # version the client used.
+      try:
+        self._EncodeMessages(message_list, response_comms, source, timestamp,
+                             request_comms.api_version)
+      except communicator.UnknownClientCert:
+        # We can not encode messages to the client yet because we do not have
+        # the client certificate - return them to the queue so we can try again
+        # later.
+        with data_store.DB.GetMutationPool() as pool:
+          queue_manager.QueueManager(token=self.token).Schedule(tasks, pool)
+        raise
+    finally:
+      # The response acknowledges the received messages, so it must not be
+      # sent before they are stored.
+      if receive_task is not None:
+        receive_task.Wait()
 
     return source, len(messages)
 
+  def _DrainTaskSchedulerQueue(self, source, required_count):
+    """Drains the client's queue, in the drain stage if pipelined."""
+    if self.pipeline is None:
+      return self.DrainTaskSchedulerQueueForClient(source, required_count)
+
+    try:
+      return self.pipeline.drain.Run(self.DrainTaskSchedulerQueueForClient,
+                                     source, required_count)
+    except FrontendOverloadedError:
+      # The client's messages might already be stored, so the request must
+      # not fail now. The client gets its messages with one of the next polls.
+      return []
+
+  def _EncodeMessages(self, message_list, response_comms, destination,
+                      timestamp, api_version):
+    self._communicator.EncodeMessages(
+        message_list,
+        response_comms,
+        destination=destination,
+        timestamp=timestamp,
+        api_version=api_version)
+
   def DrainTaskSchedulerQueueForClient(self, client, max_count=None):
     """Drains the client's Task Scheduler queue.
 
@@ -665,25 +930,49 @@ class FrontendInit(registry.InitHook):
     stats.STATS.RegisterGaugeMetric(
         "frontend_active_count", int, fields=[("source", str)])
     stats.STATS.RegisterGaugeMetric("frontend_max_active_count", int)
+    # Metrics updated on every request use per-thread shards to keep the
+    # instrumentation overhead low.
     stats.STATS.RegisterCounterMetric(
-        "frontend_http_requests", fields=[("action", str), ("protocol", str)])
+        "frontend_http_requests",
+        fields=[("action", str), ("protocol", str)],
+        thread_shards=True)
     stats.STATS.RegisterCounterMetric(
-        "frontend_in_bytes", fields=[("source", str)])
+        "frontend_in_bytes", fields=[("source", str)], thread_shards=True)
     stats.STATS.RegisterCounterMetric(
-        "frontend_out_bytes", fields=[("source", str)])
+        "frontend_out_bytes", fields=[("source", str)], thread_shards=True)
     stats.STATS.RegisterCounterMetric(
-        "frontend_request_count", fields=[("source", str)])
+        "frontend_request_count", fields=[("source", str)], thread_shards=True)
     # Client requests sent to an inactive datacenter. This indicates a
     # misconfiguration.
     stats.STATS.RegisterCounterMetric(
         "frontend_inactive_request_count", fields=[("source", str)])
+    # Client requests rejected because the frontend is overloaded.
+    stats.STATS.RegisterCounterMetric(
+        "frontend_rejected_request_count", fields=[("source", str)])
     stats.STATS.RegisterEventMetric(
-        "frontend_request_latency", fields=[("source", str)])
+        "frontend_request_latency", fields=[("source", str)],
+        thread_shards=True)
 
-    stats.STATS.RegisterEventMetric("grr_frontendserver_handle_time")
-    stats.STATS.RegisterCounterMetric("grr_frontendserver_handle_num")
+    stats.STATS.RegisterEventMetric(
+        "grr_frontendserver_handle_time", thread_shards=True)
+    stats.STATS.RegisterCounterMetric(
+        "grr_frontendserver_handle_num", thread_shards=True)
     stats.STATS.RegisterGaugeMetric("grr_frontendserver_client_cache_size", int)
-    stats.STATS.RegisterCounterMetric("grr_messages_sent")
+    stats.STATS.RegisterCounterMetric("grr_messages_sent", thread_shards=True)
+
+    stats.STATS.RegisterEventMetric(
+        "grr_frontend_stage_latency", fields=[("stage", str)],
+        thread_shards=True)
+    stats.STATS.RegisterEventMetric(
+        "grr_frontend_stage_queueing_time", fields=[("stage", str)],
+        thread_shards=True)
+    stats.STATS.RegisterGaugeMetric(
+        "grr_frontend_stage_pending_tasks", int, fields=[("stage", str)])
+    stats.STATS.RegisterCounterMetric(
+        "grr_frontend_stage_rejected_tasks", fields=[("stage", str)])
 
     stats.STATS.RegisterCounterMetric(
-        "grr_pub_key_cache", fields=[("type", str)])
+        "grr_pub_key_cache", fields=[("type", str)], thread_shards=True)
+    stats.STATS.RegisterCounterMetric(
+        "grr_outgoing_cipher_cache", fields=[("type", str)],
+        thread_shards=True)
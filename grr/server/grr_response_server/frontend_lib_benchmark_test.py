@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Benchmarks for decoding client messages in the frontend."""
+
+import time
+
+from builtins import range  # pylint: disable=redefined-builtin
+
+from grr_response_client import comms
+from grr_response_core import config
+from grr_response_core.lib import flags
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_server import data_store
+from grr_response_server import frontend_lib
+from grr.test_lib import benchmark_test_lib
+from grr.test_lib import test_lib
+
+
+class FrontendDecodeBenchmark(benchmark_test_lib.MicroBenchmarks):
+  """Measures bundle decoding throughput of a single frontend thread."""
+
+  units = "s"
+
+  REPEATS = 200
+
+  def setUp(self):
+    super(FrontendDecodeBenchmark, self).setUp(["Bundles/s per core"],
+                                               ["<20"])
+
+    private_key = config.CONFIG["Client.private_key"]
+    client_cert = self.ClientCertFromPrivateKey(private_key)
+    data_store.REL_DB.WriteClientMetadata(
+        client_cert.GetCN()[len("aff4:/"):],
+        fleetspeak_enabled=False,
+        certificate=client_cert)
+
+    self.client_communicator = comms.ClientCommunicator(
+        private_key=private_key)
+    self.client_communicator.LoadServerCertificate(
+        server_certificate=config.CONFIG["Frontend.certificate"],
+        ca_certificate=config.CONFIG["CA.certificate"])
+
+    self.server_communicator = frontend_lib.RelationalServerCommunicator(
+        certificate=config.CONFIG["Frontend.certificate"],
+        private_key=config.CONFIG["PrivateKeys.server_key"])
+
+  def _EncodeBundles(self, count):
+    bundles = []
+    for i in range(count):
+      message_list = rdf_flows.MessageList()
+      message_list.job.Append(session_id="aff4:/W:session", request_id=i)
+      result = rdf_flows.ClientCommunication()
+      self.client_communicator.EncodeMessages(message_list, result)
+      bundles.append(result)
+    return bundles
+
+  def _TimeDecode(self, name, bundles, flush_cache):
+    cache = self.server_communicator.encrypted_cipher_cache
+    start = time.time()
+    for bundle in bundles:
+      if flush_cache:
+        cache.Flush()
+      self.server_communicator.DecodeMessages(bundle)
+    time_taken = (time.time() - start) / len(bundles)
+
+    self.AddResult(name, time_taken, len(bundles), int(1 / time_taken))
+
+  def testDecodeThroughput(self):
+    """Decoding with and without the session cipher cache."""
+    bundles = self._EncodeBundles(self.REPEATS)
+
+    self._TimeDecode("Decode (cipher cache cold)", bundles, flush_cache=True)
+    self._TimeDecode("Decode (cipher cache warm)", bundles, flush_cache=False)
+
+  def testEncodeThroughput(self):
+    """Encoding responses with the outgoing cipher cache."""
+    destination = self.client_communicator.common_name
+    message_list = rdf_flows.MessageList()
+    message_list.job.Append(session_id="aff4:/W:session")
+
+    for name, flush_cache in [("Encode (cipher cache cold)", True),
+                              ("Encode (cipher cache warm)", False)]:
+      cache = self.server_communicator.outgoing_cipher_cache
+      start = time.time()
+      for _ in range(self.REPEATS):
+        if flush_cache:
+          cache.Flush()
+        self.server_communicator.EncodeMessages(
+            message_list,
+            rdf_flows.ClientCommunication(),
+            destination=destination)
+      time_taken = (time.time() - start) / self.REPEATS
+
+      self.AddResult(name, time_taken, self.REPEATS, int(1 / time_taken))
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
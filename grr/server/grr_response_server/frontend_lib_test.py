@@ -5,6 +5,7 @@ from __future__ import division
 import array
 import logging
 import pdb
+import threading
 import time
 
 from builtins import chr  # pylint: disable=redefined-builtin
@@ -522,6 +523,123 @@ class GRRFEServerTest(frontend_test_lib.FrontEndServerTest):
     self.assertEqual(crash_details_rel.session_id, session_id)
 
 
+class PipelinedGRRFEServerTest(GRRFEServerTest):
+  """Runs the frontend tests with the bundle processing stages enabled."""
+
+  def InitTestServer(self):
+    self.server = frontend_lib.FrontEndServer(
+        certificate=config.CONFIG["Frontend.certificate"],
+        private_key=config.CONFIG["PrivateKeys.server_key"],
+        message_expiry_time=self.MESSAGE_EXPIRY_TIME,
+        threadpool_prefix="pool-%s" % self._testMethodName,
+        pipelined=True)
+
+  def tearDown(self):
+    self.server.pipeline.Stop()
+    super(PipelinedGRRFEServerTest, self).tearDown()
+
+  def _InstallMockCommunicator(self, client_id, messages):
+
+    class MockCommunicator(object):
+
+      def DecodeMessages(self, *unused_args):
+        return (messages, client_id, 100)
+
+      def EncodeMessages(self, *unused_args, **unused_kw):
+        pass
+
+    self.server._communicator = MockCommunicator()
+
+  def _Overloaded(self, *unused_args):
+    raise frontend_lib.FrontendOverloadedError("Overloaded.")
+
+  def testOverloadedReceiveStageRejectsRequestBeforeStoringMessages(self):
+    client_id = self.SetupClient(0)
+    self._InstallMockCommunicator(
+        client_id, [rdf_flows.GrrMessage(session_id="aff4:/flows/W:1")])
+
+    received = []
+    drained = []
+    with utils.MultiStubber(
+        (self.server.pipeline.receive, "Submit", self._Overloaded),
+        (self.server, "ReceiveMessages", lambda *args: received.append(args)),
+        (self.server, "DrainTaskSchedulerQueueForClient",
+         lambda *args: drained.append(args) or [])):
+      with self.assertRaises(frontend_lib.FrontendOverloadedError):
+        self.server.HandleMessageBundles(rdf_flows.ClientCommunication(),
+                                         rdf_flows.ClientCommunication())
+
+    self.assertEqual(received, [])
+    self.assertEqual(drained, [])
+
+  def testOverloadedDrainStageDoesNotFailRequest(self):
+    client_id = self.SetupClient(0)
+    self._InstallMockCommunicator(
+        client_id, [rdf_flows.GrrMessage(session_id="aff4:/flows/W:1")])
+
+    received = []
+    with utils.MultiStubber(
+        (self.server.pipeline.drain, "Run", self._Overloaded),
+        (self.server, "ReceiveMessages", lambda *args: received.append(args))):
+      source, message_count = self.server.HandleMessageBundles(
+          rdf_flows.ClientCommunication(), rdf_flows.ClientCommunication())
+
+    self.assertEqual(source, client_id)
+    self.assertEqual(message_count, 1)
+    self.assertEqual(len(received), 1)
+
+
+class FrontendStageTest(test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super(FrontendStageTest, self).setUp()
+    self.stage = frontend_lib.FrontendStage(
+        "test", num_threads=1, queue_size=1, enqueue_timeout=0.1)
+
+  def tearDown(self):
+    self.stage.Stop()
+    super(FrontendStageTest, self).tearDown()
+
+  def testRunReturnsResult(self):
+    self.assertEqual(self.stage.Run(lambda x, y: x + y, 1, 2), 3)
+
+  def testRunPropagatesExceptions(self):
+
+    def Fail():
+      raise communicator.UnknownClientCert("Cert not found")
+
+    with self.assertRaises(communicator.UnknownClientCert):
+      self.stage.Run(Fail)
+
+    # The worker survives the exception.
+    self.assertEqual(self.stage.Run(lambda: 42), 42)
+
+  def testFullStageRejectsTasks(self):
+    started = threading.Event()
+    release = threading.Event()
+
+    def Block():
+      started.set()
+      release.wait()
+
+    # Occupies the single worker thread.
+    blocking = threading.Thread(target=self.stage.Run, args=(Block,))
+    blocking.start()
+    started.wait()
+    # Fills the queue.
+    queued = threading.Thread(target=self.stage.Run, args=(lambda: None,))
+    queued.start()
+    while not self.stage._queue.full():  # pylint: disable=protected-access
+      time.sleep(0.01)
+
+    with self.assertRaises(frontend_lib.FrontendOverloadedError):
+      self.stage.Run(lambda: None)
+
+    release.set()
+    blocking.join()
+    queued.join()
+
+
 class FleetspeakFrontendTests(frontend_test_lib.FrontEndServerTest):
 
   def testFleetspeakEnrolment(self):
@@ -646,6 +764,47 @@ class ClientCommsTest(test_lib.GRRBaseTest):
       self.assertEqual(decoded_messages[i].auth_state,
                        rdf_flows.GrrMessage.AuthorizationState.AUTHENTICATED)
 
+  def testRepeatedPollsSkipRSAOperations(self):
+    self._MakeClientRecord()
+    self.ClientServerCommunicate()
+
+    rsa_operations = stats.STATS.GetMetricValue("grr_rsa_operations")
+    hits = stats.STATS.GetMetricValue(
+        "grr_encrypted_cipher_cache", fields=["hits"])
+
+    # The client reuses its session cipher, the server has it cached.
+    for message in self.ClientServerCommunicate():
+      self.assertEqual(message.auth_state,
+                       rdf_flows.GrrMessage.AuthorizationState.AUTHENTICATED)
+
+    self.assertEqual(
+        stats.STATS.GetMetricValue("grr_rsa_operations"), rsa_operations)
+    self.assertEqual(
+        stats.STATS.GetMetricValue(
+            "grr_encrypted_cipher_cache", fields=["hits"]), hits + 1)
+
+  def testResponseCipherIsReused(self):
+    self._MakeClientRecord()
+
+    results = []
+    for i in range(2):
+      message_list = rdf_flows.MessageList()
+      message_list.job.Append(session_id="aff4:/W:session", request_id=i)
+      result = rdf_flows.ClientCommunication()
+      self.server_communicator.EncodeMessages(
+          message_list,
+          result,
+          destination=rdf_client.ClientURN(self.client_id))
+      results.append(result)
+
+    self.assertEqual(results[0].encrypted_cipher, results[1].encrypted_cipher)
+    self.assertNotEqual(results[0].encrypted, results[1].encrypted)
+
+    for i, result in enumerate(results):
+      messages, _, _ = self.client_communicator.DecryptMessage(
+          result.SerializeToString())
+      self.assertEqual([m.request_id for m in messages], [i])
+
   def testClientPingAndClockIsUpdated(self):
     """Check PING and CLOCK are updated, simulate bad client clock."""
     self._MakeClientRecord()
@@ -20,6 +20,7 @@ from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_proto import api_utils_pb2
 from grr_response_server import aff4
+from grr_response_server import data_store
 from grr_response_server.aff4_objects import aff4_grr
 from grr_response_server.flows.general import export as flow_export
 
@@ -290,3 +291,24 @@ def FilterCollection(collection, offset, count=0, filter_value=None):
     items = list(itertools.islice(collection.GenerateItems(offset), count))
 
   return items
+
+
+def ReadRelationalResults(collection, offset, count=0):
+  """Reads results of a flow or hunt collection from the relational database.
+
+  Callers have to make sure that the relational database holds all of the
+  results, see FlowContext.relational_db_has_all_results.
+
+  Args:
+    collection: An aff4 results collection. Only its id is used.
+    offset: The position of the first result to read.
+    count: The maximum number of results to read (0 means all of them).
+
+  Returns:
+    A tuple of a list of GrrMessages wrapping the results and the total number
+    of results in the collection.
+  """
+  collection_id = utils.SmartUnicode(collection.collection_id)
+  results = data_store.REL_DB.ReadResults(collection_id, offset, count or
+                                          sys.maxsize)
+  return results, data_store.REL_DB.CountResults(collection_id)
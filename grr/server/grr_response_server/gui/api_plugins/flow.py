@@ -18,6 +18,7 @@ from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_proto.api import flow_pb2
 from grr_response_server import access_control
 from grr_response_server import aff4
+from grr_response_server import data_store
 from grr_response_server import flow
 from grr_response_server import instant_output_plugin
 from grr_response_server import notification
@@ -391,11 +392,34 @@ class ApiListFlowResultsHandler(api_call_handler_base.ApiCallHandler):
     flow_urn = args.flow_id.ResolveClientFlowURN(args.client_id, token=token)
     output_collection = flow.GRRFlow.ResultCollectionForFID(flow_urn)
 
-    items = api_call_handler_utils.FilterCollection(
-        output_collection, args.offset, args.count, args.filter)
+    # Filtering needs to look at every result, so it is only done on the
+    # collection.
+    use_relational_db = False
+    if (data_store.RelationalDBReadEnabled(category="results") and
+        not args.filter):
+      try:
+        flow_obj = aff4.FACTORY.Open(
+            flow_urn, aff4_type=flow.GRRFlow, mode="r", token=token)
+        use_relational_db = flow_obj.context.relational_db_has_all_results
+      except aff4.InstantiationError:
+        pass
+
+    if use_relational_db:
+      messages, total_count = api_call_handler_utils.ReadRelationalResults(
+          output_collection, args.offset, args.count)
+      items = []
+      for message in messages:
+        item = message.payload
+        item.age = message.age
+        items.append(item)
+    else:
+      items = api_call_handler_utils.FilterCollection(
+          output_collection, args.offset, args.count, args.filter)
+      total_count = len(output_collection)
+
     wrapped_items = [ApiFlowResult().InitFromRdfValue(item) for item in items]
     return ApiListFlowResultsResult(
-        items=wrapped_items, total_count=len(output_collection))
+        items=wrapped_items, total_count=total_count)
 
 
 class ApiListFlowLogsArgs(rdf_structs.RDFProtoStruct):
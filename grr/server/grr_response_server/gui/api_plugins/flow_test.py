@@ -7,6 +7,7 @@ import tarfile
 import zipfile
 
 
+import mock
 import yaml
 
 from grr_response_core.lib import flags
@@ -15,9 +16,11 @@ from grr_response_core.lib.rdfvalues import file_finder as rdf_file_finder
 from grr_response_core.lib.rdfvalues import paths as rdf_paths
 from grr_response_core.lib.rdfvalues import test_base as rdf_test_base
 from grr_response_server import aff4
+from grr_response_server import data_store
 from grr_response_server import flow
 from grr_response_server.flows.general import file_finder
 from grr_response_server.flows.general import processes
+from grr_response_server.gui import api_call_handler_utils
 from grr_response_server.gui import api_test_lib
 from grr_response_server.gui.api_plugins import client as client_plugin
 from grr_response_server.gui.api_plugins import flow as flow_plugin
@@ -356,6 +359,89 @@ class ApiGetExportedFlowResultsHandlerTest(test_lib.GRRBaseTest):
          "Finish: %s" % utils.SmartStr(flow_urn)])  # pyformat: disable
 
 
+class ApiListFlowResultsHandlerTest(test_lib.GRRBaseTest):
+  """Tests for ApiListFlowResultsHandler reading from the relational db."""
+
+  def setUp(self):
+    super(ApiListFlowResultsHandlerTest, self).setUp()
+
+    self.handler = flow_plugin.ApiListFlowResultsHandler()
+    self.client_id = self.SetupClient(0)
+
+    self.write_enabled_patch = mock.patch.object(
+        data_store, "RelationalDBWriteEnabled", return_value=True)
+    self.write_enabled_patch.start()
+
+    self.read_enabled_patch = mock.patch.object(
+        data_store,
+        "RelationalDBReadEnabled",
+        side_effect=lambda category=None: category == "results")
+    self.read_enabled_patch.start()
+
+  def tearDown(self):
+    self.read_enabled_patch.stop()
+    self.write_enabled_patch.stop()
+    super(ApiListFlowResultsHandlerTest, self).tearDown()
+
+  def _RunFlow(self):
+    flow_urn = flow.StartFlow(
+        flow_name=flow_test_lib.DummyFlowWithSingleReply.__name__,
+        client_id=self.client_id,
+        token=self.token)
+    flow_test_lib.TestFlowHelper(flow_urn, token=self.token)
+
+    return flow_plugin.ApiListFlowResultsArgs(
+        client_id=self.client_id, flow_id=flow_urn.Basename())
+
+  def testReadsResultsFromRelationalDB(self):
+    args = self._RunFlow()
+
+    with utils.Stubber(api_call_handler_utils, "FilterCollection", None):
+      result = self.handler.Handle(args, token=self.token)
+
+    self.assertEqual(result.total_count, 1)
+    self.assertEqual(len(result.items), 1)
+    self.assertEqual(result.items[0].payload_type, "RDFString")
+    self.assertEqual(utils.SmartStr(result.items[0].payload), "oh")
+
+  def testFallsBackToCollectionForResultsWrittenEarlier(self):
+    with mock.patch.object(
+        data_store, "RelationalDBWriteEnabled", return_value=False):
+      args = self._RunFlow()
+
+    result = self.handler.Handle(args, token=self.token)
+
+    self.assertEqual(result.total_count, 1)
+    self.assertEqual(len(result.items), 1)
+    self.assertEqual(utils.SmartStr(result.items[0].payload), "oh")
+
+  def testFallsBackToCollectionForFlowsCreatedEarlier(self):
+    with mock.patch.object(
+        data_store, "RelationalDBWriteEnabled", return_value=False):
+      flow_urn = flow.StartFlow(
+          flow_name=flow_test_lib.DummyFlowWithSingleReply.__name__,
+          client_id=self.client_id,
+          token=self.token)
+    flow_test_lib.TestFlowHelper(flow_urn, token=self.token)
+    args = flow_plugin.ApiListFlowResultsArgs(
+        client_id=self.client_id, flow_id=flow_urn.Basename())
+
+    with utils.Stubber(api_call_handler_utils, "ReadRelationalResults", None):
+      result = self.handler.Handle(args, token=self.token)
+
+    self.assertEqual(result.total_count, 1)
+    self.assertEqual(utils.SmartStr(result.items[0].payload), "oh")
+
+  def testFiltersResultsOnCollection(self):
+    args = self._RunFlow()
+    args.filter = "oh"
+
+    with utils.Stubber(api_call_handler_utils, "ReadRelationalResults", None):
+      result = self.handler.Handle(args, token=self.token)
+
+    self.assertEqual(len(result.items), 1)
+
+
 def main(argv):
   test_lib.main(argv)
 
@@ -24,6 +24,7 @@ from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_proto.api import hunt_pb2
 
 from grr_response_server import aff4
+from grr_response_server import data_store
 from grr_response_server import events
 from grr_response_server import foreman_rules
 from grr_response_server import instant_output_plugin
@@ -471,6 +472,37 @@ class ApiListHuntResultsResult(rdf_structs.RDFProtoStruct):
   ]
 
 
+def _GetCompleteResultSegmentStore(hunt_urn, hunt=None, token=None):
+  """Returns result segments of a hunt if they hold all of its results.
+
+  Segments are stored on the local disk of the host that processed the
+  hunt's results. On any other host they are either missing or incomplete and
+  the results have to be read from the data store instead.
+
+  Args:
+    hunt_urn: URN of the hunt.
+    hunt: GRRHunt object, opened if not given.
+    token: Security token.
+
+  Returns:
+    A HuntResultSegmentStore or None if the results can't be read from it.
+  """
+  store = implementation.GRRHunt.ResultSegmentStoreForHID(hunt_urn)
+  if not store.Exists():
+    return None
+
+  if hunt is None:
+    try:
+      hunt = aff4.FACTORY.Open(
+          hunt_urn, aff4_type=implementation.GRRHunt, token=token)
+    except aff4.InstantiationError:
+      return None
+
+  if not store.HoldsAllResults(hunt.context.results_count):
+    return None
+  return store
+
+
 class ApiListHuntResultsHandler(api_call_handler_base.ApiCallHandler):
   """Renders hunt results."""
 
@@ -478,14 +510,35 @@ class ApiListHuntResultsHandler(api_call_handler_base.ApiCallHandler):
   result_type = ApiListHuntResultsResult
 
   def Handle(self, args, token=None):
-    results_collection = implementation.GRRHunt.ResultCollectionForHID(
-        args.hunt_id.ToURN())
-    items = api_call_handler_utils.FilterCollection(
-        results_collection, args.offset, args.count, args.filter)
-    wrapped_items = [ApiHuntResult().InitFromGrrMessage(item) for item in items]
+    hunt_urn = args.hunt_id.ToURN()
+    # Filtering needs to look at every result, so it is only done on the
+    # collection.
+    hunt = None
+    if (data_store.RelationalDBReadEnabled(category="results") and
+        not args.filter):
+      try:
+        hunt = aff4.FACTORY.Open(
+            hunt_urn, aff4_type=implementation.GRRHunt, token=token)
+      except aff4.InstantiationError:
+        pass
 
+    if hunt is not None and hunt.context.relational_db_has_all_results:
+      items, total_count = api_call_handler_utils.ReadRelationalResults(
+          implementation.GRRHunt.ResultCollectionForHID(hunt_urn), args.offset,
+          args.count)
+    else:
+      results_collection = _GetCompleteResultSegmentStore(
+          hunt_urn, hunt=hunt, token=token)
+      if results_collection is None:
+        results_collection = implementation.GRRHunt.ResultCollectionForHID(
+            hunt_urn)
+      items = api_call_handler_utils.FilterCollection(
+          results_collection, args.offset, args.count, args.filter)
+      total_count = len(results_collection)
+
+    wrapped_items = [ApiHuntResult().InitFromGrrMessage(item) for item in items]
     return ApiListHuntResultsResult(
-        items=wrapped_items, total_count=len(results_collection))
+        items=wrapped_items, total_count=total_count)
 
 
 class ApiListHuntCrashesArgs(rdf_structs.RDFProtoStruct):
@@ -806,12 +859,23 @@ class ApiGetHuntClientCompletionStatsHandler(
         mode="r",
         token=token)
 
-    clients_by_status = hunt.GetClientsByStatus()
-    started_clients = clients_by_status["STARTED"]
-    completed_clients = clients_by_status["COMPLETED"]
+    context = hunt.context
+    if context and context.HasField("client_completion_rollup"):
+      # Hunts keep these counts up to date as clients start and complete.
+      start_time = None
+      if context.HasField("start_time"):
+        start_time = context.start_time
+      start_stats, complete_stats = (
+          context.client_completion_rollup.GetDataPoints(
+              start_time=start_time))
+    else:
+      # Hunts created before the rollup was introduced.
+      clients_by_status = hunt.GetClientsByStatus()
+      started_clients = clients_by_status["STARTED"]
+      completed_clients = clients_by_status["COMPLETED"]
 
-    (start_stats, complete_stats) = self._SampleClients(started_clients,
-                                                        completed_clients)
+      (start_stats, complete_stats) = self._SampleClients(
+          started_clients, completed_clients)
 
     if len(start_stats) > target_size:
       # start_stats and complete_stats are equally big, so resample both
@@ -1373,6 +1437,7 @@ class ApiDeleteHuntHandler(api_call_handler_base.ApiCallHandler):
       # scheduled clients.
       # This means that we can safely delete the hunt.
       aff4.FACTORY.Delete(hunt_urn, token=token)
+      implementation.GRRHunt.ResultSegmentStoreForHID(hunt_urn).Delete()
 
     except aff4.InstantiationError:
       # Raise standard NotFoundError if the hunt object can't be opened.
@@ -1398,14 +1463,16 @@ class ApiGetExportedHuntResultsHandler(api_call_handler_base.ApiCallHandler):
 
     hunt_urn = args.hunt_id.ToURN()
     try:
-      aff4.FACTORY.Open(
+      hunt = aff4.FACTORY.Open(
           hunt_urn, aff4_type=implementation.GRRHunt, mode="rw", token=token)
     except aff4.InstantiationError:
       raise HuntNotFoundError(
           "Hunt with id %s could not be found" % args.hunt_id)
 
-    output_collection = implementation.GRRHunt.TypedResultCollectionForHID(
-        hunt_urn)
+    output_collection = _GetCompleteResultSegmentStore(hunt_urn, hunt=hunt)
+    if output_collection is None:
+      output_collection = implementation.GRRHunt.TypedResultCollectionForHID(
+          hunt_urn)
 
     plugin = plugin_cls(source_urn=hunt_urn, token=token)
     return api_call_handler_base.ApiBinaryStream(
@@ -8,6 +8,7 @@ import zipfile
 
 
 from builtins import range  # pylint: disable=redefined-builtin
+import mock
 import yaml
 
 from grr_response_core.lib import flags
@@ -23,6 +24,7 @@ from grr_response_server import aff4
 from grr_response_server import data_store
 from grr_response_server.aff4_objects import aff4_grr
 from grr_response_server.flows.general import file_finder
+from grr_response_server.gui import api_call_handler_utils
 from grr_response_server.gui import api_test_lib
 from grr_response_server.gui.api_plugins import hunt as hunt_plugin
 from grr_response_server.hunts import implementation
@@ -700,6 +702,267 @@ class ApiDeleteHuntHandlerTest(api_test_lib.ApiCallHandlerTest,
           self.hunt_urn, aff4_type=implementation.GRRHunt, token=self.token)
 
 
+class ApiGetHuntClientCompletionStatsHandlerTest(
+    api_test_lib.ApiCallHandlerTest, hunt_test_lib.StandardHuntTestMixin):
+  """Test for ApiGetHuntClientCompletionStatsHandler."""
+
+  def setUp(self):
+    super(ApiGetHuntClientCompletionStatsHandlerTest, self).setUp()
+
+    self.handler = hunt_plugin.ApiGetHuntClientCompletionStatsHandler()
+    self.client_ids = self.SetupClients(5)
+
+    with test_lib.FakeTime(42):
+      with self.CreateHunt(description="the hunt") as hunt_obj:
+        hunt_obj.Run()
+    self.hunt_urn = hunt_obj.urn
+
+    client_mock = hunt_test_lib.SampleHuntMock()
+    for i, client_id in enumerate(self.client_ids):
+      with test_lib.FakeTime(45 + i * 10):
+        self.AssignTasksToClients([client_id])
+        hunt_test_lib.TestHuntHelper(client_mock, [client_id], False,
+                                     self.token)
+
+  def _Handle(self, size=0):
+    args = hunt_plugin.ApiGetHuntClientCompletionStatsArgs(
+        hunt_id=self.hunt_urn.Basename(), size=size)
+    return self.handler.Handle(args, token=self.token)
+
+  def testStatsAreReadFromRollup(self):
+    hunt_obj = aff4.FACTORY.Open(self.hunt_urn, token=self.token)
+    rollup = hunt_obj.context.client_completion_rollup
+    self.assertEqual(
+        sum(b.started_clients_count for b in rollup.buckets), 5)
+    self.assertEqual(
+        sum(b.completed_clients_count for b in rollup.buckets), 5)
+
+    with utils.Stubber(implementation.GRRHunt, "GetClientsByStatus",
+                       lambda _: self.fail("Clients were read.")):
+      result = self._Handle()
+
+    # Hours are counted from the hunt's start at 42s, clients started and
+    # completed every 10s from 45s on.
+    expected = [(0.0, 0)] + [((3 + i * 10) / 3600.0, i + 1) for i in range(5)]
+    self.assertEqual(result,
+                     hunt_plugin.ApiGetHuntClientCompletionStatsResult()
+                     .InitFromDataPoints(expected, expected))
+
+  def testClientsAreCountedOnce(self):
+    with aff4.FACTORY.Open(
+        self.hunt_urn, mode="rw", token=self.token) as hunt_obj:
+      for client_id in self.client_ids[:2]:
+        hunt_obj.RegisterClient(client_id)
+        hunt_obj.RegisterCompletedClient(client_id)
+
+    result = self._Handle()
+    self.assertEqual(result.start_points[-1].y_value, 5)
+    self.assertEqual(result.complete_points[-1].y_value, 5)
+
+  def testStatsAreResampled(self):
+    result = self._Handle(size=2)
+    self.assertLess(len(result.start_points), 6)
+    self.assertEqual(len(result.start_points), len(result.complete_points))
+    self.assertEqual(result.start_points[-1].y_value, 5)
+    self.assertEqual(result.complete_points[-1].y_value, 5)
+
+  def testLegacyHuntsFallBackToClientCollections(self):
+    with aff4.FACTORY.Open(
+        self.hunt_urn, mode="rw", token=self.token) as hunt_obj:
+      hunt_obj.context.ClearField("client_completion_rollup")
+
+    result = self._Handle()
+    self.assertEqual(result.start_points[-1].y_value, 5)
+    self.assertEqual(result.complete_points[-1].y_value, 5)
+
+
+class ApiListHuntResultsHandlerTest(test_lib.GRRBaseTest,
+                                    hunt_test_lib.StandardHuntTestMixin):
+  """Test for ApiListHuntResultsHandler reading from result segments."""
+
+  def setUp(self):
+    super(ApiListHuntResultsHandlerTest, self).setUp()
+
+    self.handler = hunt_plugin.ApiListHuntResultsHandler()
+
+    self.config_overrider = test_lib.ConfigOverrider({
+        "HuntResultSegments.enabled": True,
+        "HuntResultSegments.root_dir": self.temp_dir
+    })
+    self.config_overrider.Start()
+
+    self.hunt = implementation.StartHunt(
+        hunt_name=standard.GenericHunt.__name__,
+        flow_runner_args=rdf_flow_runner.FlowRunnerArgs(
+            flow_name=flow_test_lib.DummyFlowWithSingleReply.__name__),
+        client_rate=0,
+        token=self.token)
+    self.hunt.Run()
+
+    self.client_ids = self.SetupClients(5)
+    self.AssignTasksToClients(client_ids=self.client_ids)
+    self.RunHunt(client_ids=self.client_ids)
+
+    self.args = hunt_plugin.ApiListHuntResultsArgs(
+        hunt_id=self.hunt.urn.Basename())
+
+  def tearDown(self):
+    self.config_overrider.Stop()
+    super(ApiListHuntResultsHandlerTest, self).tearDown()
+
+  def _SourcesOfResults(self, result):
+    return sorted(utils.SmartStr(item.client_id) for item in result.items)
+
+  def testReadsResultsFromSegments(self):
+    store = implementation.GRRHunt.ResultSegmentStoreForHID(self.hunt.urn)
+    self.assertEqual(len(store), 5)
+
+    with utils.Stubber(implementation.GRRHunt, "ResultCollectionForHID",
+                       None):
+      result = self.handler.Handle(self.args, token=self.token)
+
+    self.assertEqual(result.total_count, 5)
+    self.assertEqual(
+        self._SourcesOfResults(result),
+        sorted(client_id.Basename() for client_id in self.client_ids))
+
+  def testFallsBackToCollectionIfSegmentsAreIncomplete(self):
+    # Simulate results of the hunt processed on a different host: segments
+    # on this one lack them.
+    store = implementation.GRRHunt.ResultSegmentStoreForHID(self.hunt.urn)
+    store.Delete()
+    store.AddMessages(
+        [rdf_flows.GrrMessage(payload=rdfvalue.RDFString("foo"))],
+        rdfvalue.RDFDatetime.Now())
+
+    result = self.handler.Handle(self.args, token=self.token)
+
+    self.assertEqual(result.total_count, 5)
+    self.assertEqual(
+        self._SourcesOfResults(result),
+        sorted(client_id.Basename() for client_id in self.client_ids))
+
+  def testIncompleteSegmentsAreDeletedWhenMoreResultsArrive(self):
+    store = implementation.GRRHunt.ResultSegmentStoreForHID(self.hunt.urn)
+    store.Delete()
+    store.AddMessages(
+        [rdf_flows.GrrMessage(payload=rdfvalue.RDFString("foo"))],
+        rdfvalue.RDFDatetime.Now())
+
+    client_id = self.SetupClient(5)
+    self.AssignTasksToClients(client_ids=[client_id])
+    self.RunHunt(client_ids=[client_id])
+
+    self.assertFalse(store.Exists())
+
+  def testFallsBackToCollectionIfSegmentsAreMissing(self):
+    implementation.GRRHunt.ResultSegmentStoreForHID(self.hunt.urn).Delete()
+
+    result = self.handler.Handle(self.args, token=self.token)
+
+    self.assertEqual(result.total_count, 5)
+
+
+class ApiListHuntResultsHandlerRelationalDBTest(
+    test_lib.GRRBaseTest, hunt_test_lib.StandardHuntTestMixin):
+  """Test for ApiListHuntResultsHandler reading from the relational db."""
+
+  def setUp(self):
+    super(ApiListHuntResultsHandlerRelationalDBTest, self).setUp()
+
+    self.handler = hunt_plugin.ApiListHuntResultsHandler()
+
+    self.write_enabled_patch = mock.patch.object(
+        data_store, "RelationalDBWriteEnabled", return_value=True)
+    self.write_enabled_patch.start()
+
+    self.read_enabled_patch = mock.patch.object(
+        data_store,
+        "RelationalDBReadEnabled",
+        side_effect=lambda category=None: category == "results")
+    self.read_enabled_patch.start()
+
+    self.client_ids = self.SetupClients(5)
+
+  def tearDown(self):
+    self.read_enabled_patch.stop()
+    self.write_enabled_patch.stop()
+    super(ApiListHuntResultsHandlerRelationalDBTest, self).tearDown()
+
+  def _StartHunt(self):
+    hunt = implementation.StartHunt(
+        hunt_name=standard.GenericHunt.__name__,
+        flow_runner_args=rdf_flow_runner.FlowRunnerArgs(
+            flow_name=flow_test_lib.DummyFlowWithSingleReply.__name__),
+        client_rate=0,
+        token=self.token)
+    hunt.Run()
+
+    return hunt_plugin.ApiListHuntResultsArgs(hunt_id=hunt.urn.Basename())
+
+  def _RunHuntOnClients(self, client_ids):
+    self.AssignTasksToClients(client_ids=client_ids)
+    self.RunHunt(client_ids=client_ids)
+
+  def _RunHunt(self):
+    args = self._StartHunt()
+    self._RunHuntOnClients(self.client_ids)
+    return args
+
+  def _SourcesOfResults(self, result):
+    return sorted(utils.SmartStr(item.client_id) for item in result.items)
+
+  def testReadsResultsFromRelationalDB(self):
+    args = self._RunHunt()
+
+    with utils.Stubber(api_call_handler_utils, "FilterCollection", None):
+      result = self.handler.Handle(args, token=self.token)
+
+    self.assertEqual(result.total_count, 5)
+    self.assertEqual(
+        self._SourcesOfResults(result),
+        sorted(client_id.Basename() for client_id in self.client_ids))
+
+  def testReadsPageOfResultsFromRelationalDB(self):
+    args = self._RunHunt()
+    args.offset = 1
+    args.count = 2
+
+    with utils.Stubber(api_call_handler_utils, "FilterCollection", None):
+      result = self.handler.Handle(args, token=self.token)
+
+    self.assertEqual(result.total_count, 5)
+    self.assertEqual(len(result.items), 2)
+
+  def testFallsBackToCollectionForResultsWrittenEarlier(self):
+    with mock.patch.object(
+        data_store, "RelationalDBWriteEnabled", return_value=False):
+      args = self._RunHunt()
+
+    result = self.handler.Handle(args, token=self.token)
+
+    self.assertEqual(result.total_count, 5)
+    self.assertEqual(
+        self._SourcesOfResults(result),
+        sorted(client_id.Basename() for client_id in self.client_ids))
+
+  def testFallsBackToCollectionIfRelationalWritesWereInterrupted(self):
+    args = self._StartHunt()
+    self._RunHuntOnClients(self.client_ids[:2])
+    with mock.patch.object(
+        data_store, "RelationalDBWriteEnabled", return_value=False):
+      self._RunHuntOnClients(self.client_ids[2:3])
+    self._RunHuntOnClients(self.client_ids[3:])
+
+    with utils.Stubber(api_call_handler_utils, "ReadRelationalResults", None):
+      result = self.handler.Handle(args, token=self.token)
+
+    self.assertEqual(result.total_count, 5)
+    self.assertEqual(
+        self._SourcesOfResults(result),
+        sorted(client_id.Basename() for client_id in self.client_ids))
+
+
 class ApiGetExportedHuntResultsHandlerTest(test_lib.GRRBaseTest,
                                            hunt_test_lib.StandardHuntTestMixin):
 
@@ -933,6 +933,7 @@ class ApiGrantApprovalHandlerBase(api_call_handler_base.ApiCallHandler):
     try:
       data_store.REL_DB.GrantApproval(args.username, args.approval_id,
                                       token.username)
+      access_control.NotifyApprovalsChanged()
 
       approval_obj = data_store.REL_DB.ReadApprovalRequest(
           args.username, args.approval_id)
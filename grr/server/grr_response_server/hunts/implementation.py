@@ -35,6 +35,7 @@ from grr_response_server import output_plugin as output_plugin_lib
 from grr_response_server import queue_manager
 from grr_response_server.aff4_objects import aff4_grr
 from grr_response_server.hunts import results as hunts_results
+from grr_response_server.hunts import results_segments
 from grr_response_server.rdfvalues import flow_runner as rdf_flow_runner
 from grr_response_server.rdfvalues import hunts as rdf_hunts
 from grr_response_server.rdfvalues import objects as rdf_objects
@@ -681,7 +682,9 @@ class HuntRunner(object):
         creator=self.token.username,
         expires=args.expiry_time.Expiry(),
         start_time=rdfvalue.RDFDatetime.Now(),
-        usage_stats=rdf_stats.ClientResourcesStats())
+        usage_stats=rdf_stats.ClientResourcesStats(),
+        client_completion_rollup=rdf_hunts.HuntClientCompletionRollup(),
+        relational_db_has_all_results=data_store.RelationalDBWriteEnabled())
 
     return context
 
@@ -1054,6 +1057,14 @@ class GRRHunt(flow.FlowBase):
   def TypedResultCollection(self):
     return self.TypedResultCollectionForHID(self.session_id)
 
+  # Segment files for results, only written if HuntResultSegments.enabled.
+  @classmethod
+  def ResultSegmentStoreForHID(cls, hunt_id):
+    return results_segments.HuntResultSegmentStore(hunt_id)
+
+  def ResultSegmentStore(self):
+    return self.ResultSegmentStoreForHID(self.session_id)
+
   # Collection for logs.
   @property
   def logs_collection_urn(self):
@@ -1177,12 +1188,40 @@ class GRRHunt(flow.FlowBase):
   def _ClientSymlinkUrn(self, client_id):
     return client_id.Add("flows").Add("%s:hunt" % (self.urn.Basename()))
 
+  # Clients counted in the client completion rollup.
+  @property
+  def rollup_clients_urn(self):
+    return self.urn.Add("RollupClients")
+
+  def _IsCountedInRollup(self, client_urn, status):
+    """Marks a client as counted in the rollup, returns True if it was."""
+    attribute = "metadata:%s:%s" % (status,
+                                    rdf_client.ClientURN(client_urn).Basename())
+    value, _ = data_store.DB.Resolve(self.rollup_clients_urn, attribute)
+    if value is not None:
+      return True
+
+    data_store.DB.Set(self.rollup_clients_urn, attribute, 1)
+    return False
+
   def RegisterClient(self, client_urn):
-    if self.context.clients_queued_count:
-      self.context.clients_queued_count -= 1
+    with self.lock:
+      if self.context.clients_queued_count:
+        self.context.clients_queued_count -= 1
+      # Like the client collections when they are read, the rollup only counts
+      # the first registration of every client.
+      if (self.context.HasField("client_completion_rollup") and
+          not self._IsCountedInRollup(client_urn, "started")):
+        self.context.client_completion_rollup.RegisterStartedClient(
+            rdfvalue.RDFDatetime.Now())
     self._AddURNToCollection(client_urn, self.all_clients_collection_urn)
 
   def RegisterCompletedClient(self, client_urn):
+    with self.lock:
+      if (self.context.HasField("client_completion_rollup") and
+          not self._IsCountedInRollup(client_urn, "completed")):
+        self.context.client_completion_rollup.RegisterCompletedClient(
+            rdfvalue.RDFDatetime.Now())
     self._AddURNToCollection(client_urn, self.completed_clients_collection_urn)
 
   def RegisterClientWithResults(self, client_urn):
@@ -1352,6 +1391,24 @@ class GRRHunt(flow.FlowBase):
             multi_type_collection.MultiTypeCollection.StaticAdd(
                 self.multi_type_output_urn, msg, mutation_pool=pool)
 
+        if data_store.RelationalDBWriteEnabled():
+          data_store.REL_DB.WriteResults(
+              utils.SmartUnicode(self.results_collection_urn), msgs)
+        else:
+          # The relational database misses these results for good, even if
+          # relational writes get enabled again later.
+          self.context.relational_db_has_all_results = False
+
+        if results_segments.IsEnabled():
+          store = self.ResultSegmentStore()
+          # Segments are local to the host writing them. Once results of the
+          # hunt were stored elsewhere, segments on this host can never be
+          # complete again, so they are deleted instead of written to.
+          if store.HoldsAllResults(self.context.results_count):
+            store.AddMessages(msgs, rdfvalue.RDFDatetime.Now())
+          elif store.Exists():
+            store.Delete()
+
         self.context.completed_clients_count += 1
         if responses:
           self.RegisterClientWithResults(client_id)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+"""Append-only segment files for hunt results.
+
+Hunt results are written to one segment per payload type. A segment is a pair
+of files:
+
+  <type>.seg: A sequence of records, each consisting of a fixed size header
+    (timestamp, suffix, payload length) followed by a serialized GrrMessage.
+  <type>.idx: A sparse index with one fixed size entry (record number,
+    timestamp high-water mark, offset into the .seg file) for every
+    INDEX_SPACING records.
+
+Readers memory-map the segment, use the sparse index to jump close to the
+requested record number or timestamp and then scan sequentially, so that
+paging through a hunt with millions of results doesn't touch the data store
+at all.
+
+Segments live on the local disk of the host that processed the hunt's results,
+so they are only supported on single-host deployments where workers and the
+AdminUI share a disk. Hosts check that the segments hold all results of the
+hunt (see HuntResultSegmentStore.HoldsAllResults) before writing or reading
+them and use the data store collections otherwise. Workers delete segments
+that can't be complete anymore, and the CleanHunts cron job deletes segments
+of hunts that no longer exist (see DeleteOrphanedSegments).
+"""
+
+import errno
+import fcntl
+import heapq
+import itertools
+import mmap
+import os
+import shutil
+import struct
+
+from builtins import range  # pylint: disable=redefined-builtin
+
+from grr_response_core import config
+from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+
+# timestamp (microseconds since epoch), suffix, payload length.
+_RECORD_HEADER = struct.Struct(">QII")
+# record number, timestamp high-water mark, offset of the record.
+_INDEX_ENTRY = struct.Struct(">QQQ")
+
+SEGMENT_EXTENSION = ".seg"
+INDEX_EXTENSION = ".idx"
+
+
+def IsEnabled():
+  return bool(config.CONFIG["HuntResultSegments.enabled"])
+
+
+class Segment(object):
+  """A single append-only result segment holding values of one type."""
+
+  # How many records between sparse index entries.
+  INDEX_SPACING = 1024
+
+  def __init__(self, base_path):
+    self.segment_path = base_path + SEGMENT_EXTENSION
+    self.index_path = base_path + INDEX_EXTENSION
+
+  def _ReadIndex(self):
+    """Returns a list of (record number, timestamp, offset) tuples."""
+    try:
+      with open(self.index_path, "rb") as fd:
+        data = fd.read()
+    except IOError as e:
+      if e.errno == errno.ENOENT:
+        return []
+      raise
+
+    # A crash during an append may leave a partial entry behind.
+    usable = len(data) - len(data) % _INDEX_ENTRY.size
+    return [
+        _INDEX_ENTRY.unpack_from(data, offset)
+        for offset in range(0, usable, _INDEX_ENTRY.size)
+    ]
+
+  def _IterHeaders(self, buf, offset, end):
+    """Yields (offset, timestamp, suffix, length) for records in buf."""
+    while offset + _RECORD_HEADER.size <= end:
+      timestamp, suffix, length = _RECORD_HEADER.unpack_from(buf, offset)
+      if offset + _RECORD_HEADER.size + length > end:
+        # Incomplete trailing record, still being written.
+        return
+      yield offset, timestamp, suffix, length
+      offset += _RECORD_HEADER.size + length
+
+  def _Tail(self, index, buf, end):
+    """Returns (record count, timestamp high-water mark, end offset)."""
+    if index:
+      count, high_water, offset = index[-1]
+    else:
+      count, high_water, offset = 0, 0, 0
+
+    for offset, timestamp, _, length in self._IterHeaders(buf, offset, end):
+      count += 1
+      high_water = max(high_water, timestamp)
+      offset += _RECORD_HEADER.size + length
+    return count, high_water, offset
+
+  def Append(self, records):
+    """Appends (timestamp, suffix, serialized message) tuples to the segment.
+
+    Appends are serialized between processes with an exclusive lock on the
+    segment file.
+
+    Args:
+      records: An iterable of (timestamp, suffix, serialized message) tuples.
+    """
+    utils.EnsureDirExists(os.path.dirname(self.segment_path))
+
+    with open(self.segment_path, "ab+") as segment_fd:
+      fcntl.flock(segment_fd, fcntl.LOCK_EX)
+      try:
+        size = os.fstat(segment_fd.fileno()).st_size
+        if size:
+          buf = mmap.mmap(segment_fd.fileno(), size, access=mmap.ACCESS_READ)
+          try:
+            count, high_water, end = self._Tail(self._ReadIndex(), buf, size)
+          finally:
+            buf.close()
+        else:
+          count, high_water, end = 0, 0, 0
+
+        if end != size:
+          # Drop an incomplete record left behind by a crashed writer.
+          segment_fd.truncate(end)
+
+        data = []
+        index_entries = []
+        offset = end
+        for timestamp, suffix, serialized in records:
+          if count % self.INDEX_SPACING == 0:
+            index_entries.append(
+                _INDEX_ENTRY.pack(count, max(high_water, timestamp), offset))
+          data.append(_RECORD_HEADER.pack(timestamp, suffix, len(serialized)))
+          data.append(serialized)
+          offset += _RECORD_HEADER.size + len(serialized)
+          high_water = max(high_water, timestamp)
+          count += 1
+
+        segment_fd.seek(0, os.SEEK_END)
+        segment_fd.write("".join(data))
+        segment_fd.flush()
+        if index_entries:
+          with open(self.index_path, "ab") as index_fd:
+            index_fd.write("".join(index_entries))
+      finally:
+        fcntl.flock(segment_fd, fcntl.LOCK_UN)
+
+  def _Map(self):
+    """Returns a read-only memory map of the segment or None if it's empty."""
+    try:
+      fd = open(self.segment_path, "rb")
+    except IOError as e:
+      if e.errno == errno.ENOENT:
+        return None
+      raise
+
+    with fd:
+      size = os.fstat(fd.fileno()).st_size
+      if not size:
+        return None
+      return mmap.mmap(fd.fileno(), size, access=mmap.ACCESS_READ)
+
+  def __len__(self):
+    buf = self._Map()
+    if buf is None:
+      return 0
+    try:
+      count, _, _ = self._Tail(self._ReadIndex(), buf, len(buf))
+      return count
+    finally:
+      buf.close()
+
+  def ScanRaw(self, offset=0, after_timestamp=None):
+    """Yields (timestamp, suffix, serialized message) tuples.
+
+    Args:
+      offset: Number of the first record to return.
+      after_timestamp: If set, only records stored strictly after this
+        timestamp (in microseconds) are returned.
+    """
+    buf = self._Map()
+    if buf is None:
+      return
+
+    try:
+      index = self._ReadIndex()
+      # Find the last index entry we can safely start scanning from: one
+      # before the requested record number, and with a high-water mark that
+      # guarantees no earlier record is newer than after_timestamp.
+      start_record, start_offset = 0, 0
+      for record_number, high_water, record_offset in index:
+        if record_number > offset:
+          break
+        if after_timestamp is not None and high_water > after_timestamp:
+          break
+        start_record, start_offset = record_number, record_offset
+
+      record_number = start_record
+      for record_offset, timestamp, suffix, length in self._IterHeaders(
+          buf, start_offset, len(buf)):
+        if record_number >= offset and (after_timestamp is None or
+                                        timestamp > after_timestamp):
+          start = record_offset + _RECORD_HEADER.size
+          yield timestamp, suffix, buf[start:start + length]
+        record_number += 1
+    finally:
+      buf.close()
+
+
+class HuntResultSegmentStore(object):
+  """Result segments of a single hunt, grouped by payload type.
+
+  Provides the read interface of MultiTypeCollection (ListStoredTypes,
+  ScanByType, LengthByType) as well as the one of an indexed collection
+  (GenerateItems, __len__) for the results of all types merged by timestamp.
+  """
+
+  def __init__(self, hunt_id):
+    self.hunt_id = hunt_id
+    self.root_dir = os.path.join(config.CONFIG["HuntResultSegments.root_dir"],
+                                 hunt_id.Basename())
+
+  def _Segment(self, type_name):
+    return Segment(os.path.join(self.root_dir, type_name))
+
+  def Exists(self):
+    return os.path.isdir(self.root_dir)
+
+  def HoldsAllResults(self, results_count):
+    """Checks whether the segments hold all results of the hunt.
+
+    Segments are stored on the local disk of the host that wrote them, so
+    results processed on other hosts are missing from them.
+
+    Args:
+      results_count: Number of results the hunt has (see HuntContext).
+
+    Returns:
+      True if the segments hold exactly results_count results.
+    """
+    if not results_count:
+      return not self.Exists() or not len(self)
+    return self.Exists() and len(self) == results_count
+
+  def AddMessages(self, messages, timestamp):
+    """Appends GrrMessages to the segments of their payload types.
+
+    Args:
+      messages: A list of GrrMessages.
+      timestamp: RDFDatetime the messages were stored at.
+    """
+    timestamp = timestamp.AsMicrosecondsSinceEpoch()
+    for type_name, group in utils.GroupBy(messages, _TypeName).items():
+      self._Segment(type_name).Append(
+          (timestamp, suffix, msg.SerializeToString())
+          for suffix, msg in enumerate(group))
+
+  def ListStoredTypes(self):
+    try:
+      names = os.listdir(self.root_dir)
+    except OSError as e:
+      if e.errno == errno.ENOENT:
+        return []
+      raise
+
+    return sorted(
+        name[:-len(SEGMENT_EXTENSION)]
+        for name in names
+        if name.endswith(SEGMENT_EXTENSION))
+
+  def _Decode(self, timestamp, serialized):
+    item = rdf_flows.GrrMessage.FromSerializedString(serialized)
+    item.age = timestamp
+    return item
+
+  def ScanByType(self,
+                 type_name,
+                 after_timestamp=None,
+                 include_suffix=False,
+                 max_records=None):
+    """Scans for stored records of a given type.
+
+    Args:
+      type_name: Type of the records to scan.
+      after_timestamp: If set, only returns values recorded after timestamp.
+      include_suffix: If true, the timestamps returned are pairs of the form
+        (micros_since_epoc, suffix).
+      max_records: The maximum number of records to return. Defaults to
+        unlimited.
+
+    Yields:
+      Pairs (timestamp, rdf_value), indicating that rdf_value was stored at
+      timestamp.
+    """
+    records = self._Segment(type_name).ScanRaw(after_timestamp=after_timestamp)
+    for timestamp, suffix, serialized in itertools.islice(records, max_records):
+      item = self._Decode(timestamp, serialized)
+      if include_suffix:
+        yield ((timestamp, suffix), item)
+      else:
+        yield (timestamp, item)
+
+  def LengthByType(self, type_name):
+    return len(self._Segment(type_name))
+
+  def GenerateItems(self, offset=0):
+    """Yields results of all types ordered by timestamp, starting at offset."""
+    type_names = self.ListStoredTypes()
+    if len(type_names) == 1:
+      # The common case: the sparse index lets us seek straight to offset.
+      records = self._Segment(type_names[0]).ScanRaw(offset=offset)
+      for timestamp, _, serialized in records:
+        yield self._Decode(timestamp, serialized)
+      return
+
+    # Records are merged on their headers only, skipped ones never get parsed.
+    merged = heapq.merge(
+        *[self._Segment(name).ScanRaw() for name in type_names])
+    for timestamp, _, serialized in itertools.islice(merged, offset, None):
+      yield self._Decode(timestamp, serialized)
+
+  def __iter__(self):
+    return self.GenerateItems()
+
+  def __len__(self):
+    return sum(self.LengthByType(name) for name in self.ListStoredTypes())
+
+  def Delete(self):
+    shutil.rmtree(self.root_dir, ignore_errors=True)
+
+
+def DeleteOrphanedSegments(hunt_ids):
+  """Deletes segments of all hunts except the given ones.
+
+  Args:
+    hunt_ids: An iterable of URNs of existing hunts.
+
+  Returns:
+    The number of hunts whose segments were deleted.
+  """
+  root_dir = config.CONFIG["HuntResultSegments.root_dir"]
+  try:
+    names = os.listdir(root_dir)
+  except OSError as e:
+    if e.errno == errno.ENOENT:
+      return 0
+    raise
+
+  existing = set(hunt_id.Basename() for hunt_id in hunt_ids)
+  deleted = 0
+  for name in names:
+    if name not in existing:
+      shutil.rmtree(os.path.join(root_dir, name), ignore_errors=True)
+      deleted += 1
+  return deleted
+
+
+def _TypeName(message):
+  return message.args_rdf_name or rdf_flows.GrrMessage.__name__
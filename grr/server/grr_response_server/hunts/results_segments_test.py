@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""Tests for grr_response_server.hunts.results_segments."""
+
+import os
+
+from builtins import range  # pylint: disable=redefined-builtin
+
+from grr_response_core.lib import flags
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_server.hunts import results_segments
+from grr.test_lib import test_lib
+
+
+class SegmentTest(test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super(SegmentTest, self).setUp()
+    self.segment = results_segments.Segment(
+        os.path.join(self.temp_dir, "segments", "ClientSummary"))
+
+  def _Append(self, timestamps):
+    self.segment.Append(
+        (ts, 0, "value_%d" % ts) for ts in timestamps)
+
+  def testEmptySegment(self):
+    self.assertEqual(len(self.segment), 0)
+    self.assertEqual(list(self.segment.ScanRaw()), [])
+
+  def testScanReturnsRecordsInOrder(self):
+    self._Append(range(1, 11))
+    self._Append(range(11, 21))
+
+    self.assertEqual(len(self.segment), 20)
+    self.assertEqual([data for _, _, data in self.segment.ScanRaw()],
+                     ["value_%d" % i for i in range(1, 21)])
+
+  def testScanFromOffsetUsesIndex(self):
+    self.segment.INDEX_SPACING = 10
+    self._Append(range(1, 101))
+
+    got = list(self.segment.ScanRaw(offset=55))
+    self.assertEqual([ts for ts, _, _ in got], list(range(56, 101)))
+
+  def testScanAfterTimestamp(self):
+    self.segment.INDEX_SPACING = 10
+    self._Append(range(1, 101))
+
+    got = list(self.segment.ScanRaw(after_timestamp=42))
+    self.assertEqual([ts for ts, _, _ in got], list(range(43, 101)))
+
+  def testScanAfterTimestampHandlesOutOfOrderRecords(self):
+    self.segment.INDEX_SPACING = 2
+    self._Append([10, 20, 5, 30, 6, 40])
+
+    got = list(self.segment.ScanRaw(after_timestamp=15))
+    self.assertEqual([ts for ts, _, _ in got], [20, 30, 40])
+
+  def testIncompleteTrailingRecordIsIgnoredAndOverwritten(self):
+    self._Append(range(1, 4))
+    with open(self.segment.segment_path, "ab") as fd:
+      fd.write("\x00\x00\x00")
+
+    self.assertEqual(len(self.segment), 3)
+
+    self._Append([4])
+    self.assertEqual([ts for ts, _, _ in self.segment.ScanRaw()], [1, 2, 3, 4])
+
+
+class HuntResultSegmentStoreTest(test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super(HuntResultSegmentStoreTest, self).setUp()
+    self.config_overrider = test_lib.ConfigOverrider({
+        "HuntResultSegments.root_dir": self.temp_dir
+    })
+    self.config_overrider.Start()
+    self.store = results_segments.HuntResultSegmentStore(
+        rdfvalue.RDFURN("aff4:/hunts/H:123456"))
+
+  def tearDown(self):
+    self.config_overrider.Stop()
+    super(HuntResultSegmentStoreTest, self).tearDown()
+
+  def _AddMessages(self, payloads, timestamp):
+    self.store.AddMessages([
+        rdf_flows.GrrMessage(payload=payload, source="C.1000000000000000")
+        for payload in payloads
+    ], rdfvalue.RDFDatetime.FromSecondsSinceEpoch(timestamp))
+
+  def testStoreDoesNotExistUntilWritten(self):
+    self.assertFalse(self.store.Exists())
+    self.assertEqual(len(self.store), 0)
+    self.assertEqual(self.store.ListStoredTypes(), [])
+
+    self._AddMessages([rdf_client.ClientSummary()], 1)
+    self.assertTrue(self.store.Exists())
+
+  def testHoldsAllResults(self):
+    self.assertTrue(self.store.HoldsAllResults(0))
+    self.assertFalse(self.store.HoldsAllResults(2))
+
+    self._AddMessages([rdfvalue.RDFString("a"), rdfvalue.RDFString("b")], 1)
+    self.assertTrue(self.store.HoldsAllResults(2))
+    self.assertFalse(self.store.HoldsAllResults(0))
+    self.assertFalse(self.store.HoldsAllResults(3))
+
+  def testResultsAreGroupedByType(self):
+    self._AddMessages([
+        rdf_client.ClientSummary(system_uptime=i) for i in range(3)
+    ] + [rdfvalue.RDFString("foo")], 1)
+
+    self.assertEqual(self.store.ListStoredTypes(),
+                     ["ClientSummary", "RDFString"])
+    self.assertEqual(self.store.LengthByType("ClientSummary"), 3)
+    self.assertEqual(self.store.LengthByType("RDFString"), 1)
+    self.assertEqual(len(self.store), 4)
+
+    values = [
+        item.payload.system_uptime
+        for _, item in self.store.ScanByType("ClientSummary")
+    ]
+    self.assertEqual(values, [0, 1, 2])
+
+  def testScanByTypeSetsAgeAndSource(self):
+    self._AddMessages([rdfvalue.RDFString("foo")], 42)
+
+    (timestamp, item), = list(self.store.ScanByType("RDFString"))
+    self.assertEqual(timestamp, 42 * 1000000)
+    self.assertEqual(item.age,
+                     rdfvalue.RDFDatetime.FromSecondsSinceEpoch(42))
+    self.assertEqual(item.source.Basename(), "C.1000000000000000")
+    self.assertEqual(item.payload, "foo")
+
+  def testGenerateItemsMergesTypesByTimestamp(self):
+    self._AddMessages([rdfvalue.RDFString("a")], 1)
+    self._AddMessages([rdf_client.ClientSummary(system_uptime=2)], 2)
+    self._AddMessages([rdfvalue.RDFString("c")], 3)
+
+    items = list(self.store.GenerateItems())
+    self.assertEqual([item.age.AsSecondsSinceEpoch() for item in items],
+                     [1, 2, 3])
+
+    items = list(self.store.GenerateItems(offset=1))
+    self.assertEqual([item.age.AsSecondsSinceEpoch() for item in items],
+                     [2, 3])
+
+  def testDeleteRemovesAllSegments(self):
+    self._AddMessages([rdfvalue.RDFString("a")], 1)
+    self.store.Delete()
+
+    self.assertFalse(self.store.Exists())
+    self.assertEqual(len(self.store), 0)
+
+  def testDeleteOrphanedSegmentsKeepsSegmentsOfExistingHunts(self):
+    self._AddMessages([rdfvalue.RDFString("a")], 1)
+    orphaned = results_segments.HuntResultSegmentStore(
+        rdfvalue.RDFURN("aff4:/hunts/H:654321"))
+    orphaned.AddMessages(
+        [rdf_flows.GrrMessage(payload=rdfvalue.RDFString("b"))],
+        rdfvalue.RDFDatetime.FromSecondsSinceEpoch(1))
+
+    deleted = results_segments.DeleteOrphanedSegments(
+        [rdfvalue.RDFURN("aff4:/hunts/H:123456")])
+
+    self.assertEqual(deleted, 1)
+    self.assertTrue(self.store.Exists())
+    self.assertFalse(orphaned.Exists())
+
+  def testDeleteOrphanedSegmentsWithoutRootDir(self):
+    with test_lib.ConfigOverrider({
+        "HuntResultSegments.root_dir": os.path.join(self.temp_dir, "missing")
+    }):
+      self.assertEqual(results_segments.DeleteOrphanedSegments([]), 0)
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
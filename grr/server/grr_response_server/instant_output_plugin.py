@@ -1,21 +1,44 @@
 #!/usr/bin/env python
 """Instant output plugins used by the API for on-the-fly conversion."""
 
+import collections
 import itertools
+import logging
+import multiprocessing
 import re
+import threading
+import time
+import traceback
 
 
 from builtins import zip  # pylint: disable=redefined-builtin
 from future.utils import itervalues
 from future.utils import with_metaclass
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import registry
 from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_server import aff4
 from grr_response_server import export
 
 
+class ConversionError(export.ExportError):
+  """Raised when a batch of values could not be converted by a worker process.
+
+  Attributes:
+    worker_traceback: Text of the traceback of the error in the worker.
+  """
+
+  def __init__(self, message, worker_traceback=None):
+    if worker_traceback:
+      message = "%s\nWorker traceback:\n%s" % (message, worker_traceback)
+    super(ConversionError, self).__init__(message)
+    self.worker_traceback = worker_traceback
+
+
 class InstantOutputPlugin(with_metaclass(registry.MetaclassRegistry, object)):
   """The base class for instant output plugins.
 
@@ -96,6 +119,104 @@ class InstantOutputPlugin(with_metaclass(registry.MetaclassRegistry, object)):
     """
 
 
+def _ConvertBatch(index, converter_cls_name, serialized_options,
+                  serialized_pairs):
+  """Converts a batch of values in a conversion worker process.
+
+  Args:
+    index: Index of the batch, returned as is.
+    converter_cls_name: Name of the ExportConverter class to use.
+    serialized_options: Serialized ExportOptions for the converter.
+    serialized_pairs: List of (serialized ExportedMetadata, serialized
+        GrrMessage) tuples with values to convert.
+
+  Returns:
+    A tuple (index, results, error), where results is a list of (class name,
+    serialized value) tuples with converted values and error is the traceback
+    text of an error that prevented the conversion (None if there was no
+    error).
+  """
+  try:
+    converter_cls = export.ExportConverter.classes[converter_cls_name]
+    converter = converter_cls(
+        export.ExportOptions.FromSerializedString(serialized_options))
+
+    metadata_value_pairs = []
+    for serialized_metadata, serialized_message in serialized_pairs:
+      metadata = export.ExportedMetadata.FromSerializedString(
+          serialized_metadata)
+      message = rdf_flows.GrrMessage.FromSerializedString(serialized_message)
+      metadata_value_pairs.append((metadata, message.payload))
+
+    results = [(result.__class__.__name__, result.SerializeToString())
+               for result in converter.BatchConvert(metadata_value_pairs)]
+    return index, results, None
+  # Errors are passed back to the exporting process, where they are raised.
+  except Exception:  # pylint: disable=broad-except
+    return index, None, traceback.format_exc()
+
+
+_conversion_pool = None
+_conversion_pool_processes = None
+_conversion_pool_lock = threading.Lock()
+
+
+def _GetConversionPool(processes):
+  """Returns a pool of conversion worker processes, creating it if needed."""
+  global _conversion_pool, _conversion_pool_processes
+
+  with _conversion_pool_lock:
+    if _conversion_pool is None or _conversion_pool_processes != processes:
+      if _conversion_pool is not None:
+        _conversion_pool.close()
+      _conversion_pool = multiprocessing.Pool(processes=processes)
+      _conversion_pool_processes = processes
+
+    return _conversion_pool
+
+
+def _ResetConversionPool(pool):
+  """Terminates a pool that failed, so that the next export creates a new one."""
+  global _conversion_pool
+
+  with _conversion_pool_lock:
+    if _conversion_pool is pool:
+      _conversion_pool = None
+  pool.terminate()
+
+
+def InitConversionPool():
+  """Creates the pool of conversion worker processes if it is configured.
+
+  Worker processes are forked, so the pool should be created before the
+  process starts any threads: locks held by other threads at the time of the
+  fork would never be released in the workers.
+  """
+  processes = config.CONFIG["Export.conversion_processes"]
+  if processes > 0:
+    _GetConversionPool(processes)
+
+
+def FlattenProtoStructFields(proto_struct_class, path=()):
+  """Yields the leaf fields of an RDFProtoStruct class, flattening embeddings.
+
+  Args:
+    proto_struct_class: RDFProtoStruct class of exported values.
+    path: Names of fields leading to embedded values of proto_struct_class.
+
+  Yields:
+    (field names path, column name, type info) tuples in field order. Column
+    names of embedded fields are their field names paths joined with dots.
+  """
+  for type_info in proto_struct_class.type_infos:
+    field_path = path + (type_info.name,)
+    if type_info.__class__ is rdf_structs.ProtoEmbedded:
+      for field in FlattenProtoStructFields(type_info.type, path=field_path):
+        yield field
+    else:
+      yield field_path, utils.SmartStr(".".join(field_path)), type_info
+
+
 class InstantOutputPluginWithExportConversion(InstantOutputPlugin):
   """Instant output plugin that flattens data before exporting."""
 
@@ -239,28 +360,176 @@ class InstantOutputPluginWithExportConversion(InstantOutputPlugin):
           batch_with_metadata, token=self.token):
         yield result
 
+  def _SerializeBatch(self, batch):
+    """Serializes a batch of messages (with their metadata) for conversion."""
+    metadata_items = self._GetMetadataForClients([gm.source for gm in batch])
+
+    serialized_metadata = {}
+    serialized_pairs = []
+    for metadata, gm in zip(metadata_items, batch):
+      try:
+        serialized = serialized_metadata[metadata.client_urn]
+      except KeyError:
+        serialized = metadata.SerializeToString()
+        serialized_metadata[metadata.client_urn] = serialized
+
+      serialized_pairs.append((serialized, gm.SerializeToString()))
+
+    return serialized_pairs
+
+  def _ParseConvertedValues(self, results):
+    for cls_name, serialized in results:
+      yield rdfvalue.RDFValue.classes[cls_name].FromSerializedString(serialized)
+
+  def _GenerateConvertedValuesInParallel(self, converter, grr_messages,
+                                         processes, ordered):
+    """Generates converted values using a pool of worker processes.
+
+    Batches of BATCH_SIZE messages are sent to the worker processes, at most
+    two batches per process at a time. Metadata of clients of the following
+    batches is fetched while the preceding ones are being converted.
+
+    If a batch is not converted within Export.conversion_timeout (e.g. because
+    a worker process died and the pool lost the batch), the pool is discarded
+    and this and all the following batches are converted in this process.
+
+    Args:
+      converter: ExportConverter instance. Has to be subprocess_safe.
+      grr_messages: An iterable (a generator is assumed) with GRRMessage values.
+      processes: Number of worker processes to use.
+      ordered: If True, converted values are generated in order of the
+          messages they were converted from. Otherwise, they are generated
+          in order in which batches of messages are converted.
+
+    Yields:
+      Values generated by the converter.
+
+    Raises:
+      ConversionError: if conversion of any of the batches failed.
+    """
+    pool = _GetConversionPool(processes)
+    converter_cls_name = converter.__class__.__name__
+    serialized_options = converter.options.SerializeToString()
+    timeout = config.CONFIG["Export.conversion_timeout"].seconds
+
+    batches = enumerate(utils.Grouper(grr_messages, self.BATCH_SIZE))
+    pending = collections.deque()
+    next_index = 0
+    converted_batches = {}
+
+    while True:
+      while pool is not None and len(pending) < 2 * processes:
+        try:
+          index, batch = next(batches)
+        except StopIteration:
+          break
+
+        serialized_pairs = self._SerializeBatch(batch)
+        async_result = pool.apply_async(
+            _ConvertBatch, (index, converter_cls_name, serialized_options,
+                            serialized_pairs))
+        pending.append((index, serialized_pairs, async_result))
+
+      if pending:
+        entry = pending[0]
+        if not ordered and pool is not None:
+          entry = next((p for p in pending if p[2].ready()), entry)
+        pending.remove(entry)
+        index, serialized_pairs, async_result = entry
+      elif pool is None:
+        try:
+          index, batch = next(batches)
+        except StopIteration:
+          break
+        serialized_pairs = self._SerializeBatch(batch)
+        async_result = None
+      else:
+        break
+
+      converted = None
+      if pool is not None:
+        try:
+          converted = async_result.get(timeout)
+        except multiprocessing.TimeoutError:
+          logging.warning(
+              "Conversion with %s timed out after %d seconds, converting in "
+              "the exporting thread instead.", converter_cls_name, timeout)
+          _ResetConversionPool(pool)
+          pool = None
+        except Exception:  # pylint: disable=broad-except
+          logging.exception(
+              "Conversion with %s failed in a worker process, converting in "
+              "the exporting thread instead.", converter_cls_name)
+      if converted is None:
+        converted = _ConvertBatch(index, converter_cls_name, serialized_options,
+                                  serialized_pairs)
+
+      _, results, error = converted
+      if error is not None:
+        raise ConversionError(
+            "Conversion with %s failed." % converter_cls_name,
+            worker_traceback=error)
+
+      if not ordered:
+        for result in self._ParseConvertedValues(results):
+          yield result
+        continue
+
+      converted_batches[index] = results
+      while next_index in converted_batches:
+        for result in self._ParseConvertedValues(
+            converted_batches.pop(next_index)):
+          yield result
+        next_index += 1
+
+  def _ConvertValues(self, converter, grr_messages):
+    processes = config.CONFIG["Export.conversion_processes"]
+    if processes > 0 and converter.subprocess_safe:
+      return self._GenerateConvertedValuesInParallel(
+          converter,
+          grr_messages,
+          processes,
+          ordered=config.CONFIG["Export.ordered_conversion"])
+    else:
+      return self._GenerateConvertedValues(converter, grr_messages)
+
   def ProcessValues(self, value_type, values_generator_fn):
     converter_classes = export.ExportConverter.GetConvertersByClass(value_type)
     if not converter_classes:
       return
     converters = [cls(self.GetExportOptions()) for cls in converter_classes]
 
+    start_time = time.time()
+    row_counts = [0]
+
+    def CountRows(values):
+      for value in values:
+        row_counts[0] += 1
+        yield value
+
     next_types = set()
     processed_types = set()
     while True:
       converted_responses = itertools.chain.from_iterable(
-          self._GenerateConvertedValues(converter, values_generator_fn())
+          self._ConvertValues(converter, values_generator_fn())
           for converter in converters)
 
       generator = self._GenerateSingleTypeIteration(next_types, processed_types,
                                                     converted_responses)
 
-      for chunk in self.ProcessSingleTypeExportedValues(value_type, generator):
+      for chunk in self.ProcessSingleTypeExportedValues(
+          value_type, CountRows(generator)):
         yield chunk
 
       if not next_types:
         break
 
+    elapsed = time.time() - start_time
+    logging.info("%s exported %d rows converted from %s values in %.1fs "
+                 "(%.1f rows/s).", self.__class__.__name__, row_counts[0],
+                 value_type.__name__, elapsed,
+                 row_counts[0] / elapsed if elapsed else 0.0)
+
 
 def ApplyPluginToMultiTypeCollection(plugin, output_collection,
                                      source_urn=None):
@@ -268,7 +537,9 @@ def ApplyPluginToMultiTypeCollection(plugin, output_collection,
 
   Args:
     plugin: InstantOutputPlugin instance.
-    output_collection: MultiTypeCollection instance.
+    output_collection: MultiTypeCollection instance or any object providing
+        the same ListStoredTypes/ScanByType interface (e.g.
+        HuntResultSegmentStore).
     source_urn: If not None, override source_urn for collection items. This has
         to be used when exporting flow results - their GrrMessages don't have
         "source" attribute set.
@@ -3,6 +3,7 @@
 """Tests for CSV output plugin."""
 
 import csv
+import multiprocessing
 import os
 import zipfile
 
@@ -10,8 +11,11 @@ from builtins import range  # pylint: disable=redefined-builtin
 import yaml
 
 from grr_response_core.lib import flags
+from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_server import export
+from grr_response_server import instant_output_plugin
 from grr_response_server.output_plugins import csv_plugin
 from grr_response_server.output_plugins import test_plugins
 from grr.test_lib import test_lib
@@ -190,6 +194,119 @@ class CSVInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
                        self.client_id.Add("/fs/os/foo/bar/%d" % i))
 
 
+class CSVInstantOutputPluginParallelConversionTest(CSVInstantOutputPluginTest):
+  """Tests instant CSV output plugin converting values in worker processes."""
+
+  def setUp(self):
+    super(CSVInstantOutputPluginParallelConversionTest, self).setUp()
+    self.config_overrider = test_lib.ConfigOverrider({
+        "Export.conversion_processes": 2,
+    })
+    self.config_overrider.Start()
+
+    # Make sure values are split into multiple batches.
+    self.batch_size_stubber = utils.Stubber(self.plugin, "BATCH_SIZE", 7)
+    self.batch_size_stubber.Start()
+
+  def tearDown(self):
+    super(CSVInstantOutputPluginParallelConversionTest, self).tearDown()
+    self.batch_size_stubber.Stop()
+    self.config_overrider.Stop()
+
+  def testCSVPluginWithUnorderedConversion(self):
+    num_rows = 100
+
+    responses = []
+    for i in range(num_rows):
+      responses.append(
+          rdf_client.StatEntry(
+              pathspec=rdf_paths.PathSpec(
+                  path="/foo/bar/%d" % i, pathtype="OS")))
+
+    with test_lib.ConfigOverrider({"Export.ordered_conversion": False}):
+      zip_fd, prefix = self.ProcessValuesToZip(
+          {rdf_client.StatEntry: responses})
+
+    parsed_output = list(
+        csv.DictReader(
+            zip_fd.open("%s/ExportedFile/from_StatEntry.csv" % prefix)))
+    self.assertEqual(
+        sorted(row["urn"] for row in parsed_output),
+        sorted(
+            self.client_id.Add("/fs/os/foo/bar/%d" % i)
+            for i in range(num_rows)))
+
+  def _StatEntries(self, num_rows):
+    return [
+        rdf_client.StatEntry(
+            pathspec=rdf_paths.PathSpec(path="/foo/bar/%d" % i, pathtype="OS"))
+        for i in range(num_rows)
+    ]
+
+  def testFallsBackToInProcessConversionIfWorkersDoNotRespond(self):
+
+    class LostResult(object):
+
+      def ready(self):
+        return False
+
+      def get(self, timeout=None):
+        raise multiprocessing.TimeoutError()
+
+    class LostPool(object):
+      terminated = False
+
+      def apply_async(self, *unused_args):
+        return LostResult()
+
+      def terminate(self):
+        self.terminated = True
+
+    pool = LostPool()
+    with utils.Stubber(instant_output_plugin, "_GetConversionPool",
+                       lambda _: pool):
+      zip_fd, prefix = self.ProcessValuesToZip(
+          {rdf_client.StatEntry: self._StatEntries(20)})
+
+    self.assertTrue(pool.terminated)
+    parsed_output = list(
+        csv.DictReader(
+            zip_fd.open("%s/ExportedFile/from_StatEntry.csv" % prefix)))
+    self.assertEqual([row["urn"] for row in parsed_output], [
+        self.client_id.Add("/fs/os/foo/bar/%d" % i) for i in range(20)
+    ])
+
+  def testWorkerErrorsAreRaisedWithTraceback(self):
+    with utils.Stubber(export.ExportConverter, "classes", {}):
+      index, results, error = instant_output_plugin._ConvertBatch(
+          0, "StatEntryToExportedFileConverter", b"", [])
+
+    self.assertEqual(index, 0)
+    self.assertIsNone(results)
+    self.assertIn("Traceback", error)
+    self.assertIn("KeyError", error)
+
+    class FailedResult(object):
+
+      def ready(self):
+        return True
+
+      def get(self, timeout=None):
+        return 0, None, error
+
+    class FailingPool(object):
+
+      def apply_async(self, *unused_args):
+        return FailedResult()
+
+    with utils.Stubber(instant_output_plugin, "_GetConversionPool",
+                       lambda _: FailingPool()):
+      with self.assertRaises(instant_output_plugin.ConversionError) as context:
+        self.ProcessValuesToZip({rdf_client.StatEntry: self._StatEntries(1)})
+
+    self.assertEqual(context.exception.worker_traceback, error)
+
+
 def main(argv):
   test_lib.main(argv)
 
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""Plugin that exports results as Parquet files."""
+
+import itertools
+import os
+import zipfile
+
+
+import pyarrow as pa
+from pyarrow import parquet as pq
+import yaml
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
+from grr_response_server import instant_output_plugin
+
+
+class Rdf2ArrowAdapter(object):
+  """An adapter for converting RDF values to Arrow-typed column values."""
+
+  class Converter(object):
+
+    def __init__(self, arrow_type, convert_fn):
+      self.arrow_type = arrow_type
+      self.convert_fn = convert_fn
+
+  DEFAULT_CONVERTER = Converter(pa.string(), utils.SmartUnicode)
+
+  BINARY_CONVERTER = Converter(pa.binary(), lambda x: x.SerializeToString())
+
+  INT_CONVERTER = Converter(pa.int64(), int)
+
+  UINT_CONVERTER = Converter(pa.uint64(), int)
+
+  BOOL_CONVERTER = Converter(pa.bool_(), bool)
+
+  # Converters for fields that have a semantic type annotation in their
+  # protobuf definition.
+  SEMANTIC_CONVERTERS = {
+      rdfvalue.RDFInteger:
+          INT_CONVERTER,
+      rdfvalue.RDFBool:
+          BOOL_CONVERTER,
+      rdfvalue.RDFDatetime:
+          Converter(
+              pa.timestamp("us"), lambda x: x.AsMicrosecondsSinceEpoch()),
+      rdfvalue.RDFDatetimeSeconds:
+          Converter(
+              pa.timestamp("us"), lambda x: x.AsSecondsSinceEpoch() * 1000000),
+      rdfvalue.Duration:
+          Converter(pa.int64(), lambda x: x.microseconds),
+  }
+
+  # Converters for fields that do not have a semantic type annotation in their
+  # protobuf definition.
+  NON_SEMANTIC_CONVERTERS = {
+      rdf_structs.ProtoUnsignedInteger: UINT_CONVERTER,
+      rdf_structs.ProtoSignedInteger: INT_CONVERTER,
+      rdf_structs.ProtoFixed32: Converter(pa.uint32(), int),
+      rdf_structs.ProtoFixed64: UINT_CONVERTER,
+      rdf_structs.ProtoFloat: Converter(pa.float32(), float),
+      rdf_structs.ProtoDouble: Converter(pa.float64(), float),
+      rdf_structs.ProtoBoolean: BOOL_CONVERTER,
+      rdf_structs.ProtoBinary: Converter(pa.binary(), bytes),
+      rdf_structs.ProtoEnum: Converter(pa.string(), str),
+  }
+
+  @staticmethod
+  def GetConverter(type_info):
+    """Returns a converter for values of a field as stored in RDFProtoStructs.
+
+    Args:
+      type_info: Type descriptor of the field.
+
+    Returns:
+      A Converter object.
+    """
+    if type_info.__class__ is rdf_structs.ProtoRDFValue:
+      if (issubclass(type_info.type, rdfvalue.RDFBytes) and
+          not issubclass(type_info.type, rdfvalue.RDFString)):
+        return Rdf2ArrowAdapter.BINARY_CONVERTER
+      return Rdf2ArrowAdapter.SEMANTIC_CONVERTERS.get(
+          type_info.type, Rdf2ArrowAdapter.DEFAULT_CONVERTER)
+    else:
+      return Rdf2ArrowAdapter.NON_SEMANTIC_CONVERTERS.get(
+          type_info.__class__, Rdf2ArrowAdapter.DEFAULT_CONVERTER)
+
+
+class _ParquetSink(object):
+  """File-like object collecting data written by a Parquet writer.
+
+  Written data is only kept until it's read with GetValueAndReset(), so the
+  output file doesn't have to be buffered in memory as a whole. Unlike
+  utils.RollingMemoryStream, data written just before the writer closes the
+  sink can still be read.
+  """
+
+  def __init__(self):
+    self._chunks = []
+    self._offset = 0
+    self.closed = False
+
+  def write(self, b):  # pylint: disable=invalid-name
+    if self.closed:
+      raise ValueError("Attempting to write to a closed sink.")
+
+    self._chunks.append(b)
+    self._offset += len(b)
+
+  def flush(self):  # pylint: disable=invalid-name
+    pass
+
+  def tell(self):  # pylint: disable=invalid-name
+    return self._offset
+
+  def close(self):  # pylint: disable=invalid-name
+    self.closed = True
+
+  def GetValueAndReset(self):
+    """Gets data written since the last GetValueAndReset() call."""
+    value = b"".join(self._chunks)
+    self._chunks = []
+    return value
+
+
+class ParquetInstantOutputPlugin(
+    instant_output_plugin.InstantOutputPluginWithExportConversion):
+  """Instant output plugin that converts results into Parquet files."""
+
+  plugin_name = "parquet-zip"
+  friendly_name = "Parquet (zipped)"
+  description = "Output ZIP archive with Parquet files."
+  output_file_extension = ".zip"
+
+  # Number of rows written to each row group of a Parquet file. Only a single
+  # row group is kept in memory at a time.
+  ROW_GROUP_SIZE = 10000
+
+  # Text and binary columns compress much better with a slower codec.
+  COMPRESSION = "SNAPPY"
+  BYTES_COMPRESSION = "GZIP"
+
+  def __init__(self, *args, **kwargs):
+    super(ParquetInstantOutputPlugin, self).__init__(*args, **kwargs)
+    self.archive_generator = None  # Created in Start()
+    self.export_counts = {}
+
+  @property
+  def path_prefix(self):
+    prefix, _ = os.path.splitext(self.output_file_name)
+    return prefix
+
+  def Start(self):
+    self.archive_generator = utils.StreamingZipGenerator(
+        compression=zipfile.ZIP_DEFLATED)
+    self.export_counts = {}
+    return []
+
+  def ProcessSingleTypeExportedValues(self, original_value_type,
+                                      exported_values):
+    first_value = next(exported_values, None)
+    if not first_value:
+      return
+
+    if not isinstance(first_value, rdf_structs.RDFProtoStruct):
+      raise ValueError("The Parquet plugin only supports export-protos")
+
+    # Column chunks are compressed by the Parquet writer already, compressing
+    # them again would only waste CPU.
+    yield self.archive_generator.WriteFileHeader(
+        "%s/%s/from_%s.parquet" %
+        (self.path_prefix, first_value.__class__.__name__,
+         original_value_type.__name__),
+        compress_type=zipfile.ZIP_STORED)
+
+    columns = self._GetParquetColumns(first_value.__class__)
+
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(
+        sink,
+        self._GetArrowSchema(columns),
+        compression=self._GetCompression(columns),
+        use_dictionary=True)
+
+    counter = 0
+    for batch in utils.Grouper(
+        itertools.chain([first_value], exported_values), self.ROW_GROUP_SIZE):
+      counter += len(batch)
+      writer.write_table(self._ConvertToTable(columns, batch))
+      yield self.archive_generator.WriteFileChunk(sink.GetValueAndReset())
+
+    writer.close()
+    yield self.archive_generator.WriteFileChunk(sink.GetValueAndReset())
+    yield self.archive_generator.WriteFileFooter()
+
+    counts_for_original_type = self.export_counts.setdefault(
+        original_value_type.__name__, dict())
+    counts_for_original_type[first_value.__class__.__name__] = counter
+
+  def _GetParquetColumns(self, proto_struct_class):
+    """Returns a list of columns for values of a given class.
+
+    Args:
+      proto_struct_class: RDFProtoStruct class of exported values.
+
+    Returns:
+      A list of (field names path, column name, Converter) tuples.
+    """
+    return [(field_path, name, Rdf2ArrowAdapter.GetConverter(type_info))
+            for field_path, name, type_info in
+            instant_output_plugin.FlattenProtoStructFields(proto_struct_class)]
+
+  def _GetArrowSchema(self, columns):
+    return pa.schema([
+        pa.field(name, converter.arrow_type) for _, name, converter in columns
+    ])
+
+  def _GetCompression(self, columns):
+    """Returns a mapping of Parquet column names to compression codecs."""
+    compression = {}
+    for _, name, converter in columns:
+      if converter.arrow_type in (pa.string(), pa.binary()):
+        compression[name] = self.BYTES_COMPRESSION
+      else:
+        compression[name] = self.COMPRESSION
+    return compression
+
+  def _ConvertToTable(self, columns, values):
+    """Converts a batch of RDFProtoStructs into an Arrow table."""
+    column_values = [[] for _ in columns]
+
+    for value in values:
+      for (field_path, _, converter), column in zip(columns, column_values):
+        struct = value
+        for name in field_path:
+          if not struct.HasField(name):
+            column.append(None)
+            break
+          struct = struct.Get(name)
+        else:
+          column.append(converter.convert_fn(struct))
+
+    arrays = [
+        pa.array(column, type=converter.arrow_type)
+        for (_, _, converter), column in zip(columns, column_values)
+    ]
+    return pa.Table.from_arrays(arrays, names=[name for _, name, _ in columns])
+
+  def Finish(self):
+    manifest = {"export_stats": self.export_counts}
+
+    yield self.archive_generator.WriteFileHeader(self.path_prefix + "/MANIFEST")
+    yield self.archive_generator.WriteFileChunk(yaml.safe_dump(manifest))
+    yield self.archive_generator.WriteFileFooter()
+    yield self.archive_generator.Close()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- mode: python; encoding: utf-8 -*-
+"""Tests for the Parquet instant output plugin."""
+
+import datetime
+import io
+import os
+import unittest
+import zipfile
+
+
+from builtins import range  # pylint: disable=redefined-builtin
+import yaml
+
+from grr_response_core.lib import flags
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import type_info
+from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
+from grr_response_server import export
+from grr_response_server.output_plugins import test_plugins
+from grr.test_lib import test_lib
+
+# pyarrow is an optional dependency of the server.
+try:
+  import pyarrow as pa
+  from pyarrow import parquet as pq
+  from grr_response_server.output_plugins import parquet_plugin
+except ImportError:
+  pa = pq = parquet_plugin = None
+
+
+class TestEmbeddedStruct(rdf_structs.RDFProtoStruct):
+  """Custom struct for testing schema generation."""
+
+  type_description = type_info.TypeDescriptorSet(
+      rdf_structs.ProtoString(name="e_string_field", field_number=1),
+      rdf_structs.ProtoDouble(name="e_double_field", field_number=2))
+
+
+class ParquetTestStruct(rdf_structs.RDFProtoStruct):
+  """Custom struct for testing schema generation."""
+
+  type_description = type_info.TypeDescriptorSet(
+      rdf_structs.ProtoString(name="string_field", field_number=1),
+      rdf_structs.ProtoBinary(name="bytes_field", field_number=2),
+      rdf_structs.ProtoUnsignedInteger(name="uint_field", field_number=3),
+      rdf_structs.ProtoSignedInteger(name="int_field", field_number=4),
+      rdf_structs.ProtoFloat(name="float_field", field_number=5),
+      rdf_structs.ProtoDouble(name="double_field", field_number=6),
+      rdf_structs.ProtoEnum(
+          name="enum_field",
+          field_number=7,
+          enum_name="EnumField",
+          enum={"FIRST": 1,
+                "SECOND": 2}),
+      rdf_structs.ProtoBoolean(name="bool_field", field_number=8),
+      rdf_structs.ProtoRDFValue(
+          name="urn_field", field_number=9, rdf_type="RDFURN"),
+      rdf_structs.ProtoRDFValue(
+          name="time_field", field_number=10, rdf_type="RDFDatetime"),
+      rdf_structs.ProtoRDFValue(
+          name="time_field_seconds",
+          field_number=11,
+          rdf_type="RDFDatetimeSeconds"),
+      rdf_structs.ProtoRDFValue(
+          name="duration_field", field_number=12, rdf_type="Duration"),
+      rdf_structs.ProtoEmbedded(
+          name="embedded_field", field_number=13, nested=TestEmbeddedStruct))
+
+
+@unittest.skipIf(parquet_plugin is None, "pyarrow is not installed")
+class ParquetInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
+  """Tests the Parquet instant output plugin."""
+
+  plugin_cls = getattr(parquet_plugin, "ParquetInstantOutputPlugin", None)
+
+  STAT_ENTRY_RESPONSES = [
+      rdf_client.StatEntry(
+          pathspec=rdf_paths.PathSpec(path="/foo/bar/%d" % i, pathtype="OS"),
+          st_mode=33184,  # octal = 100640 => u=rw,g=r,o= => -rw-r-----
+          st_ino=1063090,
+          st_dev=64512,
+          st_nlink=1 + i,
+          st_uid=139592,
+          st_gid=5000,
+          st_size=0,
+          st_atime=1493596800,  # Midnight, 01.05.2017 UTC in seconds
+          st_mtime=1493683200,  # Midnight, 01.05.2017 UTC in seconds
+          st_ctime=1493683200) for i in range(10)
+  ]
+
+  def ProcessValuesToZip(self, values_by_cls):
+    fd_path = self.ProcessValues(values_by_cls)
+    file_basename, _ = os.path.splitext(os.path.basename(fd_path))
+    return zipfile.ZipFile(fd_path), file_basename
+
+  def ReadParquetFile(self, zip_fd, name):
+    return pq.ParquetFile(io.BytesIO(zip_fd.read(name)))
+
+  def testColumnTypeInference(self):
+    columns = self.plugin._GetParquetColumns(ParquetTestStruct)
+    column_types = {name: converter.arrow_type for _, name, converter in columns}
+    self.assertEqual(column_types, {
+        "string_field": pa.string(),
+        "bytes_field": pa.binary(),
+        "uint_field": pa.uint64(),
+        "int_field": pa.int64(),
+        "float_field": pa.float32(),
+        "double_field": pa.float64(),
+        "enum_field": pa.string(),
+        "bool_field": pa.bool_(),
+        "urn_field": pa.string(),
+        "time_field": pa.timestamp("us"),
+        "time_field_seconds": pa.timestamp("us"),
+        "duration_field": pa.int64(),
+        "embedded_field.e_string_field": pa.string(),
+        "embedded_field.e_double_field": pa.float64()
+    })
+
+  def testColumnCompression(self):
+    columns = self.plugin._GetParquetColumns(ParquetTestStruct)
+    compression = self.plugin._GetCompression(columns)
+    self.assertEqual(compression["string_field"], "GZIP")
+    self.assertEqual(compression["bytes_field"], "GZIP")
+    self.assertEqual(compression["int_field"], "SNAPPY")
+    self.assertEqual(compression["time_field"], "SNAPPY")
+
+  def testConversionToTable(self):
+    columns = self.plugin._GetParquetColumns(ParquetTestStruct)
+    test_structs = [
+        ParquetTestStruct(
+            string_field="string_value",
+            bytes_field="bytes_value",
+            uint_field=123,
+            int_field=456,
+            float_field=0.5,
+            double_field=0.456,
+            enum_field="SECOND",
+            bool_field=True,
+            urn_field=rdfvalue.RDFURN("www.test.com"),
+            time_field=rdfvalue.RDFDatetime.FromDatetime(
+                datetime.datetime(2017, 5, 1)),
+            time_field_seconds=rdfvalue.RDFDatetimeSeconds.FromDatetime(
+                datetime.datetime(2017, 5, 2)),
+            duration_field=rdfvalue.Duration.FromSeconds(123),
+            embedded_field=TestEmbeddedStruct(
+                e_string_field="e_string_value", e_double_field=0.789)),
+        ParquetTestStruct(
+            enum_field="FIRST",
+            embedded_field=TestEmbeddedStruct(e_double_field=0.789)),
+    ]
+
+    table = self.plugin._ConvertToTable(columns, test_structs)
+    self.assertEqual(table.num_rows, 2)
+    self.assertEqual(table.schema.names, [name for _, name, _ in columns])
+    self.assertEqual(
+        table.to_pydict(), {
+            "string_field": [u"string_value", None],
+            "bytes_field": [b"bytes_value", None],
+            "uint_field": [123, None],
+            "int_field": [456, None],
+            "float_field": [0.5, None],
+            "double_field": [0.456, None],
+            "enum_field": [u"SECOND", u"FIRST"],
+            "bool_field": [True, None],
+            "urn_field": [u"aff4:/www.test.com", None],
+            "time_field": [datetime.datetime(2017, 5, 1), None],
+            "time_field_seconds": [datetime.datetime(2017, 5, 2), None],
+            "duration_field": [123000000, None],
+            "embedded_field.e_string_field": [u"e_string_value", None],
+            "embedded_field.e_double_field": [0.789, 0.789]
+        })
+
+  def testExportedFilenamesAndManifestForValuesOfSameType(self):
+    zip_fd, prefix = self.ProcessValuesToZip({
+        rdf_client.StatEntry: self.STAT_ENTRY_RESPONSES
+    })
+    self.assertEqual(
+        set(zip_fd.namelist()),
+        {"%s/MANIFEST" % prefix,
+         "%s/ExportedFile/from_StatEntry.parquet" % prefix})
+    parsed_manifest = yaml.load(zip_fd.read("%s/MANIFEST" % prefix))
+    self.assertEqual(parsed_manifest,
+                     {"export_stats": {
+                         "StatEntry": {
+                             "ExportedFile": 10
+                         }
+                     }})
+
+  def testExportedSchemaForValuesOfSameType(self):
+    zip_fd, prefix = self.ProcessValuesToZip({
+        rdf_client.StatEntry: self.STAT_ENTRY_RESPONSES
+    })
+    parquet_file = self.ReadParquetFile(
+        zip_fd, "%s/ExportedFile/from_StatEntry.parquet" % prefix)
+
+    arrow_schema = parquet_file.schema.to_arrow_schema()
+    columns = self.plugin._GetParquetColumns(export.ExportedFile)
+    self.assertEqual(arrow_schema.names, [name for _, name, _ in columns])
+    self.assertEqual(
+        arrow_schema.field_by_name("metadata.client_urn").type, pa.string())
+    self.assertEqual(arrow_schema.field_by_name("st_ino").type, pa.uint64())
+    self.assertEqual(
+        arrow_schema.field_by_name("st_atime").type, pa.timestamp("us"))
+
+  def testExportedRowsForValuesOfSameType(self):
+    zip_fd, prefix = self.ProcessValuesToZip({
+        rdf_client.StatEntry: self.STAT_ENTRY_RESPONSES
+    })
+    parquet_file = self.ReadParquetFile(
+        zip_fd, "%s/ExportedFile/from_StatEntry.parquet" % prefix)
+
+    select_columns = [
+        "metadata.client_urn", "metadata.source_urn", "urn", "st_mode",
+        "st_ino", "st_dev", "st_nlink", "st_uid", "st_gid", "st_size",
+        "st_atime", "st_mtime", "st_ctime", "st_blksize", "st_rdev", "symlink"
+    ]
+    table = parquet_file.read(columns=select_columns).to_pydict()
+    self.assertEqual(table["urn"], [
+        self.client_id.Add("/fs/os/foo/bar").Add(str(i)) for i in range(10)
+    ])
+
+    for i in range(10):
+      results = {k: table[k][i] for k in select_columns if k != "urn"}
+      expected_results = {
+          "metadata.client_urn": self.client_id,
+          "metadata.source_urn": self.results_urn,
+          "st_mode": "-rw-r-----",
+          "st_ino": 1063090,
+          "st_dev": 64512,
+          "st_nlink": i + 1,
+          "st_uid": 139592,
+          "st_gid": 5000,
+          "st_size": 0,
+          "st_atime": datetime.datetime(2017, 5, 1),
+          "st_mtime": datetime.datetime(2017, 5, 2),
+          "st_ctime": datetime.datetime(2017, 5, 2),
+          "st_blksize": 0,
+          "st_rdev": 0,
+          "symlink": ""
+      }
+      self.assertEqual(results, expected_results)
+
+  def testEachBatchOfRowsIsWrittenAsSeparateRowGroup(self):
+    with utils.Stubber(parquet_plugin.ParquetInstantOutputPlugin,
+                       "ROW_GROUP_SIZE", 3):
+      zip_fd, prefix = self.ProcessValuesToZip({
+          rdf_client.StatEntry: self.STAT_ENTRY_RESPONSES
+      })
+    parquet_file = self.ReadParquetFile(
+        zip_fd, "%s/ExportedFile/from_StatEntry.parquet" % prefix)
+
+    self.assertEqual(parquet_file.metadata.num_row_groups, 4)
+    self.assertEqual(parquet_file.metadata.num_rows, 10)
+    self.assertEqual(
+        parquet_file.read(columns=["st_nlink"]).to_pydict(),
+        {"st_nlink": list(range(1, 11))})
+
+  def testExportedFilenamesAndManifestForValuesOfMultipleTypes(self):
+    zip_fd, prefix = self.ProcessValuesToZip({
+        rdf_client.StatEntry: [
+            rdf_client.StatEntry(pathspec=rdf_paths.PathSpec(
+                path="/foo/bar", pathtype="OS"))
+        ],
+        rdf_client.Process: [rdf_client.Process(pid=42)]
+    })
+    self.assertEqual(
+        set(zip_fd.namelist()), {
+            "%s/MANIFEST" % prefix,
+            "%s/ExportedFile/from_StatEntry.parquet" % prefix,
+            "%s/ExportedProcess/from_Process.parquet" % prefix
+        })
+
+    parsed_manifest = yaml.load(zip_fd.read("%s/MANIFEST" % prefix))
+    self.assertEqual(parsed_manifest, {
+        "export_stats": {
+            "StatEntry": {
+                "ExportedFile": 1
+            },
+            "Process": {
+                "ExportedProcess": 1
+            }
+        }
+    })
+
+  def testExportedRowsForValuesOfMultipleTypes(self):
+    zip_fd, prefix = self.ProcessValuesToZip({
+        rdf_client.StatEntry: [
+            rdf_client.StatEntry(pathspec=rdf_paths.PathSpec(
+                path="/foo/bar", pathtype="OS"))
+        ],
+        rdf_client.Process: [rdf_client.Process(pid=42)]
+    })
+    stat_entry_table = self.ReadParquetFile(
+        zip_fd, "%s/ExportedFile/from_StatEntry.parquet" % prefix).read(
+            columns=["metadata.client_urn", "metadata.source_urn", "urn"])
+    process_table = self.ReadParquetFile(
+        zip_fd, "%s/ExportedProcess/from_Process.parquet" % prefix).read(
+            columns=["metadata.client_urn", "metadata.source_urn", "pid"])
+
+    self.assertEqual(
+        stat_entry_table.to_pydict(), {
+            "metadata.client_urn": [self.client_id],
+            "metadata.source_urn": [self.results_urn],
+            "urn": [self.client_id.Add("/fs/os/foo/bar")]
+        })
+    self.assertEqual(
+        process_table.to_pydict(), {
+            "metadata.client_urn": [self.client_id],
+            "metadata.source_urn": [self.results_urn],
+            "pid": [42]
+        })
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
@@ -1,15 +1,15 @@
 #!/usr/bin/env python
 """Plugin that exports results as SQLite db scripts."""
 
+import base64
 import collections
 import io
+import itertools
 import os
 import zipfile
 
 
 from future.utils import iteritems
-from future.utils import iterkeys
-from future.utils import itervalues
 import sqlite3
 import yaml
 
@@ -69,6 +69,33 @@ class Rdf2SqliteAdapter(object):
       return Rdf2SqliteAdapter.NON_SEMANTIC_CONVERTERS.get(
           type_info.__class__, Rdf2SqliteAdapter.DEFAULT_CONVERTER)
 
+  @staticmethod
+  def GetFieldConvertFn(type_info):
+    """Returns a function converting values of a field to a SQLite value.
+
+    Unlike convert_fn of the field's converter, which expects values in their
+    primitive form (see RDFProtoStruct.ToPrimitiveDict()), the returned
+    function accepts values as they are stored in RDFProtoStructs.
+
+    Args:
+      type_info: Type descriptor of the field.
+
+    Returns:
+      A function taking a single field value.
+    """
+    convert_fn = Rdf2SqliteAdapter.GetConverter(type_info).convert_fn
+
+    if isinstance(type_info, rdf_structs.ProtoBoolean):
+      return convert_fn
+    elif isinstance(type_info, rdf_structs.ProtoEnum):
+      return lambda value: convert_fn(str(value))
+    elif (type_info.__class__ is rdf_structs.ProtoRDFValue and
+          issubclass(type_info.type, rdfvalue.RDFBytes)):
+      return lambda value: convert_fn(
+          base64.encodestring(value.SerializeToString()))
+    else:
+      return convert_fn
+
 
 class SqliteInstantOutputPlugin(
     instant_output_plugin.InstantOutputPluginWithExportConversion):
@@ -79,7 +106,7 @@ class SqliteInstantOutputPlugin(
   description = "Output ZIP archive containing SQLite scripts."
   output_file_extension = ".zip"
 
-  ROW_BATCH = 100
+  ROW_BATCH = 1000
 
   def __init__(self, *args, **kwargs):
     super(SqliteInstantOutputPlugin, self).__init__(*args, **kwargs)
@@ -111,36 +138,47 @@ class SqliteInstantOutputPlugin(
     table_name = "%s.from_%s" % (first_value.__class__.__name__,
                                  original_value_type.__name__)
     schema = self._GetSqliteSchema(first_value.__class__)
+    columns = self._GetSqliteColumns(first_value.__class__)
 
     # We will buffer the sql statements into an in-memory sql database before
     # dumping them to the zip archive. We rely on the PySQLite library for
     # string escaping.
     db_connection = sqlite3.connect(":memory:")
     db_cursor = db_connection.cursor()
+    # Rows are only buffered in the database, there is no need to be able to
+    # roll back changes.
+    db_cursor.execute("PRAGMA journal_mode = OFF;")
 
     yield self.archive_generator.WriteFileChunk("BEGIN TRANSACTION;\n")
-    with db_connection:
-      buf = io.StringIO()
-      buf.write(u"CREATE TABLE \"%s\" (\n  " % table_name)
-      column_types = [(k, v.sqlite_type) for k, v in iteritems(schema)]
-      buf.write(u",\n  ".join([u"\"%s\" %s" % (k, v) for k, v in column_types]))
-      buf.write(u"\n);")
-      db_cursor.execute(buf.getvalue())
-      yield self.archive_generator.WriteFileChunk(buf.getvalue() + u"\n")
-      self._InsertValueIntoDb(table_name, schema, first_value, db_cursor)
-
-    for sql in self._FlushAllRows(db_connection, table_name):
-      yield sql
-    counter = 1
-    for batch in utils.Grouper(exported_values, self.ROW_BATCH):
+    buf = io.StringIO()
+    buf.write(u"CREATE TABLE \"%s\" (\n  " % table_name)
+    column_types = [(k, v.sqlite_type) for k, v in iteritems(schema)]
+    buf.write(u",\n  ".join([u"\"%s\" %s" % (k, v) for k, v in column_types]))
+    buf.write(u"\n);")
+    db_cursor.execute(buf.getvalue())
+    yield self.archive_generator.WriteFileChunk(buf.getvalue() + u"\n")
+
+    insert_statement = self._GetInsertStatement(table_name, columns)
+    dump_statement = self._GetDumpStatement(table_name, columns)
+
+    counter = 0
+    for batch in utils.Grouper(
+        itertools.chain([first_value], exported_values), self.ROW_BATCH):
       counter += len(batch)
+      rows = [self._ConvertToSqlRow(columns, value) for value in batch]
       with db_connection:
-        for value in batch:
-          self._InsertValueIntoDb(table_name, schema, value, db_cursor)
-      for sql in self._FlushAllRows(db_connection, table_name):
-        yield sql
+        db_cursor.executemany(insert_statement, rows)
+      yield self._FlushAllRows(db_connection, table_name, dump_statement)
 
     db_connection.close()
+
+    # Creating indexes once all the rows are inserted is faster than updating
+    # them with every row.
+    if "metadata.client_urn" in schema:
+      yield self.archive_generator.WriteFileChunk(
+          "CREATE INDEX \"%s.client_urn\" "
+          "ON \"%s\" (\"metadata.client_urn\");\n" % (table_name, table_name))
+
     yield self.archive_generator.WriteFileChunk("COMMIT;\n")
     yield self.archive_generator.WriteFileFooter()
 
@@ -148,54 +186,65 @@ class SqliteInstantOutputPlugin(
         original_value_type.__name__, dict())
     counts_for_original_type[first_value.__class__.__name__] = counter
 
-  def _GetSqliteSchema(self, proto_struct_class, prefix=""):
+  def _GetSqliteSchema(self, proto_struct_class):
     """Returns a mapping of SQLite column names to Converter objects."""
-    schema = collections.OrderedDict()
-    for type_info in proto_struct_class.type_infos:
-      if type_info.__class__ is rdf_structs.ProtoEmbedded:
-        schema.update(
-            self._GetSqliteSchema(
-                type_info.type, prefix="%s%s." % (prefix, type_info.name)))
+    return collections.OrderedDict(
+        (name, Rdf2SqliteAdapter.GetConverter(type_info))
+        for _, name, type_info in
+        instant_output_plugin.FlattenProtoStructFields(proto_struct_class))
+
+  def _GetSqliteColumns(self, proto_struct_class):
+    """Returns a list of columns for values of a given class.
+
+    Args:
+      proto_struct_class: RDFProtoStruct class of exported values.
+
+    Returns:
+      A list of (field names path, convert function) tuples in the same order
+      as columns of the schema returned by _GetSqliteSchema().
+    """
+    return [(field_path, Rdf2SqliteAdapter.GetFieldConvertFn(type_info))
+            for field_path, _, type_info in
+            instant_output_plugin.FlattenProtoStructFields(proto_struct_class)]
+
+  def _ConvertToSqlRow(self, columns, value):
+    """Converts an RDFProtoStruct into a tuple of SQLite values."""
+    row = []
+    for field_path, convert_fn in columns:
+      struct = value
+      for name in field_path:
+        if not struct.HasField(name):
+          row.append(None)
+          break
+        struct = struct.Get(name)
       else:
-        field_name = utils.SmartStr(prefix + type_info.name)
-        schema[field_name] = Rdf2SqliteAdapter.GetConverter(type_info)
-    return schema
-
-  def _InsertValueIntoDb(self, table_name, schema, value, db_cursor):
-    sql_dict = self._ConvertToCanonicalSqlDict(schema, value.ToPrimitiveDict())
-    buf = io.StringIO()
-    buf.write(u"INSERT INTO \"%s\" (\n  " % table_name)
-    buf.write(u",\n  ".join(["\"%s\"" % k for k in iterkeys(sql_dict)]))
-    buf.write(u"\n)")
-    buf.write(u"VALUES (%s);" % u",".join([u"?"] * len(sql_dict)))
-    db_cursor.execute(buf.getvalue(), list(itervalues(sql_dict)))
-
-  def _ConvertToCanonicalSqlDict(self, schema, raw_dict, prefix=""):
-    """Converts a dict of RDF values into a SQL-ready form."""
-    flattened_dict = {}
-    for k, v in iteritems(raw_dict):
-      if isinstance(v, dict):
-        flattened_dict.update(
-            self._ConvertToCanonicalSqlDict(
-                schema, v, prefix="%s%s." % (prefix, k)))
-      else:
-        field_name = prefix + k
-        flattened_dict[field_name] = schema[field_name].convert_fn(v)
-    return flattened_dict
-
-  def _FlushAllRows(self, db_connection, table_name):
+        row.append(convert_fn(struct))
+    return tuple(row)
+
+  def _GetInsertStatement(self, table_name, columns):
+    return u"INSERT INTO \"%s\" VALUES (%s);" % (table_name, u",".join(
+        [u"?"] * len(columns)))
+
+  def _GetDumpStatement(self, table_name, columns):
+    """Returns a query generating INSERT statements for rows of a table."""
+    # This mimics the queries used by sqlite3.Connection.iterdump().
+    quoted_columns = [
+        u"'||quote(\"%s\")||'" % ".".join(field_path).replace('"', '""')
+        for field_path, _ in columns
+    ]
+    table_name = table_name.replace('"', '""')
+    return u"SELECT 'INSERT INTO \"%s\" VALUES(%s)' FROM \"%s\";" % (
+        table_name, u",".join(quoted_columns), table_name)
+
+  def _FlushAllRows(self, db_connection, table_name, dump_statement):
     """Copies rows from the given db into the output file then deletes them."""
-    for sql in db_connection.iterdump():
-      # The archive generator expects strings (not Unicode objects returned by
-      # the pysqlite library).
-      sql = utils.SmartStr(sql)
-      if (sql.startswith("CREATE TABLE") or
-          sql.startswith("BEGIN TRANSACTION") or sql.startswith("COMMIT")):
-        # These statements only need to be written once.
-        continue
-      yield self.archive_generator.WriteFileChunk(sql + "\n")
+    sql = u"".join(
+        row[0] + u";\n" for row in db_connection.execute(dump_statement))
     with db_connection:
       db_connection.cursor().execute("DELETE FROM \"%s\";" % table_name)
+    # The archive generator expects strings (not Unicode objects returned by
+    # the pysqlite library).
+    return self.archive_generator.WriteFileChunk(utils.SmartStr(sql))
 
   def Finish(self):
     manifest = {"export_stats": self.export_counts}
@@ -61,7 +61,9 @@ class SqliteTestStruct(rdf_structs.RDFProtoStruct):
       rdf_structs.ProtoRDFValue(
           name="duration_field", field_number=12, rdf_type="Duration"),
       rdf_structs.ProtoEmbedded(
-          name="embedded_field", field_number=13, nested=TestEmbeddedStruct))
+          name="embedded_field", field_number=13, nested=TestEmbeddedStruct),
+      rdf_structs.ProtoRDFValue(
+          name="rdf_bytes_field", field_number=14, rdf_type="RDFBytes"))
 
 
 class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
@@ -116,11 +118,17 @@ class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
         "time_field_seconds": "INTEGER",
         "duration_field": "INTEGER",
         "embedded_field.e_string_field": "TEXT",
-        "embedded_field.e_double_field": "REAL"
+        "embedded_field.e_double_field": "REAL",
+        "rdf_bytes_field": "TEXT"
     })
 
-  def testConversionToCanonicalSqlDict(self):
+  def _ConvertToSqlDict(self, test_struct):
     schema = self.plugin._GetSqliteSchema(SqliteTestStruct)
+    columns = self.plugin._GetSqliteColumns(SqliteTestStruct)
+    row = self.plugin._ConvertToSqlRow(columns, test_struct)
+    return dict(zip(iterkeys(schema), row))
+
+  def testConversionToSqlRow(self):
     test_struct = SqliteTestStruct(
         string_field="string_value",
         bytes_field="bytes_value",
@@ -137,11 +145,10 @@ class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
             datetime.datetime(2017, 5, 2)),
         duration_field=rdfvalue.Duration.FromSeconds(123),
         embedded_field=TestEmbeddedStruct(
-            e_string_field="e_string_value", e_double_field=0.789))
-    sql_dict = self.plugin._ConvertToCanonicalSqlDict(
-        schema, test_struct.ToPrimitiveDict())
+            e_string_field="e_string_value", e_double_field=0.789),
+        rdf_bytes_field=rdfvalue.RDFBytes(b"rdf_bytes_value"))
     self.assertEqual(
-        sql_dict,
+        self._ConvertToSqlDict(test_struct),
         {
             "string_field": "string_value",
             "bytes_field": "bytes_value",
@@ -156,9 +163,26 @@ class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
             "time_field_seconds": 1493683200000000,  # Midnight, May 2
             "duration_field": 123000000,
             "embedded_field.e_string_field": "e_string_value",
-            "embedded_field.e_double_field": 0.789
+            "embedded_field.e_double_field": 0.789,
+            "rdf_bytes_field": "cmRmX2J5dGVzX3ZhbHVl\n"
         })
 
+  def testConversionToSqlRowOfMissingFields(self):
+    test_struct = SqliteTestStruct(
+        enum_field="FIRST",
+        bool_field=False,
+        embedded_field=TestEmbeddedStruct(e_double_field=0.789))
+    sql_dict = self._ConvertToSqlDict(test_struct)
+    self.assertEqual(sql_dict["enum_field"], "FIRST")
+    self.assertEqual(sql_dict["bool_field"], 0)
+    self.assertEqual(sql_dict["embedded_field.e_double_field"], 0.789)
+    self.assertIsNone(sql_dict["embedded_field.e_string_field"])
+    self.assertIsNone(sql_dict["string_field"])
+    self.assertIsNone(sql_dict["rdf_bytes_field"])
+
+    sql_dict = self._ConvertToSqlDict(SqliteTestStruct())
+    self.assertEqual(set(sql_dict.values()), {None})
+
   def testExportedFilenamesAndManifestForValuesOfSameType(self):
     zip_fd, prefix = self.ProcessValuesToZip({
         rdf_client.StatEntry: self.STAT_ENTRY_RESPONSES
@@ -200,6 +224,10 @@ class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
     self.assertEqual(column_types["st_ino"], "INTEGER")
     self.assertEqual(column_types["st_atime"], "INTEGER")
 
+    self.db_cursor.execute("PRAGMA index_list('ExportedFile.from_StatEntry');")
+    indexes = [row[1] for row in self.db_cursor.fetchall()]
+    self.assertEqual(indexes, ["ExportedFile.from_StatEntry.client_urn"])
+
   def testExportedRowsForValuesOfSameType(self):
     zip_fd, prefix = self.ProcessValuesToZip({
         rdf_client.StatEntry: self.STAT_ENTRY_RESPONSES
@@ -138,16 +138,20 @@ class QueueManager(object):
     notification_shard_index = (
         QueueManager.notification_shard_counters[queue_name] %
         self.num_notification_shards)
-    if notification_shard_index > 0:
-      return queue.Add(str(notification_shard_index))
+    return self.GetNotificationShardByIndex(queue, notification_shard_index)
+
+  def GetNotificationShardByIndex(self, queue, shard_index):
+    """Returns the urn of the shard with the given index of a queue."""
+    if shard_index > 0:
+      return queue.Add(str(shard_index))
     else:
       return queue
 
   def GetAllNotificationShards(self, queue):
-    result = [queue]
-    for i in range(1, self.num_notification_shards):
-      result.append(queue.Add(str(i)))
-    return result
+    return [
+        self.GetNotificationShardByIndex(queue, i)
+        for i in range(self.num_notification_shards)
+    ]
 
   def Copy(self):
     """Return a copy of the queue manager.
@@ -488,6 +492,21 @@ class QueueManager(object):
     return self._SortByPriority(
         list(itervalues(self._GetUnsortedNotifications(queue_shard))), queue)
 
+  def GetNotificationsByPriorityForShard(self, queue, shard_index):
+    """Same as GetNotificationsByPriority but for a given shard.
+
+    Used by workers that lease individual shards of a queue.
+
+    Args:
+      queue: usually rdfvalue.RDFURN("aff4:/W")
+      shard_index: The index of the shard, in [0, Worker.queue_shards).
+    Returns:
+      dict of notifications objects keyed by priority.
+    """
+    queue_shard = self.GetNotificationShardByIndex(queue, shard_index)
+    return self._SortByPriority(
+        list(itervalues(self._GetUnsortedNotifications(queue_shard))), queue)
+
   def GetNotificationsByPriorityForAllShards(self, queue):
     """Same as GetNotificationsByPriority but for all shards.
 
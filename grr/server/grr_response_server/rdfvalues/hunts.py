@@ -23,11 +23,110 @@ class HuntNotification(rdf_structs.RDFProtoStruct):
   ]
 
 
+class HuntClientCompletionBucket(rdf_structs.RDFProtoStruct):
+  protobuf = flows_pb2.HuntClientCompletionBucket
+
+
+class HuntClientCompletionRollup(rdf_structs.RDFProtoStruct):
+  """Started and completed client counts of a hunt in time buckets."""
+
+  protobuf = flows_pb2.HuntClientCompletionRollup
+  rdf_deps = [
+      HuntClientCompletionBucket,
+  ]
+
+  # Buckets are merged pairwise once there are more than this many of them.
+  MAX_BUCKETS = 1000
+
+  def _Bucket(self, timestamp):
+    """Returns the bucket a timestamp falls into, creating it if needed."""
+    start_time = timestamp.AsSecondsSinceEpoch()
+    start_time -= start_time % self.bucket_size
+
+    # Registrations come in roughly chronological order, so we search from
+    # the end.
+    index = len(self.buckets)
+    while index > 0 and self.buckets[index - 1].start_time > start_time:
+      index -= 1
+
+    if index > 0 and self.buckets[index - 1].start_time == start_time:
+      return self.buckets[index - 1]
+
+    bucket = HuntClientCompletionBucket(start_time=start_time)
+    if index == len(self.buckets):
+      self.buckets.Append(bucket)
+    else:
+      buckets = list(self.buckets)
+      buckets.insert(index, bucket)
+      self.buckets = buckets
+
+    if len(self.buckets) > self.MAX_BUCKETS:
+      self._Merge()
+      return self._Bucket(timestamp)
+
+    return self.buckets[index]
+
+  def _Merge(self):
+    """Doubles the bucket size, merging neighbouring buckets."""
+    self.bucket_size *= 2
+    merged = []
+    for bucket in self.buckets:
+      start_time = bucket.start_time - bucket.start_time % self.bucket_size
+      if merged and merged[-1].start_time == start_time:
+        merged[-1].started_clients_count += bucket.started_clients_count
+        merged[-1].completed_clients_count += bucket.completed_clients_count
+      else:
+        merged.append(
+            HuntClientCompletionBucket(
+                start_time=start_time,
+                started_clients_count=bucket.started_clients_count,
+                completed_clients_count=bucket.completed_clients_count))
+    self.buckets = merged
+
+  def RegisterStartedClient(self, timestamp):
+    self._Bucket(timestamp).started_clients_count += 1
+
+  def RegisterCompletedClient(self, timestamp):
+    self._Bucket(timestamp).completed_clients_count += 1
+
+  def GetDataPoints(self, start_time=None):
+    """Returns cumulative started and completed clients over time.
+
+    Args:
+      start_time: The rdfvalue.RDFDatetime the hunt started at. Defaults to
+        one bucket before the first registration.
+
+    Returns:
+      A tuple (started, completed) of lists of (hours, count) pairs, with
+      hours counted from start_time.
+    """
+    if not self.buckets:
+      return ([], [])
+
+    if start_time is None:
+      t0 = self.buckets[0].start_time - self.bucket_size
+    else:
+      t0 = start_time.AsSecondsSinceEpoch()
+    started = [(0.0, 0)]
+    completed = [(0.0, 0)]
+    started_count = completed_count = 0
+    for bucket in self.buckets:
+      # Buckets can start a bit before the hunt once they have been merged.
+      hours = max(bucket.start_time - t0, 0) / 3600.0
+      started_count += bucket.started_clients_count
+      completed_count += bucket.completed_clients_count
+      started.append((hours, started_count))
+      completed.append((hours, completed_count))
+
+    return (started, completed)
+
+
 class HuntContext(rdf_structs.RDFProtoStruct):
   protobuf = flows_pb2.HuntContext
   rdf_deps = [
       rdf_client.ClientResources,
       rdf_stats.ClientResourcesStats,
+      HuntClientCompletionRollup,
       rdfvalue.RDFDatetime,
       rdfvalue.SessionID,
   ]
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Tests for hunt RDFValues."""
+
+from builtins import range  # pylint: disable=redefined-builtin
+
+from grr_response_core.lib import flags
+from grr_response_core.lib import rdfvalue
+from grr_response_server.rdfvalues import hunts as rdf_hunts
+from grr.test_lib import test_lib
+
+
+class HuntClientCompletionRollupTest(test_lib.GRRBaseTest):
+
+  def _Time(self, seconds):
+    return rdfvalue.RDFDatetime.FromSecondsSinceEpoch(seconds)
+
+  def testEmptyRollupHasNoDataPoints(self):
+    rollup = rdf_hunts.HuntClientCompletionRollup()
+    self.assertEqual(rollup.GetDataPoints(), ([], []))
+
+  def testCountsAreCumulative(self):
+    rollup = rdf_hunts.HuntClientCompletionRollup()
+    rollup.RegisterStartedClient(self._Time(100))
+    rollup.RegisterStartedClient(self._Time(100))
+    rollup.RegisterStartedClient(self._Time(3700))
+    rollup.RegisterCompletedClient(self._Time(3700))
+    # Out of order registrations end up in the right bucket.
+    rollup.RegisterCompletedClient(self._Time(1900))
+
+    started, completed = rollup.GetDataPoints()
+    self.assertEqual(started, [(0.0, 0), (1 / 3600.0, 2), (1801 / 3600.0, 2),
+                               (3601 / 3600.0, 3)])
+    self.assertEqual(completed, [(0.0, 0), (1 / 3600.0, 0),
+                                 (1801 / 3600.0, 1), (3601 / 3600.0, 2)])
+
+  def testHoursAreCountedFromStartTime(self):
+    rollup = rdf_hunts.HuntClientCompletionRollup()
+    rollup.RegisterStartedClient(self._Time(3700))
+    rollup.RegisterCompletedClient(self._Time(7300))
+
+    started, completed = rollup.GetDataPoints(start_time=self._Time(100))
+    self.assertEqual(started, [(0.0, 0), (1.0, 1), (2.0, 1)])
+    self.assertEqual(completed, [(0.0, 0), (1.0, 0), (2.0, 1)])
+
+  def testBucketsAreMergedWhenThereAreTooMany(self):
+    rollup = rdf_hunts.HuntClientCompletionRollup()
+    rollup.MAX_BUCKETS = 10
+    for i in range(100):
+      rollup.RegisterStartedClient(self._Time(1000 + i))
+      rollup.RegisterCompletedClient(self._Time(1000 + i))
+
+    self.assertLessEqual(len(rollup.buckets), 10)
+    self.assertEqual(rollup.bucket_size, 16)
+    for bucket in rollup.buckets:
+      self.assertEqual(bucket.start_time % rollup.bucket_size, 0)
+
+    started, completed = rollup.GetDataPoints()
+    self.assertEqual(started[-1][1], 100)
+    self.assertEqual(completed[-1][1], 100)
+
+  def testRollupSurvivesSerialization(self):
+    rollup = rdf_hunts.HuntClientCompletionRollup()
+    rollup.RegisterStartedClient(self._Time(10))
+    rollup.RegisterCompletedClient(self._Time(20))
+
+    context = rdf_hunts.HuntContext(client_completion_rollup=rollup)
+    context = rdf_hunts.HuntContext.FromSerializedString(
+        context.SerializeToString())
+    self.assertEqual(context.client_completion_rollup.GetDataPoints(),
+                     rollup.GetDataPoints())
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  flags.StartMain(main)
@@ -5,12 +5,14 @@ import os
 import platform
 
 from grr_response_core import config
+from grr_response_core.config import contexts
 from grr_response_core.lib import config_lib
 from grr_response_core.lib import registry
 from grr_response_core.lib import stats
 # pylint: disable=unused-import
 from grr_response_core.lib.local import plugins
 # pylint: enable=unused-import
+from grr_response_server import instant_output_plugin
 from grr_response_server import server_logging
 from grr_response_server.local import registry_init
 
@@ -67,6 +69,11 @@ def Init():
 
   server_logging.ServerLoggingStartupInit()
 
+  # Export conversion workers are forked, so they have to be started before
+  # any of the init hooks starts a thread.
+  if config.CONFIG.ContextApplied(contexts.ADMIN_UI_CONTEXT):
+    instant_output_plugin.InitConversionPool()
+
   registry.Init()
 
   # Exempt config updater from this check because it is the one responsible for
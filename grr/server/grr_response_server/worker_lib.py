@@ -1,13 +1,21 @@
 #!/usr/bin/env python
 """Module with GRRWorker implementation."""
+from __future__ import division
 
 import logging
+import math
+import os
 import pdb
+import random
+import socket
+import threading
 import time
 import traceback
 
 
+from builtins import range  # pylint: disable=redefined-builtin
 from future.utils import iteritems
+from future.utils import itervalues
 
 from grr_response_core import config
 from grr_response_core.lib import flags
@@ -38,6 +46,187 @@ class FlowProcessingError(Error):
   """Raised when flow requests/responses can't be processed."""
 
 
+class NotificationShardLeaser(object):
+  """Splits the notification shards of the worker queues between workers.
+
+  Every worker announces itself with a heartbeat in the data store and holds a
+  subject lock for each shard it processes. Workers aim for an equal share of
+  the shards: they give back shards above their share so that newly started
+  workers can pick them up, and take over unowned shards, e.g. the ones of a
+  worker that died and whose leases expired.
+  """
+
+  LEASES_URN = rdfvalue.RDFURN("aff4:/worker_shard_leases")
+  HEARTBEAT_PREFIX = "worker:heartbeat:"
+
+  def __init__(self, queues, lease_time, worker_id=None):
+    """Constructor.
+
+    Args:
+      queues: The queues whose shards are leased.
+      lease_time: Lease time of the shards in seconds. Leases are renewed on
+        every call to Rebalance, so it has to be called more often than this.
+      worker_id: A string identifying this worker. Defaults to a value unique
+        to this process.
+    """
+    if worker_id is None:
+      worker_id = "%s-%d-%x" % (socket.gethostname(), os.getpid(),
+                                random.getrandbits(32))
+    self.worker_id = worker_id
+    self.lease_time = lease_time
+
+    num_shards = config.CONFIG["Worker.queue_shards"]
+    self.shards = [(queue, i) for queue in queues for i in range(num_shards)]
+    # Maps (queue, shard index) tuples to the DBSubjectLock we hold on them.
+    self.leases = {}
+
+  def _LockSubject(self, shard):
+    queue, shard_index = shard
+    return self.LEASES_URN.Add(queue.Basename()).Add(str(shard_index))
+
+  def _Heartbeat(self):
+    data_store.DB.Set(self.LEASES_URN, self.HEARTBEAT_PREFIX + self.worker_id,
+                      int(time.time() * 1e6))
+
+  def _CountActiveWorkers(self):
+    """Returns the number of workers that sent a recent heartbeat."""
+    cutoff = (time.time() - 2 * self.lease_time) * 1e6
+    active = 0
+    stale = []
+    for attribute, last_seen, _ in data_store.DB.ResolvePrefix(
+        self.LEASES_URN, self.HEARTBEAT_PREFIX):
+      if last_seen >= cutoff:
+        active += 1
+      else:
+        stale.append(attribute)
+
+    if stale:
+      data_store.DB.DeleteAttributes(self.LEASES_URN, stale)
+
+    return max(1, active)
+
+  def Rebalance(self):
+    """Renews our leases and adjusts the number of shards we hold.
+
+    Returns:
+      A tuple (acquired, released) of lists of (queue, shard index) tuples.
+    """
+    self._Heartbeat()
+    fair_share = int(math.ceil(len(self.shards) / self._CountActiveWorkers()))
+
+    released = []
+    for shard, lock in list(iteritems(self.leases)):
+      if lock.CheckLease() > 0:
+        lock.UpdateLease(self.lease_time)
+      else:
+        # We were too slow to renew, another worker might own it by now.
+        del self.leases[shard]
+        released.append(shard)
+
+    while len(self.leases) > fair_share:
+      shard, lock = self.leases.popitem()
+      lock.Release()
+      released.append(shard)
+
+    acquired = []
+    candidates = [shard for shard in self.shards if shard not in self.leases]
+    # Avoid all workers competing for the same shards.
+    random.shuffle(candidates)
+    for shard in candidates:
+      if len(self.leases) >= fair_share:
+        break
+
+      try:
+        lock = data_store.DB.DBSubjectLock(
+            self._LockSubject(shard), lease_time=self.lease_time)
+      except data_store.DBSubjectLockError:
+        continue
+
+      self.leases[shard] = lock
+      acquired.append(shard)
+
+    stats.STATS.SetGaugeValue("worker_leased_shards", len(self.leases))
+    return acquired, released
+
+  def ReleaseAll(self):
+    """Releases all leases, returns the released shards."""
+    released = list(self.leases)
+    for lock in itervalues(self.leases):
+      lock.Release()
+    self.leases = {}
+    data_store.DB.DeleteAttributes(self.LEASES_URN,
+                                   [self.HEARTBEAT_PREFIX + self.worker_id])
+    stats.STATS.SetGaugeValue("worker_leased_shards", 0)
+    return released
+
+
+class ShardWorkerLoop(threading.Thread):
+  """Processes the notifications of a single leased queue shard.
+
+  Each loop has its own thread pool, so a slow shard or a large flow only
+  delays the notifications in its own shard.
+  """
+
+  def __init__(self, worker, queue, shard_index):
+    super(ShardWorkerLoop, self).__init__(
+        name="ShardWorkerLoop-%s-%d" % (queue.Basename(), shard_index))
+    self.daemon = True
+    self.worker = worker
+    self.queue = queue
+    self.shard_index = shard_index
+    self.thread_pool = threadpool.ThreadPool.Factory(
+        "%s_%s_shard_%d" % (worker.threadpool_prefix, queue.Basename(),
+                            shard_index),
+        min_threads=1,
+        max_threads=config.CONFIG["Worker.shard_threads"])
+    self.thread_pool.Start()
+
+    self._stop = threading.Event()
+    self._lock = threading.Lock()
+    self._processed = 0
+
+  def Stop(self):
+    """Makes the loop exit after the current iteration."""
+    self._stop.set()
+
+  def Wait(self):
+    """Waits for a stopped loop to exit and stops its thread pool.
+
+    The pool is kept in the thread pool registry, a loop started later for the
+    same shard restarts it.
+    """
+    self.join()
+    self.thread_pool.Stop()
+
+  def PopProcessedCount(self):
+    """Returns the number of flows processed since the last call."""
+    with self._lock:
+      result, self._processed = self._processed, 0
+    return result
+
+  def run(self):
+    last_active = 0
+    while not self._stop.is_set():
+      processed = 0
+      try:
+        processed = self.worker.ProcessShardOnce(self.queue, self.shard_index,
+                                                 self.thread_pool)
+      # We need to keep going no matter what.
+      except Exception:  # pylint: disable=broad-except
+        logging.exception("Error processing shard %d of %s.", self.shard_index,
+                          self.queue)
+        stats.STATS.IncrementCounter("grr_worker_exceptions")
+
+      if processed:
+        last_active = time.time()
+        with self._lock:
+          self._processed += processed
+      elif time.time() - last_active > self.worker.SHORT_POLL_TIME:
+        self._stop.wait(self.worker.POLLING_INTERVAL)
+      else:
+        self._stop.wait(self.worker.SHORT_POLLING_INTERVAL)
+
+
 class GRRWorker(object):
   """A GRR worker."""
 
@@ -65,7 +254,8 @@ class GRRWorker(object):
                queues=queues_config.WORKER_LIST,
                threadpool_prefix="grr_threadpool",
                threadpool_size=None,
-               token=None):
+               token=None,
+               shard_affine=None):
     """Constructor.
 
     Args:
@@ -73,6 +263,9 @@ class GRRWorker(object):
       threadpool_prefix: A name for the thread pool used by this worker.
       threadpool_size: The number of workers to start in this thread pool.
       token: The token to use for the worker.
+      shard_affine: If True, the worker leases notification shards and runs a
+        ShardWorkerLoop for each of them instead of walking all queues in
+        RunOnce. Defaults to the Worker.shard_affine config option.
 
     Raises:
       RuntimeError: If the token is not provided.
@@ -99,9 +292,20 @@ class GRRWorker(object):
       self.__class__.thread_pool.Start()
 
     self.token = token
+    self.threadpool_prefix = threadpool_prefix
     self.last_active = 0
     self.last_mh_lease_attempt = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(0)
 
+    if shard_affine is None:
+      shard_affine = config.CONFIG["Worker.shard_affine"]
+    if shard_affine:
+      self.shard_leaser = NotificationShardLeaser(
+          queues, config.CONFIG["Worker.shard_lease_time"])
+    else:
+      self.shard_leaser = None
+    self.shard_loops = {}
+    self.last_shard_rebalance = 0
+
     # Well known flows are just instantiated.
     self.well_known_flows = flow.WellKnownFlow.GetAllWellKnownFlows(token=token)
 
@@ -122,6 +326,7 @@ class GRRWorker(object):
         else:
           processed = 0
           data_store.REL_DB.UnregisterMessageHandler()
+          self._StopShardLoops()
           was_master = False
           time.sleep(60)
 
@@ -137,6 +342,7 @@ class GRRWorker(object):
 
     except KeyboardInterrupt:
       logging.info("Caught interrupt, exiting.")
+      self._StopShardLoops()
       self.__class__.thread_pool.Join()
 
   def _ProcessMessageHandlerRequests(self, requests):
@@ -168,9 +374,15 @@ class GRRWorker(object):
     The worker processes new jobs from the task master. For each job
     we retrieve the session from the Task Scheduler.
 
+    In shard affine mode, this only rebalances the leased shards, the
+    messages are processed by the ShardWorkerLoops.
+
     Returns:
         Total number of messages processed by this call.
     """
+    if self.shard_leaser is not None:
+      return self._RunShardLoops()
+
     start_time = time.time()
     processed = 0
 
@@ -186,41 +398,9 @@ class GRRWorker(object):
       stats.STATS.RecordEvent("worker_time_to_retrieve_notifications",
                               time.time() - fetch_messages_start)
 
-      # Process stuck flows first
-      stuck_flows = notifications_by_priority.pop(queue_manager.STUCK_PRIORITY,
-                                                  [])
-
-      if stuck_flows:
-        self.ProcessStuckFlows(stuck_flows, queue_manager)
-
-      notifications_available = []
-      for priority in sorted(notifications_by_priority, reverse=True):
-        for notification in notifications_by_priority[priority]:
-          # Filter out session ids we already tried to lock but failed.
-          if notification.session_id not in self.queued_flows:
-            notifications_available.append(notification)
-
-      try:
-        # If we spent too much time processing what we have so far, the
-        # active_sessions list might not be current. We therefore break here
-        # so we can re-fetch a more up to date version of the list, and try
-        # again later. The risk with running with an old active_sessions list
-        # is that another worker could have already processed this message,
-        # and when we try to process it, there is nothing to do - costing us a
-        # lot of processing time. This is a tradeoff between checking the data
-        # store for current information and processing out of date
-        # information.
-        processed += self.ProcessMessages(
-            notifications_available, queue_manager,
-            self.RUN_ONCE_MAX_SECONDS - (time.time() - start_time))
-
-      # We need to keep going no matter what.
-      except Exception as e:  # pylint: disable=broad-except
-        logging.error("Error processing message %s. %s.", e,
-                      traceback.format_exc())
-        stats.STATS.IncrementCounter("grr_worker_exceptions")
-        if flags.FLAGS.debug:
-          pdb.post_mortem()
+      processed += self._ProcessNotificationsByPriority(
+          notifications_by_priority, queue_manager,
+          self.RUN_ONCE_MAX_SECONDS - (time.time() - start_time))
 
       queue_manager.UnfreezeTimestamp()
       # If we have spent too much time, stop.
@@ -228,6 +408,126 @@ class GRRWorker(object):
         return processed
     return processed
 
+  def ProcessShardOnce(self, queue, shard_index, thread_pool):
+    """Processes the current notifications of a single queue shard.
+
+    Args:
+      queue: The queue the shard belongs to.
+      shard_index: The index of the shard.
+      thread_pool: The thread pool to process the flows in. This method
+        returns once all of them are done.
+
+    Returns:
+      The number of processed flows.
+    """
+    queue_manager = queue_manager_lib.QueueManager(token=self.token)
+    queue_manager.FreezeTimestamp()
+
+    fetch_messages_start = time.time()
+    notifications_by_priority = (
+        queue_manager.GetNotificationsByPriorityForShard(queue, shard_index))
+    stats.STATS.RecordEvent("worker_time_to_retrieve_notifications",
+                            time.time() - fetch_messages_start)
+
+    processed = self._ProcessNotificationsByPriority(
+        notifications_by_priority,
+        queue_manager,
+        self.RUN_ONCE_MAX_SECONDS,
+        thread_pool=thread_pool)
+    # Waiting for the flows to finish guarantees that the next fetch doesn't
+    # return notifications for flows that are still being processed.
+    thread_pool.Join()
+
+    queue_manager.UnfreezeTimestamp()
+    return processed
+
+  def _ProcessNotificationsByPriority(self,
+                                      notifications_by_priority,
+                                      queue_manager,
+                                      time_limit,
+                                      thread_pool=None):
+    """Processes notifications as returned by GetNotificationsByPriority."""
+    # Process stuck flows first
+    stuck_flows = notifications_by_priority.pop(queue_manager.STUCK_PRIORITY,
+                                                [])
+
+    if stuck_flows:
+      self.ProcessStuckFlows(stuck_flows, queue_manager)
+
+    notifications_available = []
+    for priority in sorted(notifications_by_priority, reverse=True):
+      for notification in notifications_by_priority[priority]:
+        # Filter out session ids we already tried to lock but failed.
+        if notification.session_id not in self.queued_flows:
+          notifications_available.append(notification)
+
+    try:
+      # If we spent too much time processing what we have so far, the
+      # active_sessions list might not be current. We therefore break here
+      # so we can re-fetch a more up to date version of the list, and try
+      # again later. The risk with running with an old active_sessions list
+      # is that another worker could have already processed this message,
+      # and when we try to process it, there is nothing to do - costing us a
+      # lot of processing time. This is a tradeoff between checking the data
+      # store for current information and processing out of date
+      # information.
+      return self.ProcessMessages(
+          notifications_available,
+          queue_manager,
+          time_limit,
+          thread_pool=thread_pool)
+
+    # We need to keep going no matter what.
+    except Exception as e:  # pylint: disable=broad-except
+      logging.error("Error processing message %s. %s.", e,
+                    traceback.format_exc())
+      stats.STATS.IncrementCounter("grr_worker_exceptions")
+      if flags.FLAGS.debug:
+        pdb.post_mortem()
+      return 0
+
+  def _RunShardLoops(self):
+    """Rebalances the leased shards and starts or stops their loops."""
+    # Leases are renewed here, so this has to happen well within lease_time.
+    if (time.time() - self.last_shard_rebalance >
+        self.shard_leaser.lease_time / 3):
+      acquired, released = self.shard_leaser.Rebalance()
+      self.last_shard_rebalance = time.time()
+
+      # A shard can be released and re-acquired by the same rebalance, its old
+      # loop has to be gone before a new one uses the shard's thread pool.
+      self._StopLoops([
+          self.shard_loops.pop(shard)
+          for shard in released
+          if shard in self.shard_loops
+      ])
+
+      for shard in acquired:
+        queue, shard_index = shard
+        loop = ShardWorkerLoop(self, queue, shard_index)
+        loop.start()
+        self.shard_loops[shard] = loop
+
+    return sum(
+        loop.PopProcessedCount() for loop in itervalues(self.shard_loops))
+
+  def _StopShardLoops(self):
+    if self.shard_leaser is None:
+      return
+
+    self.shard_leaser.ReleaseAll()
+    self._StopLoops(list(itervalues(self.shard_loops)))
+    self.shard_loops = {}
+    self.last_shard_rebalance = 0
+
+  def _StopLoops(self, loops):
+    # Stop all loops before waiting, so they finish their iterations in
+    # parallel.
+    for loop in loops:
+      loop.Stop()
+    for loop in loops:
+      loop.Wait()
+
   def ProcessStuckFlows(self, stuck_flows, queue_manager):
     stats.STATS.IncrementCounter("grr_flows_stuck", len(stuck_flows))
 
@@ -246,7 +546,11 @@ class GRRWorker(object):
         # "stuck flow" notification itself.
         queue_manager.DeleteNotification(stuck_flow.session_id)
 
-  def ProcessMessages(self, active_notifications, queue_manager, time_limit=0):
+  def ProcessMessages(self,
+                      active_notifications,
+                      queue_manager,
+                      time_limit=0,
+                      thread_pool=None):
     """Processes all the flows in the messages.
 
     Precondition: All tasks come from the same queue.
@@ -261,10 +565,15 @@ class GRRWorker(object):
         queue_manager: QueueManager object used to manage notifications,
                        requests and responses.
         time_limit: If set return as soon as possible after this many seconds.
+        thread_pool: The thread pool to process the flows in, defaults to the
+                     worker's shared thread pool.
 
     Returns:
         The number of processed flows.
     """
+    if thread_pool is None:
+      thread_pool = self.__class__.thread_pool
+
     now = time.time()
     processed = 0
     for notification in active_notifications:
@@ -274,7 +583,7 @@ class GRRWorker(object):
 
         processed += 1
         self.queued_flows.Put(notification.session_id, 1)
-        self.__class__.thread_pool.AddTask(
+        thread_pool.AddTask(
             target=self._ProcessMessages,
             args=(notification, queue_manager.Copy()),
             name=self.__class__.__name__)
@@ -391,6 +700,7 @@ class WorkerInit(registry.InitHook):
   def RunOnce(self):
     """Exports the vars.."""
     stats.STATS.RegisterCounterMetric("grr_flows_stuck")
+    stats.STATS.RegisterCounterMetric("grr_worker_exceptions")
     stats.STATS.RegisterCounterMetric(
         "worker_bad_flow_objects", fields=[("type", str)])
     stats.STATS.RegisterCounterMetric(
@@ -401,5 +711,9 @@ class WorkerInit(registry.InitHook):
                    "these to be high when the system"
                    "is idle."))
     stats.STATS.RegisterEventMetric(
-        "worker_flow_processing_time", fields=[("flow", str)])
-    stats.STATS.RegisterEventMetric("worker_time_to_retrieve_notifications")
+        "worker_flow_processing_time",
+        fields=[("flow", str)],
+        thread_shards=True)
+    stats.STATS.RegisterEventMetric(
+        "worker_time_to_retrieve_notifications", thread_shards=True)
+    stats.STATS.RegisterGaugeMetric("worker_leased_shards", int)
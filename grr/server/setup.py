@@ -163,6 +163,10 @@ setup_args = dict(
         # store support:
         # pip install grr-response[mysqldatastore]
         "mysqldatastore": ["mysqlclient==1.3.12"],
+        # This is an optional component. Install to get Parquet instant
+        # output plugin support:
+        # pip install grr-response[parquet]
+        "parquet": ["pyarrow==0.11.1"],
     },
     data_files=data_files)
 
@@ -41,6 +41,7 @@ from grr_response_server import artifact
 from grr_response_server import client_index
 from grr_response_server import data_store
 from grr_response_server import email_alerts
+from grr_response_server import foreman
 from grr_response_server.aff4_objects import aff4_grr
 from grr_response_server.aff4_objects import filestore
 from grr_response_server.aff4_objects import users
@@ -103,6 +104,8 @@ class GRRBaseTest(unittest.TestCase):
     # to access the delegate directly (assuming it's an InMemoryDB
     # implementation).
     data_store.REL_DB.delegate.ClearTestDB()
+    foreman.RULE_CACHE.Invalidate()
+    client_index.IN_MEMORY_INDEX.Invalidate()
 
     aff4.FACTORY.Flush()
 